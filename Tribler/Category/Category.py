@@ -5,6 +5,8 @@ import os, re
 from Tribler.Category.init_category import getCategoryInfo
 from FamilyFilter import XXXFilter
 from traceback import print_exc
+from collections import OrderedDict
+from threading import Lock
 
 import sys
 
@@ -12,6 +14,7 @@ from Tribler.__init__ import LIBRARYNAME
 
 DEBUG=False
 category_file = "category.conf"
+CATEGORY_CACHE_SIZE = 2048  # torrents of which the categories are remembered
 
 
 class Category:
@@ -37,6 +40,11 @@ class Category:
                 print_exc()
 
         self.xxx_filter = XXXFilter(install_dir)
+        self.category_rules = self._compileCategories()
+
+        # (display_name, tracker, comment, hash of files_list) -> categories, least recently used first
+        self.category_cache = OrderedDict()
+        self.category_cache_lock = Lock()
 
 
         if DEBUG:
@@ -103,7 +111,14 @@ class Category:
         # torrent_dict is the  dict of
         # a torrent file
         # return value: list of category the torrent belongs to
+        return self.calculateCategoryNonDict(*self._getTorrentInfo(torrent_dict, display_name))
+
+    # calculate the categories for a list of (torrent_dict, display_name) pairs
+    # return list of lists
+    def calculateCategories(self, torrents):
+        return self.calculateCategoriesNonDict([self._getTorrentInfo(torrent_dict, display_name) for torrent_dict, display_name in torrents])
 
+    def _getTorrentInfo(self, torrent_dict, display_name):
         files_list = []
         try:
             # the multi-files mode
@@ -118,10 +133,36 @@ class Category:
             tracker = torrent_dict.get('announce-list',[['']])[0][0]
 
         comment = torrent_dict.get('comment')
-        return self.calculateCategoryNonDict(files_list, display_name, tracker, comment)
+        return files_list, display_name, tracker, comment
 
 
     def calculateCategoryNonDict(self, files_list, display_name, tracker, comment):
+        return self.calculateCategoriesNonDict([(files_list, display_name, tracker, comment)])[0]
+
+    # calculate the categories for a list of (files_list, display_name, tracker, comment) tuples
+    # return list of lists
+    def calculateCategoriesNonDict(self, torrents):
+        # the words of names that occur in several torrents are found once
+        words = {}
+        categories = []
+        for files_list, display_name, tracker, comment in torrents:
+            key = (display_name, tracker, comment, hash(tuple(map(tuple, files_list))))
+            with self.category_cache_lock:
+                torrent_category = self.category_cache.pop(key, None)
+                if torrent_category:
+                    self.category_cache[key] = torrent_category
+
+            if not torrent_category:
+                torrent_category = self._calculateCategory(files_list, display_name, tracker, comment, words)
+                with self.category_cache_lock:
+                    self.category_cache[key] = torrent_category
+                    if len(self.category_cache) > CATEGORY_CACHE_SIZE:
+                        self.category_cache.popitem(last=False)
+
+            categories.append(list(torrent_category))
+        return categories
+
+    def _calculateCategory(self, files_list, display_name, tracker, comment, words):
         # Check xxx
         try:
 
@@ -132,10 +173,15 @@ class Category:
             print_exc()
 
         torrent_category = None
-        # filename_list ready
+        # the words of the display name and of the files are shared by all categories
+        display_name = display_name.lower()
+        display_words = words.get(display_name)
+        if display_words is None:
+            display_words = words[display_name] = set(self._getWords(display_name))
+        files = [(name.lower(), length) for name, length in files_list]
         strongest_cat = 0.0
-        for category in self.category_info:    # for each category
-            (decision, strength) = self.judge(category, files_list, display_name)
+        for category, suffixes, keywords in self.category_rules:    # for each category
+            (decision, strength) = self._judge(category, suffixes, keywords, display_words, files, words)
             if decision and (strength > strongest_cat):
                 torrent_category = [category['name']]
                 strongest_cat = strength
@@ -145,21 +191,27 @@ class Category:
 
         return torrent_category
 
+    def _compileCategories(self):
+        # the suffixes as a tuple for str.endswith and the keywords as
+        # (keyword, weight) pairs, in the order of category_info
+        return [(category, tuple(category['suffix']), category['keywords'].items()) for category in self.category_info]
+
     # judge whether a torrent file belongs to a certain category
     # return bool
     def judge(self, category, files_list, display_name = ''):
+        display_words = set(self._getWords(display_name.lower()))
+        files = [(name.lower(), length) for name, length in files_list]
+        return self._judge(category, tuple(category['suffix']), category['keywords'].items(), display_words, files, {})
+
+    def _judge(self, category, suffixes, keywords, display_words, files, file_words):
+        # files are (lowercase name, length) pairs, file_words caches the
+        # words of each name for the next categories
 
         # judge file keywords
-        display_name = display_name.lower()
         factor = 1.0
-        fileKeywords = self._getWords(display_name)
-
-        for ikeywords in category['keywords'].keys():
-            try:
-                fileKeywords.index(ikeywords)
-                factor *= 1 - category['keywords'][ikeywords]
-            except:
-                pass
+        for keyword, weight in keywords:
+            if keyword in display_words:
+                factor *= 1 - weight
         if (1 - factor) > 0.5:
             if 'strength' in category:
                 return (True, category['strength'])
@@ -169,7 +221,7 @@ class Category:
         # judge each file
         matchSize = 0
         totalSize = 1e-19
-        for name, length in files_list:
+        for name, length in files:
             totalSize += length
             # judge file size
             if ( length < category['minfilesize'] ) or \
@@ -177,27 +229,21 @@ class Category:
                 continue
 
             # judge file suffix
-            OK = False
-            for isuffix in category['suffix']:
-                if name.lower().endswith( isuffix ):
-                    OK = True
-                    break
-            if OK:
+            if name.endswith(suffixes):
                 matchSize += length
                 continue
 
             # judge file keywords
+            if not keywords:
+                continue
+            fileKeywords = file_words.get(name)
+            if fileKeywords is None:
+                fileKeywords = file_words[name] = set(self._getWords(name))
+
             factor = 1.0
-            fileKeywords = self._getWords(name.lower())
-
-            for ikeywords in category['keywords'].keys():
-#                pass
-                try:
-                    fileKeywords.index(ikeywords)
-                    #print ikeywords
-                    factor *= 1 - category['keywords'][ikeywords]
-                except:
-                    pass
+            for keyword, weight in keywords:
+                if keyword in fileKeywords:
+                    factor *= 1 - weight
             if factor < 0.5:
                 # print filename_list[index] + '#######################'
                 matchSize += length
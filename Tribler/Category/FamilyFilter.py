@@ -13,6 +13,8 @@ class XXXFilter:
     def __init__(self, install_dir):
         termfilename = os.path.join(install_dir, LIBRARYNAME, 'Category','filter_terms.filter')
         self.xxx_terms, self.xxx_searchterms = self.initTerms(termfilename)
+        self.xxx_words = self.expandTerms(self.xxx_terms)
+        self.xxx_searchterms_regexp = self.compileSearchTerms(self.xxx_searchterms)
 
     def initTerms(self, filename):
         terms = set()
@@ -36,6 +38,26 @@ class XXXFilter:
             print 'Read %d XXX terms from file %s' % (len(terms)+len(searchterms), filename)
         return terms, searchterms
 
+    def expandTerms(self, terms):
+        """ Returns the words that isXXXTerm considers dirty: the terms and
+        the terms followed by 'es', 's' or 'n'. A word ending with 'es' is
+        only dirty without the 'es', so a term ending with 'e' followed by
+        's' is not. """
+        words = set(terms)
+        for term in terms:
+            words.add(term + 'es')
+            words.add(term + 'n')
+            if not term.endswith('e'):
+                words.add(term + 's')
+        return words
+
+    def compileSearchTerms(self, searchterms):
+        """ Returns a regexp that finds any of the searchterms in a string,
+        or None when there are no searchterms """
+        if searchterms:
+            return re.compile('|'.join(re.escape(term) for term in sorted(searchterms)))
+        return None
+
     def _getWords(self, string):
         return [a.lower() for a in WORDS_REGEXP.findall(string)]
 
@@ -62,42 +84,32 @@ class XXXFilter:
         s = s.lower()
         if self.isXXXTerm(s): # We have also put some full titles in the filter file
             return True
-        if not self.isAudio(s) and self.foundXXXTerm(s):
+        is_audio = self.isAudio(s)
+        if not is_audio and self.foundXXXTerm(s):
             return True
-        words = self._getWords(s)
+        words = WORDS_REGEXP.findall(s)
         words2 = [' '.join(words[i:i+2]) for i in xrange(0, len(words)-1)]
-        num_xxx = len([w for w in words+words2 if self.isXXXTerm(w, s)])
-        if isFilename and self.isAudio(s):
-            return num_xxx > 2 # almost never classify mp3 as porn
+        xxx_words = self.xxx_words
+        if isFilename and is_audio:
+            return len([w for w in words+words2 if w in xxx_words]) > 2 # almost never classify mp3 as porn
         else:
-            return num_xxx > 0
+            return any(w in xxx_words for w in words) or any(w in xxx_words for w in words2)
 
     def foundXXXTerm(self, s):
-        for term in self.xxx_searchterms:
-            if term in s:
-                if DEBUG:
-                    print 'XXXFilter: Found term "%s" in %s' % (term, s)
-                return True
+        match = self.xxx_searchterms_regexp and self.xxx_searchterms_regexp.search(s)
+        if match:
+            if DEBUG:
+                print 'XXXFilter: Found term "%s" in %s' % (match.group(), s)
+            return True
         return False
 
     def isXXXTerm(self, s, title=None):
         # check if term-(e)s is in xxx-terms
         s = s.lower()
-        if s in self.xxx_terms:
+        if s in self.xxx_words:
             if DEBUG:
                 print 'XXXFilter: "%s" is dirty%s' % (s, title and ' in %s' % title or '')
             return True
-        if s.endswith('es'):
-            if s[:-2] in self.xxx_terms:
-                if DEBUG:
-                    print 'XXXFilter: "%s" is dirty%s' % (s[:-2], title and ' in %s' % title or '')
-                return True
-        elif s.endswith('s') or s.endswith('n'):
-            if s[:-1] in self.xxx_terms:
-                if DEBUG:
-                    print 'XXXFilter: "%s" is dirty%s' % (s[:-1], title and ' in %s' % title or '')
-                return True
-
         return False
 
     audio_extensions = ['cda', 'flac', 'm3u', 'mp2', 'mp3', 'md5', 'vorbis', 'wav', 'wma', 'ogg']
@@ -9,7 +9,8 @@ import pickle
 import socket
 import binascii
 import time as timemod
-from threading import Event,Thread,enumerate as enumerate_threads, currentThread
+from threading import Event,Thread,enumerate as enumerate_threads, currentThread, Lock
+from multiprocessing.pool import ThreadPool
 from traceback import print_exc, print_stack
 import traceback
 
@@ -59,12 +60,26 @@ else:
 
 SPECIAL_VALUE=481
 
+RESUME_WORKERS = 4          # threads loading the checkpoints of the downloads to resume
+RESUME_BATCH_SIZE = 50      # downloads added to libtorrent at once when resuming
+RESUME_BATCH_DELAY = 0.5    # seconds between two batches
+
+DOWNLOAD_STATES_FULL_INTERVAL = 30.0    # seconds between two full snapshots for incremental states callbacks
+
 DEBUG = False
 PROFILE = False
 
 # Internal classes
 #
 
+class DownloadStatesDelta:
+    """ What an incremental download states callback has been told """
+
+    def __init__(self):
+        # {Download: state_version of its last reported DownloadState}
+        self.versions = {}
+        self.last_full = 0.0
+
 class TriblerLaunchMany(Thread):
 
     def __init__(self):
@@ -83,6 +98,11 @@ class TriblerLaunchMany(Thread):
             self.sesslock = sesslock
 
             self.downloads = {}
+            self.resume_lock = Lock()
+            self.resume_pending = set()
+            self.resume_scheduling = False
+            self.resume_progress = {'total': 0, 'loaded': 0, 'resumed': 0, 'started': 0, 'failed': 0, 'removed': 0, 'took': None}
+            self.resume_start = None
             config = session.sessconfig # Should be safe at startup
 
             self.locally_guessed_ext_ip = self.guess_ext_ip_from_local_info()
@@ -139,7 +159,11 @@ class TriblerLaunchMany(Thread):
                 self.peer_db.registerConnectionUpdater(self.session)
                 self.torrent_db     = TorrentDBHandler.getInstance()
                 torrent_collecting_dir = os.path.abspath(config['torrent_collecting_dir'])
-                self.torrent_db.register(Category.getInstance(),torrent_collecting_dir)
+                torrent_store = None
+                if config['torrent_store']:
+                    from Tribler.Core.CacheDB.TorrentStore import TorrentStore
+                    torrent_store = TorrentStore(torrent_collecting_dir)
+                self.torrent_db.register(Category.getInstance(),torrent_collecting_dir,torrent_store)
                 self.mypref_db      = MyPreferenceDBHandler.getInstance()
                 self.votecast_db = VoteCastDBHandler.getInstance()
                 self.votecast_db.registerSession(self.session)
@@ -401,6 +425,7 @@ class TriblerLaunchMany(Thread):
 
     def network_engine_wrapper_created_callback(self,d,pstate):
         """ Called by network thread """
+        self.resume_started(d)
         try:
             if pstate is None:
                 # Checkpoint at startup
@@ -420,6 +445,9 @@ class TriblerLaunchMany(Thread):
         finally:
             self.sesslock.release()
 
+        # no longer wait for it to be added to libtorrent
+        self.resume_cancelled(d, failed=False)
+
         if not hidden:
             self.remove_id(infohash)
 
@@ -509,8 +537,8 @@ class TriblerLaunchMany(Thread):
     #
     # State retrieval
     #
-    def set_download_states_callback(self,usercallback,getpeerlist,when=0.0):
-        """ Called by any thread """
+    def set_download_states_callback(self,usercallback,getpeerlist,when=0.0,delta=None):
+        """ Called by any thread, delta is a DownloadStatesDelta for incremental callbacks """
         self.sesslock.acquire()
         try:
             # Even if the list of Downloads changes in the mean time this is
@@ -530,10 +558,10 @@ class TriblerLaunchMany(Thread):
                 # 2012-07-31: Turn MOREINFO on/off on demand for efficiency.
                 d.set_moreinfo_stats(getpeerlist)
 
-        network_set_download_states_callback_lambda = lambda:self.network_set_download_states_callback(usercallback,getpeerlist)
+        network_set_download_states_callback_lambda = lambda:self.network_set_download_states_callback(usercallback,getpeerlist,delta)
         self.rawserver.add_task(network_set_download_states_callback_lambda,when)
 
-    def network_set_download_states_callback(self,usercallback,getpeerlist):
+    def network_set_download_states_callback(self,usercallback,getpeerlist,delta=None):
         """ Called by network thread """
         self.sesslock.acquire()
         try:
@@ -546,8 +574,21 @@ class TriblerLaunchMany(Thread):
         finally:
             self.sesslock.release()
 
+        # An incremental callback only gets the states of the Downloads that
+        # changed since it was last called.  The peer lists are not tracked, so
+        # with getpeerlist all states are included.  A full snapshot also
+        # tells the callback that a reported Download has been removed.
+        now = timemod.time()
+        full = delta is None or getpeerlist or now - delta.last_full >= DOWNLOAD_STATES_FULL_INTERVAL
+        if not full:
+            dlset = set(dllist)
+            full = any(d not in dlset for d in delta.versions)
+
         dslist = []
         for d in dllist:
+            version = getattr(d, 'state_version', None)
+            if not full and version is not None and delta.versions.get(d) == version:
+                continue
             try:
                 ds = d.network_get_state(None,getpeerlist,sessioncalling=True)
                 dslist.append(ds)
@@ -555,17 +596,29 @@ class TriblerLaunchMany(Thread):
                 #Niels, 2012-10-18: If Swift connection is crashing, it will raise an exception
                 #We're catching it here to continue building the downloadstates
                 print_exc()
+            else:
+                if delta is not None:
+                    delta.versions[d] = version
+
+        if full and delta is not None:
+            # forget removed Downloads
+            delta.versions = dict((d, delta.versions[d]) for d in dllist if d in delta.versions)
+            delta.last_full = now
 
         # Invoke the usercallback function via a new thread.
         # After the callback is invoked, the return values will be passed to
         # the returncallback for post-callback processing.
-        self.session.uch.perform_getstate_usercallback(usercallback,dslist,self.sesscb_set_download_states_returncallback)
+        if delta is None:
+            self.session.uch.perform_getstate_usercallback(usercallback,dslist,self.sesscb_set_download_states_returncallback)
+        else:
+            returncallback = lambda usercallback,when,newgetpeerlist:self.sesscb_set_download_states_returncallback(usercallback,when,newgetpeerlist,delta)
+            self.session.uch.perform_getstate_usercallback(usercallback,dslist,returncallback,full=full)
 
-    def sesscb_set_download_states_returncallback(self,usercallback,when,newgetpeerlist):
+    def sesscb_set_download_states_returncallback(self,usercallback,when,newgetpeerlist,delta=None):
         """ Called by SessionCallbackThread """
         if when > 0.0:
             # reschedule
-            self.set_download_states_callback(usercallback,newgetpeerlist,when=when)
+            self.set_download_states_callback(usercallback,newgetpeerlist,when=when,delta=delta)
 
     #
     # Persistence methods
@@ -587,9 +640,123 @@ class TriblerLaunchMany(Thread):
             finally:
                 self.sesslock.release()
 
-            for i, filename in enumerate(filelist):
-                shouldCommit = i+1 == len(filelist)
-                self.resume_download(filename, initialdlstatus, initialdlstatus_dict, commit=shouldCommit, setupDelay=i*0.1)
+            self.resume_downloads(filelist, initialdlstatus, initialdlstatus_dict)
+
+    def resume_downloads(self, filelist, initialdlstatus=None, initialdlstatus_dict={}):
+        """
+        Called by any thread.  Loads the checkpoints in filelist using a pool of
+        RESUME_WORKERS threads, after which the downloads are added to
+        libtorrent in batches of RESUME_BATCH_SIZE, downloading and seeding
+        downloads first.  Progress is available through get_resume_progress.
+        """
+        with self.resume_lock:
+            self.resume_start = timemod.time()
+            self.resume_scheduling = True
+            self.resume_pending.clear()
+            self.resume_progress = {'total': len(filelist), 'loaded': 0, 'resumed': 0, 'started': 0, 'failed': 0, 'removed': 0, 'took': None}
+
+        def load(filename):
+            try:
+                data = self.load_resume_data(filename)
+            except:
+                print_exc()
+                data = None
+            with self.resume_lock:
+                self.resume_progress['loaded'] += 1
+            return filename, data
+
+        entries = []
+        if filelist:
+            pool = ThreadPool(min(RESUME_WORKERS, len(filelist)))
+            try:
+                for i, (filename, data) in enumerate(pool.imap(load, filelist)):
+                    if data:
+                        entries.append((self.resume_priority(data, initialdlstatus, initialdlstatus_dict), i, filename, data))
+                    else:
+                        with self.resume_lock:
+                            self.resume_progress['failed'] += 1
+            finally:
+                pool.close()
+                pool.join()
+        entries.sort()
+
+        if DEBUG:
+            print >> sys.stderr, "tlm: resume_downloads: loaded", len(entries), "checkpoints in", timemod.time() - self.resume_start
+
+        for i, (_, _, filename, (tdef, sdef, dscfg, pstate)) in enumerate(entries):
+            shouldCommit = i+1 == len(entries)
+            setupDelay = (i / RESUME_BATCH_SIZE) * RESUME_BATCH_DELAY
+
+            # libtorrent downloads are started after setupDelay, see resume_started and resume_cancelled
+            if tdef:
+                with self.resume_lock:
+                    self.resume_pending.add(tdef.get_infohash())
+
+            if self.resume_loaded_download(filename, tdef, sdef, dscfg, pstate, initialdlstatus, initialdlstatus_dict, commit=shouldCommit, setupDelay=setupDelay):
+                with self.resume_lock:
+                    self.resume_progress['resumed'] += 1
+            else:
+                with self.resume_lock:
+                    self.resume_progress['failed'] += 1
+                    if tdef:
+                        self.resume_pending.discard(tdef.get_infohash())
+
+        with self.resume_lock:
+            self.resume_scheduling = False
+        self.resume_started(None)
+
+    def resume_priority(self, data, initialdlstatus=None, initialdlstatus_dict={}):
+        """ Returns the order in which a download is resumed, downloading first and stopped last """
+        tdef, sdef, _, pstate = data
+        download_id = tdef.get_id() if tdef else sdef.get_id() if sdef else None
+        if initialdlstatus_dict.get(download_id, initialdlstatus) == DLSTATUS_STOPPED:
+            return 3
+
+        status = None
+        if isinstance(pstate, dict) and isinstance(pstate.get('dlstate', None), dict):
+            status = pstate['dlstate'].get('status', None)
+        if status == DLSTATUS_DOWNLOADING:
+            return 0
+        if status == DLSTATUS_SEEDING:
+            return 1
+        if status in (DLSTATUS_STOPPED, DLSTATUS_STOPPED_ON_ERROR):
+            return 3
+        return 2
+
+    def resume_started(self, d):
+        """ Called by any thread, when download d was added to libtorrent """
+        self._resume_done(d, 'started')
+
+    def resume_cancelled(self, d, failed=True):
+        """ Called by any thread, when adding download d to libtorrent failed, or
+        with failed=False when d was removed before it was added.  A failed
+        download is no longer counted as resumed. """
+        self._resume_done(d, 'failed' if failed else 'removed')
+
+    def _resume_done(self, d, outcome):
+        with self.resume_lock:
+            if d:
+                infohash = d.get_def().get_infohash()
+                if infohash not in self.resume_pending:
+                    return
+                self.resume_pending.discard(infohash)
+                self.resume_progress[outcome] += 1
+                if outcome == 'failed':
+                    self.resume_progress['resumed'] -= 1
+
+                if outcome == 'started' and self.resume_progress['started'] % RESUME_BATCH_SIZE == 0:
+                    print >> sys.stderr, "tlm: resume_downloads: started %d of %d downloads" % (self.resume_progress['started'], self.resume_progress['total'])
+
+            if self.resume_start is not None and not self.resume_scheduling and not self.resume_pending:
+                self.resume_progress['took'] = timemod.time() - self.resume_start
+                self.resume_start = None
+                print >> sys.stderr, "tlm: resume_downloads: resumed %(resumed)d of %(total)d downloads, %(failed)d failed, %(removed)d removed, took %(took).2f seconds" % self.resume_progress
+
+    def get_resume_progress(self):
+        """ Called by any thread, returns a dict with the number of checkpoints
+        loaded, downloads resumed and started, and the time took when done """
+        with self.resume_lock:
+            return dict(self.resume_progress)
 
     def load_download_pstate_noexc(self,infohash):
         """ Called by any thread, assume sesslock already held """
@@ -604,6 +771,11 @@ class TriblerLaunchMany(Thread):
             return None
 
     def resume_download(self,filename,initialdlstatus=None,initialdlstatus_dict={},commit=True,setupDelay=0):
+        tdef, sdef, dscfg, pstate = self.load_resume_data(filename)
+        self.resume_loaded_download(filename, tdef, sdef, dscfg, pstate, initialdlstatus, initialdlstatus_dict, commit, setupDelay)
+
+    def load_resume_data(self, filename):
+        """ Called by any thread, returns (tdef, sdef, dscfg, pstate) of the checkpoint in filename """
         tdef = sdef = dscfg = pstate = None
 
         try:
@@ -632,7 +804,13 @@ class TriblerLaunchMany(Thread):
             infohash = binascii.unhexlify(file[:-7])
             torrent = self.torrent_db.getTorrent(infohash, keys = ['name','torrent_file_name','swift_torrent_hash'], include_mypref = False)
             torrentfile = None
-            if torrent:
+            loaded = False
+            torrent_store = self.torrent_db.torrent_store
+            if torrent_store is not None and torrent_store.has_torrent(infohash):
+                tdef = TorrentDef.load_from_memory(torrent_store.get_torrent(infohash))
+                loaded = True
+
+            elif torrent:
                 torrent_dir = self.session.get_torrent_collecting_dir()
 
                 if torrent['swift_torrent_hash']:
@@ -647,7 +825,9 @@ class TriblerLaunchMany(Thread):
 
             if torrentfile and os.path.isfile(torrentfile):
                 tdef = TorrentDef.load(torrentfile)
+                loaded = True
 
+            if loaded:
                 defaultDLConfig = DefaultDownloadStartupConfig.getInstance()
                 dscfg = defaultDLConfig.copy()
 
@@ -657,6 +837,10 @@ class TriblerLaunchMany(Thread):
                         if os.path.isdir(preferences[2]) or preferences[2] == '':
                             dscfg.set_dest_dir(preferences[2])
 
+        return tdef, sdef, dscfg, pstate
+
+    def resume_loaded_download(self, filename, tdef, sdef, dscfg, pstate, initialdlstatus=None, initialdlstatus_dict={}, commit=True, setupDelay=0):
+        """ Called by any thread, returns True if the download was resumed """
         if DEBUG:
             print >>sys.stderr,"tlm: load_checkpoint: pstate is",dlstatus_strings[pstate['dlstate']['status']],pstate['dlstate']['progress']
             if pstate['engineresumedata'] is None:
@@ -673,6 +857,7 @@ class TriblerLaunchMany(Thread):
                     else:
                         initialdlstatus = initialdlstatus_dict.get(sdef.get_id(), initialdlstatus)
                         self.swift_add(sdef,dscfg,pstate,initialdlstatus)
+                    return True
 
                 except Exception,e:
                     self.rawserver_nonfatalerrorfunc(e)
@@ -681,6 +866,7 @@ class TriblerLaunchMany(Thread):
                 os.remove(filename)
         else:
             print >> sys.stderr, "tlm: could not resume checkpoint", filename, tdef, dscfg
+        return False
 
     def checkpoint(self,stop=False,checkpoint=True,gracetime=2.0):
         """ Called by any thread, assume sesslock already held """
@@ -752,6 +938,9 @@ class TriblerLaunchMany(Thread):
             self.dispersy.stop(timeout=2.0)
 
         if self.session.sessconfig['megacache']:
+            if self.torrent_db.torrent_store is not None:
+                self.torrent_db.torrent_store.close()
+
             self.peer_db.delInstance()
             self.torrent_db.delInstance()
             self.mypref_db.delInstance()
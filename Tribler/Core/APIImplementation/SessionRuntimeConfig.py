@@ -238,6 +238,16 @@ class SessionRuntimeConfig(SessionConfigInterface):
         finally:
             self.sesslock.release()
 
+    def set_torrent_store(self,value):
+        raise OperationNotPossibleAtRuntimeException()
+
+    def get_torrent_store(self):
+        self.sesslock.acquire()
+        try:
+            return SessionConfigInterface.get_torrent_store(self)
+        finally:
+            self.sesslock.release()
+
     def set_superpeer(self,value):
         raise OperationNotPossibleAtRuntimeException()
 
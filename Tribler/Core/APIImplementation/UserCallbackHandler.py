@@ -42,13 +42,16 @@ class UserCallbackHandler:
                 print_exc()
         self.perform_usercallback(session_vod_usercallback_target)
 
-    def perform_getstate_usercallback(self,usercallback,data,returncallback):
-        """ Called by network thread """
+    def perform_getstate_usercallback(self,usercallback,data,returncallback,full=None):
+        """ Called by network thread, full is passed to incremental states callbacks """
         if DEBUG:
             print >>sys.stderr,"Session: perform_getstate_usercallback()"
         def session_getstate_usercallback_target():
             try:
-                (when,getpeerlist) = usercallback(data)
+                if full is None:
+                    (when,getpeerlist) = usercallback(data)
+                else:
+                    (when,getpeerlist) = usercallback(data,full)
                 returncallback(usercallback,when,getpeerlist)
             except:
                 print_exc()
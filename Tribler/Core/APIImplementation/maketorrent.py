@@ -7,6 +7,8 @@ import sys
 import os
 from hashlib import md5
 import zlib
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 from Tribler.Core.Utilities.Crypto import sha
 from copy import copy
@@ -27,6 +29,13 @@ ignore = [] # Arno: was ['core', 'CVS']
 
 DEBUG = False
 
+try:
+    HASH_WORKERS = cpu_count()      # threads hashing the pieces, hashlib releases the GIL
+except NotImplementedError:
+    HASH_WORKERS = 1
+HASH_BATCH_SIZE = 8 * 1024 * 1024   # bytes of consecutive pieces hashed by one task
+HASH_BUFFER_SIZE = 1024 * 1024      # bytes read at once for the per-file hashes
+
 def make_torrent_file(input, userabortflag = None, userprogresscallback = lambda x: None):
     """ Create a torrent file from the supplied input.
 
@@ -148,11 +157,8 @@ def makeinfo(input,userabortflag,userprogresscallback):
     encoding = input['encoding']
 
     pieces = []
-    sh = sha()
-    done = 0L
     fs = []
     totalsize = 0L
-    totalhashed = 0L
 
     # 1. Determine which files should go into the torrent (=expand any dirs
     # specified by user in input['files']
@@ -206,57 +212,15 @@ def makeinfo(input,userabortflag,userprogresscallback):
 
     # 4. Read files and calc hashes, if not live
     if 'live' not in input:
-        for p, f, size in subs:
-            pos = 0L
-
-            h = open(f, 'rb')
-
-            if input['makehash_md5']:
-                hash_md5 = md5.new()
-            if input['makehash_sha1']:
-                hash_sha1 = sha()
-            if input['makehash_crc32']:
-                hash_crc32 = zlib.crc32('')
-
-            while pos < size:
-                a = min(size - pos, piece_length - done)
-
-                # See if the user cancelled
-                if userabortflag is not None and userabortflag.isSet():
-                    return (None,None)
-
-                readpiece = h.read(a)
-
-                # See if the user cancelled
-                if userabortflag is not None and userabortflag.isSet():
-                    return (None,None)
-
-                sh.update(readpiece)
-
-                if input['makehash_md5']:
-                    # Update MD5
-                    hash_md5.update(readpiece)
-
-                if input['makehash_crc32']:
-                    # Update CRC32
-                    hash_crc32 = zlib.crc32(readpiece, hash_crc32)
-
-                if input['makehash_sha1']:
-                    # Update SHA1
-                    hash_sha1.update(readpiece)
-
-                done += a
-                pos += a
-                totalhashed += a
-
-                if done == piece_length:
-                    pieces.append(sh.digest())
-                    done = 0
-                    sh = sha()
-
-                if userprogresscallback is not None:
-                    userprogresscallback(float(totalhashed) / float(totalsize))
+        if HASH_WORKERS > 1 and totalsize > HASH_BATCH_SIZE:
+            hashes = hash_files_parallel(input,subs,totalsize,piece_length,userabortflag,userprogresscallback)
+        else:
+            hashes = hash_files(input,subs,totalsize,piece_length,userabortflag,userprogresscallback)
+        if hashes is None:
+            return (None,None)
+        (pieces,filehashes) = hashes
 
+        for (p, f, size), filehash in zip(subs, filehashes):
             newdict = {'length': num2num(size),
                        'path': uniconvertl(p,encoding),
                        'path.utf-8': uniconvertl(p, 'utf-8') }
@@ -268,20 +232,10 @@ def makeinfo(input,userabortflag,userprogresscallback):
                         newdict['playtime'] = file['playtime']
                     break
 
-            if input['makehash_md5']:
-                newdict['md5sum'] = hash_md5.hexdigest()
-            if input['makehash_crc32']:
-                newdict['crc32'] = "%08X" % hash_crc32
-            if input['makehash_sha1']:
-                newdict['sha1'] = hash_sha1.digest()
+            newdict.update(filehash)
 
             fs.append(newdict)
 
-            h.close()
-
-        if done > 0:
-            pieces.append(sh.digest())
-
     # 5. Create info dict
     if len(subs) == 1:
         flkey = 'length'
@@ -333,6 +287,189 @@ def makeinfo(input,userabortflag,userprogresscallback):
     return (infodict,piece_length)
 
 
+class FileHasher:
+    """ Calculates the optional MD5, CRC32 and SHA1 hashes of a file """
+
+    def __init__(self,input):
+        self.hash_md5 = md5() if input['makehash_md5'] else None
+        self.hash_crc32 = zlib.crc32('') if input['makehash_crc32'] else None
+        self.hash_sha1 = sha() if input['makehash_sha1'] else None
+
+    def update(self,data):
+        if self.hash_md5 is not None:
+            self.hash_md5.update(data)
+        if self.hash_crc32 is not None:
+            self.hash_crc32 = zlib.crc32(data, self.hash_crc32)
+        if self.hash_sha1 is not None:
+            self.hash_sha1.update(data)
+
+    def get_hashes(self):
+        """ Returns the hashes as the fields of the file dict """
+        hashes = {}
+        if self.hash_md5 is not None:
+            hashes['md5sum'] = self.hash_md5.hexdigest()
+        if self.hash_crc32 is not None:
+            hashes['crc32'] = "%08X" % self.hash_crc32
+        if self.hash_sha1 is not None:
+            hashes['sha1'] = self.hash_sha1.digest()
+        return hashes
+
+
+def hash_files(input,subs,totalsize,piece_length,userabortflag,userprogresscallback):
+    """ Read the files in subs, a list of (pathlist,filename,size) tuples,
+    one after the other and calculate the piece hashes and the per-file hashes.
+
+    Returns a (pieces,filehashes) pair, or None on userabort. """
+    pieces = []
+    filehashes = []
+    sh = sha()
+    done = 0L
+    totalhashed = 0L
+
+    for p, f, size in subs:
+        pos = 0L
+
+        h = open(f, 'rb')
+        filehasher = FileHasher(input)
+
+        while pos < size:
+            a = min(size - pos, piece_length - done)
+
+            # See if the user cancelled
+            if userabortflag is not None and userabortflag.isSet():
+                return None
+
+            readpiece = h.read(a)
+
+            # See if the user cancelled
+            if userabortflag is not None and userabortflag.isSet():
+                return None
+
+            sh.update(readpiece)
+            filehasher.update(readpiece)
+
+            done += a
+            pos += a
+            totalhashed += a
+
+            if done == piece_length:
+                pieces.append(sh.digest())
+                done = 0
+                sh = sha()
+
+            if userprogresscallback is not None:
+                userprogresscallback(float(totalhashed) / float(totalsize))
+
+        filehashes.append(filehasher.get_hashes())
+
+        h.close()
+
+    if done > 0:
+        pieces.append(sh.digest())
+
+    return (pieces,filehashes)
+
+
+def hash_files_parallel(input,subs,totalsize,piece_length,userabortflag,userprogresscallback):
+    """ Same as hash_files, but HASH_WORKERS threads calculate the hashes.
+    Each task hashes a range of consecutive pieces of about HASH_BATCH_SIZE
+    bytes, reading the part of every file in the range at once. The per-file
+    hashes are calculated by a task per file.
+
+    Returns a (pieces,filehashes) pair, or None on userabort. """
+
+    def aborted():
+        return userabortflag is not None and userabortflag.isSet()
+
+    # The offset of each file in the concatenation of all files
+    files = []
+    offset = 0L
+    for p, f, size in subs:
+        if size > 0:
+            files.append((offset,f,size))
+        offset += size
+
+    def hash_pieces(first_piece):
+        begin = first_piece * piece_length
+        end = min(begin + pieces_per_task * piece_length, totalsize)
+        batchpieces = []
+        sh = sha()
+        done = 0L
+        for fileoffset, f, size in files:
+            if fileoffset + size <= begin or fileoffset >= end:
+                continue
+            if aborted():
+                return None
+
+            h = open(f, 'rb')
+            try:
+                h.seek(max(begin - fileoffset, 0))
+                data = h.read(min(end - fileoffset, size) - max(begin - fileoffset, 0))
+            finally:
+                h.close()
+
+            pos = 0
+            while pos < len(data):
+                a = min(len(data) - pos, piece_length - done)
+                sh.update(buffer(data, pos, a))
+                done += a
+                pos += a
+                if done == piece_length:
+                    batchpieces.append(sh.digest())
+                    done = 0
+                    sh = sha()
+        if done > 0:
+            batchpieces.append(sh.digest())
+        return (end - begin, batchpieces)
+
+    def hash_file(f):
+        filehasher = FileHasher(input)
+        h = open(f, 'rb')
+        try:
+            while not aborted():
+                data = h.read(HASH_BUFFER_SIZE)
+                if not data:
+                    break
+                filehasher.update(data)
+        finally:
+            h.close()
+        return filehasher.get_hashes()
+
+    pieces_per_task = max(HASH_BATCH_SIZE / piece_length, 1)
+    numpieces = (totalsize + piece_length - 1) / piece_length
+
+    pool = ThreadPool(HASH_WORKERS)
+    try:
+        if input['makehash_md5'] or input['makehash_crc32'] or input['makehash_sha1']:
+            filehashresults = [pool.apply_async(hash_file, (f,)) for p, f, size in subs]
+        else:
+            filehashresults = None
+
+        pieces = []
+        totalhashed = 0L
+        for result in pool.imap(hash_pieces, xrange(0, numpieces, pieces_per_task)):
+            if result is None or aborted():
+                return None
+            (hashed,batchpieces) = result
+            pieces.extend(batchpieces)
+            totalhashed += hashed
+
+            if userprogresscallback is not None:
+                userprogresscallback(float(totalhashed) / float(totalsize))
+
+        if filehashresults is None:
+            filehashes = [{} for _ in subs]
+        else:
+            filehashes = [result.get() for result in filehashresults]
+        if aborted():
+            return None
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return (pieces,filehashes)
+
+
 def subfiles(d):
     """ Return list of (pathlist,local filename) tuples for all the files in
     directory 'd' """
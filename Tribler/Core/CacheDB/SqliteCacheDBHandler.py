@@ -49,6 +49,9 @@ SHOW_ERROR = False
 MAX_KEYWORDS_STORED = 5
 MAX_KEYWORD_LENGTH = 50
 
+# minimal number of rows fetched at once by a ranked search
+SEARCH_BATCH_SIZE = 100
+
 #Rahim:
 MAX_POPULARITY_REC_PER_TORRENT = 5 # maximum number of records in popularity table for each torrent
 MAX_POPULARITY_REC_PER_TORRENT_PEER = 3 # maximum number of records per each combination of torrent and peer
@@ -510,6 +513,7 @@ class TorrentDBHandler(BasicDBHandler):
         self.id2status = dict([(x,y) for (y,x) in self.status_table.items()])
         self.id2status[None] = 'unknown'
         self.torrent_dir = None
+        self.torrent_store = None
         # 0 - unknown
         # 1 - good
         # 2 - dead
@@ -558,10 +562,14 @@ class TorrentDBHandler(BasicDBHandler):
 
         self.value_name_for_channel = ['C.torrent_id', 'infohash', 'name', 'torrent_file_name', 'length', 'creation_date', 'num_files', 'thumbnail', 'insert_time', 'secret', 'relevance', 'source_id', 'category_id', 'status_id', 'num_seeders', 'num_leechers', 'comment']
 
+        self.search_stats = {'searches': 0, 'ranked_searches': 0, 'rows': 0, 'results': 0, 'stages': {}, 'last': {}}
+        self.search_stats_lock = Lock()
+
 
-    def register(self, category, torrent_dir):
+    def register(self, category, torrent_dir, torrent_store=None):
         self.category = category
         self.torrent_dir = torrent_dir
+        self.torrent_store = torrent_store
 
         self.mypref_db = MyPreferenceDBHandler.getInstance()
         self.votecast_db = VoteCastDBHandler.getInstance()
@@ -610,7 +618,18 @@ class TorrentDBHandler(BasicDBHandler):
                 self.notifier.notify(NTFY_TORRENTS, NTFY_INSERT, infohash)
 
     def addExternalTorrentNoDef(self, infohash, name, files, trackers, timestamp, source, extra_info={}):
-        if not self.hasTorrent(infohash):
+        self.addExternalTorrentsNoDef([(infohash, name, files, trackers, timestamp, extra_info)], source)
+
+    def addExternalTorrentsNoDef(self, torrents, source):
+        """ Adds the (infohash, name, files, trackers, timestamp, extra_info)
+        torrents that are not in the database yet, the categories of all these
+        torrents are calculated at once """
+        to_be_added = []
+        infohashes = set()
+        for infohash, name, files, trackers, timestamp, extra_info in torrents:
+            if infohash in infohashes or self.hasTorrent(infohash):
+                continue
+
             metainfo = {'info':{}, 'encoding':'utf_8'}
             metainfo['info']['name'] = name.encode('utf_8')
             metainfo['info']['piece length'] = -1
@@ -626,7 +645,7 @@ class TorrentDBHandler(BasicDBHandler):
             elif len(files) == 1:
                 metainfo['info']['length'] = files[0][1]
             else:
-                return
+                continue
 
             if len(trackers) > 0:
                 metainfo['announce'] = trackers[0]
@@ -638,8 +657,22 @@ class TorrentDBHandler(BasicDBHandler):
             try:
                 torrentdef = TorrentDef.load_from_dict(metainfo)
                 torrentdef.infohash = infohash
+            except:
+                print >> sys.stderr, "Could not create a TorrentDef instance", infohash, timestamp, name, files, trackers, source, extra_info
+                print_exc()
+                continue
+
+            infohashes.add(infohash)
+            to_be_added.append((torrentdef, files, trackers, extra_info))
+
+        if not to_be_added:
+            return
 
-                torrent_id = self._addTorrentToDB(torrentdef, source, extra_info, False)
+        categories = self.category.calculateCategories([(torrentdef.metainfo, torrentdef.get_name_as_unicode()) for torrentdef, _, _, _ in to_be_added])
+        for (torrentdef, files, trackers, extra_info), category in zip(to_be_added, categories):
+            infohash = torrentdef.infohash
+            try:
+                torrent_id = self._addTorrentToDB(torrentdef, source, extra_info, False, category)
                 self._rtorrent_handler.notify_possible_torrent_infohash(infohash)
 
                 insert_files = [(torrent_id, unicode(path), length) for path, length in files]
@@ -656,7 +689,7 @@ class TorrentDBHandler(BasicDBHandler):
                     sql_insert_collecting = "INSERT OR IGNORE INTO TorrentCollecting (torrent_id, source) VALUES (?,?)"
                     self._db.executemany(sql_insert_collecting, insert_collecting, False)
             except:
-                print >> sys.stderr, "Could not create a TorrentDef instance", infohash, timestamp, name, files, trackers, source, extra_info
+                print >> sys.stderr, "Could not add torrent", infohash, torrentdef.get_name_as_unicode(), files, trackers, source, extra_info
                 print_exc()
 
     def addInfohash(self, infohash, commit=True):
@@ -723,7 +756,7 @@ class TorrentDBHandler(BasicDBHandler):
             self.id2src[src_int] = src
         return src_int
 
-    def _get_database_dict(self, torrentdef, source="BC", extra_info={}):
+    def _get_database_dict(self, torrentdef, source="BC", extra_info={}, category=None):
         assert isinstance(torrentdef, TorrentDef), "TORRENTDEF has invalid type: %s" % type(torrentdef)
         assert torrentdef.is_finalized(), "TORRENTDEF is not finalized"
         mime, thumb = torrentdef.get_thumbnail()
@@ -742,7 +775,7 @@ class TorrentDBHandler(BasicDBHandler):
                 # todo: the category_id is calculated directly from
                 # torrentdef.metainfo, the category checker should use
                 # the proper torrentdef api
-                "category_id":self._getCategoryID(self.category.calculateCategory(torrentdef.metainfo, torrentdef.get_name_as_unicode())),
+                "category_id":self._getCategoryID(category or self.category.calculateCategory(torrentdef.metainfo, torrentdef.get_name_as_unicode())),
                 "status_id":self._getStatusID(extra_info.get("status", "unknown")),
                 "num_seeders":extra_info.get("seeder", -1),
                 "num_leechers":extra_info.get("leecher", -1),
@@ -757,13 +790,13 @@ class TorrentDBHandler(BasicDBHandler):
 
         return dict
 
-    def _addTorrentToDB(self, torrentdef, source, extra_info, commit):
+    def _addTorrentToDB(self, torrentdef, source, extra_info, commit, category=None):
         assert isinstance(torrentdef, TorrentDef), "TORRENTDEF has invalid type: %s" % type(torrentdef)
         assert torrentdef.is_finalized(), "TORRENTDEF is not finalized"
 
         infohash = torrentdef.get_infohash()
         swarmname = torrentdef.get_name_as_unicode()
-        database_dict = self._get_database_dict(torrentdef, source, extra_info)
+        database_dict = self._get_database_dict(torrentdef, source, extra_info, category)
 
         # see if there is already a torrent in the database with this infohash
         torrent_id = self._db.getTorrentID(infohash)
@@ -1469,7 +1502,7 @@ class TorrentDBHandler(BasicDBHandler):
 #            torrents2del = 100
         if self.channelcast_db._channel_id:
             sql = """
-                select torrent_file_name, torrent_id, swift_torrent_hash, relevance,
+                select torrent_file_name, torrent_id, infohash, swift_torrent_hash, relevance,
                     min(relevance,2500) +  min(500,num_leechers) + 4*min(500,num_seeders) - (max(0,min(500,(%d-creation_date)/86400)) ) as weight
                 from CollectedTorrent
                 where torrent_id not in (select torrent_id from MyPreference)
@@ -1479,7 +1512,7 @@ class TorrentDBHandler(BasicDBHandler):
             """ % (int(time()), self.channelcast_db._channel_id, torrents2del)
         else:
             sql = """
-                select torrent_file_name, torrent_id, swift_torrent_hash, relevance,
+                select torrent_file_name, torrent_id, infohash, swift_torrent_hash, relevance,
                     min(relevance,2500) +  min(500,num_leechers) + 4*min(500,num_seeders) - (max(0,min(500,(%d-creation_date)/86400)) ) as weight
                 from CollectedTorrent
                 where torrent_id not in (select torrent_id from MyPreference)
@@ -1495,7 +1528,7 @@ class TorrentDBHandler(BasicDBHandler):
         sql_del_torrent = "update Torrent set torrent_file_name = null where torrent_id=?"
         # sql_del_tracker = "delete from TorrentTracker where torrent_id=?"
         # sql_del_pref = "delete from Preference where torrent_id=?"
-        tids = [(torrent_id,) for torrent_file_name, torrent_id, swift_torrent_hash, relevance, weight in res_list]
+        tids = [(torrent_id,) for torrent_file_name, torrent_id, infohash_str, swift_torrent_hash, relevance, weight in res_list]
 
         self._db.executemany(sql_del_torrent, tids, commit=False)
         # self._db.executemany(sql_del_tracker, tids, commit=False)
@@ -1511,21 +1544,28 @@ class TorrentDBHandler(BasicDBHandler):
         torrent_dir = self.getTorrentDir()
         deleted = 0 # deleted any file?
         insert_files = []
-        for torrent_file_name, torrent_id, swift_torrent_hash, relevance, weight in res_list:
+        for torrent_file_name, torrent_id, infohash_str, swift_torrent_hash, relevance, weight in res_list:
+            infohash = str2bin(infohash_str)
 
             torrent_path = os.path.join(torrent_dir, torrent_file_name)
             if not os.path.exists(torrent_path):
                 roothash_as_hex = binascii.hexlify(swift_torrent_hash)
                 torrent_path = os.path.join(torrent_dir, roothash_as_hex)
 
-            if os.path.exists(torrent_path):
-                try:
+            try:
+                if self.torrent_store is not None and self.torrent_store.has_torrent(infohash):
+                    tdef = TorrentDef.load_from_memory(self.torrent_store.get_torrent(infohash))
+                elif os.path.exists(torrent_path):
                     tdef = TorrentDef.load(torrent_path)
+                else:
+                    tdef = None
+
+                if tdef:
                     files = [(torrent_id, unicode(path), length) for path, length in tdef.get_files_as_unicode_with_length()]
                     files = sample(files, 25)
                     insert_files.extend(files)
-                except:
-                    pass
+            except:
+                pass
 
             mhash_path = torrent_path + '.mhash'
             mbinmap_path = torrent_path + '.mbinmap'
@@ -1547,6 +1587,9 @@ class TorrentDBHandler(BasicDBHandler):
                 #print >> sys.stderr, "Error in erase torrent", Exception, msg
                 pass
 
+        if self.torrent_store is not None:
+            self.torrent_store.delete_torrents([str2bin(infohash_str) for torrent_file_name, torrent_id, infohash_str, swift_torrent_hash, relevance, weight in res_list])
+
         if len(insert_files) > 0:
             sql_insert_files = "INSERT OR IGNORE INTO TorrentFiles (torrent_id, path, length) VALUES (?,?,?)"
             self._db.executemany(sql_insert_files, insert_files, commit = False)
@@ -1569,7 +1612,9 @@ class TorrentDBHandler(BasicDBHandler):
             sql_update_sims = 'UPDATE Torrent SET relevance=? WHERE torrent_id=?'
             self._db.executemany(sql_update_sims, tid_rel_pairs, commit=commit)
 
-    def searchNames(self, kws, local=True, keys = ['torrent_id', 'infohash', 'name', 'torrent_file_name', 'length', 'creation_date', 'num_files', 'insert_time', 'category_id', 'status_id', 'num_seeders', 'num_leechers', 'dispersy_id', 'swift_hash','swift_torrent_hash'], doSort = True):
+    def searchNames(self, kws, local=True, keys = ['torrent_id', 'infohash', 'name', 'torrent_file_name', 'length', 'creation_date', 'num_files', 'insert_time', 'category_id', 'status_id', 'num_seeders', 'num_leechers', 'dispersy_id', 'swift_hash','swift_torrent_hash'], doSort = True, limit = None):
+        """ Returns the torrents matching kws. If limit is set, only the limit
+        torrents with the most seeders are returned, see _searchNamesRanked. """
         #        if local:
 #            mainsql += "C.id, C.dispersy_id, C.name, C.description, C.time_stamp, inserted, "
 #            value_name += ['channeltorrent_id', 'dispersy_id', 'chant_name', 'description', 'time_stamp', 'inserted']
@@ -1578,8 +1623,6 @@ class TorrentDBHandler(BasicDBHandler):
         assert not doSort or ('num_seeders' in keys or 'T.num_seeders' in keys)
 
         infohash_index = keys.index('infohash')
-        swift_hash_index = keys.index('swift_hash') if 'swift_hash' in keys else -1
-        swift_torrent_hash_index = keys.index('swift_torrent_hash') if 'swift_torrent_hash' in keys else -1
         num_seeders_index = keys.index('num_seeders') if 'num_seeders' in keys else -1
 
         if num_seeders_index == -1:
@@ -1599,29 +1642,122 @@ class TorrentDBHandler(BasicDBHandler):
                     WHERE t.torrent_id = FullTextIndex.rowid AND C.deleted_at IS NULL AND FullTextIndex MATCH ?
                     """
 
-        if not local:
-            mainsql += " LIMIT 250"
-
         query = " ".join(filter_keywords(kws))
         not_negated = [kw for kw in filter_keywords(kws) if kw[0] != '-']
 
-        results = self._db.fetchall(mainsql, (query, ))
+        if limit:
+            return self._searchNamesRanked(mainsql, query, not_negated, keys, limit, t1)
+
+        if not local:
+            mainsql += " LIMIT 250"
+
+        results = self._db.fetchall(mainsql, (query, ), committed = True)
+        nr_rows = len(results)
 
         t2 = time()
 
-        channels = set()
+        channel_dict = self._getSearchChannels(set(result[-2] for result in results if result[-2]))
+
+        t3 = time()
+
+        result_dict = self._mergeSearchResults(results, channel_dict, infohash_index)
+
+        t4 = time()
+
+        #step 2, fix all dict fields
+        dont_sort_list = []
+        results = [list(result) for result in result_dict.values()]
+        for i in xrange(len(results) - 1, -1, -1):
+            result = results[i]
+            self._fixSearchResult(result, keys, not_negated, channel_dict)
+
+            if doSort and result[num_seeders_index] <= 0:
+                dont_sort_list.append(result)
+                results.pop(i)
+
+        t5 = time()
+
+        if doSort:
+            def compare(a,b):
+                return cmp(a[num_seeders_index], b[num_seeders_index])
+            results.sort(compare, reverse = True)
+        results.extend(dont_sort_list)
+
+        if not local:
+            results = results[:25]
+
+        self._addSearchStats(False, nr_rows, len(results), fts = t2-t1, channels = t3-t2, merge = t4-t3, matchinfo = t5-t4, sort = time()-t5)
+        return results
+
+    def _searchNamesRanked(self, mainsql, query, not_negated, keys, limit, t1):
+        """ SQLite orders the matching rows on num_seeders, rows are fetched in
+        batches until limit torrents remain after merging their channels.
+        Hence only the rows of the returned torrents, and of torrents dropped
+        because of spam channels, are processed in Python. The rows of a
+        torrent are never split over two batches. """
+        infohash_index = keys.index('infohash')
+        mainsql += " ORDER BY T.num_seeders DESC, T.torrent_id LIMIT ? OFFSET ?"
+        batch_size = max(2 * limit, SEARCH_BATCH_SIZE)
+
+        # the time to build the query counts as fts, once
+        fts = time() - t1
+        channels = merge = 0.0
         channel_dict = {}
+        results = []
+        offset = 0
+        while len(results) < limit:
+            t2 = time()
+            rows = self._db.fetchall(mainsql, (query, batch_size, offset), committed = True)
+            last_batch = len(rows) < batch_size
+            if not last_batch:
+                # the last torrent could have more rows in the next batch
+                last_infohash = rows[-1][infohash_index]
+                while rows and rows[-1][infohash_index] == last_infohash:
+                    rows.pop()
+
+                if not rows:
+                    batch_size *= 2
+                    fts += time() - t2
+                    continue
+            offset += len(rows)
+
+            t3 = time()
+            new_channels = set(row[-2] for row in rows if row[-2] and row[-2] not in channel_dict)
+            channel_dict.update(self._getSearchChannels(new_channels))
+
+            t4 = time()
+            result_dict = self._mergeSearchResults(rows, channel_dict, infohash_index)
+            for row in rows:
+                result = result_dict.pop(row[infohash_index], None)
+                if result:
+                    results.append(result)
+
+            fts += t3 - t2
+            channels += t4 - t3
+            merge += time() - t4
+            if last_batch:
+                break
+
+        t5 = time()
+        results = [list(result) for result in results[:limit]]
         for result in results:
-            if result[-2]:
-                channels.add(result[-2])
+            self._fixSearchResult(result, keys, not_negated, channel_dict)
 
+        self._addSearchStats(True, offset, len(results), fts = fts, channels = channels, merge = merge, matchinfo = time() - t5, sort = 0.0)
+        return results
+
+    def _getSearchChannels(self, channels):
+        """ Returns the channels with ids in channels by id """
+        channel_dict = {}
         if len(channels) > 0:
             #Channels consist of a tuple (id, dispersy_cid, name, description, nr_torrents, nr_favorites, nr_spam, my_vote, modified)
             for channel in self.channelcast_db.getChannels(channels):
                 if channel[1] != '-1':
                     channel_dict[channel[0]] = channel
+        return channel_dict
 
-        t3 = time()
+    def _mergeSearchResults(self, results, channel_dict, infohash_index):
+        """ Returns one result per infohash, keeping the one with the best channel """
         myChannelId = self.channelcast_db._channel_id or 0
 
         result_dict = {}
@@ -1660,62 +1796,76 @@ class TorrentDBHandler(BasicDBHandler):
             elif infohash not in result_dict:
                 result_dict[infohash] = result
 
-        t4 = time()
-
-        #step 2, fix all dict fields
-        dont_sort_list = []
-        results = [list(result) for result in result_dict.values()]
-        for i in xrange(len(results) - 1, -1, -1):
-            result = results[i]
+        return result_dict
 
-            result[infohash_index] = str2bin(result[infohash_index])
-            if swift_hash_index >= 0 and result[swift_hash_index] :
-                result[swift_hash_index] = str2bin(result[swift_hash_index])
-            if swift_torrent_hash_index >= 0 and result[swift_torrent_hash_index]:
-                result[swift_torrent_hash_index] = str2bin(result[swift_torrent_hash_index])
-
-            matches = {'swarmname':set(), 'filenames':set(), 'fileextensions': set()}
-
-            #Matchinfo is documented at: http://www.sqlite.org/fts3.html#matchinfo
-            matchinfo = str(result[-1])
-            num_phrases, num_cols = unpack_from('II', matchinfo)
-            unpack_str = 'I'*(3*num_cols*num_phrases)
-            matchinfo = unpack_from('II'+unpack_str, matchinfo)
-
-            swarmnames, filenames, fileextensions  = [
-                [matchinfo[3 * (i + p*num_cols) + 2] for p in range(num_phrases)]
-                for i in range(num_cols)
-            ]
-
-            for i, keyword in enumerate(not_negated):
-                if swarmnames[i]:
-                    matches['swarmname'].add(keyword)
-                if filenames[i]:
-                    matches['filenames'].add(keyword)
-                if fileextensions[i]:
-                    matches['fileextensions'].add(keyword)
-            result[-1] = matches
-
-            channel = channel_dict.get(result[-2], (result[-2], None, '', '', 0, 0, 0, 0, 0, False))
-            result.extend(channel)
-
-            if doSort and result[num_seeders_index] <= 0:
-                dont_sort_list.append(result)
-                results.pop(i)
-
-        t5 = time()
+    def _fixSearchResult(self, result, keys, not_negated, channel_dict):
+        """ Converts the hashes, replaces the Matchinfo blob by the matching
+        keywords and appends the channel of a search result list """
+        infohash_index = keys.index('infohash')
+        swift_hash_index = keys.index('swift_hash') if 'swift_hash' in keys else -1
+        swift_torrent_hash_index = keys.index('swift_torrent_hash') if 'swift_torrent_hash' in keys else -1
 
-        if doSort:
-            def compare(a,b):
-                return cmp(a[num_seeders_index], b[num_seeders_index])
-            results.sort(compare, reverse = True)
-        results.extend(dont_sort_list)
+        result[infohash_index] = str2bin(result[infohash_index])
+        if swift_hash_index >= 0 and result[swift_hash_index] :
+            result[swift_hash_index] = str2bin(result[swift_hash_index])
+        if swift_torrent_hash_index >= 0 and result[swift_torrent_hash_index]:
+            result[swift_torrent_hash_index] = str2bin(result[swift_torrent_hash_index])
+
+        matches = {'swarmname':set(), 'filenames':set(), 'fileextensions': set()}
+
+        #Matchinfo is documented at: http://www.sqlite.org/fts3.html#matchinfo
+        matchinfo = str(result[-1])
+        num_phrases, num_cols = unpack_from('II', matchinfo)
+        unpack_str = 'I'*(3*num_cols*num_phrases)
+        matchinfo = unpack_from('II'+unpack_str, matchinfo)
+
+        swarmnames, filenames, fileextensions  = [
+            [matchinfo[3 * (i + p*num_cols) + 2] for p in range(num_phrases)]
+            for i in range(num_cols)
+        ]
+
+        for i, keyword in enumerate(not_negated):
+            if swarmnames[i]:
+                matches['swarmname'].add(keyword)
+            if filenames[i]:
+                matches['filenames'].add(keyword)
+            if fileextensions[i]:
+                matches['fileextensions'].add(keyword)
+        result[-1] = matches
+
+        channel = channel_dict.get(result[-2], (result[-2], None, '', '', 0, 0, 0, 0, 0, False))
+        result.extend(channel)
+
+    def _addSearchStats(self, ranked, nr_rows, nr_results, **stages):
+        self.search_stats_lock.acquire()
+        try:
+            stats = self.search_stats
+            stats['searches'] += 1
+            if ranked:
+                stats['ranked_searches'] += 1
+            stats['rows'] += nr_rows
+            stats['results'] += nr_results
+            for stage, took in stages.iteritems():
+                total, maximum = stats['stages'].get(stage, (0.0, 0.0))
+                stats['stages'][stage] = (total + took, max(maximum, took))
+            stats['last'] = stages
+        finally:
+            self.search_stats_lock.release()
 
-        if not local:
-            results = results[:25]
+        if DEBUG:
+            print >> sys.stderr, "TorrentDBHandler: searchNames: # hits:%d (%d rows from db); search time:" % (nr_results, nr_rows), ", ".join("%s %.3f" % (stage, took) for stage, took in stages.iteritems())
 
-        #print >> sys.stderr, "# hits:%d (%d from db, %d not sorted); search time:%.3f,%.3f,%.3f,%.3f,%.3f,%.3f" % (len(results),len(results),len(dont_sort_list),t2-t1, t3-t2, t4-t3, t5-t4, time()-t5, time()-t1)
-        return results
+    def getSearchStats(self):
+        """ Returns the number of searches, the number of rows read from the
+        database, the number of results, the (total, max) time per stage of
+        searchNames and the times of the last search """
+        self.search_stats_lock.acquire()
+        try:
+            stats = dict(self.search_stats)
+            stats['stages'] = dict(stats['stages'])
+            return stats
+        finally:
+            self.search_stats_lock.release()
 
     def getSearchSuggestion(self, keywords, limit = 1):
         match = [keyword.lower() for keyword in keywords]
@@ -2636,6 +2786,7 @@ class ChannelCastDBHandler(BasicDBHandler):
         torrent_ids, inserted = self.torrent_db.addOrGetTorrentIDSReturn(infohashes)
 
         insert_data = []
+        external_torrents = []
         updated_channels = {}
         for i, torrent in enumerate(torrentlist):
             channel_id, dispersy_id, peer_id, infohash, timestamp, name, files, trackers = torrent
@@ -2643,18 +2794,22 @@ class ChannelCastDBHandler(BasicDBHandler):
 
             #if new or not yet collected
             if infohash in inserted:
-                self.torrent_db.addExternalTorrentNoDef(infohash, name, files, trackers, timestamp, "DISP", {'dispersy_id':dispersy_id})
+                external_torrents.append((infohash, name, files, trackers, timestamp, {'dispersy_id':dispersy_id}))
 
             insert_data.append((dispersy_id, torrent_id, channel_id, peer_id, name, timestamp))
             updated_channels[channel_id] = updated_channels.get(channel_id, 0) + 1
 
+        if external_torrents:
+            self.torrent_db.addExternalTorrentsNoDef(external_torrents, "DISP")
+
         if len(insert_data) > 0:
             sql_insert_torrent = "INSERT INTO _ChannelTorrents (dispersy_id, torrent_id, channel_id, peer_id, name, time_stamp) VALUES (?,?,?,?,?,?)"
-            self._db.executemany(sql_insert_torrent, insert_data, commit = False)
+            self._db.queue_writemany(sql_insert_torrent, insert_data)
 
+        # queued, consecutive batches of torrents are inserted using a single executemany
         sql_update_channel = "UPDATE _Channels SET modified = strftime('%s','now'), nr_torrents = nr_torrents+? WHERE id = ?"
         update_channels = [(new_torrents, channel_id) for channel_id, new_torrents in updated_channels.iteritems()]
-        self._db.executemany(sql_update_channel, update_channels, commit = self.shouldCommit)
+        self._db.queue_writemany(sql_update_channel, update_channels)
 
         for channel_id in updated_channels.keys():
             self.notifier.notify(NTFY_CHANNELCAST, NTFY_UPDATE, channel_id)
@@ -3180,10 +3335,11 @@ class ChannelCastDBHandler(BasicDBHandler):
         if limit:
             sql += " LIMIT %d"%limit
 
+        # torrents are received from other peers, these do not have to be read by the DB thread
         if channel_id:
-            results = self._db.fetchall(sql, (channel_id,))
+            results = self._db.fetchall(sql, (channel_id,), committed = True)
         else:
-            results = self._db.fetchall(sql)
+            results = self._db.fetchall(sql, committed = True)
 
         if limit is None and channel_id:
             #use this possibility to update nrtorrent in channel
@@ -3706,6 +3862,11 @@ class NetworkBuzzDBHandler(BasicDBHandler):
 
     def __flush_to_database(self):
         while True:
+            if self.nr_bi_phrases < self.MAX_UNCOLLECTED:
+                # counted before queueing, the phrases of the previous flush have been
+                # written by now and the count does not force the queue to be flushed
+                self.updateBiPhraseCount()
+
             with self.termLock:
                 try:
                     add_new_terms_sql = "INSERT INTO TermFrequency (term, freq) VALUES (?, ?);"
@@ -3715,9 +3876,10 @@ class NetworkBuzzDBHandler(BasicDBHandler):
                                         FROM TermFrequency TF1, TermFrequency TF2
                                         WHERE TF1.term = ? AND TF2.term = ?"""
 
-                    self._db.executemany(add_new_terms_sql, self.new_terms.values(), commit=False)
-                    self._db.executemany(update_exist_terms_sql, self.update_terms.values(), commit=False)
-                    self._db.executemany(ins_phrase_sql, self.new_phrases, commit = False)
+                    # queued, addTorrent does not have to wait for the termLock while these are executed
+                    self._db.queue_writemany(add_new_terms_sql, self.new_terms.values())
+                    self._db.queue_writemany(update_exist_terms_sql, self.update_terms.values())
+                    self._db.queue_writemany(ins_phrase_sql, self.new_phrases)
                 except:
                     print_exc()
                     print >> sys.stderr, "could not insert terms", self.new_terms.values()
@@ -3726,9 +3888,6 @@ class NetworkBuzzDBHandler(BasicDBHandler):
                 self.update_terms.clear()
                 self.new_phrases = []
 
-            if self.nr_bi_phrases < self.MAX_UNCOLLECTED:
-                self.updateBiPhraseCount()
-
             if self.nr_bi_phrases < 100:
                 yield 5.0
             else:
@@ -0,0 +1,302 @@
+# see LICENSE.txt for license information
+"""
+A packed, append-only store for the collected .torrent files.
+
+Instead of one file per torrent in the torrent collecting dir, the bencoded
+torrents are appended to a single pack file as records:
+
+    type (1 byte, 'P' put or 'D' delete), infohash (20 bytes),
+    length (4 bytes), crc32 of type, infohash and data (4 bytes), data
+
+The store keeps an infohash -> (offset,length) index in memory.  A snapshot
+of the index is written to a separate file on close, after compaction and
+when the number of updates since the last snapshot exceeds both
+INDEX_SNAPSHOT_INTERVAL and a quarter of the number of torrents; when
+opening the store, the records appended after the snapshot are read from
+the pack.  A record that was not
+completely written, e.g. because Tribler crashed, is cut off the pack.
+
+Deleting a torrent appends a delete record.  When the deleted records take
+more space than the live ones, the live records are copied into a new pack,
+which replaces the old one.
+"""
+
+import os
+import sys
+import struct
+import zlib
+from threading import RLock
+from traceback import print_exc
+
+DEBUG = False
+
+PACK_FILENAME = 'torrents.pack'
+INDEX_FILENAME = 'torrents.idx'
+
+PACK_MAGIC = 'TPCK'
+INDEX_MAGIC = 'TIDX'
+# magic and generation, which changes when the pack is compacted
+PACK_HEADER = struct.Struct('!4sQ')
+# magic, generation, pack size and number of entries
+INDEX_HEADER = struct.Struct('!4sQQI')
+INDEX_ENTRY = struct.Struct('!20sQI')
+# type, infohash, length, crc32
+RECORD_HEADER = struct.Struct('!c20sII')
+
+RECORD_PUT = 'P'
+RECORD_DELETE = 'D'
+
+INDEX_SNAPSHOT_INTERVAL = 1000
+COMPACT_MIN_DEAD_SIZE = 1024 * 1024
+
+class TorrentStore:
+
+    def __init__(self, dirname, sync=True):
+        """
+        Open the store in dirname, creating it if it does not exist.
+
+        @param dirname The directory to keep the pack and index files in.
+        @param sync Whether to flush every update to disk before returning.
+        """
+        self.dirname = dirname
+        self.sync = sync
+        self.pack_filename = os.path.join(dirname, PACK_FILENAME)
+        self.index_filename = os.path.join(dirname, INDEX_FILENAME)
+
+        self.lock = RLock()
+        self.index = {} # infohash -> (offset of the data,length)
+        self.generation = 0
+        self.size = 0 # the end of the last complete record
+        self.dead_size = 0 # the size of the overwritten and deleted records
+        self.updates = 0 # since the last index snapshot
+
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.pack_filename):
+            self.generation = struct.unpack('!Q', os.urandom(8))[0]
+            f = open(self.pack_filename, 'wb')
+            f.write(PACK_HEADER.pack(PACK_MAGIC, self.generation))
+            f.close()
+
+        self.pack = open(self.pack_filename, 'r+b')
+        magic, self.generation = PACK_HEADER.unpack(self.pack.read(PACK_HEADER.size))
+        if magic != PACK_MAGIC:
+            self.pack.close()
+            raise ValueError("TorrentStore: %s is not a torrent pack" % self.pack_filename)
+
+        offset = self._load_index()
+        if offset is None:
+            self.index = {}
+            self.dead_size = 0
+            offset = PACK_HEADER.size
+        self.size = self._scan(offset)
+
+        self.pack.seek(0, os.SEEK_END)
+        if self.pack.tell() > self.size:
+            print >> sys.stderr, "TorrentStore: removing incomplete record at", self.size, "from", self.pack_filename
+            self.pack.truncate(self.size)
+            self._flush()
+
+    def _load_index(self):
+        """ Load the index snapshot, if it belongs to this pack.
+        @return The pack size at the time of the snapshot or None. """
+        try:
+            f = open(self.index_filename, 'rb')
+            try:
+                data = f.read()
+            finally:
+                f.close()
+        except IOError:
+            return None
+
+        try:
+            magic, generation, size, nr_entries = INDEX_HEADER.unpack_from(data)
+            self.pack.seek(0, os.SEEK_END)
+            if magic != INDEX_MAGIC or generation != self.generation or size > self.pack.tell() or \
+                    len(data) != INDEX_HEADER.size + nr_entries * INDEX_ENTRY.size:
+                return None
+
+            live_size = 0
+            for i in xrange(nr_entries):
+                infohash, offset, length = INDEX_ENTRY.unpack_from(data, INDEX_HEADER.size + i * INDEX_ENTRY.size)
+                self.index[infohash] = (offset, length)
+                live_size += RECORD_HEADER.size + length
+            self.dead_size = size - PACK_HEADER.size - live_size
+            return size
+
+        except struct.error:
+            if DEBUG:
+                print_exc()
+            self.index = {}
+            return None
+
+    def _scan(self, offset):
+        """ Apply the records from offset onwards to the index.
+        @return The end of the last complete record. """
+        self.pack.seek(offset)
+        while True:
+            header = self.pack.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return offset
+
+            type, infohash, length, crc = RECORD_HEADER.unpack(header)
+            data = self.pack.read(length)
+            if type not in (RECORD_PUT, RECORD_DELETE) or len(data) < length or \
+                    zlib.crc32(data, zlib.crc32(header[:21])) & 0xffffffff != crc:
+                return offset
+
+            self._apply(type, infohash, offset + RECORD_HEADER.size, length)
+            offset += RECORD_HEADER.size + length
+
+    def _apply(self, type, infohash, offset, length):
+        old = self.index.pop(infohash, None)
+        if old:
+            self.dead_size += RECORD_HEADER.size + old[1]
+        if type == RECORD_PUT:
+            self.index[infohash] = (offset, length)
+        else:
+            self.dead_size += RECORD_HEADER.size
+
+    def _append(self, type, infohash, data):
+        assert len(infohash) == 20, "TorrentStore: infohash has invalid length: %d" % len(infohash)
+        header = struct.pack('!c20s', type, infohash)
+        crc = zlib.crc32(data, zlib.crc32(header)) & 0xffffffff
+
+        self.pack.seek(self.size)
+        self.pack.write(header + struct.pack('!II', len(data), crc) + data)
+        self._apply(type, infohash, self.size + RECORD_HEADER.size, len(data))
+        self.size += RECORD_HEADER.size + len(data)
+        self.updates += 1
+
+    def _flush(self):
+        self.pack.flush()
+        if self.sync:
+            os.fsync(self.pack.fileno())
+
+    def _updated(self):
+        self._flush()
+        if self.dead_size > COMPACT_MIN_DEAD_SIZE and self.dead_size > self.size - self.dead_size:
+            self.compact()
+        elif self.updates >= max(INDEX_SNAPSHOT_INTERVAL, len(self.index) / 4):
+            self._write_index()
+
+    def _write_index(self):
+        entries = [INDEX_ENTRY.pack(infohash, offset, length) for infohash, (offset, length) in self.index.iteritems()]
+        tmp_filename = self.index_filename + '.tmp'
+        f = open(tmp_filename, 'wb')
+        try:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.generation, self.size, len(entries)))
+            f.write(''.join(entries))
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        finally:
+            f.close()
+        replace_file(tmp_filename, self.index_filename)
+        self.updates = 0
+
+    def has_torrent(self, infohash):
+        return infohash in self.index
+
+    def get_torrent(self, infohash):
+        """ Returns the bencoded torrent with this infohash or None. """
+        self.lock.acquire()
+        try:
+            if self.pack and infohash in self.index:
+                offset, length = self.index[infohash]
+                self.pack.seek(offset)
+                return self.pack.read(length)
+        finally:
+            self.lock.release()
+
+    def put_torrent(self, infohash, data):
+        """ Add or replace the bencoded torrent with this infohash.  Updates
+        after close() are ignored. """
+        self.lock.acquire()
+        try:
+            if self.pack:
+                self._append(RECORD_PUT, infohash, data)
+                self._updated()
+        finally:
+            self.lock.release()
+
+    def delete_torrents(self, infohashes):
+        """ Remove the torrents with these infohashes.
+        @return The number of torrents removed. """
+        self.lock.acquire()
+        try:
+            deleted = 0
+            for infohash in infohashes:
+                if self.pack and infohash in self.index:
+                    self._append(RECORD_DELETE, infohash, '')
+                    deleted += 1
+            if deleted:
+                self._updated()
+            return deleted
+        finally:
+            self.lock.release()
+
+    def get_infohashes(self):
+        self.lock.acquire()
+        try:
+            return self.index.keys()
+        finally:
+            self.lock.release()
+
+    def compact(self):
+        """ Copy the live records into a new pack, which replaces the old one. """
+        self.lock.acquire()
+        try:
+            if DEBUG:
+                print >> sys.stderr, "TorrentStore: compacting", self.pack_filename, self.size, "bytes,", self.dead_size, "dead"
+
+            generation = (self.generation + 1) & 0xffffffffffffffff
+            tmp_filename = self.pack_filename + '.tmp'
+            index = {}
+            f = open(tmp_filename, 'wb')
+            try:
+                f.write(PACK_HEADER.pack(PACK_MAGIC, generation))
+                size = PACK_HEADER.size
+                # copy in pack order, which keeps the reads sequential
+                for offset, length, infohash in sorted((offset, length, infohash) for infohash, (offset, length) in self.index.iteritems()):
+                    self.pack.seek(offset - RECORD_HEADER.size)
+                    f.write(self.pack.read(RECORD_HEADER.size + length))
+                    index[infohash] = (size + RECORD_HEADER.size, length)
+                    size += RECORD_HEADER.size + length
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+
+            # the old index does not match the generation of the new pack
+            self.pack.close()
+            replace_file(tmp_filename, self.pack_filename)
+            self.pack = open(self.pack_filename, 'r+b')
+            self.index, self.generation, self.size, self.dead_size = index, generation, size, 0
+            self._write_index()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            if self.pack:
+                self.pack.flush()
+                os.fsync(self.pack.fileno())
+                self._write_index()
+                self.pack.close()
+                self.pack = None
+        finally:
+            self.lock.release()
+
+def replace_file(src, dst):
+    """ Rename src to dst, also on Windows where the rename does not replace
+    an existing file """
+    try:
+        os.rename(src, dst)
+    except OSError:
+        os.remove(dst)
+        os.rename(src, dst)
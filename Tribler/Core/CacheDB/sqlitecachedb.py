@@ -16,8 +16,9 @@ from Tribler.Core.Utilities.unicode import dunno2unicode
 # ONLY USE APSW >= 3.5.9-r1
 import apsw
 from Tribler.Core.Utilities.utilities import get_collected_torrent_filename
-from threading import currentThread, Event, RLock, Lock
+from threading import currentThread, Event, RLock, Lock, Condition
 import inspect
+import re
 from Tribler.Core.Swift.SwiftDef import SwiftDef
 
 try:
@@ -59,6 +60,11 @@ DB_FILE_NAME = 'tribler.sdb'
 DB_DIR_NAME = 'sqlite'    # db file path = DB_DIR_NAME/DB_FILE_NAME
 DEFAULT_BUSY_TIMEOUT = 10000
 MAX_SQL_BATCHED_TO_TRANSACTION = 1000   # don't change it unless carefully tested. A transaction with 1000 batched updates took 1.5 seconds
+WRITE_BATCH_SIZE = 500      # queued writes are flushed after this many writes, or
+WRITE_BATCH_DELAY = 0.5     # after this many seconds
+COMMIT_BATCH_SIZE = 5000    # a flush commits after this many writes, or
+COMMIT_MAX_DELAY = 5.0      # if the last commit is this many seconds ago
+READ_POOL_SIZE = 4          # the number of read-only connections for committed reads, 0 disables them
 NULL = None
 icon_dir = None
 SHOW_ALL_EXECUTE = False
@@ -344,6 +350,8 @@ class SQLiteCacheDBBase:
             #
             cur.execute("PRAGMA synchronous = NORMAL;")
             cur.execute("PRAGMA cache_size = 10000;")
+            # temporary tables and indices, e.g. used by ORDER BY and GROUP BY, are kept in memory
+            cur.execute("PRAGMA temp_store = MEMORY;")
 
             #Niels 19-09-2012: even though my database upgraded to increase the pagesize it did not keep wal mode?
             #Enabling WAL on every starup
@@ -2386,6 +2394,263 @@ def forceAndReturnDBThread(func):
     invoke_func.__name__ = func.__name__
     return invoke_func
 
+class WriteBatcher:
+    """
+    Queues writes which do not have to be executed immediately.  Writes using
+    the same statement are executed as a single executemany on the DB thread,
+    WRITE_BATCH_DELAY seconds after the first write was queued or as soon as
+    WRITE_BATCH_SIZE writes are queued.  A write is added to an earlier group
+    with the same statement if none of the groups queued after it use one of
+    its tables, statements using different tables are assumed independent.
+    A flush commits if COMMIT_BATCH_SIZE writes or COMMIT_MAX_DELAY seconds
+    passed since the last commit.
+
+    Before executing any statement mentioning a table used by a queued write,
+    SQLiteNoCacheDB flushes the queue, hence reads always see queued writes.
+    Tables are matched by name, do not queue writes to a table which is read
+    through a view with another name.
+    """
+
+    TABLE_RE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE(?:\s+OR\s+\w+)?)\s+_?(\w+)", re.IGNORECASE)
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = Lock()
+        self.pending = []       # [[sql, [args, ...]], ...]
+        self.queue_size = 0
+        self.tables = set()
+        self.flush_scheduled = False
+        self.urgent_flush_scheduled = False
+        self.sql_tables = {}
+
+        self.writes_since_commit = 0
+        self.last_commit = time()
+
+        self.nr_queued = 0
+        self.nr_flushes = 0
+        self.nr_statements = 0
+        self.nr_failed = 0
+        self.max_batch = 0
+        self.flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.nr_commits = 0
+        self.commit_time = 0.0
+        self.max_commit_time = 0.0
+
+    def _getTables(self, sql):
+        tables = self.sql_tables.get(sql)
+        if tables is None:
+            tables = self.sql_tables[sql] = frozenset(table.lower() for table in self.TABLE_RE.findall(sql))
+            assert tables, sql
+        return tables
+
+    def queue(self, sql, args_list):
+        if not args_list:
+            return
+
+        tables = self._getTables(sql)
+        with self.lock:
+            for group_sql, group_args in reversed(self.pending):
+                if group_sql == sql:
+                    group_args.extend(args_list)
+                    break
+                if tables & self._getTables(group_sql):
+                    self.pending.append([sql, list(args_list)])
+                    break
+            else:
+                self.pending.append([sql, list(args_list)])
+            self.queue_size += len(args_list)
+            self.nr_queued += len(args_list)
+            if not tables <= self.tables:
+                # replaced instead of updated, hasPending iterates over it without the lock
+                self.tables = self.tables | tables
+
+            delay = None
+            if self.queue_size >= WRITE_BATCH_SIZE:
+                if not self.urgent_flush_scheduled:
+                    self.urgent_flush_scheduled = True
+                    delay = 0.0
+            elif not self.flush_scheduled:
+                self.flush_scheduled = True
+                delay = WRITE_BATCH_DELAY
+
+        # without a DB thread register_task runs flush immediately, hence not holding the lock
+        if delay is not None:
+            register_task(None, self.flush, delay = delay, priority = 99 if delay == 0.0 else 0)
+
+    def hasPending(self, sql):
+        if self.queue_size:
+            lower_sql = sql.lower()
+            for table in self.tables:
+                if table in lower_sql:
+                    return True
+        return False
+
+    def flush(self):
+        global _shouldCommit, _cacheCommit
+        with self.lock:
+            queue = self.pending
+            queue_size = self.queue_size
+            self.pending = []
+            self.queue_size = 0
+            self.tables = set()
+            self.flush_scheduled = self.urgent_flush_scheduled = False
+
+        if not queue:
+            return
+
+        t1 = time()
+        nr_failed = 0
+        for sql, args_list in queue:
+            nr_failed += self._executeGroup(sql, args_list)
+        took = time() - t1
+        if _cacheCommit:
+            _shouldCommit = True
+
+        with self.lock:
+            self.nr_failed += nr_failed
+            self.nr_flushes += 1
+            self.nr_statements += len(queue)
+            self.max_batch = max(self.max_batch, max(len(args_list) for _, args_list in queue))
+            self.flush_time += took
+            self.max_flush_time = max(self.max_flush_time, took)
+            self.writes_since_commit += queue_size
+
+        if DEBUG:
+            print >> sys.stderr, "WriteBatcher: flushed", queue_size, "writes in", len(queue), "statements took", took
+
+        if self.writes_since_commit >= COMMIT_BATCH_SIZE or time() - self.last_commit >= COMMIT_MAX_DELAY:
+            self.db.commitNow()
+
+    def _executeGroup(self, sql, args_list):
+        """ Returns the number of rows which failed """
+        # a savepoint allows to undo the rows executed before a failing row, after
+        # which every row is retried separately
+        cur = self.db.getCursor()
+        try:
+            cur.execute("SAVEPOINT write_batch;")
+            cur.executemany(sql, args_list)
+            cur.execute("RELEASE write_batch;")
+            return 0
+
+        except:
+            print_exc()
+            cur.execute("ROLLBACK TO write_batch;")
+            cur.execute("RELEASE write_batch;")
+
+            nr_failed = 0
+            for args in args_list:
+                try:
+                    cur.execute(sql, args)
+                except:
+                    nr_failed += 1
+                    print >> sys.stderr, "WriteBatcher: could not execute", sql, args
+            return nr_failed
+
+    def addCommit(self, took):
+        with self.lock:
+            self.writes_since_commit = 0
+            self.last_commit = time()
+            self.nr_commits += 1
+            self.commit_time += took
+            self.max_commit_time = max(self.max_commit_time, took)
+
+    def getStats(self):
+        with self.lock:
+            return {"queue_depth": self.queue_size,
+                    "queued": self.nr_queued,
+                    "flushes": self.nr_flushes,
+                    "statements": self.nr_statements,
+                    "failed": self.nr_failed,
+                    "avg_batch_size": (self.nr_queued - self.queue_size) / float(self.nr_statements) if self.nr_statements else 0.0,
+                    "max_batch_size": self.max_batch,
+                    "avg_flush_time": self.flush_time / self.nr_flushes if self.nr_flushes else 0.0,
+                    "max_flush_time": self.max_flush_time,
+                    "commits": self.nr_commits,
+                    "avg_commit_time": self.commit_time / self.nr_commits if self.nr_commits else 0.0,
+                    "max_commit_time": self.max_commit_time}
+
+class ReadPool:
+    """
+    A pool of read-only connections, used to run SELECT statements from
+    threads other than the DB thread without waiting for it.  In WAL mode the
+    readers and the writer do not block each other, but a reader only sees
+    the writes the DB thread has committed.
+    """
+
+    def __init__(self, db_path, busytimeout, size):
+        self.db_path = db_path
+        self.busytimeout = busytimeout
+        self.size = size
+        self.condition = Condition()
+        self.idle = []
+        self.nr_connections = 0
+
+        self.nr_reads = 0
+        self.nr_waits = 0
+
+    def _acquire(self):
+        with self.condition:
+            self.nr_reads += 1
+            if not self.idle and self.nr_connections >= self.size:
+                self.nr_waits += 1
+                while not self.idle and self.nr_connections >= self.size:
+                    self.condition.wait()
+
+            if self.idle:
+                return self.idle.pop()
+            self.nr_connections += 1
+
+        try:
+            con = apsw.Connection(self.db_path, flags = apsw.SQLITE_OPEN_READONLY)
+            con.setbusytimeout(self.busytimeout)
+            return con
+        except:
+            with self.condition:
+                self.nr_connections -= 1
+                self.condition.notify()
+            raise
+
+    def _release(self, con):
+        with self.condition:
+            self.idle.append(con)
+            self.condition.notify()
+
+    def fetchall(self, sql, args=None):
+        con = self._acquire()
+        try:
+            cur = con.cursor()
+            if args is None:
+                return list(cur.execute(sql))
+            return list(cur.execute(sql, args))
+        finally:
+            self._release(con)
+
+    def fetchone(self, sql, args=None):
+        # the same results as SQLiteCacheDBBase.fetchone
+        find = self.fetchall(sql, args)
+        if len(find) == 0:
+            return NULL
+        find = find[0]
+        if len(find) > 1:
+            return find
+        return find[0]
+
+    def getStats(self):
+        with self.condition:
+            return {"connections": self.nr_connections,
+                    "reads": self.nr_reads,
+                    "waits": self.nr_waits}
+
+    def close(self):
+        # connections in use are closed by apsw when they are garbage collected
+        with self.condition:
+            idle = self.idle
+            self.idle = []
+            self.nr_connections -= len(idle)
+        for con in idle:
+            con.close()
+
 class SQLiteNoCacheDB(SQLiteCacheDBV5):
     __single = None
     DEBUG = False
@@ -2414,6 +2679,8 @@ class SQLiteNoCacheDB(SQLiteCacheDBV5):
         if self.__single != None:
             raise RuntimeError, "SQLiteCacheDB is singleton"
         SQLiteCacheDBBase.__init__(self, *args, **kargs)
+        self.write_batcher = WriteBatcher(self)
+        self.read_pool = None
 
         if __debug__:
             if self.__counter > 0:
@@ -2436,10 +2703,15 @@ class SQLiteNoCacheDB(SQLiteCacheDBV5):
     @forceDBThread
     def commitNow(self, vacuum = False, exiting = False):
         global _shouldCommit, _cacheCommit
+        if onDBThread():
+            self.write_batcher.flush()
+
         if _cacheCommit and _shouldCommit and onDBThread():
             try:
                 if DEBUG: print >> sys.stderr, "SQLiteNoCacheDB.commitNow: COMMIT"
+                t1 = time()
                 self._execute("COMMIT;")
+                self.write_batcher.addCommit(time() - t1)
             except:
                 print >> sys.stderr, "COMMIT FAILED"
                 print_exc()
@@ -2479,6 +2751,24 @@ class SQLiteNoCacheDB(SQLiteCacheDBV5):
 
         return self._executemany(sql, args)
 
+    def queue_write(self, sql, args):
+        """
+        Queues a write to be executed by the WriteBatcher, returns immediately.
+        Can be called from any thread.
+        """
+        self.write_batcher.queue(sql, [args])
+
+    def queue_writemany(self, sql, args_list):
+        """ Queues one write for every args in args_list, see queue_write """
+        self.write_batcher.queue(sql, args_list)
+
+    def flush_writes(self):
+        """ Executes all queued writes, without committing them """
+        call_task(None, self.write_batcher.flush)
+
+    def getWriteStats(self):
+        return self.write_batcher.getStats()
+
     def cache_transaction(self, sql, args=None):
         if DEPRECATION_DEBUG:
             raise DeprecationWarning('Please do not use cache_transaction')
@@ -2501,16 +2791,72 @@ class SQLiteNoCacheDB(SQLiteCacheDBV5):
         if vacuum:
             self.commitNow(vacuum, exiting=exiting)
 
+    def close(self, clean=False):
+        if self.read_pool:
+            self.read_pool.close()
+            self.read_pool = None
+        SQLiteCacheDBV5.close(self, clean)
+
+    def _getReadPool(self, sql, committed):
+        """
+        Returns the ReadPool if sql can be executed on it by this thread, or None
+        if it has to be executed on the DB thread
+        """
+        # without a DB thread every thread uses its own connection
+        if not committed or not READ_POOL_SIZE or not _callback or onDBThread():
+            return None
+        if not sql.lstrip()[:6].upper() == "SELECT" or self.write_batcher.hasPending(sql):
+            return None
+
+        if not self.read_pool:
+            db_path = self.class_variables['db_path']
+            if not db_path or db_path.lower() == ':memory:':
+                return None
+
+            self.lock.acquire()
+            try:
+                if not self.read_pool:
+                    self.read_pool = ReadPool(db_path, self.class_variables['busytimeout'], READ_POOL_SIZE)
+            finally:
+                self.lock.release()
+        return self.read_pool
+
+    def fetchone(self, sql, args=None, committed=False):
+        """
+        If committed is True, the caller does not need to see writes which the
+        DB thread has not committed yet.  From other threads such a SELECT is
+        executed using the ReadPool, without waiting for the DB thread.
+        """
+        read_pool = self._getReadPool(sql, committed)
+        if read_pool:
+            return read_pool.fetchone(sql, args)
+        return self._fetchone(sql, args)
+
+    def fetchall(self, sql, args=None, retry=0, committed=False):
+        """ See fetchone for committed """
+        read_pool = self._getReadPool(sql, committed)
+        if read_pool:
+            return read_pool.fetchall(sql, args)
+        return self._fetchall(sql, args, retry)
+
+    def getReadStats(self):
+        if self.read_pool:
+            return self.read_pool.getStats()
+        return {"connections": 0, "reads": 0, "waits": 0}
+
     @forceAndReturnDBThread
-    def fetchone(self, sql, args=None):
+    def _fetchone(self, sql, args=None):
         return SQLiteCacheDBV5.fetchone(self, sql, args)
 
     @forceAndReturnDBThread
-    def fetchall(self, sql, args=None, retry=0):
+    def _fetchall(self, sql, args=None, retry=0):
         return SQLiteCacheDBV5.fetchall(self, sql, args, retry)
 
     @forceAndReturnDBThread
     def _execute(self, sql, args=None):
+        if self.write_batcher.hasPending(sql):
+            self.write_batcher.flush()
+
         cur = self.getCursor()
 
         if SHOW_ALL_EXECUTE or self.show_execute:
@@ -2552,6 +2898,9 @@ class SQLiteNoCacheDB(SQLiteCacheDBV5):
 
     @forceAndReturnDBThread
     def _executemany(self, sql, args=None):
+        if self.write_batcher.hasPending(sql):
+            self.write_batcher.flush()
+
         cur = self.getCursor()
 
         if SHOW_ALL_EXECUTE or self.show_execute:
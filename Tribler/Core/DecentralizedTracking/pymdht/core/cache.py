@@ -12,9 +12,12 @@ an infohash, and a few seconds later the user clicks 'download', thus calling
 pymdht.get_peers() again.\
 """
 
+from collections import OrderedDict
+
 import ptime as time
 
 CACHING_NODE = ('0.0.0.0', 0)
+MAX_CACHED_LOOKUPS = 1000
 
 class CachedLookup(object):
 
@@ -30,20 +33,28 @@ class CachedLookup(object):
 
 class Cache(object):
 
-    def __init__(self, validity_time):
+    def __init__(self, validity_time, max_cached_lookups=MAX_CACHED_LOOKUPS):
         self.validity_time = validity_time
-        self.cached_lookups = []
+        self.max_cached_lookups = max_cached_lookups
+        # info_hash -> cached_lookup, least recently put first
+        self.cached_lookups = OrderedDict()
 
     def put_cached_lookup(self, cached_lookup):
-        # first remove expired chached lookups
-        for i in range(len(self.cached_lookups), 0, -1):
-            if time.time() > (self.cached_lookups[i-1].start_ts +
-                              self.validity_time):
-                del self.cached_lookups[i-1]
-        self.cached_lookups.append(cached_lookup)
+        # first remove expired chached lookups, these are at the front
+        while self.cached_lookups:
+            info_hash = next(iter(self.cached_lookups))
+            if time.time() <= (self.cached_lookups[info_hash].start_ts +
+                               self.validity_time):
+                break
+            del self.cached_lookups[info_hash]
+        # a new lookup replaces the cached one
+        self.cached_lookups.pop(cached_lookup.info_hash, None)
+        self.cached_lookups[cached_lookup.info_hash] = cached_lookup
+        if len(self.cached_lookups) > self.max_cached_lookups:
+            self.cached_lookups.popitem(last=False)
 
     def get_cached_lookup(self, info_hash):
-        for cached_lookup in self.cached_lookups:
-            if cached_lookup.info_hash == info_hash:
-                if time.time() < cached_lookup.start_ts + self.validity_time:
-                    return cached_lookup.peers, CACHING_NODE
+        cached_lookup = self.cached_lookups.get(info_hash)
+        if cached_lookup:
+            if time.time() < cached_lookup.start_ts + self.validity_time:
+                return cached_lookup.peers, CACHING_NODE
@@ -37,6 +37,7 @@ from querier import Querier
 from message import QUERY, RESPONSE, ERROR
 from node import Node
 import responder
+import cache
 #import pkgutil
 
 #from profilestats import profile
@@ -93,7 +94,7 @@ class Controller:
         self._next_timeout_ts = current_ts
         self._next_main_loop_call_ts = current_ts
         self._pending_lookups = []
-        self._cached_lookups = {}
+        self._cache = cache.Cache(CACHE_VALID_PERIOD)
 
     def on_stop(self):
         self._experimental_m.on_stop()
@@ -126,25 +127,19 @@ class Controller:
         datagrams_to_send = self._register_queries(queries_to_send)
         return datagrams_to_send
 
-    def _clean_peer_caches(self):
-        oldest_valid_ts = time.time() - CACHE_VALID_PERIOD
-
-        for key, values in self._cached_lookups.items():
-            ts, _ = values
-            if ts < oldest_valid_ts:
-                del self._cached_lookups[key]
-
     def _get_cached_peers(self, info_hash):
-        self._clean_peer_caches()
-        if info_hash in self._cached_lookups:
-            return self._cached_lookups[info_hash][1]
+        cached = self._cache.get_cached_lookup(info_hash)
+        if cached:
+            return list(cached[0])
 
     def _add_cache_peers(self, info_hash, peers):
-        self._clean_peer_caches()
-
-        if info_hash not in self._cached_lookups:
-            self._cached_lookups[info_hash] = (time.time(), [])
-        self._cached_lookups[info_hash][1].extend(peers)
+        cached = self._cache.get_cached_lookup(info_hash)
+        if cached:
+            cached[0].update(peers)
+        else:
+            cached_lookup = cache.CachedLookup(info_hash)
+            cached_lookup.add_peers(peers)
+            self._cache.put_cached_lookup(cached_lookup)
 
     def _try_do_lookup(self):
         queries_to_send = []
@@ -160,10 +155,11 @@ class Controller:
             lookup_obj = self._pending_lookups[0]
         else:
             return queries_to_send
-        distance = lookup_obj.info_hash.distance(self._my_id)
-        bootstrap_rnodes = self._routing_m.get_closest_rnodes(distance.log,
+        log_distance = lookup_obj.info_hash.log_distance(self._my_id)
+        bootstrap_rnodes = self._routing_m.get_closest_rnodes(log_distance,
                                                               0,
-                                                              True)
+                                                              True,
+                                                        lookup_obj.info_hash)
         #TODO: get the full bucket
         if bootstrap_rnodes:
             del self._pending_lookups[0]
@@ -13,6 +13,7 @@ This module provides the Id object and necessary tools.
 import sys
 import random
 import base64
+import heapq
 
 import logging
 
@@ -104,17 +105,15 @@ class Id(object):
 
     @property
     def long(self):
-        if not self._long:
+        if self._long is None:
             self._long = long(self.hex, 16)
         return self._long
 
     @property
     def log(self):
-        if not self._log:
-            if self.long == 0:
-                self._log = -1
-            else:
-                self._log = len(bin(self.long)) - 3
+        if self._log is None:
+            # bit_length() is 0 for 0, which gives the -1 we want
+            self._log = self.long.bit_length() - 1
         return self._log
 
     @property
@@ -191,7 +190,8 @@ class Id(object):
         159
 
         """
-        return self.distance(other).log
+        # No Id object is built for the distance
+        return (self.long ^ other.long).bit_length() - 1
 
     def get_prefix(self, prefix_len):
         return self.bin_str[:prefix_len]
@@ -210,24 +210,28 @@ class Id(object):
         The original list is not modified.
 
         """
-        id_list_copy = id_list[:]
-        max_distance = ID_SIZE_BITS + 1
-        log_distance_list = []
-        for element in id_list:
-            log_distance_list.append(self.log_distance(element))
-
-        result = []
-        for _ in range(len(id_list)):
-            lowest_index = None
-            lowest_distance = max_distance
-            for j in range(len(id_list_copy)):
-                if log_distance_list[j] < lowest_distance:
-                    lowest_index = j
-                    lowest_distance = log_distance_list[j]
-            result.append(id_list_copy[lowest_index])
-            del log_distance_list[lowest_index]
-            del id_list_copy[lowest_index]
-        return result
+        # sorted is stable: ids at the same log distance keep their order
+        return sorted(id_list, key=self.log_distance)
+
+    def closest(self, elements, num_elements, key=None):
+        """Return the 'num_elements' elements closest (XOR distance) to
+        self, the closest first. 'key' returns the Id of an element. By
+        default, the elements are Id objects.
+
+        The elements are not sorted, a heap keeps the closest ones.
+
+        >>> z = Id(chr(0) * ID_SIZE_BYTES)
+        >>> ids = [Id(chr(0)*(ID_SIZE_BYTES-1)+chr(i)) for i in (6, 1, 5, 3)]
+        >>> [id_.long for id_ in z.closest(ids, 2)]
+        [1L, 3L]
+
+        """
+        my_long = self.long
+        if key is None:
+            return heapq.nsmallest(num_elements, elements,
+                                   key=lambda id_: my_long ^ id_.long)
+        return heapq.nsmallest(num_elements, elements,
+                               key=lambda element: my_long ^ key(element).long)
 
     def generate_close_id(self, log_distance):
         assert log_distance < ID_SIZE_BITS
@@ -12,6 +12,8 @@ simpler.
 '''
 
 import sys
+import errno
+import select
 import socket
 import threading
 import logging
@@ -25,6 +27,12 @@ from Tribler.dispersy.decorator import attach_profiler
 logger = logging.getLogger('dht')
 
 BUFFER_SIZE = 3000
+RECV_BATCH_SIZE = 256 # datagrams received per step, the main loop runs in between
+SOCKET_RCVBUF = 1024 * 1024 # holds bursts of datagrams between steps
+
+# recvfrom errors of a non-blocking socket without pending datagrams
+WOULD_BLOCK_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK,
+                      getattr(errno, 'WSAEWOULDBLOCK', 10035))
 
 DEBUG = False
 
@@ -48,6 +56,13 @@ class ThreadedReactor(threading.Thread):
         self._call_asap_queue = []
         self._next_main_loop_call_ts = 0 # call immediately
 
+        # stats, see get_stats
+        self._start_ts = time.time()
+        self._num_received = 0
+        self._num_sent = 0
+        self._max_recv_batch = 0
+        self._max_call_asap_depth = 0
+
         self._capturing = False
         self._captured = []
 
@@ -61,7 +76,12 @@ class ThreadedReactor(threading.Thread):
 
         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.s.settimeout(self.task_interval)
+        self.s.setblocking(False)
+        try:
+            self.s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                              SOCKET_RCVBUF)
+        except (socket.error), e:
+            logger.warning('Could not set the receive buffer size:\n%s' % e)
         my_addr = ('', self._port)
         self.s.bind(my_addr)
 
@@ -135,54 +155,97 @@ class ThreadedReactor(threading.Thread):
     def run_one_step(self):
         """Main loop activated by calling self.start()"""
 
-        # Deal with call_asap requests
+        # Deal with all call_asap requests queued since the last step
         #TODO: retry for 5 seconds if no msgs_to_send (inside controller?)
-        call_asap_tuple = None
         self._lock.acquire()
         try:
-            if self._call_asap_queue:
-                call_asap_tuple = self._call_asap_queue.pop(0)
+            call_asap_queue = self._call_asap_queue
+            self._call_asap_queue = []
         finally:
             self._lock.release()
-        if call_asap_tuple:
-            callback_f, args, kwds = call_asap_tuple
-            datagrams_to_send = callback_f(*args, **kwds)
-            for datagram in datagrams_to_send:
-                self._sendto(datagram)
+        self._max_call_asap_depth = max(self._max_call_asap_depth,
+                                        len(call_asap_queue))
+        datagrams_to_send = []
+        for callback_f, args, kwds in call_asap_queue:
+            datagrams_to_send.extend(callback_f(*args, **kwds))
 
         # Call main_loop
         if time.time() >= self._next_main_loop_call_ts:
             (self._next_main_loop_call_ts,
-             datagrams_to_send) = self._main_loop_f()
-            for datagram in datagrams_to_send:
-                self._sendto(datagram)
+             datagrams) = self._main_loop_f()
+            datagrams_to_send.extend(datagrams)
+        self._send_datagrams(datagrams_to_send)
 
-        # Get data from the network
+        # Wait for data from the network, unless more call_asap requests
+        # came in meanwhile
+        timeout = 0 if self._call_asap_queue else self.task_interval
         try:
-            data, addr = self.s.recvfrom(BUFFER_SIZE)
-        except (socket.timeout):
-            pass #timeout
-        except (socket.error), e:
+            readable, _, _ = select.select([self.s], [], [], timeout)
+        except (select.error), e:
             logger.warning(
-                'Got socket.error when receiving data:\n%s' % e)
-        else:
+                'Got select.error when waiting for data:\n%s' % e)
+            return
+        if readable:
+            self._send_datagrams(self._receive_datagrams())
+
+    def _receive_datagrams(self):
+        """Handle the datagrams that are pending on the socket, at most
+        RECV_BATCH_SIZE. Return the datagrams to send in response.
+
+        """
+        datagrams_to_send = []
+        num_received = 0
+        while num_received < RECV_BATCH_SIZE:
+            try:
+                data, addr = self.s.recvfrom(BUFFER_SIZE)
+            except (socket.error), e:
+                if e.args[0] not in WOULD_BLOCK_ERRNOS:
+                    logger.warning(
+                        'Got socket.error when receiving data:\n%s' % e)
+                break
+            num_received += 1
             self._add_capture((time.time(), addr, False, data))
             ip_is_blocked = self.floodbarrier_active and \
                             self.floodbarrier.ip_blocked(addr[0])
             if ip_is_blocked:
-                import sys
-#                print >>sys.stderr, '>>>>>>>>>>>>>>>>>>', addr
-#                print >>sys.stderr, '>>>>>>>>>>>>>>>>>>', `addr`
                 logger.warning("blocked")
-#                print >>sys.stderr, '>>>>>>>>>>>>>>>>>> DONE'
-                return
+                continue
             datagram_received = Datagram(data, addr)
             (self._next_main_loop_call_ts,
-             datagrams_to_send) = self._on_datagram_received_f(
+             datagrams) = self._on_datagram_received_f(
              datagram_received)
-            for datagram in datagrams_to_send:
+            datagrams_to_send.extend(datagrams)
+        self._num_received += num_received
+        self._max_recv_batch = max(self._max_recv_batch, num_received)
+        return datagrams_to_send
+
+    def _send_datagrams(self, datagrams_to_send):
+        """Send the datagrams of a step together. Identical datagrams, such
+        as the responses to a retransmitted query, are sent once.
+
+        """
+        sent = set()
+        for datagram in datagrams_to_send:
+            key = (datagram.data, datagram.addr)
+            if key not in sent:
+                sent.add(key)
                 self._sendto(datagram)
 
+    def get_stats(self):
+        """Return the number of datagrams received and sent, per second
+        since the reactor was created, and the largest number of datagrams
+        received at once and of call_asap requests queued at once.
+
+        """
+        elapsed = max(time.time() - self._start_ts, 1e-3)
+        return {'packets_received': self._num_received,
+                'packets_sent': self._num_sent,
+                'received_per_second': self._num_received / elapsed,
+                'sent_per_second': self._num_sent / elapsed,
+                'max_recv_batch': self._max_recv_batch,
+                'call_asap_depth': len(self._call_asap_queue),
+                'max_call_asap_depth': self._max_call_asap_depth}
+
     def stop(self):#, stop_callback):
         """Stop the thread. It cannot be resumed afterwards"""
 
@@ -213,6 +276,7 @@ class ThreadedReactor(threading.Thread):
 
         try:
             bytes_sent = self.s.sendto(datagram.data, datagram.addr)
+            self._num_sent += 1
             if bytes_sent != len(datagram.data):
                 logger.warning(
                     'Just %d bytes sent out of %d (Data follows)' % (
@@ -66,7 +66,7 @@ class Node(object):
 
     def log_distance(self, other):
         # Only for backward compatibility. It will be removed.
-        return self.distance(other).log
+        return self.id.log_distance(other.id)
 
     def compact(self):
         """Return compact format"""
@@ -30,20 +30,18 @@ class Responder(object):
                 return
             return self.msg_f.outgoing_ping_response(msg.src_node)
         elif msg.query == message.FIND_NODE:
-            log_distance = msg.target.distance(self._my_id).log
+            log_distance = msg.target.log_distance(self._my_id)
             rnodes = self._routing_m.get_closest_rnodes(log_distance,
-                                                        NUM_NODES, False)
-            #TODO: return the closest rnodes to the target instead of the 8
-            #first in the bucket.
+                                                        NUM_NODES, False,
+                                                        msg.target)
             return self.msg_f.outgoing_find_node_response(
                 msg.src_node, rnodes)
         elif msg.query == message.GET_PEERS:
             token = self._token_m.get(msg.src_node.ip)
-            log_distance = msg.info_hash.distance(self._my_id).log
+            log_distance = msg.info_hash.log_distance(self._my_id)
             rnodes = self._routing_m.get_closest_rnodes(log_distance,
-                                                        NUM_NODES, False)
-            #TODO: return the closest rnodes to the target instead of the 8
-            #first in the bucket.
+                                                        NUM_NODES, False,
+                                                        msg.info_hash)
             peers = self._tracker.get(msg.info_hash)
             if peers:
                 logger.debug('RESPONDING with PEERS:\n%r' % peers)
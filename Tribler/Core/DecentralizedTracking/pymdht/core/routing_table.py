@@ -4,6 +4,7 @@
 
 import ptime as time
 import logging
+from operator import attrgetter
 
 logger = logging.getLogger('dht')
 
@@ -144,14 +145,23 @@ class RoutingTable(object):
             self.sbuckets[index] = sbucket
         return sbucket
 
-    def get_closest_rnodes(self, log_distance, max_rnodes, exclude_myself):
+    def get_closest_rnodes(self, log_distance, max_rnodes, exclude_myself,
+                           target=None):
+        """Return up to max_rnodes rnodes, from the bucket at log_distance
+        towards the closer buckets first. When the target Id is given,
+        the rnodes of each bucket closest to the target are taken, the
+        closest first.
+
+        """
         result = []
         index = log_distance
         for i in range(index, 0, -1):
             sbucket = self.sbuckets[i]
             if not sbucket:
                 continue
-            result.extend(sbucket.main.rnodes[:max_rnodes-len(result)])
+            result.extend(self._get_bucket_rnodes(sbucket,
+                                                  max_rnodes-len(result),
+                                                  target))
             if len(result) == max_rnodes:
                 return result
         # Include myself (when appropiate)
@@ -162,13 +172,21 @@ class RoutingTable(object):
             sbucket = self.sbuckets[i]
             if not sbucket:
                 continue
-            result.extend(sbucket.main.rnodes[:max_rnodes-len(result)])
+            result.extend(self._get_bucket_rnodes(sbucket,
+                                                  max_rnodes-len(result),
+                                                  target))
             if len(result) == max_rnodes:
                 break
         return result
 
+    def _get_bucket_rnodes(self, sbucket, num_rnodes, target):
+        rnodes = sbucket.main.rnodes
+        if target is not None and num_rnodes > 0:
+            return target.closest(rnodes, num_rnodes, key=attrgetter('id'))
+        return rnodes[:num_rnodes]
+
     def find_next_bucket_with_room_index(self, node_=None, log_distance=None):
-        index = log_distance or node_.distance(self.my_node).log
+        index = log_distance or node_.log_distance(self.my_node)
         for i in range(index + 1, NUM_SBUCKETS):
             # exclude node's bucket
             sbucket = self.sbuckets[i]
@@ -2,6 +2,9 @@
 # Released under GNU LGPL 2.1
 # See LICENSE.txt for more information
 
+from collections import OrderedDict
+from itertools import islice
+
 import ptime as time
 
 VALIDITY_PERIOD = 30 * 60 #30 minutes
@@ -15,7 +18,11 @@ class Tracker(object):
 
     def __init__(self, validity_period=VALIDITY_PERIOD,
                  cleanup_counter=CLEANUP_COUNTER):
+        # key -> {peer: ts}, least recently put peer first
         self._tracker_dict = {}
+        # (key, peer) -> ts, least recently put first. All peers are valid
+        # for the same period, so the expired peers are at the front.
+        self._expiry_dict = OrderedDict()
         self.validity_period = validity_period
         self.cleanup_counter = cleanup_counter
         self._put_counter = 0
@@ -27,37 +34,46 @@ class Tracker(object):
         self._put_counter += 1
         if self._put_counter == self.cleanup_counter:
             self._put_counter = 0
-            for k_ in self._tracker_dict.keys():
-                ts_peers = self._tracker_dict[k_]
-                self._cleanup_key(k_)
-                if not ts_peers: #empty list. Delete key
-                    del self._tracker_dict[k_]
-                    self.num_keys -= 1
-
-        ts_peers = self._tracker_dict.setdefault(k,[])
-        if not ts_peers:
+            self._cleanup()
+
+        ts = time.time()
+        ts_peers = self._tracker_dict.get(k)
+        if ts_peers is None:
+            ts_peers = self._tracker_dict[k] = OrderedDict()
             self.num_keys += 1
-        else:
-            # let's see whether the peer is already there
-            for i in range(len(ts_peers)):
-                if ts_peers[i][1] == peer:
-                    self.num_peers -= 1
-                    del ts_peers[i]
-                    break
-        ts_peers.append((time.time(), peer))
+        elif peer in ts_peers:
+            # the peer moves to the end
+            del ts_peers[peer]
+            del self._expiry_dict[(k, peer)]
+            self.num_peers -= 1
+        ts_peers[peer] = ts
+        self._expiry_dict[(k, peer)] = ts
         self.num_peers += 1
 
     def get(self, k):
-        ts_peers = self._tracker_dict.get(k, [])
-        self._cleanup_key(k)
-        return [ts_peer[1] for ts_peer in ts_peers[-MAX_PEERS:]]
+        self._cleanup()
+        ts_peers = self._tracker_dict.get(k)
+        if not ts_peers:
+            return []
+        peers = list(islice(reversed(ts_peers), MAX_PEERS))
+        peers.reverse()
+        return peers
 
-    def _cleanup_key(self, k):
+    def _cleanup(self):
         '''
-        Clean up the list as side effect.
+        Remove the expired peers, and the keys left without peers.
         '''
-        ts_peers = self._tracker_dict.get(k, None)
         oldest_valid_ts = time.time() - self.validity_period
-        while ts_peers and  ts_peers[0][0] < oldest_valid_ts:
-            del ts_peers[0]
+        expiry_dict = self._expiry_dict
+        while expiry_dict:
+            k_peer = next(iter(expiry_dict))
+            if expiry_dict[k_peer] >= oldest_valid_ts:
+                break
+            del expiry_dict[k_peer]
+            k, peer = k_peer
+            ts_peers = self._tracker_dict[k]
+            del ts_peers[peer]
             self.num_peers -= 1
+            if not ts_peers:
+                del self._tracker_dict[k]
+                self.num_keys -= 1
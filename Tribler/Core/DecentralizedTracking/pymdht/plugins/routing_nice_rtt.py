@@ -108,8 +108,9 @@ class RoutingManager(object):
         if not lookup_target:
             lookup_target = identifier.RandomId()
         if not nodes:
-            log_distance = lookup_target.distance(self.my_node.id).log
-            nodes = self.get_closest_rnodes(log_distance, 0, True)
+            log_distance = lookup_target.log_distance(self.my_node.id)
+            nodes = self.get_closest_rnodes(log_distance, 0, True,
+                                            lookup_target)
         return lookup_target, nodes
 
 
@@ -222,7 +223,7 @@ class RoutingManager(object):
         if self.bootstrapper.is_bootstrap_node(node_):
             return
 
-        log_distance = self.my_node.distance(node_).log
+        log_distance = self.my_node.log_distance(node_)
         try:
             sbucket = self.table.get_sbucket(log_distance)
         except(IndexError):
@@ -265,7 +266,7 @@ class RoutingManager(object):
         self._found_nodes_queue.add(nodes)
 
         logger.debug('on response received %f', rtt)
-        log_distance = self.my_node.distance(node_).log
+        log_distance = self.my_node.log_distance(node_)
         try:
             sbucket = self.table.get_sbucket(log_distance)
         except(IndexError):
@@ -356,7 +357,7 @@ class RoutingManager(object):
         if self.bootstrapper.is_bootstrap_node(node_):
             return []
 
-        log_distance = self.my_node.distance(node_).log
+        log_distance = self.my_node.log_distance(node_)
         try:
             sbucket = self.table.get_sbucket(log_distance)
         except (IndexError):
@@ -387,11 +388,12 @@ class RoutingManager(object):
             self._update_rnode_on_timeout(rnode)
         return []
 
-    def get_closest_rnodes(self, log_distance, num_nodes, exclude_myself):
+    def get_closest_rnodes(self, log_distance, num_nodes, exclude_myself,
+                           target=None):
         if not num_nodes:
             num_nodes = NODES_PER_BUCKET[log_distance]
         return self.table.get_closest_rnodes(log_distance, num_nodes,
-                                             exclude_myself)
+                                             exclude_myself, target)
 
     def get_main_rnodes(self):
         return self.table.get_main_rnodes()
@@ -464,7 +466,7 @@ class _ReplacementQueue(object):
     def pop(self, _):
         while self._queue:
             rnode = self._queue.pop(0)
-            log_distance = self.table.my_node.distance(rnode).log
+            log_distance = self.table.my_node.log_distance(rnode)
             sbucket = self.table.get_sbucket(log_distance)
             m_bucket = sbucket.main
             if m_bucket.there_is_room():
@@ -502,7 +504,7 @@ class _QueryReceivedQueue(object):
             if time_in_queue < QUARANTINE_PERIOD:
                 return
             # Quarantine period passed
-            log_distance = self.table.my_node.distance(node_).log
+            log_distance = self.table.my_node.log_distance(node_)
             self._queued_nodes_set.remove(node_)
             self._nodes_queued_per_bucket[log_distance] = (
                 self._nodes_queued_per_bucket[log_distance] - 1)
@@ -528,7 +530,7 @@ class _FoundNodesQueue(object):
             if node_ in self._queued_nodes_set:
                 # This node has already been queued
                 continue
-            log_distance = self.table.my_node.distance(node_).log
+            log_distance = self.table.my_node.log_distance(node_)
             num_nodes_queued = self._nodes_queued_per_bucket[log_distance]
             if num_nodes_queued > 32:
                 # many nodes queued for this bucket already
@@ -549,7 +551,7 @@ class _FoundNodesQueue(object):
         while self._queue:
             node_ = self._queue.pop(0)
             self._queued_nodes_set.remove(node_)
-            log_distance = self.table.my_node.distance(node_).log
+            log_distance = self.table.my_node.log_distance(node_)
             sbucket = self.table.get_sbucket(log_distance)
             m_bucket = sbucket.main
             rnode = m_bucket.get_rnode(node_)
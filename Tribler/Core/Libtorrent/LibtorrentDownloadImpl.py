@@ -94,6 +94,9 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
         
         self.cew_scheduled = False
 
+        # incremented when the state changes, see TriblerLaunchMany.network_set_download_states_callback
+        self.state_version = 0
+
     def get_def(self):
         return self.tdef
 
@@ -135,12 +138,23 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
         except Exception, e:
             with self.dllock:
                 self.error = e
+                self.state_version += 1
                 print_exc()
+            self.session.lm.resume_cancelled(self)
 
     def create_engine_wrapper(self, lm_network_engine_wrapper_created_callback, pstate, lm_network_vod_event_callback, initialdlstatus = None, wrapperDelay = 0):
         with self.dllock:
             if not self.cew_scheduled:
-                network_create_engine_wrapper_lambda = lambda:self.network_create_engine_wrapper(lm_network_engine_wrapper_created_callback, pstate, lm_network_vod_event_callback, initialdlstatus)
+                def network_create_engine_wrapper_lambda():
+                    try:
+                        self.network_create_engine_wrapper(lm_network_engine_wrapper_created_callback, pstate, lm_network_vod_event_callback, initialdlstatus)
+                    except Exception, e:
+                        with self.dllock:
+                            self.error = e
+                            self.state_version += 1
+                            self.cew_scheduled = False
+                        print_exc()
+                        self.session.lm.resume_cancelled(self)
                 self.session.lm.rawserver.add_task(network_create_engine_wrapper_lambda, wrapperDelay)
                 self.cew_scheduled = True
                     
@@ -182,6 +196,7 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
 
         self.handle = self.ltmgr.add_torrent(self, atp)
         self.lm_network_vod_event_callback = lm_network_vod_event_callback
+        self.state_version += 1
 
         if self.handle:
             self.set_selected_files()
@@ -304,6 +319,7 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
             status = self.handle.status()
 
             with self.dllock:
+                fields = self.get_state_fields()
 
                 if alert_type == 'metadata_received_alert':
                     self.metadata = {'info': lt.bdecode(self.handle.get_torrent_info().metadata())}
@@ -343,6 +359,17 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
                 self.all_time_upload = status.all_time_upload
                 self.all_time_download = status.all_time_download
                 self.finished_time = status.finished_time
+
+                # Every active torrent posts a stats_alert each second, these
+                # only change the state when the transfer counters change
+                if alert_type != 'stats_alert' or fields != self.get_state_fields():
+                    self.state_version += 1
+
+    def get_state_fields(self):
+        """ The fields of the DownloadState that an alert can change, except
+        for the seeding time and the numbers of peers, which change without
+        alerts and are updated by the full snapshots of the download states. """
+        return (self.dlstate, self.error, self.length, self.progress, self.curspeeds[DOWNLOAD], self.curspeeds[UPLOAD], self.all_time_upload, self.all_time_download)
                     
     def set_files(self):
         metainfo = self.tdef.get_metainfo()
@@ -616,6 +643,7 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
                     pstate['engineresumedata'] = self.handle.write_resume_data() if getattr(self.handle.status(), 'has_metadata', False) else None
                     self.dlstate = DLSTATUS_STOPPED
                 self.pstate_for_restart = pstate
+                self.state_version += 1
             else:
                 # This method is also called at Session shutdown, where one may
                 # choose to checkpoint its Download. If the Download was 
@@ -662,6 +690,7 @@ class LibtorrentDownloadImpl(DownloadRuntimeConfig):
         with self.dllock:
             if self.handle is None:
                 self.error = None
+                self.state_version += 1
                 self.create_engine_wrapper(self.session.lm.network_engine_wrapper_created_callback, self.pstate_for_restart, self.session.lm.network_vod_event_callback, initialdlstatus = initialdlstatus)
             else:
                 self.handle.resume()   
@@ -14,6 +14,10 @@ from Tribler.Core import NoDispersyRLock
 DEBUG = False
 DHTSTATE_FILENAME = "ltdht.state"
 
+ALERT_POLL_INTERVAL = 1     # seconds between polls for alerts, when not waiting for them
+ALERT_WAKEUP = True         # wake the network thread as soon as libtorrent posts an alert
+ALERT_WAIT_TIMEOUT = 1000   # ms that the alert thread waits for an alert before checking for shutdown
+
 class LibtorrentMgr:
     # Code to make this a singleton
     __single = None
@@ -56,7 +60,22 @@ class LibtorrentMgr:
         
         self.torlock = NoDispersyRLock()
         self.torrents = {}
-        self.trsession.lm.rawserver.add_task(self.process_alerts, 1)
+
+        # alert class -> (alert type, handler), filled by the first alert of each class
+        self.alert_handlers = {}
+        # alert type -> [nr of alerts, seconds spent handling them]
+        self.alert_stats = {}
+        self.alert_batches = 0
+
+        self.alert_thread = None
+        self.alert_thread_done = False
+        self.alerts_processed = threading.Event()
+        if ALERT_WAKEUP and hasattr(self.ltsession, 'wait_for_alert'):
+            self.alert_thread = threading.Thread(target=self.alert_thread_wait_for_alerts, name="LibtorrentAlerts")
+            self.alert_thread.setDaemon(True)
+            self.alert_thread.start()
+        else:
+            self.trsession.lm.rawserver.add_task(self.process_alerts, ALERT_POLL_INTERVAL)
 
     def getInstance(*args, **kw):
         if LibtorrentMgr.__single is None:
@@ -70,6 +89,12 @@ class LibtorrentMgr:
     delInstance = staticmethod(delInstance)
             
     def shutdown(self):
+        # Stop waiting for alerts
+        if self.alert_thread:
+            self.alert_thread_done = True
+            self.alerts_processed.set()
+            self.alert_thread.join(ALERT_WAIT_TIMEOUT / 1000.0)
+
         # Save DHT state
         dhtstate_file = open(os.path.join(self.trsession.get_state_dir(), DHTSTATE_FILENAME), 'w')
         dhtstate_file.write(lt.bencode(self.ltsession.dht_state()))
@@ -151,21 +176,81 @@ class LibtorrentMgr:
         elif DEBUG:
             print >> sys.stderr, "LibtorrentMgr: cannot remove invalid torrent"
         
+    def alert_thread_wait_for_alerts(self):
+        """ Called by the alert thread, schedules process_alerts on the network
+        thread as soon as libtorrent has alerts, and waits until these are
+        handled before waiting for the next ones. """
+        ltsession = self.ltsession
+        while not self.alert_thread_done:
+            if ltsession.wait_for_alert(ALERT_WAIT_TIMEOUT) and not self.alert_thread_done:
+                self.alerts_processed.clear()
+                self.trsession.lm.rawserver.add_task(self.process_alerts, 0)
+                self.alerts_processed.wait()
+
     def process_alerts(self):
+        """ Called by network thread, handles all alerts that libtorrent posted since the last call """
         if self.ltsession:
+            alerts = self.pop_alerts()
+            if alerts:
+                self.alert_batches += 1
+                with self.torlock:
+                    for alert in alerts:
+                        self.dispatch_alert(alert)
+
+        if self.alert_thread:
+            self.alerts_processed.set()
+        elif self.ltsession:
+            self.trsession.lm.rawserver.add_task(self.process_alerts, ALERT_POLL_INTERVAL)
+
+    def pop_alerts(self):
+        # Older bindings can only pop one alert at a time
+        if hasattr(self.ltsession, 'pop_alerts'):
+            return self.ltsession.pop_alerts()
+
+        alerts = []
+        alert = self.ltsession.pop_alert()
+        while alert:
+            alerts.append(alert)
             alert = self.ltsession.pop_alert()
-            while alert:
-                handle = getattr(alert, 'handle', None) 
-                if handle:
-                    if handle.is_valid():
-                        infohash = str(handle.info_hash())
-                        with self.torlock:
-                            if infohash in self.torrents:
-                                alert_type = str(type(alert)).split("'")[1].split(".")[-1]
-                                self.torrents[infohash].process_alert(alert, alert_type)
-                            elif DEBUG:
-                                print >> sys.stderr, "LibtorrentMgr: could not find torrent", infohash
-                    elif DEBUG:
-                        print >> sys.stderr, "LibtorrentMgr: alert for invalid torrent"
-                alert = self.ltsession.pop_alert()
-            self.trsession.lm.rawserver.add_task(self.process_alerts, 1)
+        return alerts
+
+    def dispatch_alert(self, alert):
+        alert_class = alert.__class__
+        if alert_class in self.alert_handlers:
+            alert_type, handler = self.alert_handlers[alert_class]
+        else:
+            alert_type = alert_class.__name__
+            handler = self.process_torrent_alert if hasattr(alert, 'handle') else self.process_session_alert
+            self.alert_handlers[alert_class] = (alert_type, handler)
+
+        start = time.time()
+        handler(alert, alert_type)
+
+        stats = self.alert_stats.get(alert_type)
+        if not stats:
+            stats = self.alert_stats[alert_type] = [0, 0.0]
+        stats[0] += 1
+        stats[1] += time.time() - start
+
+    def process_torrent_alert(self, alert, alert_type):
+        handle = alert.handle
+        if handle:
+            if handle.is_valid():
+                infohash = str(handle.info_hash())
+                if infohash in self.torrents:
+                    self.torrents[infohash].process_alert(alert, alert_type)
+                elif DEBUG:
+                    print >> sys.stderr, "LibtorrentMgr: could not find torrent", infohash
+            elif DEBUG:
+                print >> sys.stderr, "LibtorrentMgr: alert for invalid torrent"
+
+    def process_session_alert(self, alert, alert_type):
+        if DEBUG:
+            print >> sys.stderr, "LibtorrentMgr: alert %s with message %s" % (alert_type, alert)
+
+    def get_alert_stats(self):
+        """ Returns the number of alerts and the seconds spent handling them per alert type """
+        nr_alerts = sum(count for count, _ in self.alert_stats.itervalues())
+        return { 'batches': self.alert_batches,
+                 'alerts_per_batch': float(nr_alerts) / self.alert_batches if self.alert_batches else 0.0,
+                 'types': dict((alert_type, {'count': count, 'time': took}) for alert_type, (count, took) in self.alert_stats.iteritems()) }
@@ -1,7 +1,7 @@
 # Written by Bram Cohen and Pawel Garbacki
 # see LICENSE.txt for license information
 
-from bisect import insort
+from heapq import heappush, heappop
 from SocketHandler import SocketHandler
 import socket
 from cStringIO import StringIO
@@ -48,6 +48,10 @@ def autodetect_socket_style():
 
 READSIZE = 100000
 
+# upper bounds (in seconds) of the task runtime histogram buckets, the last
+# bucket counts everything that took longer
+TASK_HISTOGRAM_BUCKETS = (0.001, 0.01, 0.1, 1.0)
+
 class RawServer:
     def __init__(self, doneflag, timeout_check_interval, timeout, noisy = True,
                  ipv6_enable = True, failfunc = lambda x: None, errorfunc = None,
@@ -62,7 +66,10 @@ class RawServer:
         self.failfunc = failfunc
         self.errorfunc = errorfunc
         self.exccount = 0
-        self.funcs = []
+        self.funcs = [] # heap of [when, seq, func, id] entries
+        self.funcs_by_id = {} # id -> list of entries in self.funcs
+        self.funcs_seq = 0 # keeps tasks scheduled at the same time in FIFO order
+        self.task_stats = {} # func name -> histogram of runtimes, see get_task_stats
         self.externally_added = []
         self.finished = Event()
         self.tasks_to_kill = []
@@ -84,7 +91,60 @@ class RawServer:
     def _add_task(self, func, delay, id = None):
         if delay < 0:
             delay = 0
-        insort(self.funcs, (clock() + delay, func, id))
+        entry = [clock() + delay, self.funcs_seq, func, id]
+        self.funcs_seq += 1
+        heappush(self.funcs, entry)
+        if id is not None:
+            self.funcs_by_id.setdefault(id, []).append(entry)
+
+    def _pop_task(self):
+        """ Removes the first task from the heap and returns it as a
+            (when, func, id) tuple.  func is None when the task was killed. """
+        entry = heappop(self.funcs)
+        when, _, func, id = entry
+        if func is not None and id is not None:
+            entries = self.funcs_by_id[id]
+            entries.remove(entry)
+            if not entries:
+                del self.funcs_by_id[id]
+        return when, func, id
+
+    def _drop_killed_tasks(self):
+        """ Removes killed tasks from the front of the heap, so the first
+            task is one that will run """
+        while self.funcs and self.funcs[0][2] is None:
+            heappop(self.funcs)
+
+    def _update_task_stats(self, func, took):
+        name = getattr(func, "func_name", None) or str(func)
+        histogram = self.task_stats.get(name)
+        if histogram is None:
+            histogram = self.task_stats[name] = [0] * (len(TASK_HISTOGRAM_BUCKETS) + 1) + [0.0, 0.0]
+
+        for index, bound in enumerate(TASK_HISTOGRAM_BUCKETS):
+            if took < bound:
+                break
+        else:
+            index = len(TASK_HISTOGRAM_BUCKETS)
+        histogram[index] += 1
+        histogram[-2] += took
+        if took > histogram[-1]:
+            histogram[-1] = took
+
+    def get_task_stats(self):
+        """ Returns a dictionary with func name -> (histogram, total, max) for
+            every task executed by listen_forever.  The histogram is a tuple
+            with the number of calls that took less than each bound in
+            TASK_HISTOGRAM_BUCKETS, followed by the number of calls that took
+            longer.  Use this to find tasks that starve the socket I/O. """
+        nr_buckets = len(TASK_HISTOGRAM_BUCKETS) + 1
+        return dict((name, (tuple(histogram[:nr_buckets]), histogram[-2], histogram[-1]))
+                    for name, histogram in self.task_stats.items())
+
+    def get_queue_size(self):
+        """ Returns the number of scheduled tasks, including killed tasks
+            that have not been dropped from the heap yet """
+        return len(self.funcs) + len(self.externally_added)
 
     def add_task(self, func, delay = 0, id = None):
         #if DEBUG:
@@ -143,6 +203,7 @@ class RawServer:
                 try:
                     self.pop_external()
                     self._kill_tasks()
+                    self._drop_killed_tasks()
                     if self.funcs:
                         period = self.funcs[0][0] + 0.001 - clock()
                     else:
@@ -162,20 +223,21 @@ class RawServer:
                     #print >>sys.stderr,"RawServer: funcs is",`self.funcs`
                     
                     
-                    while self.funcs and self.funcs[0][0] <= clock() and not self.doneflag.isSet():
-                        garbage1, func, id = self.funcs.pop(0)
-                        if id in self.tasks_to_kill:
-                            pass
+                    while not self.doneflag.isSet():
+                        self._drop_killed_tasks()
+                        if not self.funcs or self.funcs[0][0] > clock():
+                            break
+                        garbage1, func, id = self._pop_task()
                         try:
 #                            print func.func_name
                             if DEBUG:
                                 if func.func_name != "_bgalloc":
                                     print >> sys.stderr,"RawServer:f",func.func_name
-                            #st = time.time()
-                            func()
-                            #et = time.time()
-                            #diff = et - st
-                            #print >>sys.stderr,func,"took %.5f" % (diff)
+                            st = clock()
+                            try:
+                                func()
+                            finally:
+                                self._update_task_stats(func, clock() - st)
                             
                         except (SystemError, MemoryError), e:
                             self.failfunc(e)
@@ -245,11 +307,11 @@ class RawServer:
 
     def _kill_tasks(self):
         if self.tasks_to_kill:
-            new_funcs = []
-            for (t, func, id) in self.funcs:
-                if id not in self.tasks_to_kill:
-                    new_funcs.append((t, func, id))
-            self.funcs = new_funcs
+            # killed entries stay in the heap until they reach the front,
+            # _drop_killed_tasks removes them
+            for id in self.tasks_to_kill:
+                for entry in self.funcs_by_id.pop(id, ()):
+                    entry[2] = None
             self.tasks_to_kill = []
 
     def kill_tasks(self, id):
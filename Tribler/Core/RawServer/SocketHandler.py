@@ -3,12 +3,17 @@
 
 import socket
 import errno
+# the readiness backend: epoll on Linux, poll where available, select otherwise
 try:
-    from select import poll, POLLIN, POLLOUT, POLLERR, POLLHUP
+    from epollpoll import poll, POLLIN, POLLOUT, POLLERR, POLLHUP
     timemult = 1000
 except ImportError:
-    from selectpoll import poll, POLLIN, POLLOUT, POLLERR, POLLHUP
-    timemult = 1
+    try:
+        from select import poll, POLLIN, POLLOUT, POLLERR, POLLHUP
+        timemult = 1000
+    except ImportError:
+        from selectpoll import poll, POLLIN, POLLOUT, POLLERR, POLLHUP
+        timemult = 1
 from time import sleep
 from Tribler.Core.Utilities.clock import clock
 import sys
@@ -25,6 +30,10 @@ DEBUG = False
 
 all = POLLIN | POLLOUT
 
+# small queued messages are joined into one send of at most this many bytes,
+# larger messages, such as pieces, are sent from the queue without copying
+WRITE_COALESCE_SIZE = 4096
+
 if sys.platform == 'win32':
     SOCKET_BLOCK_ERRORCODE=10035    # WSAEWOULDBLOCK
 else:
@@ -89,6 +98,8 @@ class SingleSocket:
         self.socket = sock
         self.handler = handler
         self.buffer = []
+        # bytes of self.buffer[0] that have been sent
+        self.offset = 0
         self.last_hit = clock()
         self.fileno = sock.fileno()
         self.connected = False
@@ -160,6 +171,7 @@ class SingleSocket:
         sock = self.socket
         self.socket = None
         self.buffer = []
+        self.offset = 0
         del self.socket_handler.single_sockets[self.fileno]
         
         try:
@@ -185,22 +197,46 @@ class SingleSocket:
         if len(self.buffer) == 1:
             self.try_write()
 
+    def coalesce(self):
+        """ Join the small messages at the head of the queue into one string """
+        size = len(self.buffer[0]) - self.offset
+        count = 1
+        while count < len(self.buffer) and size + len(self.buffer[count]) <= WRITE_COALESCE_SIZE:
+            size += len(self.buffer[count])
+            count += 1
+        if count > 1:
+            parts = self.buffer[:count]
+            if self.offset:
+                parts[0] = parts[0][self.offset:]
+                self.offset = 0
+            self.buffer[:count] = ["".join(parts)]
+            self.socket_handler.bytes_copied += size
+
     def try_write(self):
         
         if self.connected:
             dead = False
             try:
                 while self.buffer:
+                    if len(self.buffer) > 1:
+                        self.coalesce()
                     buf = self.buffer[0]
-                    amount = self.socket.send(buf)
+                    self.socket_handler.send_calls += 1
+                    if self.offset:
+                        # a memoryview slice shares the string instead of copying the remainder
+                        amount = self.socket.send(memoryview(buf)[self.offset:])
+                    else:
+                        amount = self.socket.send(buf)
                     if amount == 0:
                         self.skipped += 1
                         break
                     self.skipped = 0
-                    if amount != len(buf):
-                        self.buffer[0] = buf[amount:]
+                    self.socket_handler.bytes_sent += amount
+                    self.offset += amount
+                    if self.offset != len(buf):
                         break
                     del self.buffer[0]
+                    self.offset = 0
             except socket.error, e:
                 #if DEBUG:
                 #    print_exc(file=sys.stderr)
@@ -240,6 +276,10 @@ class SocketHandler:
         self.btengine_said_reachable = False
         self.interrupt_socket = None
         self.udp_sockets = {}
+        # write counters of all SingleSockets
+        self.bytes_sent = 0
+        self.bytes_copied = 0
+        self.send_calls = 0
 
     def scan_for_timeouts(self):
         t = clock() - self.timeout
@@ -602,6 +642,14 @@ class SocketHandler:
         return { 'interfaces': self.interfaces, 
                  'port': self.port }
 
+    def get_write_stats(self):
+        megabytes = self.bytes_sent / 1048576.0
+        return { 'bytes_sent': self.bytes_sent,
+                 'bytes_copied': self.bytes_copied,
+                 'send_calls': self.send_calls,
+                 'send_calls_per_mb': self.send_calls / megabytes if megabytes else 0.0,
+                 'copied_per_mb': self.bytes_copied / megabytes if megabytes else 0.0 }
+
 
     def shutdown(self):
         for ss in self.single_sockets.values():
@@ -0,0 +1,82 @@
+# see LICENSE.txt for license information
+#
+# A poll class using epoll, used by SocketHandler on Linux.  epoll only
+# returns the sockets that are ready, instead of checking every registered
+# socket on each call as poll and select do.  Importing this module raises
+# ImportError when epoll is not available.
+#
+# The readiness is level-triggered, as SocketHandler.handle_events reads at
+# most one buffer per event and relies on being notified again.
+
+import sys
+import errno
+from select import epoll, EPOLLIN, EPOLLOUT, EPOLLERR, EPOLLHUP
+
+# the same values as select.POLL*
+POLLIN = EPOLLIN
+POLLOUT = EPOLLOUT
+POLLERR = EPOLLERR
+POLLHUP = EPOLLHUP
+
+# epoll.poll does not accept timeouts which do not fit in an int in milliseconds
+MAX_TIMEOUT = 2 ** 31 - 1
+
+DEBUG = False
+
+class poll:
+    """ The register/unregister/poll interface of select.poll, timeouts are in milliseconds """
+
+    def __init__(self):
+        self.epoll = epoll()
+        # {fd: (eventmask, registered object)}
+        self.registered = {}
+
+    def register(self, f, t):
+        fd = f if isinstance(f, (int, long)) else f.fileno()
+        current = self.registered.get(fd)
+        if current:
+            # SocketHandler registers a socket again after every write, a system
+            # call is only needed when the mask changes.  A different object with
+            # the same fd is a new socket, the old one was closed without unregister
+            mask, obj = current
+            if mask == t and obj is f:
+                return
+            try:
+                self.epoll.modify(fd, t)
+            except IOError, e:
+                if e.errno != errno.ENOENT:
+                    raise
+                self.epoll.register(fd, t)
+        else:
+            try:
+                self.epoll.register(fd, t)
+            except IOError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+                self.epoll.modify(fd, t)
+        self.registered[fd] = (t, f)
+
+    def unregister(self, f):
+        fd = f if isinstance(f, (int, long)) else f.fileno()
+        # raises KeyError for unknown fds, as select.poll does
+        del self.registered[fd]
+        try:
+            self.epoll.unregister(fd)
+        except IOError, e:
+            # closed sockets are removed from the epoll set by the kernel
+            if e.errno not in (errno.ENOENT, errno.EBADF):
+                raise
+
+    def poll(self, timeout = None):
+        if timeout is None or timeout < 0 or timeout >= MAX_TIMEOUT:
+            timeout = -1
+        else:
+            timeout = timeout / 1000.0
+        try:
+            return self.epoll.poll(timeout)
+        except IOError, e:
+            if e.errno != errno.EINTR:
+                raise
+            if DEBUG:
+                print >>sys.stderr,"epollpoll: interrupted"
+            return []
@@ -5,11 +5,11 @@
 # returned torrents for download.
 
 import sys
-import Queue
 import os
 
 from traceback import print_exc
 from random import choice
+from collections import deque
 from binascii import hexlify
 from time import sleep, time
 
@@ -27,6 +27,7 @@ from Tribler.Main.Utility.GuiDBHandler import startWorker
 import urllib
 import binascii
 from Tribler.Core.Utilities.utilities import get_collected_torrent_filename
+from Tribler.Core.Utilities.bencode import bencode
 
 DEBUG = False
 SWIFTFAILED_TIMEOUT = 5*60 #5 minutes
@@ -210,8 +211,9 @@ class RemoteTorrentHandler:
 
             requester = self.mrequesters[prio]
 
-            #make request
-            requester.add_request(frozenset(infohashes), candidate)
+            #make request, the requester combines the infohashes per candidate
+            for infohash in infohashes:
+                requester.add_request(infohash, candidate)
             if DEBUG:
                 print >>sys.stderr,'rtorrent: adding torrent messages request:', map(bin2str, infohashes), candidate, prio
 
@@ -221,18 +223,24 @@ class RemoteTorrentHandler:
     def _has_torrent(self, infohash, tor_col_dir, callback):
         #save torrent
         result = False
-        torrent = self.torrent_db.getTorrent(infohash, ['torrent_file_name', 'swift_torrent_hash'], include_mypref = False)
-        if torrent:
-            if torrent.get('torrent_file_name', False) and os.path.isfile(torrent['torrent_file_name']):
-                result = torrent['torrent_file_name']
+        torrent_store = self.torrent_db.torrent_store
+        if torrent_store is not None and torrent_store.has_torrent(infohash):
+            #no need to look for the file
+            result = True
+
+        else:
+            torrent = self.torrent_db.getTorrent(infohash, ['torrent_file_name', 'swift_torrent_hash'], include_mypref = False)
+            if torrent:
+                if torrent.get('torrent_file_name', False) and os.path.isfile(torrent['torrent_file_name']):
+                    result = torrent['torrent_file_name']
 
-            elif torrent.get('swift_torrent_hash', False):
-                sdef = SwiftDef(torrent['swift_torrent_hash'])
-                torrent_filename = os.path.join(tor_col_dir, sdef.get_roothash_as_hex())
+                elif torrent.get('swift_torrent_hash', False):
+                    sdef = SwiftDef(torrent['swift_torrent_hash'])
+                    torrent_filename = os.path.join(tor_col_dir, sdef.get_roothash_as_hex())
 
-                if os.path.isfile(torrent_filename):
-                    self.torrent_db.updateTorrent(infohash, notify=False, torrent_file_name=torrent_filename)
-                    result = torrent_filename
+                    if os.path.isfile(torrent_filename):
+                        self.torrent_db.updateTorrent(infohash, notify=False, torrent_file_name=torrent_filename)
+                        result = torrent_filename
 
         raw_lambda = lambda result=result: callback(result)
         self.scheduletask(raw_lambda)
@@ -257,6 +265,7 @@ class RemoteTorrentHandler:
 
         tdef.save(tmp_filename)
         sdef, swiftpath = self._write_to_collected(tmp_filename)
+        self._store_torrent(tdef)
 
         try:
             os.remove(tmp_filename)
@@ -278,11 +287,16 @@ class RemoteTorrentHandler:
 
         startWorker(None, do_db, wargs = (callback, ))
 
+    def _store_torrent(self, tdef):
+        torrent_store = self.torrent_db.torrent_store
+        if torrent_store is not None:
+            torrent_store.put_torrent(tdef.get_infohash(), bencode(tdef.get_metainfo()))
+
     def _write_to_collected(self, filename):
-        #calculate root-hash
+        #calculate root-hash, in-process instead of running swift for every torrent
         sdef = SwiftDef()
         sdef.add_content(filename)
-        sdef.finalize(self.session.get_swift_path(), destdir = self.session.get_torrent_collecting_dir())
+        sdef.finalize_in_process(destdir = self.session.get_torrent_collecting_dir())
 
         mfpath = os.path.join(self.session.get_torrent_collecting_dir(),sdef.get_roothash_as_hex())
         if not os.path.exists(mfpath):
@@ -296,7 +310,9 @@ class RemoteTorrentHandler:
             try:
                 shutil.copy(filename, mfpath)
                 shutil.move(filename+'.mhash', mfpath+'.mhash')
-                shutil.move(filename+'.mbinmap', mfpath+'.mbinmap')
+                #swift creates the .mbinmap when it opens the torrent
+                if os.path.exists(filename+'.mbinmap'):
+                    shutil.move(filename+'.mbinmap', mfpath+'.mbinmap')
 
             except:
                 print_exc()
@@ -321,6 +337,7 @@ class RemoteTorrentHandler:
         if os.path.exists(swiftpath):
             try:
                 tdef = TorrentDef.load(swiftpath)
+                self._store_torrent(tdef)
                 startWorker(None, do_db, wargs = (tdef, ))
 
             except:
@@ -342,6 +359,11 @@ class RemoteTorrentHandler:
                 handle_lambda = lambda key=key, actualTorrent=actualTorrent: self._handleCallback(key, actualTorrent)
                 self.scheduletask(handle_lambda)
 
+        #the torrent message arrived
+        for requester in self.mrequesters.values():
+            done_lambda = lambda requester=requester, infohash=infohash: requester.request_done(infohash)
+            self.scheduletask(done_lambda)
+
     def _handleCallback(self, key, torrent = True):
         if DEBUG:
             print >>sys.stderr,'rtorrent: got torrent for:', key
@@ -362,8 +384,8 @@ class RemoteTorrentHandler:
                         requester.remove_request(key)
             else:
                 for requester in self.mrequesters.values():
-                    if requester.is_being_requested(key):
-                        requester.remove_request(key)
+                    if requester.is_being_requested(key[0]):
+                        requester.remove_request(key[0])
 
     def getQueueSize(self):
         def getQueueSize(qname, requesters):
@@ -393,93 +415,210 @@ class RemoteTorrentHandler:
             return ''
         return ", ".join([qstring for qstring in [getQueueSuccess("TQueue", self.trequesters), getQueueSuccess("DQueue", self.drequesters), getQueueSuccess("MQueue", self.mrequesters)] if qstring])
 
+    def getQueueStats(self):
+        """ Returns the counters of the requesters, see Requester.get_stats, as
+        a dictionary of queue name -> prio -> counters """
+        queues = {"TQueue": self.trequesters, "DQueue": self.drequesters, "MQueue": self.mrequesters}
+        return dict((qname, dict((prio, requester.get_stats()) for prio, requester in requesters.items())) for qname, requesters in queues.iteritems())
+
 class Requester:
     REQUEST_INTERVAL = 0.5
-
-    def __init__(self, scheduletask, prio):
+    # the number of hashes that are being fetched at the same time, divided by the prio
+    REQUEST_WINDOW = 10
+    # the time after which a fetch that did not finish is considered to have failed
+    REQUEST_TIMEOUT = 60.0
+    # successful fetches over the last THROUGHPUT_WINDOW seconds make up the throughput
+    THROUGHPUT_WINDOW = 60.0
+    MAX_CANDIDATE_FAILURES = 1000
+
+    def __init__(self, scheduletask, prio, window = None):
         self.scheduletask = scheduletask
         self.prio = prio
+        self.window = max(1, (window or self.REQUEST_WINDOW) / max(1, prio))
 
-        self.queue = Queue.Queue()
-        self.sources = {}
+        self.pending = deque() # hashes in the order in which they were requested
+        self.sources = {} # hash -> set of candidates for the pending hashes
+        self.deadlines = {} # hash -> time after which a pending hash is no longer needed
+        self.in_flight = {} # hash -> (timeout, candidate, candidates not asked yet, deadline)
+        self.candidate_failures = {} # sock_addr -> nr of failed or timed out fetches since the last success
         self.canrequest = True
+        self.next_request = None
 
         self.requests_made = 0
         self.requests_success = 0
+        self.requests_failed = 0
+        self.requests_timedout = 0
+        self.requests_expired = 0
+        self.success_times = deque()
 
     def add_request(self, hash, candidate, timeout = None):
-        was_empty = self.queue.empty()
-
-        if hash not in self.sources:
-            self.sources[hash] = set()
-
         if timeout is None:
             timeout = sys.maxint
         else:
             timeout = timeout + time()
 
-        self.sources[hash].add(candidate)
-        self.queue.put((hash, timeout))
+        if hash not in self.sources:
+            self.sources[hash] = set()
+            self.deadlines[hash] = timeout
+            self.pending.append(hash)
+        else:
+            self.deadlines[hash] = max(self.deadlines[hash], timeout)
 
-        if was_empty:
-            self.scheduletask(self.doRequest, t = self.REQUEST_INTERVAL * self.prio)
+        self.sources[hash].add(candidate)
+        self.schedule_request(self.REQUEST_INTERVAL * self.prio)
 
     def is_being_requested(self, hash):
         return hash in self.sources
 
     def remove_request(self, hash):
         del self.sources[hash]
+        del self.deadlines[hash]
+
+    def request_done(self, hash, success = True):
+        """ Called on the task queue when the fetch of hash finished. Frees its
+        place in the window, or does nothing if hash is not being fetched. """
+        if hash in self.in_flight:
+            _, candidate, others, deadline = self.in_flight.pop(hash)
+            if success:
+                self.requests_success += 1
+                self.success_times.append(time())
+                self.candidate_failures.pop(get_candidate_key(candidate), None)
+            else:
+                self.requests_failed += 1
+                self._fetch_failed(hash, candidate, others, deadline)
+
+            self.schedule_request(0)
+
+    def _fetch_failed(self, hash, candidate, others, deadline):
+        key = get_candidate_key(candidate)
+        if len(self.candidate_failures) >= self.MAX_CANDIDATE_FAILURES and key not in self.candidate_failures:
+            self.candidate_failures.clear()
+        self.candidate_failures[key] = self.candidate_failures.get(key, 0) + 1
+
+        #try the other candidates
+        if others:
+            if hash in self.sources:
+                self.sources[hash].update(others)
+            else:
+                self.sources[hash] = set(others)
+                self.deadlines[hash] = deadline
+                self.pending.append(hash)
+
+    def schedule_request(self, t):
+        """ Schedule doRequest in t seconds, unless it runs before then """
+        next_request = time() + t
+        if self.next_request is None or next_request < self.next_request:
+            self.next_request = next_request
+            self.scheduletask(self.doRequest, t = t)
 
     def doRequest(self):
+        self.next_request = None
         try:
-            madeRequest = False
+            now = time()
+            for hash, (timeout, candidate, others, deadline) in self.in_flight.items():
+                if now > timeout:
+                    if DEBUG:
+                        print >> sys.stderr, "rtorrent: fetch timed out for hash", hash, candidate
+
+                    del self.in_flight[hash]
+                    self.requests_timedout += 1
+                    self._fetch_failed(hash, candidate, others, deadline)
+
             if isinstance(self.canrequest, bool):
                 canRequest = self.canrequest
             else:
                 canRequest = self.canrequest()
 
-            if canRequest:
-                #request new infohash from queue
-                while True:
-                    hash, timeout = self.queue.get_nowait()
+            if canRequest and len(self.in_flight) < self.window:
+                for candidate, requests in self._select_requests(now, self.window - len(self.in_flight)):
+                    #Make sure exceptions wont crash this requesting loop
+                    try:
+                        made = set(self.doFetchBatch(candidate, [(hash, candidates) for hash, candidates, _, _ in requests]))
+                        for hash, candidates, others, deadline in requests:
+                            if hash in made:
+                                self.requests_made += 1
+                                self.in_flight[hash] = (now + self.REQUEST_TIMEOUT, candidate, others, deadline)
+                    except:
+                        print_exc()
+
+        #Make sure exceptions wont crash this requesting loop
+        except:
+            print_exc()
+
+        if self.pending or self.in_flight:
+            self.schedule_request(self.REQUEST_INTERVAL * max(1, self.prio))
+
+    def _select_requests(self, now, max_requests):
+        """ Take up to max_requests hashes from the pending ones, the hashes
+        that can be fetched from a candidate without failures first, and group
+        them by the candidate to fetch them from.
+        @return A list of (candidate, [(hash, candidates, others, deadline), ...]) """
+        pending = deque()
+        seen = set()
+        order = []
+        for hash in self.pending:
+            if hash not in self.sources or hash in seen:
+                #removed or requested again
+                continue
+            seen.add(hash)
+
+            if hash in self.in_flight:
+                #wait for the current fetch
+                pending.append(hash)
+                continue
+
+            if now > self.deadlines[hash]:
+                if DEBUG:
+                    print >> sys.stderr, "rtorrent: timeout for hash", hash
 
-                    #check if still needed
-                    if time() > timeout:
-                        if DEBUG:
-                            print >> sys.stderr, "rtorrent: timeout for hash", hash
+                self.remove_request(hash)
+                self.requests_expired += 1
+                continue
 
-                        if hash in self.sources:
-                            del self.sources[hash]
+            failures = min(self.candidate_failures.get(get_candidate_key(candidate), 0) for candidate in self.sources[hash])
+            order.append((failures, len(order), hash))
+            pending.append(hash)
 
-                    elif hash in self.sources:
-                        break
+        selected = set(hash for _, _, hash in sorted(order)[:max_requests])
+        self.pending = deque(hash for hash in pending if hash not in selected)
 
-                    self.queue.task_done()
+        batches = {}
+        for hash in [hash for hash in pending if hash in selected]:
+            candidates = sorted(self.sources[hash], key = lambda candidate: self.candidate_failures.get(get_candidate_key(candidate), 0))
+            deadline = self.deadlines[hash]
+            self.remove_request(hash)
 
-                try:
-                    candidates = list(self.sources[hash])
-                    del self.sources[hash]
-
-                    madeRequest = self.doFetch(hash, candidates)
-                    if madeRequest:
-                        self.requests_made += 1
-
-                #Make sure exceptions wont crash this requesting loop
-                except:
-                    print_exc()
+            candidate = candidates[0]
+            batches.setdefault(get_candidate_key(candidate), (candidate, []))[1].append((hash, candidates, self.get_others(candidates), deadline))
+        return batches.values()
 
-                self.queue.task_done()
+    def get_others(self, candidates):
+        """ Returns the candidates to try when fetching from candidates fails """
+        return []
 
-            if madeRequest or not canRequest:
-                self.scheduletask(self.doRequest, t = self.REQUEST_INTERVAL * self.prio)
-            else:
-                self.scheduletask(self.doRequest)
-        except Queue.Empty:
-            pass
+    def doFetchBatch(self, candidate, requests):
+        """ Fetch the hashes in requests, which are grouped by the candidate
+        with the fewest failures.
+        @param requests List of (hash, candidates), with candidate first.
+        @return The hashes for which a request was made. """
+        return [hash for hash, candidates in requests if self.doFetch(hash, candidates)]
 
     def doFetch(self, hash, candidates):
         raise NotImplementedError()
 
+    def get_stats(self):
+        now = time()
+        while self.success_times and self.success_times[0] < now - self.THROUGHPUT_WINDOW:
+            self.success_times.popleft()
+
+        return {'pending': len(self.sources), 'in_flight': len(self.in_flight), 'window': self.window,
+                'made': self.requests_made, 'success': self.requests_success, 'failed': self.requests_failed,
+                'timedout': self.requests_timedout, 'expired': self.requests_expired,
+                'throughput': len(self.success_times) / self.THROUGHPUT_WINDOW}
+
+def get_candidate_key(candidate):
+    return candidate.sock_addr if candidate else None
+
 class TorrentRequester(Requester):
     MAGNET_TIMEOUT = 5.0
     SWIFT_CANCEL = 30.0
@@ -507,6 +646,7 @@ class TorrentRequester(Requester):
         infohash, roothash = hash
 
         if filename:
+            self.request_done(hash)
             self.remote_th.notify_possible_torrent_infohash(infohash, True)
             self.remote_th.notify_possible_torrent_infohash(hash, True)
 
@@ -539,6 +679,7 @@ class TorrentRequester(Requester):
                 download.add_peer((ip,port))
 
             except OperationNotEnabledByConfigurationException:
+                self.request_done(hash, False)
                 doMagnet = True
 
             if download and candidates:
@@ -565,21 +706,27 @@ class TorrentRequester(Requester):
             remove_lambda = lambda d=d: self._remove_download(d)
             self.scheduletask(remove_lambda)
 
+            done_lambda = lambda hash=(infohash, roothash): self.request_done(hash, False)
+            self.scheduletask(done_lambda)
+
             if not didMagnet:
                 if DEBUG:
                     print >>sys.stderr,"rtorrent: switching to magnet for", cdef.get_name(), bin2str(infohash)
-                self.magnet_requester.add_request(infohash, None, timeout = SWIFTFAILED_TIMEOUT)
+                magnet_lambda = lambda infohash=infohash: self.magnet_requester.add_request(infohash, None, timeout = SWIFTFAILED_TIMEOUT)
+                self.scheduletask(magnet_lambda)
             return (0,False)
 
         elif ds.get_progress() == 1:
             remove_lambda = lambda d=d: self._remove_download(d, False)
             self.scheduletask(remove_lambda)
 
+            done_lambda = lambda hash=(infohash, roothash): self.request_done(hash)
+            self.scheduletask(done_lambda)
+
             if DEBUG:
                 print >>sys.stderr,"rtorrent: swift finished for", cdef.get_name()
 
             self.remote_th.notify_possible_torrent_roothash(roothash)
-            self.requests_success += 1
             return (0,False)
 
         return (5.0, True)
@@ -592,6 +739,10 @@ class TorrentRequester(Requester):
         self.session.remove_download(d, removecontent = removestate, removestate = removestate, hidden = True)
 
 class TorrentMessageRequester(Requester):
+    REQUEST_WINDOW = 100
+    REQUEST_TIMEOUT = 15.0
+    # infohashes per torrent-request message, which has to fit in a single packet
+    MAX_BATCH_SIZE = 25
 
     def __init__(self, remote_th, searchcommunity, prio):
         if sys.platform == 'darwin':
@@ -600,33 +751,39 @@ class TorrentMessageRequester(Requester):
 
         Requester.__init__(self, remote_th.scheduletask, prio)
         self.searchcommunity = searchcommunity
-        self.requests_success = -1
 
-    def doFetch(self, hashes, candidates):
+    def get_others(self, candidates):
+        return candidates[1:]
+
+    def doFetchBatch(self, candidate, requests):
+        #ask one candidate for all its infohashes, the others when it fails
+        hashes = [hash for hash, _ in requests]
         if self.searchcommunity:
             if DEBUG:
-                print >>sys.stderr,"rtorrent: requesting torrent message", map(bin2str, hashes), candidates
+                print >>sys.stderr,"rtorrent: requesting torrent message", map(bin2str, hashes), candidate
 
-            for candidate in candidates:
-                self.searchcommunity.create_torrent_request(hashes, candidate)
-        return True
+            for i in xrange(0, len(hashes), self.MAX_BATCH_SIZE):
+                self.searchcommunity.create_torrent_request(set(hashes[i:i + self.MAX_BATCH_SIZE]), candidate)
+            return hashes
+        return []
 
 class MagnetRequester(Requester):
     MAX_CONCURRENT = 1
     MAGNET_RETRIEVE_TIMEOUT = 30.0
+    REQUEST_TIMEOUT = 2 * MAGNET_RETRIEVE_TIMEOUT
 
     def __init__(self, remote_th, prio):
         if sys.platform == 'darwin':
             #mac has severe problems with closing connections, add additional time to allow it to close connections
             self.REQUEST_INTERVAL = 15.0
 
-        Requester.__init__(self, remote_th.scheduletask, prio)
+        if prio == 1 and not sys.platform == 'darwin':
+            self.MAX_CONCURRENT = 3
+
+        Requester.__init__(self, remote_th.scheduletask, prio, self.MAX_CONCURRENT)
 
         self.remote_th = remote_th
         self.requestedInfohashes = set()
-
-        if prio == 1 and not sys.platform == 'darwin':
-            self.MAX_CONCURRENT = 3
         self.canrequest = lambda: len(self.requestedInfohashes) < self.MAX_CONCURRENT
 
     def doFetch(self, infohash, candidates):
@@ -641,6 +798,7 @@ class MagnetRequester(Requester):
         if filename:
             if infohash in self.requestedInfohashes:
                 self.requestedInfohashes.remove(infohash)
+            self.request_done(infohash)
             self.remote_th.notify_possible_torrent_infohash(infohash, True)
 
         else:
@@ -670,11 +828,13 @@ class MagnetRequester(Requester):
         if infohash in self.requestedInfohashes:
             self.requestedInfohashes.remove(infohash)
 
-        self.requests_success += 1
+        done_lambda = lambda infohash=infohash: self.request_done(infohash)
+        self.scheduletask(done_lambda)
 
     def __torrentdef_failed(self, infohash):
         if infohash in self.requestedInfohashes:
             self.requestedInfohashes.remove(infohash)
+        self.request_done(infohash, False)
 
 
 class ThumbnailRequester(Requester):
@@ -695,6 +855,7 @@ class ThumbnailRequester(Requester):
 
         if self.remote_th.has_thumbnail(infohash):
             self.remote_th.notify_possible_thumbnail_roothash(roothash)
+            return False
 
         elif candidates:
             candidate = candidates[0]
@@ -715,7 +876,7 @@ class ThumbnailRequester(Requester):
                 #hide download from gui
                 download = self.session.start_download(sdef, dcfg, hidden=True)
 
-                state_lambda = lambda ds, roothash=roothash: self.check_progress(ds, roothash)
+                state_lambda = lambda ds, roothash=roothash, infohash=infohash: self.check_progress(ds, roothash, infohash)
                 download.set_state_callback(state_lambda, getpeerlist=False, delay=self.SWIFT_CANCEL)
                 download.started_downloading = time()
 
@@ -739,18 +900,24 @@ class ThumbnailRequester(Requester):
 
         return True
 
-    def check_progress(self, ds, roothash):
+    def check_progress(self, ds, roothash, infohash):
         d = ds.get_download()
         cdef = d.get_def()
         if ds.get_progress() == 0 or ds.get_status() == DLSTATUS_STOPPED_ON_ERROR or time() - getattr(d, 'started_downloading', time()) > 45:
             remove_lambda = lambda d=d: self._remove_download(d)
             self.scheduletask(remove_lambda)
+
+            done_lambda = lambda hash=(roothash, infohash): self.request_done(hash, False)
+            self.scheduletask(done_lambda)
             return (0,False)
 
         elif ds.get_progress() == 1:
             remove_lambda = lambda d=d: self._remove_download(d, False)
             self.scheduletask(remove_lambda)
 
+            done_lambda = lambda hash=(roothash, infohash): self.request_done(hash)
+            self.scheduletask(done_lambda)
+
             if DEBUG:
                 print >>sys.stderr,"rtorrent: swift finished for", cdef.get_name()
 
@@ -2,7 +2,7 @@
 # see LICENSE.txt for license information
 import re
 import sys
-from itertools import islice
+from itertools import islice, izip
 import time
 
 from Tribler.Core.Search.SearchManager import split_into_keywords
@@ -527,6 +527,11 @@ class LevGrouping(GroupingAlgorithm):
     # 50/100:
     #   works well for specific queries, manages to distinguish different sources and/or languages 
     #   (is a bit slow though with long results list + psyco disabled)
+    PRUNED_SEARCH = True
+    # True:
+    #   use PrunedLevenshteinTrie, several times faster
+    # False:
+    #   use the original LevenshteinTrie, finds the same similar keys
     
     def general_description(self):
         return u'Similarly named'
@@ -547,8 +552,9 @@ class LevGrouping(GroupingAlgorithm):
         return u'Names of these items resemble "%s"' % key
     
     def create_context_state(self):
-        #return LevenshteinTrie(MAX_LEN=LevGrouping.MAX_LEN)
-        return LevenshteinTrie_Cached(MAX_LEN=LevGrouping.MAX_LEN)
+        trie_class = PrunedLevenshteinTrie if LevGrouping.PRUNED_SEARCH else LevenshteinTrie
+        #return trie_class(MAX_LEN=LevGrouping.MAX_LEN)
+        return LevenshteinTrie_Cached(MAX_LEN=LevGrouping.MAX_LEN, trie_class=trie_class)
     
     def update_context_state(self, new_hits, context_state):
         trie = context_state
@@ -768,6 +774,121 @@ class LevenshteinTrie(object):
             return 1.0/(i-1)
         return 1.0
 
+class PrunedLevenshteinTrie(LevenshteinTrie):
+    """
+    PrunedLevenshteinTrie computes the same weighted edit distances as
+    LevenshteinTrie, but visits fewer nodes and spends less time per node.
+    
+    The penalty of an edit only depends on its position and never increases
+    further in the string. Any alignment of a key and a word that share a
+    prefix of c letters, but are not equal, contains an edit at position
+    c+1 or earlier, costing at least _dynamic_penalty(c+1). Hence, only keys
+    sharing the first min_prefix(max_cost) letters of the word can be within
+    max_cost, and the search descends directly to that subtrie. With the
+    default LevGrouping.MAX_COST of 0.5 these are the first two letters.
+    
+    Furthermore, the penalties are looked up in a precomputed table and each
+    row is computed in a single loop without function calls.
+    """
+    __slots__ = ['penalties', 'min_prefixes']
+    
+    def __init__(self, MAX_LEN = 100):
+        LevenshteinTrie.__init__(self, MAX_LEN=MAX_LEN)
+        
+        # penalties[i][j] == _dynamic_penalty(max(i,j))
+        self.penalties = [[self._dynamic_penalty(max(i, j)) for j in xrange(MAX_LEN+1)] for i in xrange(MAX_LEN+1)]
+        self.min_prefixes = {}
+    
+    def min_prefix(self, max_cost):
+        """
+        Returns the number of leading letters a key must share with a
+        word, other than the word itself, to be within max_cost.
+        """
+        if max_cost not in self.min_prefixes:
+            prefix = 0
+            while prefix < self.MAX_LEN and self._dynamic_penalty(prefix+1) > max_cost:
+                prefix += 1
+            self.min_prefixes[max_cost] = prefix
+        return self.min_prefixes[max_cost]
+    
+    def search(self, word, max_cost):
+        word = word[:self.MAX_LEN]
+        results = []
+        
+        prefix = self.min_prefix(max_cost)
+        if len(word) < prefix:
+            # only the word itself can be within max_cost
+            node = self.root
+            for letter in word:
+                node = node.children.get(letter)
+                if node is None:
+                    return results
+            if word and node.word is not None:
+                results.append(node.word)
+            return results
+        
+        # compute the rows along the shared prefix, the words on this path
+        # are too short to be within max_cost
+        node = self.root
+        for row_index in xrange(1, prefix):
+            letter = word[row_index-1]
+            node = node.children.get(letter)
+            if node is None or self._compute_row(letter, word, row_index) > max_cost:
+                return results
+        
+        if prefix:
+            letter = word[prefix-1]
+            node = node.children.get(letter)
+            if node is not None:
+                self.do_search(node, letter, word, prefix, results, max_cost)
+        else:
+            for letter, child in self.root.children.iteritems():
+                self.do_search(child, letter, word, 1, results, max_cost)
+        return results
+    
+    def _compute_row(self, letter, word, row_index):
+        """
+        Computes the row for a node at depth row_index, reached through
+        letter, and returns the lowest cost in the row.
+        """
+        previous_row = self.matrix[row_index - 1]
+        current_row = self.matrix[row_index]
+        
+        # min(a+p, b+p) == min(a, b)+p holds for floats as well, the costs
+        # are therefore equal to those computed by LevenshteinTrie
+        diagonal = previous_row[0]
+        cost = lowest = current_row[0]
+        column = 1
+        for word_letter, penalty in izip(word, islice(self.penalties[row_index], 1, None)):
+            up = previous_row[column]
+            if up < cost:
+                cost = up
+            if word_letter == letter:
+                cost += penalty
+                if diagonal < cost:
+                    cost = diagonal
+            else:
+                if diagonal < cost:
+                    cost = diagonal
+                cost += penalty
+            
+            current_row[column] = cost
+            if cost < lowest:
+                lowest = cost
+            diagonal = up
+            column += 1
+        return lowest
+    
+    def do_search(self, node, letter, word, row_index, results, max_cost):
+        lowest = self._compute_row(letter, word, row_index)
+        
+        if node.word is not None and self.matrix[row_index][len(word)] <= max_cost:
+            results.append(node.word)
+        
+        if lowest <= max_cost:
+            for letter, child in node.children.iteritems():
+                self.do_search(child, letter, word, row_index+1, results, max_cost)
+
 class LevenshteinTrie_Cached(object):
     """
     LevenshteinTrie_Cached is a caching front-end for the LevenshteinTrie
@@ -780,8 +901,8 @@ class LevenshteinTrie_Cached(object):
     
     __slots__ = ['cache', 'last_max_cost', 'levtrie', 'new_words']
     
-    def __init__(self, MAX_LEN = 100):
-        self.levtrie = LevenshteinTrie(MAX_LEN=MAX_LEN)
+    def __init__(self, MAX_LEN = 100, trie_class = LevenshteinTrie):
+        self.levtrie = trie_class(MAX_LEN=MAX_LEN)
         self.cache = {} # word -> similar words
         self.last_max_cost = None
         self.new_words = set()
@@ -1087,6 +1208,7 @@ if USE_PSYCO:
     import psyco
     psyco.bind(TrieNode)
     psyco.bind(LevenshteinTrie)
+    psyco.bind(PrunedLevenshteinTrie)
     psyco.bind(LevenshteinTrie_Cached)
     
     # Can give speedups up to 3x
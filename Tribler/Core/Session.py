@@ -18,7 +18,7 @@ from Tribler.Core.SessionConfig import *
 from Tribler.Core.DownloadConfig import get_default_dest_dir
 from Tribler.Core.Utilities.utilities import find_prog_in_PATH
 from Tribler.Core.APIImplementation.SessionRuntimeConfig import SessionRuntimeConfig
-from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany
+from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany, DownloadStatesDelta
 from Tribler.Core.APIImplementation.UserCallbackHandler import UserCallbackHandler
 from Tribler.Core.osutils import get_appstate_dir
 from Tribler.Core import NoDispersyRLock
@@ -354,7 +354,7 @@ class Session(SessionRuntimeConfig):
         self.uch.perform_removestate_callback(id, [], False)
 
 
-    def set_download_states_callback(self, usercallback, getpeerlist=False):
+    def set_download_states_callback(self, usercallback, getpeerlist=False, incremental=False):
         """
         See Download.set_state_callback. Calls usercallback with a list of
         DownloadStates, one for each Download in the Session as first argument.
@@ -363,12 +363,26 @@ class Session(SessionRuntimeConfig):
         or < 0.0 if not at all) and whether to also include the details of
         the connected peers in the DownloadStates on that next call.
 
+        When incremental is True, usercallback is called with the list of
+        DownloadStates and a boolean full.  The list only contains the states
+        of the Downloads that changed since the previous call, unless full is
+        True, in which case it contains the states of all Downloads.  Full
+        snapshots are sent on the first call, when peer lists are requested,
+        after a Download has been removed, and periodically to refresh values
+        that change without notice, such as the number of connected peers and
+        the seeding time.  A Download that is missing from a full snapshot has
+        been removed.
+
         The callback will be called by a popup thread which can be used
         indefinitely (within reason) by the higher level code.
 
         @param usercallback A function adhering to the above spec.
+        @param incremental Whether to only report changed Downloads.
         """
-        self.lm.set_download_states_callback(usercallback, getpeerlist)
+        if incremental:
+            self.lm.set_download_states_callback(usercallback, getpeerlist, delta=DownloadStatesDelta())
+        else:
+            self.lm.set_download_states_callback(usercallback, getpeerlist)
 
 
     #
@@ -598,6 +612,16 @@ class Session(SessionRuntimeConfig):
         """
         self.lm.load_checkpoint(initialdlstatus, initialdlstatus_dict)
 
+    def get_resume_progress(self):
+        """ Returns the progress of the last load_checkpoint as a dict with the
+        number of checkpoints 'total', 'loaded' and 'failed', the number of
+        Downloads 'resumed' and 'started', the number of Downloads 'removed'
+        before they were started, and the time it 'took' in seconds, None
+        while the Downloads are still being started.  A Download that could
+        not be started counts as 'failed' instead of 'resumed'.
+        @return dict
+        """
+        return self.lm.get_resume_progress()
 
     def checkpoint(self):
         """ Saves the internal session state to the Session's state dir. """
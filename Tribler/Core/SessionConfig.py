@@ -362,6 +362,19 @@ class SessionConfigInterface:
         @return An absolute path name. """
         return self.sessconfig['torrent_collecting_dir']
 
+    def set_torrent_store(self,value):
+        """ Keep the collected torrents in a single pack file in the torrent
+        collecting dir, next to the files swift seeds them from (default =
+        False).
+        @param value Boolean.
+        """
+        self.sessconfig['torrent_store'] = value
+
+    def get_torrent_store(self):
+        """ Returns whether the collected torrents are kept in a pack file.
+        @return Boolean. """
+        return self.sessconfig['torrent_store']
+
     def set_torrent_collecting_rate(self,value):
         """ Maximum download rate to use for torrent collecting.
         @param value A rate in KB/s. """
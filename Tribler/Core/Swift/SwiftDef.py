@@ -12,6 +12,7 @@ import time
 from Tribler.Core.Base import *
 from Tribler.Core.simpledefs import *
 from Tribler.Core.Swift.util import *
+from Tribler.Core.Swift.SwiftHashTree import hash_files, write_mhash, calc_roothashes
 
 class SwiftDef(ContentDefinition):
     """ Definition of a swift swarm, that is, the root hash (video-on-demand) 
@@ -62,6 +63,29 @@ class SwiftDef(ContentDefinition):
     is_swift_url = staticmethod(is_swift_url)
 
 
+    def load_from_files(filenames,tracker=None):
+        """
+        Create a single-file SwiftDef for each of the files, calculating the
+        root hashes in-process (see finalize_in_process). Meant for many small
+        files, such as collected .torrent files.
+
+        @param filenames List of OS paths.
+        @param tracker (optional) The tracker of the swarms.
+        @return List of SwiftDefs, None for the files that could not be read.
+        """
+        # Class method, no locking required
+        sdefs = []
+        for filename,roothash in zip(filenames,calc_roothashes(filenames)):
+            if roothash is None:
+                sdefs.append(None)
+            else:
+                s = SwiftDef(roothash,tracker)
+                s.readonly = True
+                sdefs.append(s)
+        return sdefs
+    load_from_files = staticmethod(load_from_files)
+
+
     #
     # ContentDefinition interface
     #
@@ -351,6 +375,66 @@ class SwiftDef(ContentDefinition):
             
         return specpn
 
+    def finalize_in_process(self,userprogresscallback=None,destdir='.',removetemp=False):
+        """
+        Calculate root hash in-process, without running the swift binary.
+        The .mhash file is written where swift writes it, swift creates the
+        .mbinmap file when it opens the content.
+
+        The userprogresscallback function will be called by the calling thread.
+
+        @param userprogresscallback Function accepting a fraction as first
+        argument.
+        @param destdir OS path of where to store temporary files.
+        @param removetemp Boolean, remove temporary files or not
+        @return filename of multi-spec definition or None (single-file)
+        """
+        if userprogresscallback is not None:
+            userprogresscallback(0.0)
+
+        specpn = None
+        if len(self.files) > 1:
+            if self.multifilespec is None:
+                self.create_multifilespec()
+
+            specfn = "multifilespec-p"+str(os.getpid())+"-r"+str(random.random())+".txt"
+            specpn = os.path.join(destdir,specfn)
+
+            f = open(specpn,"wb")
+            f.write(self.multifilespec)
+            f.close()
+
+            # The content starts with the spec, followed by the files in
+            # the order of the spec
+            filenames = [specpn] + [d['inpath'] for d in sorted(self.files, key=lambda d: d['outpath'].encode("UTF-8"))]
+            filename = specpn
+        else:
+            filenames = [self.files[0]['inpath']]
+            filename = filenames[0]
+
+        if userprogresscallback is not None:
+            userprogresscallback(0.2)
+
+        tree = hash_files(filenames)
+        self.roothash = tree.get_roothash()
+        self.readonly = True
+
+        if userprogresscallback is not None:
+            userprogresscallback(0.9)
+
+        if removetemp and specpn is not None:
+            try:
+                os.remove(specpn)
+            except:
+                pass
+        else:
+            write_mhash(tree,filename)
+
+        if userprogresscallback is not None:
+            userprogresscallback(1.0)
+
+        return specpn
+
     def save_multifilespec(self,filename):
         """
         Store the multi-file spec generated by finalize() if multiple
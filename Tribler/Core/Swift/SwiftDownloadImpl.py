@@ -82,6 +82,9 @@ class SwiftDownloadImpl(SwiftDownloadRuntimeConfig):
         self.lm_network_vod_event_callback = None
         self.askmoreinfo = False
 
+        # incremented when the state changes, see TriblerLaunchMany.network_set_download_states_callback
+        self.state_version = 0
+
     #
     # Download Interface
     #
@@ -156,6 +159,7 @@ class SwiftDownloadImpl(SwiftDownloadRuntimeConfig):
         # Synchronous: starts process if needed
         self.sp = self.session.lm.spm.get_or_create_sp(self.session.get_swift_working_dir(),self.session.get_torrent_collecting_dir(),self.get_swift_listen_port(), self.get_swift_httpgw_listen_port(), self.get_swift_cmdgw_listen_port() )
         self.sp.start_download(self)
+        self.state_version += 1
     
         self.session.lm.rawserver.add_task(self.network_check_swift_alive,SWIFT_ALIVE_CHECK_INTERVAL)
         
@@ -171,6 +175,11 @@ class SwiftDownloadImpl(SwiftDownloadRuntimeConfig):
     def i2ithread_info_callback(self,dlstatus,progress,dynasize,dlspeed,ulspeed,numleech,numseeds,contentdl,contentul):
         self.dllock.acquire()
         try:
+            # swift sends INFO for every download each second, also when nothing changed
+            fields = (self.dlstatus,self.dynasize,self.progress,self.curspeeds[DOWNLOAD],self.curspeeds[UPLOAD],self.numleech,self.numseeds,self.contentbytes)
+            if fields != (dlstatus,dynasize,progress,dlspeed,ulspeed,numleech,numseeds,{DOWNLOAD:contentdl,UPLOAD:contentul}):
+                self.state_version += 1
+
             if dlstatus == DLSTATUS_SEEDING and self.dlstatus != dlstatus:
                 # started seeding
                 self.time_seeding[0] = self.get_seeding_time()
@@ -473,6 +482,7 @@ class SwiftDownloadImpl(SwiftDownloadRuntimeConfig):
                 self.sp = None
 
             self.time_seeding = [self.get_seeding_time(), None]
+            self.state_version += 1
             
             # Offload the removal of the dlcheckpoint to another thread
             if removestate:
@@ -503,6 +513,7 @@ class SwiftDownloadImpl(SwiftDownloadRuntimeConfig):
         try:
             if self.sp is None:
                 self.error = None # assume fatal error is reproducible
+                self.state_version += 1
                 self.create_engine_wrapper(self.session.lm.network_engine_wrapper_created_callback,None,self.session.lm.network_vod_event_callback,initialdlstatus=initialdlstatus)    
 
             # No exception if already started, for convenience
@@ -643,6 +654,7 @@ class SwiftDownloadImpl(SwiftDownloadRuntimeConfig):
     def set_error(self,e):
         self.dllock.acquire()
         self.error = e
+        self.state_version += 1
         self.dllock.release()
 
 
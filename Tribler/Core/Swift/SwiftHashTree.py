@@ -0,0 +1,158 @@
+# see LICENSE.txt for license information
+"""
+Calculates the root hash of swift content in-process, the same way the
+swift engine does (hashtree.cpp). The content is split in chunks, which
+are the leaves of a binary SHA1 hash tree. The tree is built over the
+largest complete subtrees from the left, the peaks, and the root hash is
+the top of the smallest tree covering the content, where a missing right
+subtree has the zero hash.
+
+The hashes are also stored the way swift does in its .mhash file: the
+hash of bin (layer,offset) at position ((2*offset+1) << layer) - 1.
+"""
+
+from traceback import print_exc
+
+from Tribler.Core.Utilities.Crypto import sha
+
+SWIFT_DEFAULT_CHUNK_SIZE = 1024
+HASH_SIZE = 20
+ZERO_HASH = '\x00' * HASH_SIZE
+READ_SIZE = 1024 * 1024
+
+DEBUG = False
+
+class SwiftHashTree:
+
+    def __init__(self, chunksize=SWIFT_DEFAULT_CHUNK_SIZE, keephashes=True):
+        """
+        Create an empty hash tree, to be filled with update().
+
+        @param chunksize The swift chunk size in bytes.
+        @param keephashes Whether to keep all hashes for get_mhash().
+        """
+        self.chunksize = chunksize
+        self.keephashes = keephashes
+        self.buffer = ''
+        self.nchunks = 0
+        self.peaks = [] # (layer,offset,hash) of the complete subtrees, largest first
+        self.hashes = {} # bin -> hash, when keephashes
+        self.roothash = None
+
+    def update(self, data):
+        """ Add the next part of the content """
+        assert self.roothash is None, "SwiftHashTree: update after get_roothash"
+        if self.buffer:
+            data = self.buffer + data
+        end = len(data) - len(data) % self.chunksize
+        for offset in xrange(0, end, self.chunksize):
+            self._add_chunk(buffer(data, offset, self.chunksize))
+        self.buffer = data[end:]
+
+    def _add_chunk(self, chunk):
+        layer, offset, hash = 0, self.nchunks, sha(chunk).digest()
+        self.nchunks += 1
+        if self.keephashes:
+            self.hashes[bin_number(layer, offset)] = hash
+
+        # a right child completes its parent
+        while offset % 2 == 1:
+            hash = sha(self.peaks.pop()[2] + hash).digest()
+            layer, offset = layer + 1, offset / 2
+            if self.keephashes:
+                self.hashes[bin_number(layer, offset)] = hash
+        self.peaks.append((layer, offset, hash))
+
+    def get_roothash(self):
+        """ Returns the root hash of the content, after adding the last,
+        partial chunk.
+        @return A string of length 20. """
+        if self.roothash is None:
+            if self.buffer:
+                self._add_chunk(self.buffer)
+                self.buffer = ''
+            self.roothash = derive_roothash(self.peaks)
+        return self.roothash
+
+    def get_nchunks(self):
+        return self.nchunks
+
+    def get_mhash(self):
+        """ Returns the contents of the .mhash file swift keeps next to the
+        content: the hashes at their bin numbers, and zeros elsewhere. """
+        assert self.keephashes, "SwiftHashTree: hashes were not kept"
+        self.get_roothash()
+        mhash = bytearray(HASH_SIZE * 2 * self.nchunks)
+        for binnr, hash in self.hashes.iteritems():
+            mhash[binnr * HASH_SIZE:(binnr + 1) * HASH_SIZE] = hash
+        return str(mhash)
+
+
+def bin_number(layer, offset):
+    """ Returns swift's number of the bin at layer, offset. The chunks are
+    the even numbers. """
+    return ((2 * offset + 1) << layer) - 1
+
+def derive_roothash(peaks):
+    """ Returns the top hash of the smallest tree covering the peaks, like
+    HashTree::DeriveRoot in swift """
+    if not peaks:
+        return ZERO_HASH
+
+    layer, offset, hash = peaks[-1]
+    c = len(peaks) - 2
+    while c >= 0:
+        if offset % 2 == 0:
+            hash = sha(hash + ZERO_HASH).digest()
+        else:
+            if peaks[c][:2] != (layer, offset - 1):
+                return ZERO_HASH
+            hash = sha(peaks[c][2] + hash).digest()
+            c -= 1
+        layer, offset = layer + 1, offset / 2
+    return hash
+
+def hash_files(filenames, chunksize=SWIFT_DEFAULT_CHUNK_SIZE, keephashes=True):
+    """ Returns a SwiftHashTree for the concatenated content of the files """
+    tree = SwiftHashTree(chunksize, keephashes)
+    for filename in filenames:
+        f = open(filename, 'rb')
+        try:
+            while True:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                tree.update(data)
+        finally:
+            f.close()
+    tree.get_roothash()
+    return tree
+
+def write_mhash(tree, filename):
+    """ Writes the .mhash file of the content in filename """
+    f = open(filename + '.mhash', 'wb')
+    try:
+        f.write(tree.get_mhash())
+    finally:
+        f.close()
+
+def calc_roothashes(filenames, chunksize=SWIFT_DEFAULT_CHUNK_SIZE, writemhash=True):
+    """
+    Calculate the root hashes of many single-file swarms at once, writing
+    the .mhash file next to each file.
+
+    @param filenames List of OS paths.
+    @return List of root hashes, None for the files that could not be read.
+    """
+    roothashes = []
+    for filename in filenames:
+        try:
+            tree = hash_files([filename], chunksize, writemhash)
+            if writemhash:
+                write_mhash(tree, filename)
+            roothashes.append(tree.get_roothash())
+        except (IOError, OSError):
+            if DEBUG:
+                print_exc()
+            roothashes.append(None)
+    return roothashes
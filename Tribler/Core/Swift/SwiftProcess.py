@@ -19,6 +19,11 @@ from Tribler.Core import NoDispersyRLock
 
 DEBUG = False
 
+# Ask swift to tunnel dispersy packets in binary frames instead of
+# TUNNELSEND/TUNNELRECV lines, see FastI2I.  Swift engines that do not
+# support them reject the request and the lines are used.
+CMDGW_TUNNEL_FRAMING = False
+
 DONE_STATE_WORKING = 0
 DONE_STATE_EARLY_SHUTDOWN = 1
 DONE_STATE_SHUTDOWN = 2
@@ -105,7 +110,7 @@ class SwiftProcess:
         # Called by any thread, assume sessionlock is held
 
         if self.is_alive():
-            self.fastconn = FastI2IConnection(self.cmdport,self.i2ithread_readlinecallback,self.connection_lost)
+            self.fastconn = FastI2IConnection(self.cmdport,self.i2ithread_readlinecallback,self.connection_lost,self.i2ithread_tunnelcallback,CMDGW_TUNNEL_FRAMING)
         else:
             print >>sys.stderr,"sp: start_cmd_connection: Process dead? returncode",self.popen.returncode,"pid",self.popen.pid
 
@@ -127,11 +132,10 @@ class SwiftProcess:
             length = int(words[2])
 
             # require LENGTH bytes
-            if len(ic.buffer) < length:
-                return length - len(ic.buffer)
+            if ic.buffered() < length:
+                return length - ic.buffered()
 
-            data = ic.buffer[:length]
-            ic.buffer = ic.buffer[length:]
+            data = ic.read(length)
 
             self.roothash2dl["dispersy"].i2ithread_data_came_in(session, (host, port), data)
 
@@ -187,6 +191,12 @@ class SwiftProcess:
                 d.i2ithread_info_callback(DLSTATUS_STOPPED_ON_ERROR,0.0,0,0.0,0.0,0,0,0,0)
 
 
+    def i2ithread_tunnelcallback(self,ic,session,address,data):
+        if self.donestate != DONE_STATE_WORKING:
+            return
+
+        self.roothash2dl["dispersy"].i2ithread_data_came_in(session, address, data)
+
     #
     # Swift Mgmt interface
     #
@@ -412,8 +422,7 @@ class SwiftProcess:
         if DEBUG:
             print >>sys.stderr,"sp: send_tunnel:",len(data),"bytes -> %s:%d" % address
 
-        self.write("TUNNELSEND %s:%d/%s %d\r\n" % (address[0], address[1], session.encode("HEX"), len(data)))
-        self.write(data)
+        self.fastconn.write_tunnel(session,address,data)
 
     def send_setmoreinfo(self,roothash_hex,enable):
         # assume splock is held to avoid concurrency on socket
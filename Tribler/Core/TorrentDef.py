@@ -92,6 +92,18 @@ class TorrentDef(ContentDefinition,Serializable,Copyable):
         return TorrentDef._read(f)
     load = staticmethod(load)
 
+    def load_from_memory(data):
+        """
+        Load a BT .torrent or Tribler .tribe file from its bencoded contents
+        and convert it into a finalized TorrentDef.
+
+        @param data  A bencoded string
+        @return TorrentDef
+        """
+        # Class method, no locking required
+        return TorrentDef._create(bdecode(data))
+    load_from_memory = staticmethod(load_from_memory)
+
     def _read(stream):
         """ Internal class method that reads a torrent file from stream,
         checks it for correctness and sets self.input and self.metainfo
@@ -50,6 +50,7 @@ sessdefaults['torrent_collecting'] = True
 sessdefaults['torrent_collecting_max_torrents'] = 50000
 sessdefaults['torrent_collecting_dir'] = None
 sessdefaults['torrent_collecting_rate'] = 5 * 10
+sessdefaults['torrent_store'] = False
 sessdefaults['torrent_checking'] = 1
 sessdefaults['torrent_checking_period'] = 31 #will be changed to min(max(86400/ntorrents, 15), 300) at runtime
 #sessdefaults['rquery'] = True
@@ -30,6 +30,7 @@ from Tribler.Video.VideoPlayer import VideoPlayer
 from Tribler.Core.DecentralizedTracking.MagnetLink import MagnetLink
 
 from math import sqrt
+from bisect import bisect_left
 from __init__ import *
 from Tribler.community.allchannel.community import AllChannelCommunity
 from Tribler.Core.Search.Bundler import Bundler
@@ -65,6 +66,10 @@ class TorrentManager:
 
         # Contains all matches for keywords in DB, not filtered by category
         self.hits = []
+        # Maps infohash to the hit in self.hits
+        self.hitsIndex = {}
+        # Number of hits and normKey -> (mean, stdDev) of the last full fulltextSort
+        self.hitsNormalization = None
         self.hitsLock = threading.Lock()
 
         # Remote results for current keywords
@@ -404,7 +409,11 @@ class TorrentManager:
                     self.rameezSort()
 
                 elif sort == 'fulltextmetric':
-                    self.fulltextSort()
+                    if new_local_hits:
+                        self.fulltextSort()
+                    else:
+                        changed_hits = new_remote_hits + [self.hitsIndex[infohash] for infohash in modified_hits]
+                        self.fulltextSort(changed_hits)
 
                 self.hits = self.rerankingStrategy.rerank(self.hits, self.searchkeywords, self.torrent_db,
                                                             None, self.mypref_db, None)
@@ -430,7 +439,7 @@ class TorrentManager:
         bundle_mode_changed = self.bundle_mode_changed or (selected_bundle_mode != bundle_mode)
         self.bundle_mode_changed = False
 
-        return [len(returned_hits), self.filteredResults , new_local_hits or new_remote_hits or bundle_mode_changed, selected_bundle_mode, returned_hits, modified_hits]
+        return [len(returned_hits), self.filteredResults , new_local_hits or bool(new_remote_hits) or bundle_mode_changed, selected_bundle_mode, returned_hits, modified_hits]
 
     def prefetch_hits(self):
         """
@@ -507,7 +516,7 @@ class TorrentManager:
 
                 self.filteredResults = 0
 
-                self.hits = []
+                self.setHits([])
                 self.remoteHits = []
                 self.gotRemoteHits = False
                 self.oldsearchkeywords = None
@@ -571,73 +580,92 @@ class TorrentManager:
                 return t
 
             results = map(create_torrent, results)
-        self.hits = results
+        self.setHits(results)
 
         if DEBUG:
             print >> sys.stderr, 'TorrentSearchGridManager: _doSearchLocalDatabase took: %s of which tuple creation took %s'%(time() - begintime, time() - begintuples)
         return True
 
+    def setHits(self, hits):
+        """ Replaces self.hits and rebuilds self.hitsIndex, caller should hold hitsLock """
+        self.hits = hits
+        self.hitsIndex = dict((hit.infohash, hit) for hit in hits)
+        self.hitsNormalization = None
+
     def addStoredRemoteResults(self):
-        """ Called by GetHitsInCategory() to add remote results to self.hits """
+        """ Called by GetHitsInCategory() to add remote results to self.hits.
+        Returns the hits appended to self.hits and the infohashes of the modified hits. """
         if DEBUG:
             begintime = time()
         try:
             self.remoteLock.acquire()
 
-            hitsUpdated = False
+            newHits = []
+            hitsReplaced = False
             hitsModified = set()
+            unclassified = []
             for remoteItem in self.remoteHits:
                 known = False
 
-                for item in self.hits:
-                    if item.infohash == remoteItem.infohash:
-                        if item.query_candidates == None:
-                            item.query_candidates = set()
-                        item.query_candidates.update(remoteItem.query_candidates)
-
-                        if item.swift_hash == None:
-                            item.swift_hash = remoteItem.swift_hash
-                            hitsModified.add(item.infohash)
+                item = self.hitsIndex.get(remoteItem.infohash, None)
+                if item is not None:
+                    if item.query_candidates == None:
+                        item.query_candidates = set()
+                    item.query_candidates.update(remoteItem.query_candidates)
 
-                        if item.swift_torrent_hash == None:
-                            item.swift_torrent_hash = remoteItem.swift_torrent_hash
-                            hitsModified.add(item.infohash)
+                    if item.swift_hash == None:
+                        item.swift_hash = remoteItem.swift_hash
+                        hitsModified.add(item.infohash)
 
-                        if remoteItem.hasChannel():
-                            if isinstance(item, RemoteTorrent):
-                                self.hits.remove(item) #Replace this item with a new result with a channel
-                                break
+                    if item.swift_torrent_hash == None:
+                        item.swift_torrent_hash = remoteItem.swift_torrent_hash
+                        hitsModified.add(item.infohash)
 
-                            #Maybe update channel?
-                            if isinstance(item, RemoteChannelTorrent):
-                                this_rating = remoteItem.channel.nr_favorites - remoteItem.channel.nr_spam
+                    known = True
+                    if remoteItem.hasChannel():
+                        if isinstance(item, RemoteTorrent):
+                            #Replace this item with a new result with a channel, it is removed from the hits below
+                            hitsReplaced = True
+                            known = False
 
-                                if item.hasChannel():
-                                    current_rating = item.channel.nr_favorites - item.channel.nr_spam
-                                else:
-                                    current_rating = this_rating - 1
+                        #Maybe update channel?
+                        elif isinstance(item, RemoteChannelTorrent):
+                            this_rating = remoteItem.channel.nr_favorites - remoteItem.channel.nr_spam
 
-                                if this_rating > current_rating:
-                                    item.updateChannel(remoteItem.channel)
-                                    hitsModified.add(item.infohash)
+                            if item.hasChannel():
+                                current_rating = item.channel.nr_favorites - item.channel.nr_spam
+                            else:
+                                current_rating = this_rating - 1
 
-                        known = True
-                        break
+                            if this_rating > current_rating:
+                                item.updateChannel(remoteItem.channel)
+                                hitsModified.add(item.infohash)
 
                 if not known:
-                    #Niels 26-10-2012: override category if name is xxx
                     if remoteItem.category_id != self.xxx_category:
-                        local_category = self.category.calculateCategoryNonDict([], remoteItem.name, '', '')[0]
-                        if local_category == 'xxx':
-                            if DEBUG:
-                                print >> sys.stderr, 'TorrentSearchGridManager:', remoteItem.name, "is xxx"
-                            remoteItem.category_id = self.xxx_category
-
-                    self.hits.append(remoteItem)
-                    hitsUpdated = True
-
+                        unclassified.append(remoteItem)
+
+                    self.hitsIndex[remoteItem.infohash] = remoteItem
+                    newHits.append(remoteItem)
+
+            #Niels 26-10-2012: override category if name is xxx
+            if unclassified:
+                local_categories = self.category.calculateCategoriesNonDict([([], remoteItem.name, '', '') for remoteItem in unclassified])
+                for remoteItem, local_category in zip(unclassified, local_categories):
+                    if local_category[0] == 'xxx':
+                        if DEBUG:
+                            print >> sys.stderr, 'TorrentSearchGridManager:', remoteItem.name, "is xxx"
+                        remoteItem.category_id = self.xxx_category
+
+            if hitsReplaced:
+                # a hit is still valid if the index points to it
+                isValid = lambda hit: self.hitsIndex[hit.infohash] is hit
+                self.hits = filter(isValid, self.hits)
+                newHits = filter(isValid, newHits)
+
+            self.hits.extend(newHits)
             self.remoteHits = []
-            return hitsUpdated, hitsModified
+            return newHits, hitsModified
         except:
             raise
 
@@ -736,51 +764,75 @@ class TorrentManager:
 
         self.hits.sort(cmp, reverse = True)
 
-    def fulltextSort(self):
-        norm_num_seeders = self.doStatNormalization(self.hits, 'num_seeders')
-        norm_neg_votes = self.doStatNormalization(self.hits, 'neg_votes')
-        norm_subscriptions = self.doStatNormalization(self.hits, 'subscriptions')
+    def fulltextSort(self, changedHits=None):
+        '''Sorts self.hits on relevance_score. changedHits are the hits appended
+        or modified since the previous fulltextSort. If given, only these are
+        scored, with the normalization of the last full sort, and inserted
+        into the sorted hits. The order of the other hits does not change. All
+        hits are normalized and sorted again once their number has doubled.'''
+
+        if changedHits is not None and self.hitsNormalization and len(self.hits) <= 2 * self.hitsNormalization[0]:
+            changed = set(hit.infohash for hit in changedHits)
+            sortedHits = [hit for hit in self.hits if hit.infohash not in changed]
+            keys = [hit.relevance_score for hit in reversed(sortedHits)]
+
+            # a reranker or rameezSort may have changed the order
+            if all(keys[i] <= keys[i+1] for i in xrange(len(keys) - 1)):
+                newHits = [hit for hit in self.hits if hit.infohash in changed]
+                self.scoreHits(newHits, self.hitsNormalization[1])
+                newHits.sort(key=lambda hit:hit.relevance_score, reverse = True)
+
+                # a new hit goes after the sorted hits with an equal score, as with a full sort
+                positions = [len(keys) - bisect_left(keys, hit.relevance_score) for hit in newHits]
+                for position, hit in reversed(zip(positions, newHits)):
+                    sortedHits.insert(position, hit)
+                self.hits = sortedHits
+                return
+
+        normalization = {}
+        self.scoreHits(self.hits, normalization)
+        self.hitsNormalization = (len(self.hits), normalization)
+        self.hits.sort(key=lambda hit:hit.relevance_score, reverse = True)
 
-        for hit in self.hits:
+    def scoreHits(self, hits, normalization):
+        norm_num_seeders = self.doStatNormalization(hits, 'num_seeders', normalization)
+        norm_neg_votes = self.doStatNormalization(hits, 'neg_votes', normalization)
+        norm_subscriptions = self.doStatNormalization(hits, 'subscriptions', normalization)
+
+        for hit in hits:
             score = 0.8*norm_num_seeders[hit.infohash] - 0.1 * norm_neg_votes[hit.infohash] + 0.1 * norm_subscriptions[hit.infohash]
             hit.relevance_score[-1] = score
 
-        self.hits.sort(key=lambda hit:hit.relevance_score, reverse = True)
-
-    def doStatNormalization(self, hits, normKey):
+    def doStatNormalization(self, hits, normKey, normalization=None):
         '''Center the variance on zero (this means mean == 0) and divide
         all values by the standard deviation. This is sometimes called scaling.
-        This is done on the field normKey of hits.'''
+        This is done on the field normKey of hits. If normalization, a dict
+        from normKey to mean and standard deviation, has normKey, these are
+        used instead of those of hits. Otherwise those of hits are stored in it.'''
 
-        tot = 0
-        for hit in hits:
-            tot += (hit.get(normKey, 0) or 0)
+        # read every value only once, this is called for all hits on every refresh
+        values = [hit.get(normKey, 0) or 0 for hit in hits]
 
-        if len(hits) > 0:
-            mean = tot/len(hits)
+        if normalization and normKey in normalization:
+            mean, stdDev = normalization[normKey]
         else:
-            mean = 0
-
-        sum = 0
-        for hit in hits:
-            temp = (hit.get(normKey, 0) or 0) - mean
-            temp = temp * temp
-            sum += temp
+            if len(values) > 0:
+                mean = sum(values)/len(values)
+            else:
+                mean = 0
 
-        if len(hits) > 1:
-            dev = sum /(len(hits)-1)
-        else:
-            dev = 0
+            if len(values) > 1:
+                dev = sum([(value - mean) * (value - mean) for value in values]) /(len(values)-1)
+            else:
+                dev = 0
 
-        stdDev = sqrt(dev)
+            stdDev = sqrt(dev)
+            if normalization is not None:
+                normalization[normKey] = (mean, stdDev)
 
-        return_dict = {}
-        for hit in hits:
-            if stdDev > 0:
-                return_dict[hit.infohash] = ((hit.get(normKey, 0) or 0) - mean)/ stdDev
-            else:
-                return_dict[hit.infohash] = 0
-        return return_dict
+        if stdDev > 0:
+            return dict((hit.infohash, (value - mean)/ stdDev) for hit, value in zip(hits, values))
+        return dict.fromkeys([hit.infohash for hit in hits], 0)
 
 class LibraryManager:
     # Code to make this a singleton
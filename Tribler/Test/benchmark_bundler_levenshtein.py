@@ -0,0 +1,90 @@
+# see LICENSE.txt for license information
+#
+# Compares the LevGrouping bundling with the original LevenshteinTrie and
+# with the PrunedLevenshteinTrie on synthetic search results.  The names of
+# the hits combine the query with title words, episode numbers, years and
+# release tags, so that many keys share a prefix, as for a real query.  The
+# hits are bundled as they arrive, in a number of parts, which is how the
+# Bundler updates the LevGrouping's context state.  Both tries must yield the
+# same bundles.  Furthermore, the keys of all hits are searched in a trie
+# holding all keys, which is the part of the bundling done by the tries.
+#
+# usage: python benchmark_bundler_levenshtein.py [nr of parts] [nr of hits ...]
+#
+
+import sys
+from random import Random
+from time import time
+
+from Tribler.Core.Search.Bundler import LevGrouping, GroupsList, LevenshteinTrie, PrunedLevenshteinTrie
+
+QUERY = 'ubuntu'
+WORDS = ['desktop', 'server', 'linux', 'live', 'alternate', 'netbook', 'remix', 'studio', 'edition', 'final',
+         'release', 'lucid', 'lynx', 'maverick', 'meerkat', 'natty', 'narwhal', 'oneiric', 'ocelot', 'precise',
+         'pangolin', 'kubuntu', 'xubuntu', 'lubuntu', 'mythbuntu', 'guide', 'book', 'unleashed', 'bible', 'video']
+TAGS = ['i386', 'amd64', 'x86', 'x64', 'iso', 'dvd', 'cd', 'lts', 'beta', 'rc', 'proper', 'repack']
+
+class FakeHit:
+
+    def __init__(self, name, infohash):
+        self.name = name
+        self.infohash = infohash
+
+def create_hits(nr_hits, random):
+    hits = []
+    for i in xrange(nr_hits):
+        words = random.sample(WORDS, random.randint(1, 3))
+        if random.random() < 0.3:
+            words.append('s%02de%02d' % (random.randint(1, 5), random.randint(1, 24)))
+        if random.random() < 0.5:
+            words.append('%d.%02d' % (random.randint(6, 12), random.choice((4, 10))))
+        words.extend(random.sample(TAGS, random.randint(0, 2)))
+        words.insert(random.choice((0, 0, 0, 1, len(words))), QUERY)
+        name = random.choice(('.', '_', ' ', '-')).join(words)
+        hits.append(FakeHit(name, str(i)))
+    return hits
+
+def bundle(hits, nr_parts, pruned_search):
+    LevGrouping.PRUNED_SEARCH = pruned_search
+    algorithm = LevGrouping()
+    groupslist = None
+    start = time()
+    for part in xrange(1, nr_parts + 1):
+        groupslist = GroupsList(QUERY, algorithm, hits[:len(hits) * part / nr_parts], groupslist)
+    took = time() - start
+    return took, [[hit.infohash for hit in group] for group in groupslist.groups]
+
+def search(keys, trie_class):
+    trie = trie_class(MAX_LEN=LevGrouping.MAX_LEN)
+    for key in keys:
+        trie.add_word(key)
+    start = time()
+    results = [sorted(trie.search(key, LevGrouping.MAX_COST)) for key in keys]
+    return time() - start, results
+
+def main():
+    nr_parts = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    hit_counts = [int(arg) for arg in sys.argv[2:]] or [1000, 10000]
+
+    old_pruned_search = LevGrouping.PRUNED_SEARCH
+    try:
+        print "%-8s %8s %8s %10s %10s %10s %10s %10s %10s" % ("hits", "keys", "bundles", "trie (s)", "hits/s", "search/s", "pruned (s)", "hits/s", "search/s")
+        for nr_hits in hit_counts:
+            hits = create_hits(nr_hits, Random(42))
+            took_trie, groups = bundle(hits, nr_parts, False)
+            took_pruned, pruned_groups = bundle(hits, nr_parts, True)
+            assert groups == pruned_groups, "the tries yield different bundles"
+
+            algorithm = LevGrouping()
+            keys = [algorithm.key(hit, None) for hit in hits]
+            took_search, results = search(keys, LevenshteinTrie)
+            took_pruned_search, pruned_results = search(keys, PrunedLevenshteinTrie)
+            assert results == pruned_results, "the tries find different keys"
+
+            print "%-8d %8d %8d %10.3f %10.0f %10.0f %10.3f %10.0f %10.0f" % (nr_hits, len(set(keys)), len(groups), took_trie, nr_hits / took_trie, nr_hits / took_search,
+                                                                     took_pruned, nr_hits / took_pruned, nr_hits / took_pruned_search)
+    finally:
+        LevGrouping.PRUNED_SEARCH = old_pruned_search
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# see LICENSE.txt for license information
+#
+# Measures how many torrents per second Category classifies, as
+# calculateCategoryNonDict does for every inserted torrent and remote search
+# hit.  The corpus of torrent names, file lists and trackers is generated from
+# common words, a sample of the family filter terms and the suffixes and
+# keywords of category.conf.  The checksum of the classifications allows
+# comparing them between versions of Category.
+#
+# usage: python benchmark_category.py [nr of torrents] [nr of rounds]
+#
+
+import os
+import sys
+from hashlib import sha1
+from random import Random
+from time import time
+
+import Tribler
+from Tribler.Category.Category import Category
+
+WORDS = ["the", "best", "of", "live", "in", "concert", "season", "episode", "complete", "collection",
+         "hd", "720p", "1080p", "dvdrip", "bluray", "x264", "remastered", "edition", "vol", "part",
+         "ubuntu", "linux", "desktop", "amd64", "iso", "install", "guide", "manual", "book", "photos",
+         "holiday", "summer", "2011", "2012", "cd1", "cd2", "disc", "track", "album", "soundtrack",
+         "divx", "xvid", "rmvb", "music", "video", "game", "setup", "crack", "readme", "sample"]
+SUFFIXES = ["avi", "mkv", "mp4", "mpg", "wmv", "mp3", "flac", "ogg", "pdf", "txt", "doc", "iso", "rar",
+            "r01", "zip", "jpg", "png", "nfo", "srt", "exe", "sfv"]
+TRACKERS = ["http://tracker.example.com/announce", "http://open.tracker.org:6969/announce", "udp://tracker.publicbt.com:80", ""]
+
+def create_corpus(nr_torrents, seed=0):
+    random = Random(seed)
+    install_dir = os.path.join(os.path.dirname(os.path.abspath(Tribler.__file__)), '..')
+    filter_terms = open(os.path.join(install_dir, 'Tribler', 'Category', 'filter_terms.filter')).read().lower().splitlines()
+    xxx_words = [term.lstrip('*') for term in filter_terms[::25]]
+
+    def create_name(nr_words):
+        words = [random.choice(WORDS) for _ in xrange(nr_words)]
+        if random.random() < 0.05:
+            words.insert(random.randint(0, nr_words), random.choice(xxx_words))
+        return random.choice(" ._-").join(words)
+
+    corpus = []
+    for _ in xrange(nr_torrents):
+        display_name = create_name(random.randint(2, 6))
+        files_list = [("%s.%s" % (create_name(random.randint(1, 4)), random.choice(SUFFIXES)), random.expovariate(1 / 100.0))
+                      for _ in xrange(random.choice((1, 1, 2, 5, 10, 20)))]
+        comment = create_name(4) if random.random() < 0.2 else None
+        corpus.append((files_list, display_name, random.choice(TRACKERS), comment))
+    return install_dir, corpus
+
+def main():
+    nr_torrents = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    nr_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    install_dir, corpus = create_corpus(nr_torrents)
+    category = Category.getInstance(install_dir)
+
+    took = 0.0
+    checksum = sha1()
+    counts = {}
+    for round in xrange(nr_rounds):
+        start = time()
+        categories = [category.calculateCategoryNonDict(*torrent) for torrent in corpus]
+        took += time() - start
+
+    for torrent_category in categories:
+        checksum.update(torrent_category[0])
+        counts[torrent_category[0]] = counts.get(torrent_category[0], 0) + 1
+
+    print "%10s %16s %12s" % ("torrents", "torrents/s", "checksum")
+    print "%10d %16.0f %12s" % (nr_torrents, nr_torrents * nr_rounds / took, checksum.hexdigest()[:12])
+    print ", ".join("%s: %d" % item for item in sorted(counts.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# see LICENSE.txt for license information
+#
+# Measures the network thread time spent on the download states callback for
+# a session with many seeding torrents of which only a few are transferring,
+# with full and with incremental states.  Each round a fraction of the
+# downloads gets a stats alert with new transfer counters, after which the
+# DownloadStates are built as the states callback does.  The torrent handles
+# are fakes, so the cost of handle.status() in libtorrent is not included.
+#
+# usage: python benchmark_downloadstates.py [nr of downloads] [nr of rounds]
+#
+
+import sys
+from random import Random
+from time import time
+
+from Tribler.Core.APIImplementation.LaunchManyCore import DownloadStatesDelta
+from Tribler.Test.test_download_states import FakeAlert, FakeSession, create_downloads, create_launchmany
+
+ACTIVE_FRACTION = 0.02
+
+def measure(nr_downloads, nr_rounds, incremental):
+    session = FakeSession()
+    downloads = create_downloads(session, nr_downloads)
+    lm = create_launchmany(session, downloads)
+    delta = DownloadStatesDelta() if incremental else None
+    random = Random(nr_downloads)
+
+    nr_states = 0
+    nr_status_calls = 0
+    took = 0.0
+    for _ in xrange(nr_rounds):
+        for d in random.sample(downloads, int(nr_downloads * ACTIVE_FRACTION)):
+            d.handle.fake_status.upload_payload_rate = random.randint(1, 100000)
+            d.handle.fake_status.all_time_upload += d.handle.fake_status.upload_payload_rate
+            d.process_alert(FakeAlert(d.handle), 'stats_alert')
+
+        status_calls = sum(d.handle.nr_status_calls for d in downloads)
+        start = time()
+        lm.network_set_download_states_callback(None, False, delta)
+        took += time() - start
+        nr_states += len(session.uch.states.pop()[0])
+        nr_status_calls += sum(d.handle.nr_status_calls for d in downloads) - status_calls
+
+    return 1000.0 * took / nr_rounds, float(nr_states) / nr_rounds, float(nr_status_calls) / nr_rounds
+
+def main():
+    nr_downloads = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    nr_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print "%12s %10s %10s %12s %16s" % ("mode", "downloads", "ms/round", "states/round", "status()/round")
+    for incremental in (False, True):
+        ms_per_round, states_per_round, status_per_round = measure(nr_downloads, nr_rounds, incremental)
+        print "%12s %10d %10.1f %12.0f %16.0f" % ("incremental" if incremental else "full", nr_downloads, ms_per_round, states_per_round, status_per_round)
+
+if __name__ == "__main__":
+    main()
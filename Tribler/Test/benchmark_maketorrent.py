@@ -0,0 +1,63 @@
+# see LICENSE.txt for license information
+#
+# Measures how fast maketorrent.makeinfo hashes a generated multi-file
+# dataset, reading the files one after the other on the calling thread and
+# with the pieces hashed by HASH_WORKERS threads.  The files are read once
+# before the measurements, so they come from the page cache.
+#
+# usage: python benchmark_maketorrent.py [total size in MB] [nr of files] [nr of workers]
+#
+
+import os
+import sys
+import shutil
+import tempfile
+from copy import deepcopy
+from time import time
+
+from Tribler.Core.APIImplementation import maketorrent
+from Tribler.Core.defaults import tdefdefaults
+
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+def create_dataset(dirname, total_size, nr_files):
+    input = deepcopy(tdefdefaults)
+    input.update({'encoding': 'utf-8', 'name': 'dataset', 'files': []})
+    # files of different sizes, so that pieces span files
+    sizes = [total_size * (i + 1) / (nr_files * (nr_files + 1) / 2) for i in xrange(nr_files)]
+    for i, size in enumerate(sizes):
+        filename = os.path.join(dirname, 'recording%d.ts' % i)
+        f = open(filename, 'wb')
+        block = os.urandom(WRITE_BLOCK_SIZE)
+        for offset in xrange(0, size, WRITE_BLOCK_SIZE):
+            f.write(block[:min(WRITE_BLOCK_SIZE, size - offset)])
+        f.close()
+        input['files'].append({'inpath': filename, 'outpath': os.path.join('dataset', 'recording%d.ts' % i), 'playtime': None, 'length': size})
+    return input
+
+def measure(input, workers):
+    maketorrent.HASH_WORKERS = workers
+    start = time()
+    info, _ = maketorrent.makeinfo(input, None, None)
+    return time() - start, info
+
+def main():
+    total_size = (int(sys.argv[1]) if len(sys.argv) > 1 else 512) * 1024 * 1024
+    nr_files = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else max(maketorrent.HASH_WORKERS, 2)
+
+    dirname = tempfile.mkdtemp()
+    try:
+        input = create_dataset(dirname, total_size, nr_files)
+        print "%10s %8s %10s %10s %8s" % ("file hash", "workers", "took", "MB/s", "same")
+        for makehash in (0, 1):
+            input['makehash_md5'] = input['makehash_sha1'] = makehash
+            _, expected = measure(input, 1)
+            for workers in sorted(set([1, 2, max_workers])):
+                took, info = measure(input, workers)
+                print "%10s %8d %9.2fs %10.1f %8s" % ("md5+sha1" if makehash else "none", workers, took, total_size / took / 1024 / 1024, info == expected)
+    finally:
+        shutil.rmtree(dirname)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# see LICENSE.txt for license information
+#
+# Measures how many similarity requests per second the privatesearch
+# SearchCommunity handles while my preference list grows from 100 to 10,000
+# infohashes.  A request consists of process_rsa_simirequest at the receiving
+# peer and compute_rsa_overlap at the requesting peer.
+#
+# 'new peer' clears the per-peer-key cache before every request, 'known peer'
+# repeats requests from the same peer key.
+#
+# usage: python benchmark_privatesearch.py [seconds per measurement]
+#
+
+import sys
+from os import urandom
+from time import time
+from collections import OrderedDict
+
+from Crypto.Util.number import bytes_to_long
+
+from Tribler.community.privatesearch.community import SearchCommunity, Das4DBStub
+from Tribler.community.privatesearch.rsa import rsa_init, rsa_encrypt
+
+class FakePayload:
+    def __init__(self, key_n, preference_list):
+        self.key_n = key_n
+        self.preference_list = preference_list
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.payload = payload
+
+def random_infohash():
+    # no leading zero byte, long_to_bytes would strip it
+    return chr(1 + ord(urandom(1)) % 255) + urandom(19)
+
+def create_community(preferences, encryption, key):
+    # only the state used by process_rsa_simirequest and compute_rsa_overlap
+    community = SearchCommunity.__new__(SearchCommunity)
+    community.encryption = encryption
+    community.key = key
+    community.max_prefs = community.max_h_prefs = len(preferences)
+    community.my_compatible_preference_cache = [None, None, OrderedDict()]
+    community.crypto_pool = None
+    community.receive_time_encryption = 0.0
+    community.create_time_decryption = 0.0
+
+    community._mypref_db = Das4DBStub(None)
+    community._mypref_db.myPreferences.update(preferences)
+    return community
+
+def measure(requester, responder, message, duration, clear_cache):
+    nr_requests = 0
+    start = time()
+    while nr_requests == 0 or time() - start < duration:
+        if clear_cache:
+            responder.my_compatible_preference_cache[2].clear()
+
+        message.payload.preference_list = message.payload.preference_list[:]
+        hisList, myList = responder.process_rsa_simirequest([message], send_messages=False)
+        overlap = requester.compute_rsa_overlap(hisList, myList)
+        nr_requests += 1
+    return nr_requests / (time() - start), overlap
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+
+    requester_key = rsa_init()
+    responder_key = rsa_init()
+
+    requester_preferences = [random_infohash() for _ in xrange(100)]
+    print "%8s %10s %12s %12s %12s" % ("prefs", "encryption", "mode", "requests/s", "overlap")
+    for nr_preferences in (100, 1000, 10000):
+        # half of the requesters preferences overlap
+        responder_preferences = requester_preferences[:50] + [random_infohash() for _ in xrange(nr_preferences - 50)]
+
+        for encryption in (True, False):
+            requester = create_community(requester_preferences, encryption, requester_key)
+            responder = create_community(responder_preferences, encryption, responder_key)
+
+            preference_list = [bytes_to_long(infohash) for infohash in requester_preferences]
+            if encryption:
+                preference_list = [rsa_encrypt(requester_key, infohash) for infohash in preference_list]
+            message = FakeMessage(FakePayload(requester_key.n, preference_list))
+
+            modes = (("new peer", True), ("known peer", False)) if encryption else (("plain", False),)
+            for mode, clear_cache in modes:
+                requests_per_second, overlap = measure(requester, responder, message, duration, clear_cache)
+                print "%8d %10s %12s %12.2f %12d" % (nr_preferences, encryption, mode, requests_per_second, overlap)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# see LICENSE.txt for license information
+#
+# Floods the pymdht ThreadedReactor with get_peers queries from a local UDP
+# socket and measures how many queries per second are handled and how many
+# are lost because the kernel buffer overflowed.  The queries are sent in
+# bursts, as the DHT traffic of many peers arrives.  In the 'receive' mode the
+# node only counts the queries, which measures the reactor itself, in the
+# 'answer' mode a Responder for a node that tracks nothing answers them.
+#
+# usage: python benchmark_pymdht_reactor.py [nr of queries] [burst size]
+#
+
+import sys
+import socket
+import threading
+import multiprocessing
+from time import time, sleep
+
+from Tribler.Core.DecentralizedTracking.pymdht.core import ptime
+from Tribler.Core.DecentralizedTracking.pymdht.core import message, minitwisted, responder
+from Tribler.Core.DecentralizedTracking.pymdht.core.identifier import RandomId
+from Tribler.Core.DecentralizedTracking.pymdht.core.node import Node
+from Tribler.Test.benchmark_pymdht_tracker import FakeRoutingManager, VERSION_LABEL
+
+BURST_INTERVAL = 0.01
+QUIET_PERIOD = 1.0
+
+class DHTNode:
+    """ Counts or answers the queries that the reactor receives """
+
+    def __init__(self, my_node, answer):
+        rnodes = [Node(("10.0.0.%d" % i, 7000), RandomId()) for i in xrange(1, 9)]
+        self.msg_f = message.MsgFactory(VERSION_LABEL, my_node.id)
+        self.responder = responder.Responder(my_node.id, FakeRoutingManager(rnodes), self.msg_f)
+        self.answer = answer
+        self.nr_received = 0
+        self.last_received = None
+
+    def main_loop(self):
+        return ptime.time() + 1, []
+
+    def on_datagram_received(self, datagram):
+        self.nr_received += 1
+        self.last_received = time()
+        if not self.answer:
+            return ptime.time() + 1, []
+        msg = self.msg_f.incoming_msg(datagram)
+        response = self.responder.get_response(msg)
+        return ptime.time() + 1, [message.Datagram(response.stamp(msg.tid), datagram.addr)]
+
+def create_queries(my_node, nr_queries):
+    msg_f = message.MsgFactory(VERSION_LABEL, RandomId())
+    return [msg_f.outgoing_get_peers_query(my_node, RandomId()).stamp("%x" % i) for i in xrange(nr_queries)]
+
+def flood(queries, burst_size, addr, results):
+    """ Runs in a separate process, so that sending and receiving the
+    queries does not compete with the reactor for the interpreter lock """
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    client.bind(('127.0.0.1', 0))
+    client.settimeout(QUIET_PERIOD)
+
+    def send():
+        for offset in xrange(0, len(queries), burst_size):
+            for query in queries[offset:offset + burst_size]:
+                client.sendto(query, addr)
+            sleep(BURST_INTERVAL)
+
+    start = time()
+    sender = threading.Thread(target=send)
+    sender.start()
+
+    nr_responses = 0
+    last_response = start
+    try:
+        while True:
+            client.recvfrom(minitwisted.BUFFER_SIZE)
+            nr_responses += 1
+            last_response = time()
+    except socket.timeout:
+        pass
+    sender.join()
+    client.close()
+    results.put((start, nr_responses, last_response))
+
+def measure(my_node, queries, burst_size, answer):
+    nr_queries = len(queries)
+    dht_node = DHTNode(my_node, answer)
+    reactor = minitwisted.ThreadedReactor(dht_node.main_loop, 0, dht_node.on_datagram_received, floodbarrier_active=False)
+    addr = ('127.0.0.1', reactor.s.getsockname()[1])
+    reactor.start()
+
+    results = multiprocessing.Queue()
+    flooder = multiprocessing.Process(target=flood, args=(queries, burst_size, addr, results))
+    flooder.start()
+    start, nr_responses, last_response = results.get()
+    flooder.join()
+    reactor.stop()
+    reactor.s.close()
+
+    if not answer:
+        nr_responses = dht_node.nr_received
+        last_response = dht_node.last_received or start
+    max_recv_batch = reactor.get_stats()['max_recv_batch'] if hasattr(reactor, "get_stats") else 1
+    return nr_responses, nr_responses / max(last_response - start, 1e-3), 100.0 * (nr_queries - nr_responses) / nr_queries, max_recv_batch
+
+def main():
+    nr_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    burst_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    my_node = Node(('127.0.0.1', 0), RandomId())
+    queries = create_queries(my_node, nr_queries)
+
+    print "%8s %10s %10s %12s %8s %10s" % ("mode", "queries", "handled", "handled/s", "lost", "max batch")
+    for answer in (False, True):
+        nr_handled, handled_per_second, lost, max_recv_batch = measure(my_node, queries, burst_size, answer)
+        print "%8s %10d %10d %12.0f %7.1f%% %10d" % ("answer" if answer else "receive", nr_queries, nr_handled, handled_per_second, lost, max_recv_batch)
+
+if __name__ == "__main__":
+    main()
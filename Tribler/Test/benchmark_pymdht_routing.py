@@ -0,0 +1,56 @@
+# see LICENSE.txt for license information
+#
+# Measures the pymdht identifier operations that the routing table uses for
+# every incoming find_node and get_peers query: the log distance of random
+# targets to the own id, get_closest_rnodes on a full routing table and the
+# ordering of ids by their distance.  The lookups are done both in bucket
+# order and for the rnodes closest to the target.
+#
+# usage: python benchmark_pymdht_routing.py [nr of lookups]
+#
+
+import sys
+from time import time
+
+from Tribler.Core.DecentralizedTracking.pymdht.core.identifier import RandomId
+from Tribler.Core.DecentralizedTracking.pymdht.core.node import Node
+from Tribler.Core.DecentralizedTracking.pymdht.core.routing_table import RoutingTable, NUM_SBUCKETS, NUM_NODES
+
+NR_FULL_BUCKETS = 20
+NR_ORDERED_IDS = 100
+
+def create_routing_table():
+    my_node = Node(('127.0.0.1', 7000), RandomId())
+    table = RoutingTable(my_node, [NUM_NODES] * NUM_SBUCKETS)
+    # the buckets close to the own id are nearly empty in a real DHT
+    for log_distance in xrange(NUM_SBUCKETS - NR_FULL_BUCKETS, NUM_SBUCKETS):
+        for i in xrange(NUM_NODES):
+            node = Node(('10.%d.%d.1' % (log_distance, i), 7000), my_node.id.generate_close_id(log_distance))
+            table.get_sbucket(log_distance).main.add(node.get_rnode(log_distance))
+    return table
+
+def measure(f, args_list):
+    start = time()
+    for args in args_list:
+        f(*args)
+    return len(args_list) / (time() - start)
+
+def main():
+    nr_lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    table = create_routing_table()
+    my_id = table.my_node.id
+    targets = [RandomId() for _ in xrange(nr_lookups)]
+    log_distances = [target.log_distance(my_id) for target in targets]
+    ordered_ids = [RandomId() for _ in xrange(NR_ORDERED_IDS)]
+
+    print "%-28s %12s" % ("operation", "ops/s")
+    results = [("log_distance", measure(my_id.log_distance, [(target,) for target in targets])),
+               ("get_closest_rnodes bucket", measure(table.get_closest_rnodes, [(log_distance, NUM_NODES, False) for log_distance in log_distances])),
+               ("get_closest_rnodes closest", measure(table.get_closest_rnodes, [(log_distance, NUM_NODES, False, target) for log_distance, target in zip(log_distances, targets)])),
+               ("DD_order_closest %d ids" % NR_ORDERED_IDS, measure(my_id.DD_order_closest, [(ordered_ids,)] * (nr_lookups / NR_ORDERED_IDS)))]
+    for operation, ops_per_second in results:
+        print "%-28s %12.0f" % (operation, ops_per_second)
+
+if __name__ == "__main__":
+    main()
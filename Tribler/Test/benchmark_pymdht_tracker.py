@@ -0,0 +1,72 @@
+# see LICENSE.txt for license information
+#
+# Measures how many announce_peer and get_peers queries per second the pymdht
+# Responder handles for a DHT node that tracks many infohashes.  The queries
+# come from many peers, for infohashes of which a few are popular, and are
+# decoded before the measurement.  The time is mocked to advance one second
+# per 20 queries, so peers expire during the replay.
+#
+# usage: python benchmark_pymdht_tracker.py [nr of infohashes] [nr of queries]
+#
+
+import sys
+from random import Random
+from time import time as real_time
+
+from Tribler.Core.DecentralizedTracking.pymdht.core import ptime as time
+from Tribler.Core.DecentralizedTracking.pymdht.core import message, responder
+from Tribler.Core.DecentralizedTracking.pymdht.core.identifier import RandomId
+from Tribler.Core.DecentralizedTracking.pymdht.core.node import Node
+
+VERSION_LABEL = 'NS\0\0'
+QUERIES_PER_SECOND = 20
+
+class FakeRoutingManager:
+    def __init__(self, rnodes):
+        self.rnodes = rnodes
+
+    def get_closest_rnodes(self, log_distance, num_nodes, exclude_myself, target=None):
+        return self.rnodes
+
+def create_queries(my_node, token_m, nr_infohashes, nr_queries, random):
+    infohashes = [RandomId() for _ in xrange(nr_infohashes)]
+    msg_f = message.MsgFactory(VERSION_LABEL, RandomId())
+    queries = []
+    for i in xrange(nr_queries):
+        # a few popular infohashes get most of the queries
+        info_hash = infohashes[min(int(random.paretovariate(1.0)) - 1, nr_infohashes - 1) if random.random() < 0.5 else random.randrange(nr_infohashes)]
+        addr = ("10.%d.%d.%d" % (random.randrange(4), random.randrange(256), random.randrange(1, 255)), random.randint(1024, 65535))
+        if random.random() < 0.5:
+            msg = msg_f.outgoing_announce_peer_query(my_node, info_hash, addr[1], token_m.get(addr[0]))
+        else:
+            msg = msg_f.outgoing_get_peers_query(my_node, info_hash)
+        queries.append(message.IncomingMsg(None, message.Datagram(msg.stamp(str(i)), addr)))
+    return queries
+
+def main():
+    nr_infohashes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    nr_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    random = Random(nr_infohashes)
+    my_node = Node(('127.0.0.1', 7000), RandomId())
+    rnodes = [Node(("10.0.0.%d" % i, 7000), RandomId()) for i in xrange(1, 9)]
+    dht_responder = responder.Responder(my_node.id, FakeRoutingManager(rnodes), message.MsgFactory(VERSION_LABEL, my_node.id))
+    queries = create_queries(my_node, dht_responder._token_m, nr_infohashes, nr_queries, random)
+
+    time.mock_mode()
+    try:
+        start = real_time()
+        for i, query in enumerate(queries):
+            dht_responder.get_response(query)
+            if i % QUERIES_PER_SECOND == 0:
+                time.sleep(1)
+        took = real_time() - start
+    finally:
+        time.normal_mode()
+
+    tracker = dht_responder._tracker
+    print "%10s %10s %12s %10s %10s" % ("infohashes", "queries", "queries/s", "keys", "peers")
+    print "%10d %10d %12.0f %10d %10d" % (nr_infohashes, nr_queries, nr_queries / took, tracker.num_keys, tracker.num_peers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# see LICENSE.txt for license information
+#
+# Measures the latency of searches done by GUI threads while the DB thread is
+# busy inserting torrents, with and without the pool of read-only
+# connections used for committed reads.  The DB thread inserts batches of torrents into Torrent and
+# FullTextIndex and commits after every batch, while each searcher thread
+# repeatedly runs searchNames for a random keyword.
+#
+# usage: python benchmark_readpool.py [seconds per measurement] [nr of searcher threads]
+#
+# run from Tribler/Test, as the database schema is read from ..
+#
+
+import os
+import sys
+import tempfile
+import threading
+from random import Random
+from shutil import rmtree
+from time import time
+
+from Tribler.dispersy.callback import Callback
+import Tribler.Core.CacheDB.sqlitecachedb as sqlitecachedb
+from Tribler.Core.CacheDB.sqlitecachedb import SQLiteCacheDB, bin2str
+from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler
+from Tribler.Test.test_search_names import CREATE_SQL_FILE, KEYWORDS, KEYS, NR_TORRENTS, FakeChannelCastDB, fill_database
+
+INSERT_BATCH_SIZE = 200
+
+class InsertStorm:
+
+    def __init__(self, db, first_torrent_id):
+        self.db = db
+        self.random = Random(first_torrent_id)
+        self.next_torrent_id = first_torrent_id
+        self.nr_inserted = 0
+        self.running = False
+
+    def run(self):
+        # a generator on the DB thread, yielding between batches as the overlay would
+        while self.running:
+            torrents = []
+            fulltext = []
+            for torrent_id in xrange(self.next_torrent_id, self.next_torrent_id + INSERT_BATCH_SIZE):
+                name = "%s %d" % (" ".join(self.random.sample(KEYWORDS, 3)), torrent_id)
+                infohash = bin2str("".join(chr(self.random.randint(0, 255)) for _ in xrange(20)))
+                torrents.append((torrent_id, infohash, name, self.random.randint(0, 5000)))
+                fulltext.append((torrent_id, name, name + ' file', 'avi'))
+            self.next_torrent_id += INSERT_BATCH_SIZE
+
+            self.db.executemany(u"INSERT INTO Torrent (torrent_id, infohash, name, num_seeders) VALUES (?,?,?,?)", torrents)
+            self.db.executemany(u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions) VALUES (?,?,?,?)", fulltext)
+            self.db.commitNow()
+            self.nr_inserted += INSERT_BATCH_SIZE
+            yield 0.0
+
+def search(torrent_db, seed, end, latencies):
+    random = Random(seed)
+    while time() < end:
+        keyword = random.choice(KEYWORDS)
+        start = time()
+        torrent_db.searchNames([keyword], keys = KEYS, limit = 25)
+        latencies.append(time() - start)
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def measure(db, callback, torrent_db, nr_searchers, duration, pool_size, first_torrent_id):
+    sqlitecachedb.READ_POOL_SIZE = pool_size
+
+    storm = InsertStorm(db, first_torrent_id)
+    storm.running = True
+    callback.register(storm.run)
+
+    latencies = []
+    end = time() + duration
+    threads = [threading.Thread(target = search, args = (torrent_db, i, end, latencies)) for i in xrange(nr_searchers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    storm.running = False
+
+    # every measurement searches the same number of torrents, the storm stops before this call runs
+    def remove_inserted():
+        db.execute_write(u"DELETE FROM Torrent WHERE torrent_id >= ?", (first_torrent_id,))
+        db.execute_write(u"DELETE FROM FullTextIndex WHERE rowid >= ?", (first_torrent_id,))
+        db.commitNow()
+    callback.call(remove_inserted)
+
+    latencies.sort()
+    return len(latencies), percentile(latencies, 0.5), percentile(latencies, 0.99), storm.nr_inserted
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    nr_searchers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    db_dir = tempfile.mkdtemp()
+    db = SQLiteCacheDB.getInstance()
+    db.initDB(os.path.join(db_dir, 'tribler.sdb'), CREATE_SQL_FILE)
+    fill_database(db)
+
+    torrent_db = TorrentDBHandler.getInstance()
+    torrent_db.channelcast_db = FakeChannelCastDB()
+
+    callback = Callback("Dispersy")
+    callback.start()
+    sqlitecachedb.try_register(db, callback)
+    try:
+        print "%10s %10s %10s %10s %10s %12s" % ("pool size", "searchers", "searches", "p50 ms", "p99 ms", "inserted/s")
+        for pool_size in (0, sqlitecachedb.READ_POOL_SIZE):
+            nr_searches, p50, p99, nr_inserted = measure(db, callback, torrent_db, nr_searchers, duration, pool_size, NR_TORRENTS + 1)
+            print "%10d %10d %10d %10.2f %10.2f %12.0f" % (pool_size, nr_searchers, nr_searches, 1000 * p50, 1000 * p99, nr_inserted / duration)
+    finally:
+        sqlitecachedb.unregister()
+        callback.stop()
+        db.close()
+        rmtree(db_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# see LICENSE.txt for license information
+#
+# Measures how long TorrentManager takes to merge remote search results into
+# its hits.  Every peer returns 25 results for the query, drawn from a pool of
+# torrents so that peers return overlapping results.  After each peer the GUI
+# refresh is simulated by addStoredRemoteResults followed by fulltextSort of
+# the new hits, as getHitsInCategory does when only remote results came in.
+#
+# usage: python benchmark_searchgridmanager.py [nr of peers]
+#
+
+import sys
+import random
+from time import time
+
+from Tribler.Main.vwxGUI.SearchGridManager import TorrentManager
+
+RESULTS_PER_PEER = 25
+
+class FakeTorrentDB:
+    category_table = {'other': 0, 'xxx': 1}
+    status_table = {'good': 1}
+
+class FakeCategory:
+    def calculateCategoryNonDict(self, *args):
+        return ['other']
+
+    def calculateCategoriesNonDict(self, torrents):
+        return [['other'] for _ in torrents]
+
+def create_manager(keywords):
+    # without connect(), only the state used by gotDispersyRemoteHits,
+    # addStoredRemoteResults and fulltextSort is set
+    manager = TorrentManager(None)
+    manager.searchkeywords = keywords
+    manager.torrent_db = FakeTorrentDB()
+    manager.channelcast_db = None
+    manager.category = FakeCategory()
+    manager.xxx_category = 1
+    return manager
+
+def create_results(nr_results, keywords):
+    results = []
+    for i in xrange(nr_results):
+        infohash = "%020d" % i
+        name = "%s %d.avi" % (" ".join(keywords), i)
+        results.append((infohash, name, 1024L * i, 1, ['other'], 0L, random.randint(0, 1000), random.randint(0, 1000), None, None, None))
+    return results
+
+def measure(nr_peers, pool, keywords):
+    manager = create_manager(keywords)
+    merge_took = []
+    sort_took = []
+    for peer in xrange(nr_peers):
+        results = random.sample(pool, RESULTS_PER_PEER)
+        manager.gotDispersyRemoteHits(keywords, results, "peer%d" % peer)
+
+        manager.hitsLock.acquire()
+        try:
+            start = time()
+            new_hits, _ = manager.addStoredRemoteResults()
+            merge_took.append(time() - start)
+
+            start = time()
+            if new_hits:
+                manager.fulltextSort(new_hits)
+            sort_took.append(time() - start)
+        finally:
+            manager.hitsLock.release()
+    return len(manager.hits), merge_took, sort_took
+
+def main():
+    nr_peers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    keywords = ["foo", "bar"]
+
+    print "%8s %8s %8s %14s %14s %14s %14s" % ("peers", "pool", "hits", "avg merge ms", "max merge ms", "avg sort ms", "max sort ms")
+    for pool_size in (250, 1000, 5000):
+        random.seed(pool_size)
+        pool = create_results(pool_size, keywords)
+        nr_hits, merge_took, sort_took = measure(nr_peers, pool, keywords)
+        print "%8d %8d %8d %14.3f %14.3f %14.3f %14.3f" % (nr_peers, pool_size, nr_hits, 1000 * sum(merge_took) / nr_peers, 1000 * max(merge_took), 1000 * sum(sort_took) / nr_peers, 1000 * max(sort_took))
+
+if __name__ == "__main__":
+    main()
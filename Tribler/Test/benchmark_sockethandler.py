@@ -0,0 +1,109 @@
+# see LICENSE.txt for license information
+#
+# Measures how many socket events per second SocketHandler handles with each
+# readiness backend, for a growing number of mostly idle loopback
+# connections.  In every round ACTIVE_CLIENTS random clients send a message,
+# which SocketHandler reads using do_poll and handle_events.  CPU time is the
+# user and system time of the process per handled event.
+#
+# usage: python benchmark_sockethandler.py [rounds]
+#
+
+import sys
+import socket
+import select
+import resource
+from random import Random
+from time import time
+
+from Tribler.Core.RawServer import selectpoll
+from Tribler.Core.RawServer.SocketHandler import SocketHandler
+
+try:
+    from Tribler.Core.RawServer import epollpoll
+except ImportError:
+    epollpoll = None
+
+ACTIVE_CLIENTS = 50
+MESSAGE = "x" * 100
+
+class Handler:
+    def __init__(self):
+        self.nr_bytes = 0
+
+    def external_connection_made(self, single_socket):
+        pass
+
+    def data_came_in(self, single_socket, data):
+        self.nr_bytes += len(data)
+
+    def connection_lost(self, single_socket):
+        pass
+
+    def connection_flushed(self, single_socket):
+        pass
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def measure(backend, nr_connections, nr_rounds):
+    handler = Handler()
+    socket_handler = SocketHandler(300, False)
+    socket_handler.poll = backend()
+    socket_handler.max_connects = nr_connections
+    socket_handler.set_handler(handler)
+    socket_handler.bind(0, ['127.0.0.1'], reuse = True)
+    server = socket_handler.servers.values()[0]
+    address = server.getsockname()
+
+    clients = []
+    try:
+        while len(clients) < nr_connections:
+            clients.append(socket.create_connection(address))
+            if len(clients) % 64 == 0 or len(clients) == nr_connections:
+                while len(socket_handler.single_sockets) < len(clients):
+                    socket_handler.handle_events(socket_handler.do_poll(1.0))
+
+        random = Random(nr_connections)
+        nr_events = 0
+        expected = 0
+        start = time()
+        start_cpu = cpu_time()
+        for _ in xrange(nr_rounds):
+            for client in random.sample(clients, min(ACTIVE_CLIENTS, nr_connections)):
+                client.send(MESSAGE)
+                expected += len(MESSAGE)
+
+            while handler.nr_bytes < expected:
+                events = socket_handler.do_poll(1.0)
+                nr_events += len(events)
+                socket_handler.handle_events(events)
+
+        took = time() - start
+        took_cpu = cpu_time() - start_cpu
+        return nr_events / took, 1000000.0 * took_cpu / nr_events
+
+    finally:
+        for client in clients:
+            client.close()
+        socket_handler.shutdown()
+
+def main():
+    nr_rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    backends = [("select", selectpoll.poll, 1000), ("poll", select.poll, None)]
+    if epollpoll:
+        backends.append(("epoll", epollpoll.poll, None))
+
+    print "%10s %12s %12s %14s" % ("backend", "connections", "events/s", "cpu us/event")
+    for nr_connections in (100, 1000, 5000):
+        for name, backend, max_connections in backends:
+            # select can not handle file descriptors above FD_SETSIZE
+            if max_connections and nr_connections >= max_connections:
+                continue
+            events_per_second, cpu_per_event = measure(backend, nr_connections, nr_rounds)
+            print "%10s %12d %12.0f %14.1f" % (name, nr_connections, events_per_second, cpu_per_event)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# see LICENSE.txt for license information
+#
+# Measures the cost of writing to loopback connections with SingleSocket,
+# for the message mix of a seeding peer: every piece message is preceded by a
+# few small have messages, each written separately as the encoder does.  The
+# send buffers are small and the receiving clients read less than is written
+# per poll, so messages queue up and the sends are often partial.  The number of send calls and copied bytes are reported per MB sent,
+# with and without joining small messages into one send.
+#
+# usage: python benchmark_socketwrite.py [MB per connection] [nr of connections]
+#
+
+import sys
+import socket
+import resource
+from time import time
+
+import Tribler.Core.RawServer.SocketHandler as SocketHandlerModule
+from Tribler.Core.RawServer.SocketHandler import SocketHandler
+
+HAVE = "\x00\x00\x00\x05\x04" + "\x00\x00\x01\x00"
+PIECE = "\x00\x00\x40\x09\x07" + "\x00" * 8 + "x" * 16384
+HAVES_PER_PIECE = 4
+PIECES_PER_REFILL = 4
+CLIENT_READSIZE = 32768
+SEND_BUFFER_SIZE = 32768
+
+class Handler:
+    def __init__(self, nr_bytes):
+        # {SingleSocket: bytes left to write}
+        self.todo = {}
+        self.nr_bytes = nr_bytes
+
+    def refill(self, single_socket):
+        for _ in xrange(PIECES_PER_REFILL):
+            if self.todo[single_socket] <= 0:
+                return
+            for _ in xrange(HAVES_PER_PIECE):
+                single_socket.write(HAVE)
+            single_socket.write(PIECE)
+            self.todo[single_socket] -= HAVES_PER_PIECE * len(HAVE) + len(PIECE)
+
+    def external_connection_made(self, single_socket):
+        self.todo[single_socket] = self.nr_bytes
+        # a small send buffer, as the window of a remote peer, makes messages queue up
+        single_socket.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+        self.refill(single_socket)
+
+    def data_came_in(self, single_socket, data):
+        pass
+
+    def connection_lost(self, single_socket):
+        pass
+
+    def connection_flushed(self, single_socket):
+        pass
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def measure(coalesce_size, nr_connections, nr_bytes):
+    SocketHandlerModule.WRITE_COALESCE_SIZE = coalesce_size
+
+    handler = Handler(nr_bytes)
+    socket_handler = SocketHandler(300, False)
+    socket_handler.set_handler(handler)
+    socket_handler.bind(0, ['127.0.0.1'], reuse = True)
+    server = socket_handler.servers.values()[0]
+    address = server.getsockname()
+
+    clients = []
+    try:
+        start = time()
+        start_cpu = cpu_time()
+        for _ in xrange(nr_connections):
+            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, CLIENT_READSIZE)
+            client.connect(address)
+            client.setblocking(0)
+            clients.append(client)
+
+        while True:
+            socket_handler.handle_events(socket_handler.do_poll(0))
+            # a write that is sent at once does not call connection_flushed
+            for single_socket in handler.todo:
+                if single_socket.is_flushed():
+                    handler.refill(single_socket)
+            nr_received = 0
+            for client in clients:
+                try:
+                    nr_received += len(client.recv(CLIENT_READSIZE))
+                except socket.error:
+                    pass
+            if not nr_received and all(todo <= 0 for todo in handler.todo.values()) and all(s.is_flushed() for s in handler.todo):
+                break
+
+        took = time() - start
+        took_cpu = cpu_time() - start_cpu
+        stats = socket_handler.get_write_stats()
+        megabytes = stats['bytes_sent'] / 1048576.0
+        return megabytes / took, 1000.0 * took_cpu / megabytes, stats['send_calls_per_mb'], stats['copied_per_mb'] / 1024.0
+
+    finally:
+        for client in clients:
+            client.close()
+        socket_handler.shutdown()
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 50.0
+    nr_connections = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print "%14s %10s %12s %12s %14s" % ("coalesce size", "MB/s", "cpu ms/MB", "sends/MB", "copied KB/MB")
+    for coalesce_size in (0, SocketHandlerModule.WRITE_COALESCE_SIZE):
+        mb_per_second, cpu_per_mb, sends_per_mb, copied_per_mb = measure(coalesce_size, nr_connections, int(megabytes * 1048576))
+        print "%14d %10.1f %12.2f %12.1f %14.1f" % (coalesce_size, mb_per_second, cpu_per_mb, sends_per_mb, copied_per_mb)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# see LICENSE.txt for license information
+#
+# Measures how fast tunneled dispersy packets are received from the swift
+# CMDGW connection, as TUNNELRECV lines and as binary frames.  A fake swift
+# endpoint answers the TUNNELFRAMING request and sends the packets in bursts
+# of many packets, split at arbitrary points as TCP does.  The packets are
+# parsed by FastI2IConnection and passed on by SwiftProcess.
+#
+# usage: python benchmark_swifttunnel.py [nr of packets]
+#
+
+import os
+import sys
+import socket
+from random import Random
+from threading import Thread, Event, RLock
+from time import time
+
+from Tribler.Utilities.FastI2I import FastI2IConnection, FRAMING_CMD, TUNNEL_FRAME, TUNNEL_HEADER
+from Tribler.Core.Swift.SwiftProcess import SwiftProcess, DONE_STATE_WORKING
+
+SESSION = "\xff\xff\xff\xff"
+BURST_SIZE = 262144
+
+class FakeDispersyDownload:
+    def __init__(self, nr_packets, done):
+        self.nr_packets = nr_packets
+        self.nr_bytes = 0
+        self.done = done
+
+    def i2ithread_data_came_in(self, session, address, data):
+        self.nr_bytes += len(data)
+        self.nr_packets -= 1
+        if self.nr_packets == 0:
+            self.done.set()
+
+class FakeSwiftProcess(SwiftProcess):
+    """ A SwiftProcess without the swift engine """
+
+    def __init__(self, download):
+        self.splock = RLock()
+        self.roothash2dl = {"dispersy": download}
+        self.donestate = DONE_STATE_WORKING
+        self.fastconn = None
+
+class FakeSwiftEndpoint(Thread):
+    """ Accepts one CMDGW connection and sends it the tunneled packets """
+
+    def __init__(self, packets, framing):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.packets = packets
+        self.framing = framing
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.start_time = None
+
+    def run(self):
+        sock, _ = self.server.accept()
+        if self.framing:
+            assert sock.recv(1024) == FRAMING_CMD + "\r\n"
+            sock.sendall(FRAMING_CMD + "\r\n")
+            messages = [TUNNEL_HEADER.pack(TUNNEL_FRAME, len(data), socket.inet_aton(address[0]), address[1], len(SESSION)) + SESSION + data
+                        for address, data in self.packets]
+        else:
+            messages = ["TUNNELRECV %s:%d/%s %d\r\n" % (address[0], address[1], SESSION.encode("HEX"), len(data)) + data
+                        for address, data in self.packets]
+        stream = "".join(messages)
+
+        self.start_time = time()
+        for offset in xrange(0, len(stream), BURST_SIZE):
+            sock.sendall(stream[offset:offset + BURST_SIZE])
+        self.sock = sock
+
+def measure(framing, packets):
+    done = Event()
+    download = FakeDispersyDownload(len(packets), done)
+    process = FakeSwiftProcess(download)
+
+    endpoint = FakeSwiftEndpoint(packets, framing)
+    endpoint.start()
+    connection = FastI2IConnection(endpoint.port, process.i2ithread_readlinecallback, lambda port: None, process.i2ithread_tunnelcallback, framing)
+    done.wait()
+    took = time() - endpoint.start_time
+
+    endpoint.sock.close()
+    endpoint.server.close()
+    connection.join()
+    return len(packets) / took, download.nr_bytes / took / 1048576.0
+
+def main():
+    nr_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    random = Random(nr_packets)
+    packets = [(("10.0.%d.%d" % (random.randint(0, 255), random.randint(1, 254)), random.randint(1024, 65535)),
+                os.urandom(random.randint(100, 1500)))
+               for _ in xrange(nr_packets)]
+
+    print "%10s %12s %10s" % ("framing", "packets/s", "MB/s")
+    for framing in (False, True):
+        packets_per_second, mb_per_second = measure(framing, packets)
+        print "%10s %12.0f %10.1f" % ("binary" if framing else "lines", packets_per_second, mb_per_second)
+
+if __name__ == "__main__":
+    main()
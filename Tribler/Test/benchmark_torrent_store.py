@@ -0,0 +1,101 @@
+# see LICENSE.txt for license information
+#
+# Compares the collected torrents as files in a directory with the packed
+# torrent store: opening the store, looking up random infohashes of which
+# half are present, reading all torrents in random order and deleting them
+# in batches, as TorrentDBHandler.freeSpace does.  The directory writes are
+# not synced to disk, the store is measured with and without an fsync per
+# update.  The reads come from the page cache.
+#
+# usage: python benchmark_torrent_store.py [nr of torrents] [torrent size in KB] [delete batch size]
+#
+
+import os
+import sys
+import shutil
+import tempfile
+from random import Random
+from time import time
+
+from Tribler.Core.CacheDB.TorrentStore import TorrentStore
+from Tribler.Core.Utilities.Crypto import sha
+from Tribler.Core.Utilities.utilities import get_collected_torrent_filename
+
+class DirectoryStore:
+    """ The torrent collecting dir layout, one file per torrent """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+    def _path(self, infohash):
+        return os.path.join(self.dirname, get_collected_torrent_filename(infohash))
+
+    def has_torrent(self, infohash):
+        return os.path.isfile(self._path(infohash))
+
+    def get_torrent(self, infohash):
+        f = open(self._path(infohash), 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def put_torrent(self, infohash, data):
+        f = open(self._path(infohash), 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+
+    def delete_torrents(self, infohashes):
+        for infohash in infohashes:
+            os.remove(self._path(infohash))
+
+    def close(self):
+        pass
+
+def measure(f, args_list):
+    start = time()
+    for args in args_list:
+        f(*args)
+    return time() - start
+
+def main():
+    nr_torrents = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    torrent_size = (int(sys.argv[2]) if len(sys.argv) > 2 else 8) * 1024
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 25
+
+    random = Random(42)
+    infohashes = [sha(str(i)).digest() for i in xrange(nr_torrents)]
+    data = os.urandom(torrent_size)
+    lookups = [(sha(str(random.randrange(2 * nr_torrents))).digest(),) for _ in xrange(nr_torrents)]
+    reads = [(infohash,) for infohash in infohashes]
+    random.shuffle(reads)
+    deletes = [(infohashes[i:i + batch_size],) for i in xrange(0, nr_torrents, batch_size)]
+    random.shuffle(deletes)
+
+    print "%-12s %10s %12s %12s %12s %12s" % ("layout", "open (s)", "write/s", "lookup/s", "read/s", "delete/s")
+    layouts = [("directory", DirectoryStore), ("pack", TorrentStore), ("pack nosync", lambda dirname: TorrentStore(dirname, sync=False))]
+    for name, create in layouts:
+        dirname = tempfile.mkdtemp()
+        try:
+            store = create(dirname)
+            # one torrent at a time, as they are collected
+            took_write = measure(store.put_torrent, [(infohash, data) for infohash in infohashes])
+            store.close()
+
+            start = time()
+            store = create(dirname)
+            took_open = time() - start
+
+            took_lookup = measure(store.has_torrent, lookups)
+            took_read = measure(store.get_torrent, reads)
+            took_delete = measure(store.delete_torrents, deletes)
+            store.close()
+
+            print "%-12s %10.3f %12.0f %12.0f %12.0f %12.0f" % (name, took_open, nr_torrents / took_write, len(lookups) / took_lookup, len(reads) / took_read, nr_torrents / took_delete)
+        finally:
+            shutil.rmtree(dirname)
+
+if __name__ == "__main__":
+    main()
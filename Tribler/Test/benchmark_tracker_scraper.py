@@ -0,0 +1,68 @@
+# see LICENSE.txt for license information
+#
+# Measures how many torrents per second are checked against local fake
+# trackers, by the blocking multiTrackerChecking and by the TrackerScraper.
+# The fake trackers answer after delay seconds to simulate the round trip.
+#
+# usage: python benchmark_tracker_scraper.py [nr_torrents] [nr_trackers] [delay]
+#
+
+import sys
+import threading
+from time import time
+
+from Tribler.Test.test_tracker_scraper import FakeUDPTracker, FakeHTTPTracker, make_torrents
+from Tribler.TrackerChecking.TrackerChecking import multiTrackerChecking
+from Tribler.TrackerChecking.TrackerScraper import TrackerScraper
+
+def benchmark_blocking(torrents):
+    start = time()
+    for torrent in torrents:
+        multiTrackerChecking(torrent, lambda tracker: [])
+    return time() - start
+
+def benchmark_scraper(torrents):
+    done = threading.Event()
+    results = []
+    def got_results(new_results):
+        results.extend(new_results)
+        if len(results) == len(torrents):
+            done.set()
+
+    scraper = TrackerScraper(got_results, max_jobs = len(torrents))
+    scraper.start()
+    start = time()
+    for torrent in torrents:
+        scraper.add_torrent(torrent)
+    done.wait(300)
+    took = time() - start
+    scraper.shutdown()
+    scraper.join()
+    return took
+
+def main():
+    nr_torrents = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    nr_trackers = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    trackers = []
+    for i in xrange(nr_trackers):
+        tracker = FakeUDPTracker(delay) if i % 2 == 0 else FakeHTTPTracker(delay)
+        tracker.start()
+        trackers.append(tracker)
+
+    torrents = []
+    for i, torrent in enumerate(make_torrents(nr_torrents, [trackers[0].url])):
+        url = trackers[i % nr_trackers].url
+        torrent['info'] = {'announce': url, 'announce-list': [[url]]}
+        torrents.append(torrent)
+
+    for name, benchmark in (("multiTrackerChecking", benchmark_blocking), ("TrackerScraper", benchmark_scraper)):
+        took = benchmark(torrents)
+        print "%-20s %6d torrents in %7.2fs: %8.1f torrents/s" % (name, nr_torrents, took, nr_torrents / took)
+
+    for tracker in trackers:
+        tracker.stop()
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,27 @@ python test_ut_pex.py
 python test_video_server.py
 python test_threadpool.py
 python test_miscutils.py
+python test_tracker_scraper.py
+python test_search_names.py
+python test_write_batcher.py
+python test_read_pool.py
+python test_socket_write.py
+python test_fasti2i.py
+python test_download_states.py
+python test_libtorrent_alerts.py
+python test_category.py
+python test_pymdht_tracker.py
+python test_pymdht_reactor.py
+python test_pymdht_identifier.py
+python test_maketorrent.py
+python test_swift_hashtree.py
+python test_torrent_store.py
+python test_remote_torrent_handler.py
+python test_bundler_levenshtein.py
+python test_privatesearch.py
+python test_resume_downloads.py
+python test_rawserver.py
+python test_remote_search_hits.py
 
 CALL test_buddycast_msg.bat 
 CALL test_dialback_conn_handler.bat
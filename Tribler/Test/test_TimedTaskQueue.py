@@ -65,6 +65,37 @@ class TestTimedTaskQueue(unittest.TestCase):
         assert self.count == 3
         self.count = 4
 
+    def test_removeTask(self):
+        self.queue = TimedTaskQueue()
+        self.count = 0
+        self.queue.add_task(self.task0a, 1, id="a")
+        self.queue.add_task(self.task0b, 1, id="b")
+        self.queue.add_task(self.task0b, 1, id="b")
+        assert self.queue.does_task_exist("a")
+        self.queue.remove_task("a")
+        assert not self.queue.does_task_exist("a")
+        assert self.queue.does_task_exist("b")
+        assert self.queue.get_queue_size() == 1
+        self.count = 1
+        sleep(3)
+        assert self.count == 2
+        assert not self.queue.does_task_exist("b")
+        del self.queue
+
+    def test_stats(self):
+        self.queue = TimedTaskQueue()
+        self.count = 0
+        self.queue.add_task(self.task0a, 0)
+        self.queue.add_task(self.task0b, 0)
+        sleep(1)
+        stats = self.queue.get_stats()
+        assert stats['queue_size'] == 0
+        assert stats['dispatched'] == 2
+        assert stats['max_lag'] >= stats['avg_lag'] >= 0
+        assert stats['runtimes']['task0a'][0] == 1
+        assert stats['runtimes']['task0b'][0] == 1
+        del self.queue
+
 def test_suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestTimedTaskQueue))
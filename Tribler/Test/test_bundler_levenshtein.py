@@ -0,0 +1,87 @@
+# see LICENSE.txt for license information
+
+import unittest
+from random import Random
+
+from Tribler.Core.Search.Bundler import LevenshteinTrie, PrunedLevenshteinTrie, LevGrouping, GroupsList
+
+class FakeHit:
+
+    def __init__(self, name, infohash):
+        self.name = name
+        self.infohash = infohash
+
+def random_words(random, n, alphabet='abc d', max_len=12):
+    return [''.join(random.choice(alphabet) for _ in xrange(random.randint(0, max_len))) for _ in xrange(n)]
+
+class TestPrunedLevenshteinTrie(unittest.TestCase):
+
+    def setUp(self):
+        self.random = Random(42)
+
+    def create_tries(self, words, MAX_LEN=10):
+        tries = LevenshteinTrie(MAX_LEN=MAX_LEN), PrunedLevenshteinTrie(MAX_LEN=MAX_LEN)
+        for trie in tries:
+            for word in words:
+                trie.add_word(word)
+        return tries
+
+    def assertSameResults(self, tries, words, max_costs):
+        for max_cost in max_costs:
+            for word in words:
+                expected, results = [sorted(trie.search(word, max_cost)) for trie in tries]
+                self.assertEqual(results, expected, "%r %s: %r != %r" % (word, max_cost, results, expected))
+
+    def test_random_words(self):
+        words = random_words(self.random, 300)
+        tries = self.create_tries(words)
+        self.assertSameResults(tries, words[:100] + random_words(self.random, 50), [0.0, 0.25, 0.5, 0.75, 1.0, 1.5, 3.0])
+
+    def test_shared_prefixes(self):
+        words = ['ubuntu ' + word for word in random_words(self.random, 200, max_len=5)]
+        tries = self.create_tries(words, MAX_LEN=12)
+        self.assertSameResults(tries, words[:100], [0.25, 0.5, 1.0])
+
+    def test_short_words(self):
+        words = ['', 'a', 'ab', 'b', 'abc', 'abd', 'abcd', 'acbd']
+        tries = self.create_tries(words)
+        self.assertSameResults(tries, words + ['x', 'abx'], [0.0, 0.5, 1.0, 2.0])
+        self.assertEqual(sorted(tries[1].search('abc', 0.5)), ['ab', 'abc', 'abcd', 'abd'])
+        self.assertEqual(tries[1].search('a', 0.5), ['a'])
+        self.assertEqual(tries[1].search('', 0.5), [])
+
+    def test_min_prefix(self):
+        trie = PrunedLevenshteinTrie(MAX_LEN=10)
+        self.assertEqual(trie.min_prefix(1.0), 0)
+        self.assertEqual(trie.min_prefix(0.5), 2)
+        self.assertEqual(trie.min_prefix(0.2), 5)
+        self.assertEqual(trie.min_prefix(0.0), 10)
+
+    def test_grouping(self):
+        names = random_words(self.random, 500, alphabet='abcde _.')
+        hits = [FakeHit(name, str(i)) for i, name in enumerate(names)]
+        groupings = []
+        old_pruned_search = LevGrouping.PRUNED_SEARCH
+        try:
+            for pruned_search in (False, True):
+                LevGrouping.PRUNED_SEARCH = pruned_search
+                algorithm = LevGrouping()
+                # the hits arrive in two parts
+                groupslist = GroupsList('query', algorithm, hits[:200])
+                groupslist = GroupsList('query', algorithm, hits, groupslist)
+                groupings.append([[hit.infohash for hit in group] for group in groupslist.groups])
+        finally:
+            LevGrouping.PRUNED_SEARCH = old_pruned_search
+        self.assertEqual(groupings[0], groupings[1])
+        self.assert_(len(groupings[1]) < len(hits))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestPrunedLevenshteinTrie))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
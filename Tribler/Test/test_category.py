@@ -0,0 +1,117 @@
+# see LICENSE.txt for license information
+
+import os
+import unittest
+
+import Tribler
+import Tribler.Category.Category as CategoryModule
+from Tribler.Category.Category import Category
+from Tribler.Category.FamilyFilter import XXXFilter
+
+INSTALL_DIR = os.path.join(os.path.dirname(os.path.abspath(Tribler.__file__)), '..')
+
+class TestXXXFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.xxx_filter = XXXFilter(INSTALL_DIR)
+        self.xxx_filter.xxx_terms = set(["babe", "boob", "hot chick"])
+        self.xxx_filter.xxx_searchterms = set(["porn", "x+x"])
+        self.xxx_filter.xxx_words = self.xxx_filter.expandTerms(self.xxx_filter.xxx_terms)
+        self.xxx_filter.xxx_searchterms_regexp = self.xxx_filter.compileSearchTerms(self.xxx_filter.xxx_searchterms)
+
+    def test_terms(self):
+        for word in ("babe", "babees", "boob", "boobs", "boobes", "boobn", "Boobs", "hot chick"):
+            self.assert_(self.xxx_filter.isXXXTerm(word), word)
+        # a word ending with 'es' is only checked without the 'es'
+        for word in ("babes", "bab", "boo", "booby", "hot"):
+            self.assertFalse(self.xxx_filter.isXXXTerm(word), word)
+
+    def test_searchterms(self):
+        self.assert_(self.xxx_filter.foundXXXTerm("someporntitle"))
+        self.assert_(self.xxx_filter.foundXXXTerm("ax+xb"))
+        self.assertFalse(self.xxx_filter.foundXXXTerm("axxb"))
+
+        self.xxx_filter.xxx_searchterms_regexp = self.xxx_filter.compileSearchTerms(set())
+        self.assertFalse(self.xxx_filter.foundXXXTerm("someporntitle"))
+
+    def test_isXXX(self):
+        self.assert_(self.xxx_filter.isXXX("My.Hot.Chick.Video.avi"))
+        self.assert_(self.xxx_filter.isXXX("Boobs", False))
+        self.assert_(self.xxx_filter.isXXX("porn.avi"))
+        self.assertFalse(self.xxx_filter.isXXX("babes.avi"))
+
+        # audio files need three terms and are not searched for searchterms
+        self.assertFalse(self.xxx_filter.isXXX("boobs - babe.mp3"))
+        self.assertFalse(self.xxx_filter.isXXX("porn.mp3"))
+        self.assert_(self.xxx_filter.isXXX("boobs - babe - boob.mp3"))
+        self.assert_(self.xxx_filter.isXXX("boobs - babe.mp3", False))
+
+class TestCategory(unittest.TestCase):
+
+    def setUp(self):
+        self.category = Category.getInstance(INSTALL_DIR)
+
+    def classify(self, files_list, display_name = 'torrent'):
+        return self.category.calculateCategoryNonDict(files_list, display_name, '', None)
+
+    def test_suffix(self):
+        self.assertEqual(self.classify([("movie.AVI", 700.0)]), ['Video'])
+        self.assertEqual(self.classify([("clip.flv", 10.0)]), ['VideoClips'])
+        self.assertEqual(self.classify([("song.mp3", 5.0)] * 9 + [("cover.jpg", 0.1)]), ['Audio'])
+        self.assertEqual(self.classify([("readme.nfo", 0.1)]), ['other'])
+
+    def test_keywords(self):
+        self.assertEqual(self.classify([("a.nfo", 0.1)], "Some.Movie.XviD"), ['Video'])
+        self.assertEqual(self.classify([("some.movie.divx.part", 700.0)]), ['Video'])
+        # the keywords of Compressed contain dots, so only the suffixes match
+        self.assertEqual(self.classify([("archive.r01", 100.0)]), ['other'])
+
+    def test_judge(self):
+        video = [category for category in self.category.category_info if category['name'] == 'Video'][0]
+        self.assertEqual(self.category.judge(video, [("movie.avi", 700.0), ("a.nfo", 0.1)]), (True, 700.0 / (700.1 + 1e-19)))
+        self.assertEqual(self.category.judge(video, [("song.mp3", 5.0)], "Some DivX"), (True, 1.0))
+        self.assertEqual(self.category.judge(video, [("song.mp3", 5.0)]), (False, 0))
+
+    def test_batch(self):
+        torrents = [([("movie.avi", 700.0)], 'movie', '', None),
+                    ([("song.mp3", 5.0)], 'song', '', None),
+                    ([("movie.avi", 700.0)], 'movie', '', None),
+                    ([], 'Some.Movie.XviD', '', None)]
+        self.category.category_cache.clear()
+        categories = self.category.calculateCategoriesNonDict(torrents)
+        self.assertEqual(categories, [['Video'], ['Audio'], ['Video'], ['Video']])
+        self.assertEqual(categories, [self.classify(*torrent[:2]) for torrent in torrents])
+        self.assertEqual(len(self.category.category_cache), 3)
+
+        # the cached categories are not shared with the callers
+        categories[0].append('other')
+        self.assertEqual(self.classify([("movie.avi", 700.0)], 'movie'), ['Video'])
+
+        metainfo = {'info': {'name': 'song.mp3', 'length': 5 * 1024 * 1024}, 'announce': 'http://tracker/announce'}
+        self.assertEqual(self.category.calculateCategories([(metainfo, 'song')]), [self.category.calculateCategory(metainfo, 'song')])
+
+    def test_cache_size(self):
+        old_size = CategoryModule.CATEGORY_CACHE_SIZE
+        CategoryModule.CATEGORY_CACHE_SIZE = 2
+        try:
+            self.category.category_cache.clear()
+            self.classify([("a.avi", 700.0)], 'a')
+            self.classify([("b.avi", 700.0)], 'b')
+            self.classify([("a.avi", 700.0)], 'a')
+            self.classify([("c.avi", 700.0)], 'c')
+            # b was the least recently used
+            self.assertEqual([key[0] for key in self.category.category_cache], ['a', 'c'])
+        finally:
+            CategoryModule.CATEGORY_CACHE_SIZE = old_size
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestXXXFilter))
+    suite.addTest(unittest.makeSuite(TestCategory))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# see LICENSE.txt for license information
+
+import copy
+import unittest
+from threading import RLock
+
+import Tribler.Core.Libtorrent.LibtorrentDownloadImpl as LibtorrentDownloadImplModule
+from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import LibtorrentDownloadImpl
+from Tribler.Core.APIImplementation import LaunchManyCore
+from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany, DownloadStatesDelta
+from Tribler.Core.simpledefs import DLSTATUS_SEEDING
+
+class FakeStatus:
+    """ The fields of a libtorrent torrent_status that LibtorrentDownloadImpl reads """
+
+    def __init__(self):
+        self.state = 5 # seeding
+        self.paused = False
+        self.error = ''
+        self.total_wanted = 1024 * 1024
+        self.progress = 1.0
+        self.download_payload_rate = 0
+        self.upload_payload_rate = 0
+        self.all_time_upload = 0
+        self.all_time_download = 1024 * 1024
+        self.finished_time = 0
+        self.num_complete = 10
+        self.num_incomplete = 2
+        self.list_seeds = 0
+        self.list_peers = 0
+        self.num_peers = 0
+        self.num_seeds = 0
+        self.pieces = [True] * 4
+
+class FakeHandle:
+    """ A libtorrent torrent_handle, status() returns a copy as libtorrent does """
+
+    def __init__(self):
+        self.fake_status = FakeStatus()
+        self.nr_status_calls = 0
+
+    def status(self):
+        self.nr_status_calls += 1
+        return copy.copy(self.fake_status)
+
+    def is_valid(self):
+        return True
+
+    def get_peer_info(self):
+        return []
+
+class FakeAlert:
+    def __init__(self, handle):
+        self.handle = handle
+
+    def category(self):
+        return 0
+
+class FakeLibtorrentMgr:
+    @staticmethod
+    def getInstance():
+        return None
+
+class FakeTorrentDef:
+    def __init__(self, infohash):
+        self.infohash = infohash
+
+    def get_def_type(self):
+        return "torrent"
+
+    def get_infohash(self):
+        return self.infohash
+
+class FakeUserCallbackHandler:
+    """ Remembers the states passed to the usercallbacks instead of calling them """
+
+    def __init__(self):
+        self.states = []
+
+    def perform_getstate_usercallback(self, usercallback, data, returncallback, full=None):
+        self.states.append((data, full))
+
+class FakeSession:
+    def __init__(self):
+        self.uch = FakeUserCallbackHandler()
+
+def create_downloads(session, nr_downloads):
+    """ Seeding LibtorrentDownloadImpls with fake torrent handles """
+    old_mgr = LibtorrentDownloadImplModule.LibtorrentMgr
+    LibtorrentDownloadImplModule.LibtorrentMgr = FakeLibtorrentMgr
+    try:
+        downloads = []
+        for i in xrange(nr_downloads):
+            d = LibtorrentDownloadImpl(session, FakeTorrentDef("%020d" % i))
+            d.handle = FakeHandle()
+            d.process_alert(FakeAlert(d.handle), 'torrent_checked_alert')
+            downloads.append(d)
+        return downloads
+    finally:
+        LibtorrentDownloadImplModule.LibtorrentMgr = old_mgr
+
+def create_launchmany(session, downloads):
+    """ A TriblerLaunchMany with just enough state to report download states """
+    lm = TriblerLaunchMany.__new__(TriblerLaunchMany)
+    lm.sesslock = RLock()
+    lm.session = session
+    lm.downloads = dict((d.get_def().get_infohash(), d) for d in downloads)
+    return lm
+
+class TestDownloadStates(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession()
+        self.downloads = create_downloads(self.session, 3)
+        self.lm = create_launchmany(self.session, self.downloads)
+
+    def get_states(self, delta):
+        self.lm.network_set_download_states_callback(None, False, delta)
+        dslist, full = self.session.uch.states.pop()
+        return sorted(ds.get_download() for ds in dslist), full
+
+    def test_stats_alert(self):
+        d = self.downloads[0]
+        version = d.state_version
+
+        d.process_alert(FakeAlert(d.handle), 'stats_alert')
+        self.assertEqual(d.state_version, version)
+        self.assertEqual(d.get_status(), DLSTATUS_SEEDING)
+
+        d.handle.fake_status.upload_payload_rate = 1000
+        d.handle.fake_status.all_time_upload = 1000
+        d.process_alert(FakeAlert(d.handle), 'stats_alert')
+        self.assertEqual(d.state_version, version + 1)
+
+        d.process_alert(FakeAlert(d.handle), 'tracker_reply_alert')
+        self.assertEqual(d.state_version, version + 2)
+
+    def test_full(self):
+        self.lm.network_set_download_states_callback(None, False)
+        dslist, full = self.session.uch.states.pop()
+        self.assertEqual(len(dslist), 3)
+        self.assertEqual(full, None)
+
+    def test_incremental(self):
+        delta = DownloadStatesDelta()
+        self.assertEqual(self.get_states(delta), (sorted(self.downloads), True))
+        self.assertEqual(self.get_states(delta), ([], False))
+
+        d = self.downloads[1]
+        d.handle.fake_status.upload_payload_rate = 1000
+        d.process_alert(FakeAlert(d.handle), 'stats_alert')
+        nr_status_calls = [download.handle.nr_status_calls for download in self.downloads]
+        self.assertEqual(self.get_states(delta), ([d], False))
+
+        # the handles of unchanged downloads are not asked for their status
+        for download, nr_calls in zip(self.downloads, nr_status_calls):
+            self.assertEqual(download.handle.nr_status_calls, nr_calls + (download is d))
+
+        # the periodic full snapshot includes all downloads
+        delta.last_full -= LaunchManyCore.DOWNLOAD_STATES_FULL_INTERVAL
+        self.assertEqual(self.get_states(delta), (sorted(self.downloads), True))
+
+    def test_peerlist(self):
+        delta = DownloadStatesDelta()
+        self.get_states(delta)
+        self.lm.network_set_download_states_callback(None, True, delta)
+        dslist, full = self.session.uch.states.pop()
+        self.assertEqual((len(dslist), full), (3, True))
+
+    def test_removed(self):
+        delta = DownloadStatesDelta()
+        self.get_states(delta)
+        del self.lm.downloads[self.downloads[0].get_def().get_infohash()]
+
+        # the removal is reported by a full snapshot right away
+        self.assertEqual(self.get_states(delta), (sorted(self.downloads[1:]), True))
+        self.assertEqual(sorted(delta.versions), sorted(self.downloads[1:]))
+        self.assertEqual(self.get_states(delta), ([], False))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestDownloadStates))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# see LICENSE.txt for license information
+
+import socket
+import unittest
+
+from Tribler.Utilities.FastI2I import FastI2IConnection, FRAMING_CMD, TUNNEL_FRAME, TUNNEL_HEADER
+
+class TestFastI2I(unittest.TestCase):
+
+    def setUp(self):
+        # FastI2IConnection connects on creation, the data is fed by the test
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+
+        self.lines = []
+        self.packets = []
+        self.connection = FastI2IConnection(self.server.getsockname()[1], self.readlinecallback, lambda port: None, self.tunnelcallback, True)
+        self.swift, _ = self.server.accept()
+        self.assertEqual(self.recv(len(FRAMING_CMD) + 2), FRAMING_CMD + "\r\n")
+
+    def tearDown(self):
+        self.swift.close()
+        self.connection.join()
+        self.server.close()
+
+    def recv(self, length):
+        data = ""
+        while len(data) < length:
+            data += self.swift.recv(length - len(data))
+        return data
+
+    def readlinecallback(self, ic, cmd):
+        words = cmd.split()
+        if words[0] == "TUNNELRECV":
+            length = int(words[2])
+            if ic.buffered() < length:
+                return length - ic.buffered()
+            self.packets.append((words[1], ic.read(length)))
+        else:
+            self.lines.append(cmd)
+
+    def tunnelcallback(self, ic, session, address, data):
+        self.packets.append(("%s:%d/%s" % (address[0], address[1], session.encode("HEX")), data))
+
+    def feed(self, stream, size):
+        for offset in xrange(0, len(stream), size):
+            self.connection.data_came_in(stream[offset:offset+size])
+
+    def test_lines(self):
+        stream = "INFO a\r\nTUNNELRECV 1.2.3.4:5/ff 6\r\n\r\nabcdINFO b\r\nTUNNELRECV 1.2.3.4:5/ff 2\r\nxy"
+        for size in (1, 3, len(stream)):
+            self.lines = []
+            self.packets = []
+            self.feed(stream, size)
+            self.assertEqual(self.lines, ["INFO a", "INFO b"])
+            self.assertEqual(self.packets, [("1.2.3.4:5/ff", "\r\nabcd"), ("1.2.3.4:5/ff", "xy")])
+            self.assertEqual(self.connection.buffered(), 0)
+
+    def test_frames(self):
+        self.connection.data_came_in(FRAMING_CMD + "\r\n")
+        self.assert_(self.connection.framing)
+
+        frame = TUNNEL_HEADER.pack(TUNNEL_FRAME, 5, socket.inet_aton("1.2.3.4"), 5, 1) + "\xff" + "ab\r\nc"
+        stream = frame + "INFO a\r\n" + frame
+        for size in (1, 7, len(stream)):
+            self.lines = []
+            self.packets = []
+            self.feed(stream, size)
+            self.assertEqual(self.lines, ["INFO a"])
+            self.assertEqual(self.packets, [("1.2.3.4:5/ff", "ab\r\nc")] * 2)
+
+        self.connection.write_tunnel("\xff", ("1.2.3.4", 5), "ab\r\nc")
+        self.assertEqual(self.recv(len(frame)), frame)
+
+    def test_frame_byte_without_framing(self):
+        # framing is not agreed yet, the frame byte starts a line
+        self.connection.tunnelcallback = None
+        self.feed("\x01INFO a\r\nTUNNELRECV 1.2.3.4:5/ff 2\r\n\x01b", 1)
+        self.assertEqual(self.lines, ["\x01INFO a"])
+        self.assertEqual(self.packets, [("1.2.3.4:5/ff", "\x01b")])
+        self.assertEqual(self.connection.buffered(), 0)
+
+    def test_refused(self):
+        self.connection.data_came_in("ERROR unknown command\r\n")
+        self.assertFalse(self.connection.framing)
+        self.assertEqual(self.lines, [])
+
+        self.connection.write_tunnel("\xff", ("1.2.3.4", 5), "ab")
+        expected = "TUNNELSEND 1.2.3.4:5/ff 2\r\nab"
+        self.assertEqual(self.recv(len(expected)), expected)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestFastI2I))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# see LICENSE.txt for license information
+
+import unittest
+from threading import Event, RLock
+from time import time
+
+import Tribler.Core.Libtorrent.LibtorrentMgr as LibtorrentMgrModule
+from Tribler.Core.Libtorrent.LibtorrentMgr import LibtorrentMgr
+
+class FakeHandle:
+    def __init__(self, infohash, valid = True):
+        self.infohash = infohash
+        self.valid = valid
+
+    def is_valid(self):
+        return self.valid
+
+    def info_hash(self):
+        return self.infohash
+
+# Named as the libtorrent alert classes, of which the name is the alert type
+class stats_alert:
+    def __init__(self, handle):
+        self.handle = handle
+
+class torrent_checked_alert(stats_alert):
+    pass
+
+class listen_succeeded_alert:
+    pass
+
+class FakeLtSession:
+    def __init__(self, alerts):
+        self.alerts = alerts
+        self.available = Event()
+        if alerts:
+            self.available.set()
+
+    def pop_alert(self):
+        if self.alerts:
+            return self.alerts.pop(0)
+        self.available.clear()
+        return None
+
+class FakeLtSessionPopAlerts(FakeLtSession):
+    def pop_alerts(self):
+        alerts, self.alerts = self.alerts, []
+        self.available.clear()
+        return alerts
+
+class FakeLtSessionWaitForAlert(FakeLtSession):
+    def wait_for_alert(self, max_wait_ms):
+        self.available.wait(max_wait_ms / 1000.0)
+        return self.alerts[0] if self.alerts else None
+
+    def post_alert(self, alert):
+        self.alerts.append(alert)
+        self.available.set()
+
+class FakeRawServer:
+    def __init__(self):
+        self.tasks = []
+        self.added = Event()
+
+    def add_task(self, func, delay = 0, id = None):
+        self.tasks.append((func, delay))
+        self.added.set()
+
+class FakeLaunchMany:
+    def __init__(self):
+        self.rawserver = FakeRawServer()
+
+class FakeSession:
+    def __init__(self):
+        self.lm = FakeLaunchMany()
+
+class FakeDownload:
+    def __init__(self):
+        self.alerts = []
+
+    def process_alert(self, alert, alert_type):
+        self.alerts.append((alert, alert_type))
+
+class FakeLibtorrentMgr(LibtorrentMgr):
+    """ A LibtorrentMgr without a libtorrent session, see LibtorrentMgr.__init__ """
+
+    def __init__(self, ltsession, torrents):
+        self.trsession = FakeSession()
+        self.ltsession = ltsession
+        self.torlock = RLock()
+        self.torrents = torrents
+        self.alert_handlers = {}
+        self.alert_stats = {}
+        self.alert_batches = 0
+        self.alert_thread = None
+        self.alert_thread_done = False
+        self.alerts_processed = Event()
+
+class TestLibtorrentAlerts(unittest.TestCase):
+
+    def setUp(self):
+        self.downloads = {"a": FakeDownload(), "b": FakeDownload()}
+        self.alerts = [stats_alert(FakeHandle("a")),
+                       listen_succeeded_alert(),
+                       torrent_checked_alert(FakeHandle("b")),
+                       stats_alert(FakeHandle("b")),
+                       stats_alert(FakeHandle("c")),
+                       stats_alert(FakeHandle("a", False))]
+
+    def check_dispatched(self, mgr):
+        self.assertEqual(self.downloads["a"].alerts, [(self.alerts[0], 'stats_alert')])
+        self.assertEqual(self.downloads["b"].alerts, [(self.alerts[2], 'torrent_checked_alert'), (self.alerts[3], 'stats_alert')])
+        self.assertEqual(mgr.alert_handlers[stats_alert], ('stats_alert', mgr.process_torrent_alert))
+        self.assertEqual(mgr.alert_handlers[listen_succeeded_alert], ('listen_succeeded_alert', mgr.process_session_alert))
+
+        stats = mgr.get_alert_stats()
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['alerts_per_batch'], 6.0)
+        self.assertEqual(dict((alert_type, type_stats['count']) for alert_type, type_stats in stats['types'].iteritems()),
+                         {'stats_alert': 4, 'torrent_checked_alert': 1, 'listen_succeeded_alert': 1})
+
+    def test_pop_alert(self):
+        mgr = FakeLibtorrentMgr(FakeLtSession(list(self.alerts)), self.downloads)
+        mgr.process_alerts()
+        self.check_dispatched(mgr)
+        self.assertEqual(mgr.trsession.lm.rawserver.tasks, [(mgr.process_alerts, LibtorrentMgrModule.ALERT_POLL_INTERVAL)])
+
+        # no alerts, no batch
+        mgr.process_alerts()
+        self.assertEqual(mgr.get_alert_stats()['batches'], 1)
+
+    def test_pop_alerts(self):
+        mgr = FakeLibtorrentMgr(FakeLtSessionPopAlerts(list(self.alerts)), self.downloads)
+        mgr.process_alerts()
+        self.check_dispatched(mgr)
+
+    def test_wakeup(self):
+        ltsession = FakeLtSessionWaitForAlert([])
+        mgr = FakeLibtorrentMgr(ltsession, self.downloads)
+        rawserver = mgr.trsession.lm.rawserver
+        mgr.alert_thread = LibtorrentMgrModule.threading.Thread(target=mgr.alert_thread_wait_for_alerts)
+        mgr.alert_thread.setDaemon(True)
+        mgr.alert_thread.start()
+        try:
+            start = time()
+            ltsession.post_alert(self.alerts[0])
+            rawserver.added.wait(5)
+            self.assert_(time() - start < 0.5)
+            self.assertEqual(rawserver.tasks, [(mgr.process_alerts, 0)])
+
+            # the network thread handles the alerts, after which the alert thread waits again
+            rawserver.added.clear()
+            func, _ = rawserver.tasks.pop()
+            func()
+            self.assertEqual(self.downloads["a"].alerts, [(self.alerts[0], 'stats_alert')])
+            self.assertEqual(rawserver.tasks, [])
+
+            ltsession.post_alert(self.alerts[3])
+            rawserver.added.wait(5)
+            self.assertEqual(rawserver.tasks, [(mgr.process_alerts, 0)])
+        finally:
+            mgr.alert_thread_done = True
+            mgr.alerts_processed.set()
+            ltsession.available.set()
+            mgr.alert_thread.join()
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestLibtorrentAlerts))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# see LICENSE.txt for license information
+
+import os
+import shutil
+import tempfile
+import unittest
+from copy import deepcopy
+from random import Random
+from threading import Event
+
+from Tribler.Core.APIImplementation import maketorrent
+from Tribler.Core.defaults import tdefdefaults
+
+class TestMakeInfo(unittest.TestCase):
+
+    def setUp(self):
+        self.old_workers, self.old_batch_size = maketorrent.HASH_WORKERS, maketorrent.HASH_BATCH_SIZE
+        maketorrent.HASH_BATCH_SIZE = 3 * 1000
+
+        self.dirname = tempfile.mkdtemp()
+        random = Random(42)
+        # the pieces span several files, one of which is empty
+        self.input = deepcopy(tdefdefaults)
+        self.input.update({'encoding': 'utf-8', 'name': 'content', 'files': [], 'piece length': 1000,
+                           'makehash_md5': 1, 'makehash_crc32': 1, 'makehash_sha1': 1})
+        for i, size in enumerate((2500, 0, 10, 4000, 7777)):
+            filename = os.path.join(self.dirname, 'file%d' % i)
+            f = open(filename, 'wb')
+            f.write(''.join(chr(random.randrange(256)) for _ in xrange(size)))
+            f.close()
+            self.input['files'].append({'inpath': filename, 'outpath': os.path.join('content', 'file%d' % i), 'playtime': None, 'length': size})
+
+    def tearDown(self):
+        maketorrent.HASH_WORKERS, maketorrent.HASH_BATCH_SIZE = self.old_workers, self.old_batch_size
+        shutil.rmtree(self.dirname)
+
+    def makeinfo(self, workers, userabortflag=None, userprogresscallback=None):
+        maketorrent.HASH_WORKERS = workers
+        return maketorrent.makeinfo(self.input, userabortflag, userprogresscallback)
+
+    def test_parallel(self):
+        progress = []
+        (info, piece_length) = self.makeinfo(1)
+        self.assertEqual(len(info['pieces']), 20 * 15)
+        self.assertEqual(info['files'][2]['crc32'], "%08X" % maketorrent.zlib.crc32(open(self.input['files'][2]['inpath'], 'rb').read()))
+
+        self.assertEqual(self.makeinfo(4, userprogresscallback=progress.append), (info, piece_length))
+        # a progress update per task of three pieces
+        self.assertEqual(len(progress), 5)
+        self.assertEqual(progress[-1], 1.0)
+
+        self.input['piece length'] = 4096
+        self.input['makehash_md5'] = self.input['makehash_crc32'] = self.input['makehash_sha1'] = 0
+        (info, piece_length) = self.makeinfo(1)
+        self.assertEqual(self.makeinfo(4), (info, piece_length))
+        self.assertFalse('md5sum' in info['files'][0])
+
+    def test_abort(self):
+        userabortflag = Event()
+        userabortflag.set()
+        self.assertEqual(self.makeinfo(4, userabortflag), (None, None))
+        self.assertEqual(self.makeinfo(1, userabortflag), (None, None))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestMakeInfo))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# see LICENSE.txt for license information
+
+import unittest
+from os import urandom
+from threading import Event
+from collections import OrderedDict
+
+from Crypto.Util.number import bytes_to_long
+
+from Tribler.community.privatesearch import community as privatesearch
+from Tribler.community.privatesearch.community import SearchCommunity, Das4DBStub
+from Tribler.community.privatesearch.rsa import rsa_init, rsa_encrypt_many, rsa_decrypt_many
+from Tribler.community.privatesearch.pallier import pallier_init, pallier_encrypt, pallier_decrypt, pallier_encrypt_many, pallier_decrypt_many
+from Tribler.community.privatesearch.cryptopool import CryptoPool, JOBS
+
+class FakePayload:
+    def __init__(self, key_n, preference_list):
+        self.key_n = key_n
+        self.preference_list = preference_list
+
+class FakeMessage:
+    def __init__(self, payload, candidate=None):
+        self.payload = payload
+        self.candidate = candidate
+
+class FakeResponsePayload:
+    def __init__(self, preference_list, his_preference_list):
+        self.preference_list = preference_list
+        self.his_preference_list = his_preference_list
+
+class FakeCryptoPool:
+    """ Runs the jobs of a CryptoPool immediately """
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, job, key, args, callback, callback_args=()):
+        self.jobs.append(job)
+        callback(JOBS[job](key, *args), 0.0, *callback_args)
+
+def random_infohash():
+    # no leading zero byte, long_to_bytes would strip it
+    return chr(1 + ord(urandom(1)) % 255) + urandom(19)
+
+def create_community(preferences, key, max_prefs=None):
+    # only the state used by process_rsa_simirequest and compute_rsa_overlap
+    community = SearchCommunity.__new__(SearchCommunity)
+    community.encryption = True
+    community.key = key
+    community.max_prefs = community.max_h_prefs = max_prefs or len(preferences)
+    community.my_compatible_preference_cache = [None, None, OrderedDict()]
+    community.crypto_pool = None
+    community.receive_time_encryption = 0.0
+    community.create_time_decryption = 0.0
+
+    community._mypref_db = Das4DBStub(None)
+    community._mypref_db.myPreferences.update(preferences)
+    return community
+
+class TestCompatiblePreferenceCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.requester_key = rsa_init()
+        cls.responder_key = rsa_init()
+
+    def setUp(self):
+        self.preferences = [random_infohash() for _ in xrange(20)]
+        self.requester = create_community(self.preferences[:10], self.requester_key)
+        self.responder = create_community(self.preferences[5:], self.responder_key, max_prefs=10)
+        self.preference_list = rsa_encrypt_many(self.requester_key, [bytes_to_long(preference) for preference in self.preferences[:10]])
+
+    def request(self, key_n=None):
+        message = FakeMessage(FakePayload(key_n or self.requester_key.n, self.preference_list[:]))
+        return self.responder.process_rsa_simirequest([message], send_messages=False)
+
+    def test_reuse(self):
+        hisList, myList = self.request()
+        peer_key_cache = self.responder.my_compatible_preference_cache[2]
+        compatible_key, cached_myList = peer_key_cache[self.requester_key.n]
+        self.assertEqual(sorted(myList), sorted(cached_myList))
+
+        # the same compatible key and subset are used for the second request
+        hisList2, myList2 = self.request()
+        self.assert_(self.responder.my_compatible_preference_cache[2] is peer_key_cache)
+        self.assert_(peer_key_cache[self.requester_key.n][0] is compatible_key)
+        self.assertEqual(sorted(hisList2), sorted(hisList))
+        self.assertEqual(sorted(myList2), sorted(myList))
+
+        # the responder shares preferences[5:10] with the requester, the subset of 10 out
+        # of 15 preferences is sampled once, so the overlap does not change
+        overlap = self.requester.compute_rsa_overlap(hisList, myList)
+        self.assertEqual(self.requester.compute_rsa_overlap(hisList2, myList2), overlap)
+        self.assert_(0 <= overlap <= 5)
+
+    def test_invalidate(self):
+        self.request()
+        subset = self.responder.my_compatible_preference_cache[1]
+
+        self.responder._mypref_db.myPreferences.add(self.preferences[0])
+        self.request()
+        self.assert_(self.preferences[0] in self.responder.my_compatible_preference_cache[0])
+        self.assert_(self.responder.my_compatible_preference_cache[1] is not subset)
+        self.assertEqual(self.responder.my_compatible_preference_cache[2].keys(), [self.requester_key.n])
+
+    def test_bounded(self):
+        old_max_peer_key_cache = privatesearch.MAX_PEER_KEY_CACHE
+        privatesearch.MAX_PEER_KEY_CACHE = 3
+        try:
+            peer_keys = [self.requester_key.n + 2 * i for i in xrange(5)]
+            for key_n in peer_keys:
+                self.request(key_n)
+            self.assertEqual(self.responder.my_compatible_preference_cache[2].keys(), peer_keys[2:])
+
+            # a request moves the peer key to the end, peer_keys[3] is evicted
+            self.request(peer_keys[2])
+            self.request(peer_keys[0])
+            self.assertEqual(self.responder.my_compatible_preference_cache[2].keys(), [peer_keys[4], peer_keys[2], peer_keys[0]])
+        finally:
+            privatesearch.MAX_PEER_KEY_CACHE = old_max_peer_key_cache
+
+class TestCryptoPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.key = rsa_init()
+        cls.pallier_key = pallier_init(cls.key)
+
+    def setUp(self):
+        self.pool = CryptoPool(1, self.register)
+        self.results = []
+        self.done = Event()
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def register(self, callback, args=()):
+        # the result of a job is registered from the result thread of the pool
+        callback(*args)
+
+    def on_result(self, result, took, tag):
+        self.results.append((tag, result, took))
+        self.done.set()
+
+    def run_job(self, job, key, args):
+        self.done.clear()
+        self.pool.submit(job, key, args, self.on_result, ("tag",))
+        self.assert_(self.done.wait(60), "timeout")
+        return self.results.pop()
+
+    def test_many(self):
+        elements = [1, 0, 1, 1]
+        ciphers = pallier_encrypt_many(self.pallier_key, elements)
+        self.assertEqual(pallier_decrypt_many(self.pallier_key, ciphers), elements)
+        self.assertEqual([pallier_decrypt(self.pallier_key, cipher) for cipher in ciphers], elements)
+        self.assertEqual(pallier_decrypt(self.pallier_key, pallier_encrypt(self.pallier_key, 1)), 1)
+        self.assertEqual(rsa_decrypt_many(self.key, rsa_encrypt_many(self.key, [5L, 7L])), [5L, 7L])
+
+    def test_jobs(self):
+        tag, ciphers, took = self.run_job(u"pallier-encrypt", self.pallier_key, ([1, 0, 1],))
+        self.assertEqual(tag, "tag")
+        self.assert_(took >= 0.0)
+        self.assertEqual(pallier_decrypt_many(self.pallier_key, ciphers), [1, 0, 1])
+
+        _, ciphers, _ = self.run_job(u"rsa-encrypt", self.key, ([3L, 4L],))
+        self.assertEqual(ciphers, rsa_encrypt_many(self.key, [3L, 4L]))
+        _, values, _ = self.run_job(u"rsa-decrypt", self.key, (ciphers,))
+        self.assertEqual(values, [3L, 4L])
+
+        statistics = self.pool.get_statistics()
+        self.assertEqual((statistics["jobs"], statistics["elements"], statistics["pending"], statistics["failed"]), (3, 7, 0, 0))
+
+    def test_failed_job(self):
+        # a failing job is counted, its callback is not called
+        self.pool.submit(u"pallier-encrypt", self.pallier_key, ([2],), self.on_result, ("failed",))
+        self.run_job(u"rsa-encrypt", self.key, ([3L],))
+        statistics = self.pool.get_statistics()
+        self.assertEqual((statistics["jobs"], statistics["pending"], statistics["failed"]), (2, 0, 1))
+        self.assertEqual(self.results, [])
+
+class TestAsyncSimilarity(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.requester_key = rsa_init()
+        cls.responder_key = rsa_init()
+
+    def setUp(self):
+        self.preferences = [random_infohash() for _ in xrange(20)]
+        self.requester = create_community(self.preferences[:10], self.requester_key)
+        self.responder = create_community(self.preferences[5:], self.responder_key)
+        self.preference_list = rsa_encrypt_many(self.requester_key, [bytes_to_long(preference) for preference in self.preferences[:10]])
+
+        for community in (self.requester, self.responder):
+            community.crypto_pool = FakeCryptoPool()
+            community.responses = []
+            community.taste_buddies = []
+            community._send_encrypted_response = lambda message, hisList, myList, community=community: community.responses.append((message, hisList, myList))
+            community.add_taste_buddies = community.taste_buddies.extend
+
+    def request(self, key_n=None):
+        message = FakeMessage(FakePayload(key_n or self.requester_key.n, self.preference_list[:]))
+        self.responder.process_rsa_simirequest([message])
+        return self.responder.responses[-1]
+
+    def test_simirequest(self):
+        _, hisList, myList = self.request()
+        self.assertEqual(self.responder.crypto_pool.jobs, [u"rsa-similarity-response"])
+        self.assertEqual(self.requester.compute_rsa_overlap(hisList, myList), 5)
+
+        # the encrypted preferences are cached, the worker only encrypts his list
+        compatible_key, cached_myList = self.responder.my_compatible_preference_cache[2][self.requester_key.n]
+        self.assertEqual(sorted(myList), sorted(cached_myList))
+        _, hisList2, myList2 = self.request()
+        self.assertEqual(sorted(myList2), sorted(myList))
+        self.assertEqual(sorted(hisList2), sorted(hisList))
+
+    def test_simirequest_bounded(self):
+        old_max_peer_key_cache = privatesearch.MAX_PEER_KEY_CACHE
+        privatesearch.MAX_PEER_KEY_CACHE = 3
+        try:
+            peer_keys = [self.requester_key.n + 2 * i for i in xrange(5)]
+            for key_n in peer_keys:
+                self.request(key_n)
+            self.request(peer_keys[2])
+            self.assertEqual(self.responder.my_compatible_preference_cache[2].keys(), [peer_keys[3], peer_keys[4], peer_keys[2]])
+        finally:
+            privatesearch.MAX_PEER_KEY_CACHE = old_max_peer_key_cache
+
+    def test_encr_response(self):
+        message, hisList, myList = self.request()
+        candidate = object()
+        self.requester.on_encr_response([FakeMessage(FakeResponsePayload(hisList, myList), candidate)])
+        self.assertEqual(self.requester.crypto_pool.jobs, [u"rsa-decrypt-hash"])
+        self.assertEqual([(overlap, candidate_) for overlap, _, candidate_ in self.requester.taste_buddies], [(5, candidate)])
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestCompatiblePreferenceCache))
+    suite.addTest(unittest.makeSuite(TestCryptoPool))
+    suite.addTest(unittest.makeSuite(TestAsyncSimilarity))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
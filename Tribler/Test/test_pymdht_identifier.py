@@ -0,0 +1,68 @@
+# see LICENSE.txt for license information
+
+import unittest
+
+from Tribler.Core.DecentralizedTracking.pymdht.core import identifier
+from Tribler.Core.DecentralizedTracking.pymdht.core.identifier import Id, RandomId
+from Tribler.Core.DecentralizedTracking.pymdht.core.node import Node
+from Tribler.Core.DecentralizedTracking.pymdht.core.routing_table import RoutingTable, NUM_SBUCKETS
+
+class TestId(unittest.TestCase):
+
+    def test_log(self):
+        self.assertEqual(Id(0).log, -1)
+        self.assertEqual(Id(1).log, 0)
+        self.assertEqual(identifier.MAX_ID.log, identifier.ID_SIZE_BITS - 1)
+        for _ in xrange(100):
+            id1, id2 = RandomId(), RandomId()
+            self.assertEqual(id1.log_distance(id2), len(bin(id1.long ^ id2.long)) - 3)
+            self.assertEqual(id1.log_distance(id2), id1.distance(id2).log)
+        self.assertEqual(id1.log_distance(Id(id1.bin_id)), -1)
+
+    def test_order_closest(self):
+        ids = [Id(i) for i in (6, 1, 5, 3, 0, 7)]
+        # ids at the same log distance keep their order
+        self.assertEqual([id_.long for id_ in Id(0).DD_order_closest(ids)], [0, 1, 3, 6, 5, 7])
+        self.assertEqual([id_.long for id_ in Id(0).closest(ids, 3)], [0, 1, 3])
+        self.assertEqual([id_.long for id_ in Id(4).closest(ids, 3)], [5, 6, 7])
+
+        target = RandomId()
+        ids = [RandomId() for _ in xrange(100)]
+        self.assertEqual(target.closest(ids, 8), sorted(ids, key=lambda id_: id_.long ^ target.long)[:8])
+        nodes = [Node(('127.0.0.1', 7000 + i), id_) for i, id_ in enumerate(ids)]
+        self.assertEqual([node.id for node in target.closest(nodes, 8, key=lambda node: node.id)], target.closest(ids, 8))
+
+class TestRoutingTable(unittest.TestCase):
+
+    def setUp(self):
+        self.my_node = Node(('127.0.0.1', 7000), Id(0))
+        self.table = RoutingTable(self.my_node, [16] * NUM_SBUCKETS)
+
+    def add(self, id_long):
+        node = Node(('127.0.0.%d' % (id_long % 256), 7000), Id(id_long))
+        rnode = node.get_rnode(node.log_distance(self.my_node))
+        self.table.get_sbucket(rnode.log_distance_to_me).main.add(rnode)
+        return rnode
+
+    def test_closest_rnodes(self):
+        # bucket 100 holds nodes in [2^100, 2^101)
+        rnodes = [self.add((1 << 100) + i) for i in (9, 2, 7, 1, 4)]
+        rnode_far = self.add(1 << 120)
+
+        self.assertEqual(self.table.get_closest_rnodes(100, 3, True), rnodes[:3])
+        target = Id((1 << 100) + 3)
+        self.assertEqual(self.table.get_closest_rnodes(100, 3, True, target), [rnodes[1], rnodes[3], rnodes[2]])
+        # the farther buckets fill up the result
+        self.assertEqual(self.table.get_closest_rnodes(100, 7, False, target), [rnodes[1], rnodes[3], rnodes[2], rnodes[4], rnodes[0], self.my_node, rnode_far])
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestId))
+    suite.addTest(unittest.makeSuite(TestRoutingTable))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
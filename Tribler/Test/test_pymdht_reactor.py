@@ -0,0 +1,88 @@
+# see LICENSE.txt for license information
+
+import socket
+import unittest
+
+from Tribler.Core.DecentralizedTracking.pymdht.core import minitwisted
+from Tribler.Core.DecentralizedTracking.pymdht.core.message import Datagram
+
+class TestThreadedReactor(unittest.TestCase):
+
+    def setUp(self):
+        self.main_loop_calls = 0
+        self.received = []
+        self.reactor = minitwisted.ThreadedReactor(self.main_loop, 0, self.on_datagram_received, task_interval=0.01, floodbarrier_active=False)
+        self.addr = ('127.0.0.1', self.reactor.s.getsockname()[1])
+
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client.bind(('127.0.0.1', 0))
+        self.client.settimeout(1)
+
+    def tearDown(self):
+        self.client.close()
+        self.reactor.s.close()
+
+    def main_loop(self):
+        self.main_loop_calls += 1
+        return 0, []
+
+    def on_datagram_received(self, datagram):
+        self.received.append(datagram.data)
+        # every query is answered with the same response
+        return 0, [Datagram('response', datagram.addr)]
+
+    def send_queries(self, nr_queries):
+        for i in xrange(nr_queries):
+            self.client.sendto('query %d' % i, self.addr)
+
+    def test_drain(self):
+        self.send_queries(10)
+        self.reactor.run_one_step()
+        self.assertEqual(self.received, ['query %d' % i for i in xrange(10)])
+
+        # the identical responses of a step are sent once
+        self.assertEqual(self.client.recvfrom(100), ('response', self.addr))
+        self.assertRaises(socket.timeout, self.client.recvfrom, 100)
+
+        stats = self.reactor.get_stats()
+        self.assertEqual((stats['packets_received'], stats['packets_sent'], stats['max_recv_batch']), (10, 1, 10))
+
+    def test_batch_size(self):
+        old_batch_size = minitwisted.RECV_BATCH_SIZE
+        minitwisted.RECV_BATCH_SIZE = 4
+        try:
+            self.send_queries(10)
+            self.reactor.run_one_step()
+            self.assertEqual(len(self.received), 4)
+            self.assertEqual(self.main_loop_calls, 1)
+
+            self.reactor.run_one_step()
+            self.reactor.run_one_step()
+            self.assertEqual(len(self.received), 10)
+            self.assertEqual(self.main_loop_calls, 3)
+        finally:
+            minitwisted.RECV_BATCH_SIZE = old_batch_size
+
+    def test_call_asap(self):
+        calls = []
+        for i in xrange(5):
+            self.reactor.call_asap(lambda i: calls.append(i) or [Datagram('call %d' % i, self.client.getsockname())], i)
+        self.assertEqual(self.reactor.get_stats()['call_asap_depth'], 5)
+
+        self.reactor.run_one_step()
+        self.assertEqual(calls, range(5))
+        self.assertEqual([self.client.recvfrom(100)[0] for _ in xrange(5)], ['call %d' % i for i in xrange(5)])
+
+        stats = self.reactor.get_stats()
+        self.assertEqual((stats['call_asap_depth'], stats['max_call_asap_depth']), (0, 5))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestThreadedReactor))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
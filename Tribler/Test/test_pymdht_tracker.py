@@ -0,0 +1,93 @@
+# see LICENSE.txt for license information
+
+import unittest
+
+from Tribler.Core.DecentralizedTracking.pymdht.core import ptime as time
+from Tribler.Core.DecentralizedTracking.pymdht.core import tracker, cache
+
+class TestTracker(unittest.TestCase):
+
+    def setUp(self):
+        time.mock_mode()
+        self.tracker = tracker.Tracker(validity_period=10, cleanup_counter=2)
+
+    def tearDown(self):
+        time.normal_mode()
+
+    def test_put(self):
+        self.tracker.put('k1', ('1.1.1.1', 1))
+        self.tracker.put('k1', ('2.2.2.2', 2))
+        self.tracker.put('k1', ('1.1.1.1', 1))
+        self.tracker.put('k2', ('3.3.3.3', 3))
+        # a peer that is put again moves to the end
+        self.assertEqual(self.tracker.get('k1'), [('2.2.2.2', 2), ('1.1.1.1', 1)])
+        self.assertEqual(self.tracker.get('k2'), [('3.3.3.3', 3)])
+        self.assertEqual(self.tracker.get('k3'), [])
+        self.assertEqual((self.tracker.num_keys, self.tracker.num_peers), (2, 3))
+
+    def test_max_peers(self):
+        for i in xrange(tracker.MAX_PEERS + 10):
+            self.tracker.put('k1', ('1.1.1.1', i))
+        self.assertEqual(self.tracker.get('k1'), [('1.1.1.1', i) for i in xrange(10, tracker.MAX_PEERS + 10)])
+
+    def test_expiry(self):
+        self.tracker.put('k1', ('1.1.1.1', 1))
+        time.sleep(6)
+        self.tracker.put('k1', ('2.2.2.2', 2))
+        self.tracker.put('k2', ('3.3.3.3', 3))
+        time.sleep(6)
+        self.assertEqual(self.tracker.get('k1'), [('2.2.2.2', 2)])
+
+        time.sleep(6)
+        self.assertEqual(self.tracker.get('k2'), [])
+        self.assertEqual((self.tracker.num_keys, self.tracker.num_peers), (0, 0))
+
+    def test_expiry_on_put(self):
+        self.tracker.put('k1', ('1.1.1.1', 1))
+        time.sleep(11)
+        self.tracker.put('k2', ('3.3.3.3', 3))
+        self.assertEqual((self.tracker.num_keys, self.tracker.num_peers), (1, 1))
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        time.mock_mode()
+        self.cache = cache.Cache(10, max_cached_lookups=2)
+
+    def tearDown(self):
+        time.normal_mode()
+
+    def put(self, info_hash, peers):
+        cached_lookup = cache.CachedLookup(info_hash)
+        cached_lookup.add_peers(peers)
+        self.cache.put_cached_lookup(cached_lookup)
+
+    def test_get(self):
+        self.put('a', [('1.1.1.1', 1)])
+        self.assertEqual(self.cache.get_cached_lookup('a'), (set([('1.1.1.1', 1)]), cache.CACHING_NODE))
+        self.assertEqual(self.cache.get_cached_lookup('b'), None)
+
+        time.sleep(11)
+        self.assertEqual(self.cache.get_cached_lookup('a'), None)
+        self.put('b', [])
+        self.assertEqual(list(self.cache.cached_lookups), ['b'])
+
+    def test_bounded(self):
+        self.put('a', [('1.1.1.1', 1)])
+        self.put('b', [('2.2.2.2', 2)])
+        self.put('a', [('3.3.3.3', 3)])
+        self.put('c', [])
+        self.assertEqual(list(self.cache.cached_lookups), ['a', 'c'])
+        self.assertEqual(self.cache.get_cached_lookup('a')[0], set([('3.3.3.3', 3)]))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTracker))
+    suite.addTest(unittest.makeSuite(TestCache))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# see LICENSE.txt for license information
+
+import unittest
+from threading import Event
+
+import Tribler.Core.RawServer.RawServer as RawServerModule
+from Tribler.Core.RawServer.RawServer import RawServer, TASK_HISTOGRAM_BUCKETS
+
+class FakeInterruptSocket:
+    def interrupt(self):
+        pass
+
+class FakeSocketHandler:
+    """ Polls by advancing the clock of the test """
+
+    def __init__(self, test):
+        self.test = test
+        self.polls = []
+
+    def get_interrupt_socket(self):
+        return FakeInterruptSocket()
+
+    def set_handler(self, handler):
+        pass
+
+    def do_poll(self, period):
+        self.polls.append(period)
+        self.test.now += period
+        return []
+
+    def close_dead(self):
+        pass
+
+    def handle_events(self, events):
+        pass
+
+    def scan_for_timeouts(self):
+        pass
+
+class TestRawServer(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.old_clock = RawServerModule.clock
+        RawServerModule.clock = lambda: self.now
+
+        self.doneflag = Event()
+        self.sockethandler = FakeSocketHandler(self)
+        # scan_for_timeouts is scheduled an hour ahead, it does not run
+        self.rawserver = RawServer(self.doneflag, 3600, 300, sockethandler=self.sockethandler)
+        self.order = []
+
+    def tearDown(self):
+        RawServerModule.clock = self.old_clock
+
+    def task(self, name, took=0.0):
+        def func():
+            self.order.append(name)
+            self.now += took
+        func.func_name = name
+        return func
+
+    def stop(self):
+        self.doneflag.set()
+
+    def test_fifo(self):
+        for name, delay in (("a", 1), ("b", 0), ("c", 1), ("d", 0), ("e", 1)):
+            self.rawserver.add_task(self.task(name), delay)
+        self.rawserver.add_task(self.stop, 2)
+        self.rawserver.listen_forever(None)
+
+        # tasks with the same deadline run in the order they were added
+        self.assertEqual(self.order, ["b", "d", "a", "c", "e"])
+        self.assert_(self.rawserver.is_finished())
+
+    def test_kill_tasks(self):
+        self.rawserver.add_task(self.task("a1"), 1, id="a")
+        self.rawserver.add_task(self.task("b"), 2, id="b")
+        self.rawserver.add_task(self.task("a2"), 3, id="a")
+        self.rawserver.add_task(self.stop, 4)
+        self.rawserver.kill_tasks("a")
+        self.rawserver.listen_forever(None)
+
+        self.assertEqual(self.order, ["b"])
+        self.assertEqual(self.rawserver.funcs_by_id, {})
+        # only scan_for_timeouts is left
+        self.assertEqual(self.rawserver.get_queue_size(), 1)
+
+    def test_killed_head(self):
+        self.rawserver.add_task(self.task("a"), 10, id="a")
+        self.rawserver.add_task(self.stop, 20)
+        self.rawserver.kill_tasks("a")
+        self.rawserver.listen_forever(None)
+
+        # the poll waits for the deadline of the first live task
+        self.assertAlmostEqual(self.sockethandler.polls[0], 20.001)
+        self.assertEqual(len(self.sockethandler.polls), 1)
+        self.assertEqual(self.order, [])
+
+    def test_task_stats(self):
+        for took in (0.0005, 0.05, 0.05, 2.0):
+            self.rawserver.add_task(self.task("a", took))
+        self.rawserver.add_task(self.task("b", 0.005))
+        self.rawserver.add_task(self.stop, 10)
+        self.rawserver.listen_forever(None)
+
+        stats = self.rawserver.get_task_stats()
+        self.assertEqual(sorted(stats), ["a", "b", "stop"])
+        self.assertEqual(len(stats["a"][0]), len(TASK_HISTOGRAM_BUCKETS) + 1)
+
+        histogram, total, maximum = stats["a"]
+        self.assertEqual(histogram, (1, 0, 2, 0, 1))
+        self.assertAlmostEqual(total, 2.1005)
+        self.assertAlmostEqual(maximum, 2.0)
+
+        histogram, total, maximum = stats["b"]
+        self.assertEqual(histogram, (0, 1, 0, 0, 0))
+        self.assertAlmostEqual(total, 0.005)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestRawServer))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
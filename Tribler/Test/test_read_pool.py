@@ -0,0 +1,90 @@
+# see LICENSE.txt for license information
+
+import os
+import unittest
+import tempfile
+import threading
+from shutil import rmtree
+
+from Tribler.dispersy.callback import Callback
+import Tribler.Core.CacheDB.sqlitecachedb as sqlitecachedb
+from Tribler.Core.CacheDB.sqlitecachedb import SQLiteCacheDB, CURRENT_MAIN_DB_VERSION
+
+CREATE_SQL_FILE = os.path.join('..', "schema_sdb_v"+str(CURRENT_MAIN_DB_VERSION)+".sql")
+
+class TestReadPool(unittest.TestCase):
+
+    # SQLiteCacheDB can only open one database file
+    @classmethod
+    def setUpClass(cls):
+        cls.db_dir = tempfile.mkdtemp()
+        cls.db = SQLiteCacheDB.getInstance()
+        cls.db.initDB(os.path.join(cls.db_dir, 'tribler.sdb'), CREATE_SQL_FILE)
+
+        cls.callback = Callback("Dispersy")
+        cls.callback.start()
+        sqlitecachedb.try_register(cls.db, cls.callback)
+
+    @classmethod
+    def tearDownClass(cls):
+        sqlitecachedb.unregister()
+        cls.callback.stop()
+        cls.db.close()
+        rmtree(cls.db_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.db.execute_write("DELETE FROM _Channels")
+        self.db.executemany("INSERT INTO _Channels (id, name) VALUES (?,?)", [(1, u'one'), (2, u'two')])
+        self.db.commitNow()
+        self.callback.call(lambda: None)
+
+    def test_committed(self):
+        stats = self.db.getReadStats()
+        self.assertEqual(self.db.fetchall("SELECT id, name FROM Channels ORDER BY id", committed = True), [(1, u'one'), (2, u'two')])
+        self.assertEqual(self.db.fetchone("SELECT name FROM Channels WHERE id = 2", committed = True), u'two')
+        self.assertEqual(self.db.fetchone("SELECT name FROM Channels WHERE id = 3", committed = True), None)
+        self.assertEqual(self.db.getReadStats()['reads'], stats['reads'] + 3)
+
+    def test_uncommitted(self):
+        self.db.execute_write("UPDATE _Channels SET name = ? WHERE id = 1", (u'uncommitted',))
+
+        # the pool does not see the transaction of the DB thread, the DB thread does
+        self.assertEqual(self.db.fetchone("SELECT name FROM Channels WHERE id = 1", committed = True), u'one')
+        self.assertEqual(self.db.fetchone("SELECT name FROM Channels WHERE id = 1"), u'uncommitted')
+
+        self.db.commitNow()
+        self.callback.call(lambda: None)
+        self.assertEqual(self.db.fetchone("SELECT name FROM Channels WHERE id = 1", committed = True), u'uncommitted')
+
+    def test_queued(self):
+        # reads of tables with queued writes are done by the DB thread, which flushes them
+        stats = self.db.getReadStats()
+        self.db.queue_write("UPDATE _Channels SET nr_torrents = ? WHERE id = 1", (5,))
+        self.assertEqual(self.db.fetchone("SELECT nr_torrents FROM Channels WHERE id = 1", committed = True), 5)
+        self.assertEqual(self.db.getReadStats()['reads'], stats['reads'])
+
+    def test_concurrent(self):
+        results = []
+        def read():
+            for _ in xrange(50):
+                results.append(self.db.fetchall("SELECT id FROM Channels ORDER BY id", committed = True))
+
+        threads = [threading.Thread(target = read) for _ in xrange(sqlitecachedb.READ_POOL_SIZE * 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [[(1,), (2,)]] * len(threads) * 50)
+        self.assert_(self.db.getReadStats()['connections'] <= sqlitecachedb.READ_POOL_SIZE)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestReadPool))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# see LICENSE.txt for license information
+
+import unittest
+
+from Tribler.Main.vwxGUI.SearchGridManager import TorrentManager
+from Tribler.Main.Utility.GuiDBTuples import Torrent, RemoteTorrent, RemoteChannelTorrent, Channel
+
+class FakeCategory:
+    def calculateCategoriesNonDict(self, torrents):
+        return [['xxx' if 'xxx' in name else 'other'] for _, name, _, _ in torrents]
+
+def create_manager():
+    # without connect(), only the state used by addStoredRemoteResults is set
+    manager = TorrentManager(None)
+    manager.category = FakeCategory()
+    manager.xxx_category = 1
+    return manager
+
+def create_channel(nr_favorites):
+    return Channel(1, 'cid', u'channel', u'', 1, nr_favorites, 0, 0, 0, False)
+
+def local_hit(infohash):
+    return Torrent(1, infohash, None, None, u'local ' + infohash, None, 1024, 2, 1, 0, 0, False)
+
+def remote_hit(infohash, candidate, swift_hash=None, channel=None):
+    if channel:
+        return RemoteChannelTorrent(-1, infohash, swift_hash, swift_hash, u'remote ' + infohash, 1024, 2, 1, 0, 0, channel, set([candidate]))
+    return RemoteTorrent(-1, infohash, swift_hash, swift_hash, u'remote ' + infohash, 1024, 2, 1, 0, 0, set([candidate]))
+
+class TestAddStoredRemoteResults(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = create_manager()
+        self.local = [local_hit('a'), local_hit('b')]
+        self.manager.setHits(self.local[:])
+
+    def add(self, *remote_hits):
+        self.manager.remoteHits = list(remote_hits)
+        new_hits, modified = self.manager.addStoredRemoteResults()
+        self.assertEqual(self.manager.remoteHits, [])
+        self.assertIndexConsistent()
+        return new_hits, modified
+
+    def assertIndexConsistent(self):
+        hits = self.manager.hits
+        self.assertEqual(len(set(hit.infohash for hit in hits)), len(hits))
+        self.assertEqual(self.manager.hitsIndex, dict((hit.infohash, hit) for hit in hits))
+
+    def test_new_hits(self):
+        c, d = remote_hit('c', 'peer1'), remote_hit('d', 'peer1')
+        c.name = u'remote xxx c'
+        new_hits, modified = self.add(c, d)
+        self.assertEqual(new_hits, [c, d])
+        self.assertEqual(modified, set())
+        self.assertEqual(self.manager.hits, self.local + [c, d])
+        # the category of a remote hit named xxx is overridden
+        self.assertEqual((c.category_id, d.category_id), (1, 2))
+
+        # the same hit from another peer is not added again
+        new_hits, modified = self.add(remote_hit('c', 'peer2'))
+        self.assertEqual(new_hits, [])
+        self.assertEqual(c.query_candidates, set(['peer1', 'peer2']))
+        self.assertEqual(len(self.manager.hits), 4)
+
+    def test_updated_hits(self):
+        a = self.local[0]
+        new_hits, modified = self.add(remote_hit('a', 'peer1', swift_hash='swift'))
+        self.assertEqual(new_hits, [])
+        self.assertEqual(modified, set(['a']))
+        self.assertEqual((a.swift_hash, a.swift_torrent_hash), ('swift', 'swift'))
+        self.assertEqual(a.query_candidates, set(['peer1']))
+
+        # only the candidates are added, the hit is not modified again
+        new_hits, modified = self.add(remote_hit('a', 'peer2', swift_hash='other'))
+        self.assertEqual((new_hits, modified), ([], set()))
+        self.assertEqual(a.swift_hash, 'swift')
+        self.assertEqual(a.query_candidates, set(['peer1', 'peer2']))
+        self.assertEqual(self.manager.hits, self.local)
+
+    def test_replaced_hits(self):
+        c = remote_hit('c', 'peer1')
+        d = remote_hit('d', 'peer1')
+        self.add(c, d)
+
+        # a remote hit without a channel is replaced by one with a channel
+        c2 = remote_hit('c', 'peer2', channel=create_channel(1))
+        new_hits, _ = self.add(c2)
+        self.assertEqual(new_hits, [c2])
+        self.assertEqual(self.manager.hits, self.local + [d, c2])
+        self.assert_(self.manager.hitsIndex['c'] is c2)
+
+        # a hit with a channel gets the channel with the better rating
+        better_channel = create_channel(5)
+        new_hits, modified = self.add(remote_hit('c', 'peer3', channel=create_channel(0)), remote_hit('c', 'peer4', channel=better_channel))
+        self.assertEqual((new_hits, modified), ([], set(['c'])))
+        self.assert_(c2.channel is better_channel)
+        self.assertEqual(c2.query_candidates, set(['peer2', 'peer3', 'peer4']))
+
+        # a hit that is added and replaced in the same batch is only added once
+        e = remote_hit('e', 'peer1')
+        e2 = remote_hit('e', 'peer2', channel=create_channel(1))
+        new_hits, _ = self.add(e, e2)
+        self.assertEqual(new_hits, [e2])
+        self.assertEqual(self.manager.hits, self.local + [d, c2, e2])
+
+        # local hits are not replaced
+        new_hits, _ = self.add(remote_hit('a', 'peer2', channel=create_channel(1)))
+        self.assertEqual(new_hits, [])
+        self.assert_(self.manager.hitsIndex['a'] is self.local[0])
+
+    def test_set_hits(self):
+        self.add(remote_hit('c', 'peer1'))
+
+        # a new local search replaces the hits and the index
+        local = [local_hit('b'), local_hit('e')]
+        self.manager.setHits(local[:])
+        self.assertIndexConsistent()
+        self.assertEqual(sorted(self.manager.hitsIndex), ['b', 'e'])
+
+        # the remote hits are merged with the new hits only
+        a, b, c = remote_hit('a', 'peer2'), remote_hit('b', 'peer2'), remote_hit('c', 'peer2')
+        new_hits, _ = self.add(a, b, c)
+        self.assertEqual(new_hits, [a, c])
+        self.assertEqual(self.manager.hits, local + [a, c])
+        self.assertEqual(local[0].query_candidates, set(['peer2']))
+
+def scored_hit(infohash, num_seeders, matches=1):
+    hit = remote_hit(infohash, 'peer1')
+    hit.num_seeders = num_seeders
+    hit.relevance_score = [matches, 0, 0, 0, 0]
+    return hit
+
+class TestFulltextSort(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = create_manager()
+        self.manager.setHits([scored_hit('a', 10), scored_hit('b', 40), scored_hit('c', 20), scored_hit('d', 30)])
+        self.manager.fulltextSort()
+        self.assertOrder('bdca')
+
+    def assertOrder(self, infohashes):
+        self.assertEqual(''.join(hit.infohash for hit in self.manager.hits), infohashes)
+
+    def merge(self, *hits):
+        self.manager.remoteHits = list(hits)
+        new_hits, _ = self.manager.addStoredRemoteResults()
+        self.manager.fulltextSort(new_hits)
+
+    def test_merge(self):
+        scores = dict((hit.infohash, hit.relevance_score[:]) for hit in self.manager.hits)
+        e, f, g = scored_hit('e', 25), scored_hit('f', 100), scored_hit('g', 0, matches=2)
+        h = scored_hit('h', 10)
+        self.merge(e, f, g, h)
+
+        # a new hit with an equal score goes after the sorted hit, as with a full sort
+        self.assertOrder('gfbdecah')
+        self.assertEqual(self.manager.hitsIndex['a'].relevance_score, h.relevance_score)
+
+        # the sorted hits keep their scores, the new hits are scored with the same normalization
+        for hit in self.manager.hits:
+            if hit.infohash in scores:
+                self.assertEqual(hit.relevance_score, scores[hit.infohash])
+        mean, stdDev = self.manager.hitsNormalization[1]['num_seeders']
+        self.assertEqual(self.manager.hitsNormalization[0], 4)
+        self.assertAlmostEqual(f.relevance_score[-1], 0.8 * (100 - mean) / stdDev)
+
+    def test_modified(self):
+        a = self.manager.hitsIndex['a']
+        a.num_seeders = 35
+        self.manager.fulltextSort([a])
+        self.assertOrder('badc')
+
+    def test_renormalize(self):
+        self.merge(*[scored_hit(infohash, 0) for infohash in 'efgh'])
+        self.assertEqual(self.manager.hitsNormalization[0], 4)
+
+        # once the number of hits doubled, all hits are normalized and sorted again
+        self.merge(scored_hit('i', 15))
+        self.assertEqual(self.manager.hitsNormalization[0], 9)
+        self.assertOrder('bdciaefgh')
+
+    def test_reordered(self):
+        # a reranker swapped the first hits, the hits are sorted again
+        hits = self.manager.hits
+        hits[0], hits[1] = hits[1], hits[0]
+        self.merge(scored_hit('e', 25))
+        self.assertOrder('bdeca')
+        self.assertEqual(self.manager.hitsNormalization[0], 5)
+
+    def test_set_hits(self):
+        self.manager.setHits([scored_hit('e', 1)])
+        self.assertEqual(self.manager.hitsNormalization, None)
+        self.merge(scored_hit('f', 2))
+        self.assertOrder('fe')
+        self.assertEqual(self.manager.hitsNormalization[0], 2)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestAddStoredRemoteResults))
+    suite.addTest(unittest.makeSuite(TestFulltextSort))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# see LICENSE.txt for license information
+
+import unittest
+from time import time
+
+from Tribler.Core.RemoteTorrentHandler import Requester, TorrentMessageRequester
+
+class FakeCandidate:
+
+    def __init__(self, port):
+        self.sock_addr = ('127.0.0.1', port)
+        self.tunnel = False
+
+class FakeRemoteTorrentHandler:
+
+    def __init__(self):
+        self.tasks = []
+
+    def scheduletask(self, task, t = 0):
+        self.tasks.append(task)
+
+    def run_tasks(self):
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            task()
+
+class FakeSearchCommunity:
+
+    def __init__(self):
+        self.requests = []
+
+    def create_torrent_request(self, torrents, candidate):
+        self.requests.append((candidate, sorted(torrents)))
+
+class FakeRequester(Requester):
+
+    def __init__(self, remote_th, prio, window):
+        Requester.__init__(self, remote_th.scheduletask, prio, window)
+        self.fetched = []
+
+    def doFetch(self, hash, candidates):
+        self.fetched.append((hash, candidates))
+        return True
+
+class TestRequester(unittest.TestCase):
+
+    def setUp(self):
+        self.remote_th = FakeRemoteTorrentHandler()
+        self.candidates = [FakeCandidate(port) for port in xrange(3)]
+
+    def test_window(self):
+        requester = FakeRequester(self.remote_th, 2, 20)
+        self.assertEqual(requester.window, 10)
+        for i in xrange(25):
+            requester.add_request(i, self.candidates[i % 2])
+        self.assertEqual(len(self.remote_th.tasks), 1)
+
+        self.remote_th.run_tasks()
+        self.assertEqual(sorted(hash for hash, _ in requester.fetched), range(10))
+        self.assertEqual(requester.get_stats()['in_flight'], 10)
+
+        for i in xrange(3):
+            requester.request_done(i)
+        requester.request_done(99)
+        self.remote_th.run_tasks()
+        self.assertEqual(sorted(hash for hash, _ in requester.fetched), range(13))
+
+        stats = requester.get_stats()
+        self.assertEqual((stats['pending'], stats['in_flight'], stats['made'], stats['success']), (12, 10, 13, 3))
+        self.assert_(stats['throughput'] > 0)
+
+    def test_timeouts(self):
+        requester = FakeRequester(self.remote_th, 1, 1)
+        requester.add_request('a', self.candidates[0])
+        requester.add_request('b', self.candidates[0], timeout = -1)
+        self.remote_th.run_tasks()
+        self.assertEqual(requester.fetched, [('a', [self.candidates[0]])])
+        self.assertEqual(requester.requests_expired, 1)
+
+        # the fetch from candidate 0 times out, so candidate 1 goes first
+        requester.add_request('c', self.candidates[0])
+        requester.add_request('d', self.candidates[1])
+        requester.add_request('d', self.candidates[0])
+        requester.in_flight['a'] = (time() - 1,) + requester.in_flight['a'][1:]
+        self.remote_th.run_tasks()
+        self.assertEqual(requester.requests_timedout, 1)
+        self.assertEqual(requester.fetched[1], ('d', [self.candidates[1], self.candidates[0]]))
+
+        # a success clears the failures
+        requester.request_done('d')
+        self.assertEqual(requester.candidate_failures, {self.candidates[0].sock_addr: 1})
+        self.remote_th.run_tasks()
+        self.assertEqual(requester.fetched[2], ('c', [self.candidates[0]]))
+        requester.request_done('c')
+        self.assertEqual(requester.candidate_failures, {})
+
+    def test_torrent_messages(self):
+        searchcommunity = FakeSearchCommunity()
+        requester = TorrentMessageRequester(self.remote_th, searchcommunity, 1)
+        requester.MAX_BATCH_SIZE = 2
+        for infohash in 'abc':
+            requester.add_request(infohash, self.candidates[0])
+        requester.add_request('d', self.candidates[1])
+        requester.add_request('d', self.candidates[2])
+        self.remote_th.run_tasks()
+
+        # one candidate is asked for all its infohashes
+        self.assertEqual(sorted(searchcommunity.requests), sorted([(self.candidates[0], ['a', 'b']), (self.candidates[0], ['c']), (requester.in_flight['d'][1], ['d'])]))
+
+        # when it fails, the other candidate is asked
+        asked = requester.in_flight['d'][1]
+        requester.request_done('d', False)
+        requester.request_done('a')
+        self.remote_th.run_tasks()
+        self.assertEqual(searchcommunity.requests[-1], ([candidate for candidate in self.candidates[1:] if candidate != asked][0], ['d']))
+        stats = requester.get_stats()
+        self.assertEqual((stats['made'], stats['success'], stats['failed']), (5, 1, 1))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestRequester))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
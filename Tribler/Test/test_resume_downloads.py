@@ -0,0 +1,185 @@
+# see LICENSE.txt for license information
+
+import unittest
+from threading import Lock, RLock
+
+import Tribler.Core.Libtorrent.LibtorrentDownloadImpl as LibtorrentDownloadImplModule
+from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import LibtorrentDownloadImpl
+from Tribler.Core.APIImplementation import LaunchManyCore
+from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany
+from Tribler.Core.simpledefs import DLSTATUS_DOWNLOADING, DLSTATUS_SEEDING, DLSTATUS_STOPPED, DLSTATUS_HASHCHECKING
+
+class FakeTorrentDef:
+    def __init__(self, infohash):
+        self.infohash = infohash
+
+    def get_id(self):
+        return self.infohash
+
+    def get_infohash(self):
+        return self.infohash
+
+class FakeDownloadStartupConfig:
+    def get_dest_dir(self):
+        return '/tmp'
+
+class FakeDownload:
+    def __init__(self, tdef):
+        self.tdef = tdef
+        self.removed = False
+
+    def get_def(self):
+        return self.tdef
+
+    def stop_remove(self, removestate=False, removecontent=False):
+        self.removed = True
+
+class FakeRawServer:
+    def __init__(self):
+        self.tasks = []
+
+    def add_task(self, task, delay=0):
+        self.tasks.append((task, delay))
+
+class FakeLibtorrentMgr:
+    @staticmethod
+    def getInstance():
+        return None
+
+class FakeSession:
+    def __init__(self, lm):
+        self.lm = lm
+
+def create_launchmany(checkpoints):
+    """ A TriblerLaunchMany that loads the checkpoints from a dict and
+    remembers the downloads it adds """
+    lm = TriblerLaunchMany.__new__(TriblerLaunchMany)
+    lm.sesslock = RLock()
+    lm.downloads = {}
+    lm.torrent_db = lm.mypref_db = None
+    lm.rawserver = FakeRawServer()
+    lm.resume_lock = Lock()
+    lm.resume_pending = set()
+    lm.resume_scheduling = False
+    lm.resume_progress = {}
+    lm.resume_start = None
+
+    lm.added = []
+    def add(tdef, dscfg, pstate=None, initialdlstatus=None, commit=True, setupDelay=0):
+        if tdef.get_infohash() == 'error':
+            raise ValueError('cannot add')
+        d = FakeDownload(tdef)
+        lm.downloads[tdef.get_infohash()] = d
+        lm.added.append((d, setupDelay))
+        return d
+    lm.add = add
+    lm.load_resume_data = lambda filename: checkpoints[filename]
+    lm.rawserver_nonfatalerrorfunc = lambda e: None
+    return lm
+
+def create_checkpoint(infohash, status):
+    return FakeTorrentDef(infohash), None, FakeDownloadStartupConfig(), {'dlstate': {'status': status}}
+
+class TestResumeDownloads(unittest.TestCase):
+
+    def setUp(self):
+        self.old_batch_size = LaunchManyCore.RESUME_BATCH_SIZE
+        LaunchManyCore.RESUME_BATCH_SIZE = 2
+        self.checkpoints = {'stopped': create_checkpoint('stopped', DLSTATUS_STOPPED),
+                            'hashchecking': create_checkpoint('hashchecking', DLSTATUS_HASHCHECKING),
+                            'seeding': create_checkpoint('seeding', DLSTATUS_SEEDING),
+                            'downloading': create_checkpoint('downloading', DLSTATUS_DOWNLOADING),
+                            'stop me': create_checkpoint('stop me', DLSTATUS_DOWNLOADING),
+                            'invalid': (None, None, None, None)}
+        self.lm = create_launchmany(self.checkpoints)
+
+    def tearDown(self):
+        LaunchManyCore.RESUME_BATCH_SIZE = self.old_batch_size
+
+    def resume(self, filenames):
+        self.lm.resume_downloads(filenames, initialdlstatus_dict={'stop me': DLSTATUS_STOPPED})
+        return [d.get_def().get_infohash() for d, _ in self.lm.added]
+
+    def test_priority(self):
+        order = self.resume(sorted(self.checkpoints))
+        self.assertEqual(order[:3], ['downloading', 'seeding', 'hashchecking'])
+        self.assertEqual(sorted(order[3:]), ['stop me', 'stopped'])
+
+    def test_batches(self):
+        self.resume(sorted(filename for filename in self.checkpoints if filename != 'invalid'))
+        delays = [delay for _, delay in self.lm.added]
+        batch_delay = LaunchManyCore.RESUME_BATCH_DELAY
+        self.assertEqual(delays, [0, 0, batch_delay, batch_delay, 2 * batch_delay])
+
+    def test_progress(self):
+        self.checkpoints['error'] = create_checkpoint('error', DLSTATUS_DOWNLOADING)
+        self.resume(sorted(self.checkpoints))
+        progress = self.lm.get_resume_progress()
+        self.assertEqual((progress['total'], progress['loaded'], progress['resumed'], progress['failed'], progress['took']), (7, 7, 5, 2, None))
+
+        for d, _ in self.lm.added[:3]:
+            self.lm.resume_started(d)
+        # only the downloads resumed from the checkpoints are counted
+        self.lm.resume_started(FakeDownload(FakeTorrentDef('other')))
+        self.lm.resume_started(self.lm.added[0][0])
+        self.assertEqual(self.lm.get_resume_progress()['started'], 3)
+        self.assertEqual(self.lm.get_resume_progress()['took'], None)
+
+        # a download that fails to start or is removed is not waited for
+        self.lm.resume_cancelled(self.lm.added[3][0])
+        self.lm.remove(self.lm.added[4][0], hidden=True)
+        self.assert_(self.lm.added[4][0].removed)
+        progress = self.lm.get_resume_progress()
+        self.assertEqual((progress['resumed'], progress['started'], progress['failed'], progress['removed']), (4, 3, 3, 1))
+        self.assertNotEqual(progress['took'], None)
+
+    def test_nothing_to_resume(self):
+        self.resume(['invalid'])
+        progress = self.lm.get_resume_progress()
+        self.assertEqual((progress['total'], progress['failed']), (1, 1))
+        self.assertNotEqual(progress['took'], None)
+
+    def create_download(self, tdef):
+        old_mgr = LibtorrentDownloadImplModule.LibtorrentMgr
+        LibtorrentDownloadImplModule.LibtorrentMgr = FakeLibtorrentMgr
+        try:
+            return LibtorrentDownloadImpl(FakeSession(self.lm), tdef)
+        finally:
+            LibtorrentDownloadImplModule.LibtorrentMgr = old_mgr
+
+    def test_setup_failed(self):
+        self.resume(['downloading'])
+        d = self.create_download(self.checkpoints['downloading'][0])
+        # the setup fails, the config has no dlconfig
+        d.setup(FakeDownloadStartupConfig(), lm_network_engine_wrapper_created_callback=self.lm.network_engine_wrapper_created_callback)
+        self.assertNotEqual(d.error, None)
+        progress = self.lm.get_resume_progress()
+        self.assertEqual((progress['resumed'], progress['failed']), (0, 1))
+        self.assertNotEqual(progress['took'], None)
+
+    def test_engine_wrapper_failed(self):
+        self.resume(['downloading'])
+        d = self.create_download(self.checkpoints['downloading'][0])
+        def network_create_engine_wrapper(*args):
+            raise ValueError('libtorrent failed')
+        d.network_create_engine_wrapper = network_create_engine_wrapper
+
+        d.create_engine_wrapper(self.lm.network_engine_wrapper_created_callback, None, None, wrapperDelay=1.0)
+        task, delay = self.lm.rawserver.tasks.pop()
+        self.assertEqual(delay, 1.0)
+        task()
+        self.assertFalse(d.cew_scheduled)
+        progress = self.lm.get_resume_progress()
+        self.assertEqual((progress['resumed'], progress['failed']), (0, 1))
+        self.assertNotEqual(progress['took'], None)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestResumeDownloads))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
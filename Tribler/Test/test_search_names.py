@@ -0,0 +1,140 @@
+# see LICENSE.txt for license information
+
+import os
+import unittest
+import tempfile
+from random import Random
+from shutil import rmtree
+
+from Tribler.Core.CacheDB.sqlitecachedb import SQLiteCacheDB, bin2str, CURRENT_MAIN_DB_VERSION
+from Tribler.Core.CacheDB import SqliteCacheDBHandler
+from Tribler.Core.CacheDB.SqliteCacheDBHandler import TorrentDBHandler
+
+CREATE_SQL_FILE = os.path.join('..', "schema_sdb_v"+str(CURRENT_MAIN_DB_VERSION)+".sql")
+KEYWORDS = ['linux', 'ubuntu', 'movie', 'music', 'debian', 'album', 'live', 'best']
+KEYS = ['T.torrent_id', 'infohash', 'T.name', 'num_seeders', 'C.id']
+NR_TORRENTS = 1000
+
+class FakeChannelCastDB:
+    """ Channel 2 is marked as spam, channel 3 is my channel and channel 6 has no dispersy_cid """
+    _channel_id = 3
+
+    def getChannels(self, channel_ids):
+        # (id, dispersy_cid, name, description, nr_torrents, nr_favorites, nr_spam, my_vote, modified, my_channel)
+        return [(i, '-1' if i == 6 else 'cid%d' % i, 'channel', '', 0, i % 4, i % 3, -1 if i == 2 else i % 2, 0, i == 3) for i in channel_ids]
+
+def fill_database(db):
+    random = Random(1)
+    torrents = []
+    fulltext = []
+    channeltorrents = []
+    for torrent_id in xrange(1, NR_TORRENTS + 1):
+        name = "%s %d" % (" ".join(random.sample(KEYWORDS, 3)), torrent_id)
+        infohash = bin2str("".join(chr(random.randint(0, 255)) for _ in xrange(20)))
+        num_seeders = random.choice([None, 0, -1] + range(1, 5000))
+        torrents.append((torrent_id, infohash, name, 'file.torrent' if torrent_id % 3 else None, num_seeders))
+        fulltext.append((torrent_id, name, name + ' file', 'avi'))
+
+        for channel_id in random.sample(range(1, 8), random.choice([0, 0, 1, 2, 3])):
+            channeltorrents.append((torrent_id, channel_id, None if random.random() < 0.9 else 5))
+
+    db.executemany(u"INSERT INTO Torrent (torrent_id, infohash, name, torrent_file_name, num_seeders) VALUES (?,?,?,?,?)", torrents, commit=False)
+    db.executemany(u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions) VALUES (?,?,?,?)", fulltext, commit=False)
+    db.executemany(u"INSERT INTO _ChannelTorrents (torrent_id, channel_id, deleted_at) VALUES (?,?,?)", channeltorrents, commit=False)
+    db.commit()
+
+class TestSearchNames(unittest.TestCase):
+
+    # SQLiteCacheDB can only open one database file
+    @classmethod
+    def setUpClass(cls):
+        cls.db_dir = tempfile.mkdtemp()
+        cls.db = SQLiteCacheDB.getInstance()
+        cls.db.initDB(os.path.join(cls.db_dir, 'tribler.sdb'), CREATE_SQL_FILE)
+        fill_database(cls.db)
+
+        cls.torrent_db = TorrentDBHandler.getInstance()
+        cls.torrent_db.channelcast_db = FakeChannelCastDB()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        rmtree(cls.db_dir, ignore_errors=True)
+
+    def test_ranked(self):
+        for keywords in (['linux'], ['linux', 'movie'], ['best', '-album'], ['nothing']):
+            results = self.torrent_db.searchNames(keywords, keys = KEYS)
+            results_by_infohash = dict((result[1], result) for result in results)
+            sorted_seeders = [result[3] for result in results if result[3] > 0]
+
+            for limit in (1, 10, 25, 250):
+                ranked = self.torrent_db.searchNames(keywords, keys = KEYS, limit = limit)
+                self.assertEqual(len(ranked), min(limit, len(results)))
+
+                # the same torrents, with the same channel, in the same order
+                for result in ranked:
+                    self.assertEqual(result, results_by_infohash[result[1]])
+                self.assertEqual([result[3] for result in ranked[:len(sorted_seeders)]], sorted_seeders[:limit])
+
+    def test_stats(self):
+        before = self.torrent_db.getSearchStats()
+        nr_results = len(self.torrent_db.searchNames(['linux'], keys = KEYS))
+        self.torrent_db.searchNames(['linux'], keys = KEYS, limit = 25)
+
+        stats = self.torrent_db.getSearchStats()
+        self.assertEqual(stats['searches'], before['searches'] + 2)
+        self.assertEqual(stats['ranked_searches'], before['ranked_searches'] + 1)
+        self.assertEqual(stats['results'], before['results'] + nr_results + 25)
+        self.assertEqual(set(stats['stages'].keys()), set(['fts', 'channels', 'merge', 'matchinfo', 'sort']))
+        self.assertEqual(set(stats['last'].keys()), set(stats['stages'].keys()))
+
+    def test_stats_batches(self):
+        # torrents in all channels, so that a batch holds few torrents
+        torrents = []
+        fulltext = []
+        channeltorrents = []
+        for torrent_id in xrange(NR_TORRENTS + 1, NR_TORRENTS + 51):
+            name = "batched %d" % torrent_id
+            torrents.append((torrent_id, bin2str("%020d" % torrent_id), name, torrent_id))
+            fulltext.append((torrent_id, name, name, 'avi'))
+            channeltorrents.extend((torrent_id, channel_id, None) for channel_id in xrange(1, 8))
+        self.db.executemany(u"INSERT INTO Torrent (torrent_id, infohash, name, num_seeders) VALUES (?,?,?,?)", torrents, commit=False)
+        self.db.executemany(u"INSERT INTO FullTextIndex (rowid, swarmname, filenames, fileextensions) VALUES (?,?,?,?)", fulltext, commit=False)
+        self.db.executemany(u"INSERT INTO _ChannelTorrents (torrent_id, channel_id, deleted_at) VALUES (?,?,?)", channeltorrents, commit=False)
+        self.db.commit()
+
+        # every call of the clock takes a second
+        self.clock = 0
+        def clock():
+            self.clock += 1
+            return self.clock
+
+        old_time, old_batch_size = SqliteCacheDBHandler.time, SqliteCacheDBHandler.SEARCH_BATCH_SIZE
+        SqliteCacheDBHandler.time = clock
+        SqliteCacheDBHandler.SEARCH_BATCH_SIZE = 1
+        try:
+            before = self.torrent_db.getSearchStats()
+            results = self.torrent_db.searchNames(['batched'], keys = KEYS, limit = 10)
+            took = self.clock
+        finally:
+            SqliteCacheDBHandler.time, SqliteCacheDBHandler.SEARCH_BATCH_SIZE = old_time, old_batch_size
+
+        self.assertEqual(len(results), 10)
+        stats = self.torrent_db.getSearchStats()
+        # batches of 20 rows hold at most 3 torrents
+        self.assert_(stats['rows'] - before['rows'] > 3 * 20)
+
+        # each second is counted in at most one stage
+        self.assert_(sum(stats['last'].values()) < took)
+        self.assert_(stats['last']['fts'] > 0)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestSearchNames))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
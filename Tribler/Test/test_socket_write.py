@@ -0,0 +1,86 @@
+# see LICENSE.txt for license information
+
+import unittest
+
+import Tribler.Core.RawServer.SocketHandler as SocketHandlerModule
+from Tribler.Core.RawServer.SocketHandler import SingleSocket, SocketHandler
+
+class FakeSocket:
+    """ Accepts at most sendsize bytes per send """
+
+    def __init__(self, sendsize):
+        self.sendsize = sendsize
+        self.sent = []
+
+    def fileno(self):
+        return 1000
+
+    def getsockname(self):
+        return ('127.0.0.1', 1)
+
+    def getpeername(self):
+        return ('127.0.0.1', 2)
+
+    def send(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        data = data[:self.sendsize]
+        self.sent.append(data)
+        return len(data)
+
+class FakePoll:
+    def register(self, sock, mask):
+        pass
+
+class TestSocketWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.socket_handler = SocketHandler(300, False)
+        self.socket_handler.poll = FakePoll()
+
+    def get_single_socket(self, sendsize):
+        single_socket = SingleSocket(self.socket_handler, FakeSocket(sendsize), None)
+        single_socket.connected = True
+        return single_socket
+
+    def test_partial(self):
+        single_socket = self.get_single_socket(1000)
+        piece = "".join(chr(i % 256) for i in xrange(2500))
+        single_socket.write(piece)
+        self.assertEqual(single_socket.socket.sent, [piece[:1000]])
+        self.assertEqual(single_socket.offset, 1000)
+
+        single_socket.try_write()
+        single_socket.try_write()
+        self.assertEqual(single_socket.socket.sent, [piece[:1000], piece[1000:2000], piece[2000:]])
+        self.assert_(single_socket.is_flushed())
+
+        stats = self.socket_handler.get_write_stats()
+        self.assertEqual(stats['bytes_sent'], 2500)
+        self.assertEqual(stats['bytes_copied'], 0)
+        self.assertEqual(stats['send_calls'], 3)
+
+    def test_coalesce(self):
+        single_socket = self.get_single_socket(10)
+        single_socket.write("0123456789abcdef")
+        large = "x" * SocketHandlerModule.WRITE_COALESCE_SIZE
+        for message in ("have1", "have2", "have3", large, "have4"):
+            single_socket.write(message)
+
+        # the rest of the first message is joined with the small messages, not with the large one
+        single_socket.socket.sendsize = SocketHandlerModule.WRITE_COALESCE_SIZE * 2
+        single_socket.try_write()
+        self.assertEqual(single_socket.socket.sent, ["0123456789", "abcdefhave1have2have3", large, "have4"])
+        self.assert_(single_socket.is_flushed())
+        self.assertEqual(self.socket_handler.get_write_stats()['bytes_copied'], 21)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestSocketWrite))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# see LICENSE.txt for license information
+
+import os
+import shutil
+import tempfile
+import unittest
+from hashlib import sha1
+from random import Random
+
+from Tribler.Core.Swift.SwiftHashTree import SwiftHashTree, ZERO_HASH, calc_roothashes
+from Tribler.Core.Swift.SwiftDef import SwiftDef
+
+def H(*hashes):
+    return sha1(''.join(hashes)).digest()
+
+def reference_roothash(data, chunksize=1024):
+    """ The top of the smallest tree covering the chunks, with zero hashes
+    for the empty subtrees """
+    chunks = [data[i:i + chunksize] for i in xrange(0, len(data), chunksize)]
+    height = 0
+    while (1 << height) < len(chunks):
+        height += 1
+
+    def node(layer, offset):
+        if offset << layer >= len(chunks):
+            return ZERO_HASH
+        if layer == 0:
+            return H(chunks[offset])
+        return H(node(layer - 1, 2 * offset), node(layer - 1, 2 * offset + 1))
+    return node(height, 0)
+
+class TestSwiftHashTree(unittest.TestCase):
+
+    def setUp(self):
+        random = Random(42)
+        self.data = ''.join(chr(random.randrange(256)) for _ in xrange(20 * 1024 + 100))
+
+    def hash(self, data, chunksize=1024):
+        tree = SwiftHashTree(chunksize)
+        tree.update(data)
+        return tree
+
+    def test_vectors(self):
+        # the root hash of a single chunk is its hash
+        tree = self.hash("123\n")
+        self.assertEqual(tree.get_roothash().encode('hex'), "a8fdc205a9f19cc1c7507a60c4f01b13d11d7fd0")
+        self.assertEqual(tree.get_mhash(), tree.get_roothash() + ZERO_HASH)
+
+        chunks = ['a' * 1024, 'b' * 1024, 'c']
+        tree = self.hash(''.join(chunks))
+        h0, h1, h2 = [H(chunk) for chunk in chunks]
+        self.assertEqual(tree.get_roothash(), H(H(h0, h1), H(h2, ZERO_HASH)))
+        # the hashes are at their bin numbers, bin 3 and 5 are not complete
+        self.assertEqual(tree.get_mhash(), ''.join([h0, H(h0, h1), h1, ZERO_HASH, h2, ZERO_HASH]))
+
+        self.assertEqual(self.hash(''.join(chunks[:2])).get_roothash(), H(h0, h1))
+        self.assertEqual(self.hash(''.join(chunks), 512).get_roothash(), reference_roothash(''.join(chunks), 512))
+
+    def test_swift_vectors(self):
+        # root hashes and .mhash files written by swift -f <file> -m (libswift
+        # tribler-6.1.x r31892, the swift.exe in the repository)
+        tree = self.hash('a' * 1024 + 'b' * 1024 + 'c')
+        self.assertEqual(tree.get_roothash().encode('hex'), "b64d56f4bd206ed3a8fa4cb2ad6a447ed55459ce")
+        self.assertEqual(tree.get_mhash().encode('hex'), "8eca554631df9ead14510e1a70ae48c70f9b9384"
+                                                         "bf34c96b077d64b1855ccd24b34ad48a555cf2e1"
+                                                         "bc88ebc04149dec63e08f46f769d59c8feaa79d0"
+                                                         "0000000000000000000000000000000000000000"
+                                                         "84a516841ba77a5b4648de2cd0dfcb30ea46dbb4"
+                                                         "0000000000000000000000000000000000000000")
+
+        tree = self.hash('x' * 1025)
+        self.assertEqual(tree.get_roothash().encode('hex'), "ad600efcd78393e645b3b145552a2971f5893350")
+        self.assertEqual(tree.get_mhash().encode('hex'), "d5a3c9bd7e746c98b4aea0e9194fb9555b3c22ad"
+                                                         "ad600efcd78393e645b3b145552a2971f5893350"
+                                                         "11f6ad8ec52a2984abaafd7c3b516503785c2072"
+                                                         "0000000000000000000000000000000000000000")
+
+        # 14 chunks, the last one 7 bytes
+        tree = self.hash(''.join(chr(i % 251) for i in xrange(13 * 1024 + 7)))
+        self.assertEqual(tree.get_roothash().encode('hex'), "4eb9c866346c1260d8f10fdc258ad1b99a23c81b")
+        self.assertEqual(len(tree.get_mhash()), 28 * 20)
+        self.assertEqual(sha1(tree.get_mhash()).hexdigest(), "826b4da1a79bb5fa422576c375af744fa5ad8f2f")
+
+    def test_sizes(self):
+        for size in (1, 1023, 1024, 1025, 3 * 1024, 4 * 1024, 5 * 1024 + 1, 8 * 1024, 13 * 1024 + 7, len(self.data)):
+            self.assertEqual(self.hash(self.data[:size]).get_roothash(), reference_roothash(self.data[:size]), size)
+
+        # the content can be added in parts of any size
+        tree = SwiftHashTree()
+        for i in xrange(0, len(self.data), 777):
+            tree.update(self.data[i:i + 777])
+        self.assertEqual(tree.get_roothash(), reference_roothash(self.data))
+        self.assertEqual(tree.get_nchunks(), 21)
+
+class TestSwiftDef(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filenames = []
+        for i, data in enumerate(("123\n", 'x' * 3000, 'y' * 5000)):
+            filename = os.path.join(self.dirname, 'file%d' % i)
+            f = open(filename, 'wb')
+            f.write(data)
+            f.close()
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_finalize_in_process(self):
+        sdef = SwiftDef()
+        sdef.add_content(self.filenames[1])
+        self.assertEqual(sdef.finalize_in_process(destdir=self.dirname), None)
+        self.assertEqual(sdef.get_roothash(), reference_roothash('x' * 3000))
+        self.assertEqual(os.path.getsize(self.filenames[1] + '.mhash'), 3 * 2 * 20)
+
+        # the content of a multi-file swarm starts with the spec
+        sdef = SwiftDef()
+        sdef.add_content(self.filenames[2], 'content/b')
+        sdef.add_content(self.filenames[0], 'content/a')
+        specpn = sdef.finalize_in_process(destdir=self.dirname)
+        spec = open(specpn, 'rb').read()
+        self.assert_(spec.endswith("content/a 4\ncontent/b 5000\n"))
+        self.assertEqual(sdef.get_roothash(), reference_roothash(spec + "123\n" + 'y' * 5000))
+        self.assert_(os.path.exists(specpn + '.mhash'))
+
+    def test_load_from_files(self):
+        sdefs = SwiftDef.load_from_files(self.filenames + [os.path.join(self.dirname, 'missing')], tracker='127.0.0.1:1')
+        self.assertEqual([sdef.get_roothash_as_hex() for sdef in sdefs[:1]], ["a8fdc205a9f19cc1c7507a60c4f01b13d11d7fd0"])
+        self.assertEqual([sdef.get_roothash() for sdef in sdefs[:3]], calc_roothashes(self.filenames, writemhash=False))
+        self.assertEqual(sdefs[3], None)
+        self.assertEqual(sdefs[2].get_url(), 'tswift://127.0.0.1:1/' + sdefs[2].get_roothash_as_hex())
+        self.assert_(os.path.exists(self.filenames[2] + '.mhash'))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestSwiftHashTree))
+    suite.addTest(unittest.makeSuite(TestSwiftDef))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# see LICENSE.txt for license information
+
+import os
+import shutil
+import tempfile
+import unittest
+from hashlib import sha1
+
+from Tribler.Core.CacheDB import TorrentStore as torrentstore
+from Tribler.Core.CacheDB.TorrentStore import TorrentStore, RECORD_HEADER, PACK_HEADER
+from Tribler.Core.Utilities.bencode import bencode
+from Tribler.Tools.pack_collected_torrents import pack_collected_torrents
+
+def create_torrent(i, size=100):
+    info = {'name': 'torrent%d' % i, 'length': 1000 * i, 'piece length': 1024, 'pieces': sha1(str(i)).digest() * (size / 20)}
+    return sha1(bencode(info)).digest(), bencode({'announce': 'http://127.0.0.1:6969/announce', 'info': info})
+
+class TestTorrentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.torrents = [create_torrent(i) for i in xrange(10)]
+        self.store = TorrentStore(self.dirname)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dirname)
+
+    def reopen(self):
+        self.store.close()
+        self.store = TorrentStore(self.dirname)
+
+    def test_put_get_delete(self):
+        for infohash, data in self.torrents:
+            self.store.put_torrent(infohash, data)
+        infohash, data = self.torrents[3]
+        self.assert_(self.store.has_torrent(infohash))
+        self.assertEqual(self.store.get_torrent(infohash), data)
+
+        self.store.put_torrent(infohash, data + 'e')
+        self.assertEqual(self.store.get_torrent(infohash), data + 'e')
+
+        self.assertEqual(self.store.delete_torrents([infohash, infohash, 'x' * 20]), 1)
+        self.assertFalse(self.store.has_torrent(infohash))
+        self.assertEqual(self.store.get_torrent(infohash), None)
+        self.assertEqual(len(self.store.get_infohashes()), 9)
+
+        self.store.close()
+        self.store.put_torrent(infohash, data)
+        self.assertEqual(self.store.get_torrent(self.torrents[0][0]), None)
+
+    def test_reopen(self):
+        for infohash, data in self.torrents[:5]:
+            self.store.put_torrent(infohash, data)
+        self.reopen()
+        # the records after the index snapshot are read from the pack
+        for infohash, data in self.torrents[5:]:
+            self.store.put_torrent(infohash, data)
+        self.store.delete_torrents([self.torrents[0][0]])
+        self.store.pack.close()
+        self.store = TorrentStore(self.dirname)
+
+        self.assertEqual(sorted(self.store.get_infohashes()), sorted(infohash for infohash, _ in self.torrents[1:]))
+        for infohash, data in self.torrents[1:]:
+            self.assertEqual(self.store.get_torrent(infohash), data)
+
+        # an index that does not match the pack is not used
+        self.store.close()
+        os.remove(self.store.pack_filename)
+        self.reopen()
+        self.assertEqual(self.store.get_infohashes(), [])
+
+    def test_incomplete_record(self):
+        for infohash, data in self.torrents[:2]:
+            self.store.put_torrent(infohash, data)
+        self.store.pack.close()
+
+        size = os.path.getsize(self.store.pack_filename)
+        f = open(self.store.pack_filename, 'ab')
+        f.write(RECORD_HEADER.pack('P', self.torrents[2][0], len(self.torrents[2][1]), 0) + self.torrents[2][1][:10])
+        f.close()
+
+        self.store = TorrentStore(self.dirname)
+        self.assertEqual(sorted(self.store.get_infohashes()), sorted(infohash for infohash, _ in self.torrents[:2]))
+        self.assertEqual(os.path.getsize(self.store.pack_filename), size)
+
+        # a record with a wrong checksum is not used either
+        self.store.put_torrent(*self.torrents[2])
+        self.store.pack.close()
+        f = open(self.store.pack_filename, 'r+b')
+        f.seek(-1, os.SEEK_END)
+        f.write('x')
+        f.close()
+        self.store = TorrentStore(self.dirname)
+        self.assertFalse(self.store.has_torrent(self.torrents[2][0]))
+        self.assertEqual(os.path.getsize(self.store.pack_filename), size)
+
+    def test_compact(self):
+        old_min_dead_size = torrentstore.COMPACT_MIN_DEAD_SIZE
+        torrentstore.COMPACT_MIN_DEAD_SIZE = 0
+        try:
+            for infohash, data in self.torrents:
+                self.store.put_torrent(infohash, data)
+            generation = self.store.generation
+            self.store.delete_torrents([infohash for infohash, _ in self.torrents[:4]])
+            self.assertEqual(self.store.generation, generation)
+
+            # more dead than live records
+            self.store.delete_torrents([self.torrents[4][0]])
+            self.assertNotEqual(self.store.generation, generation)
+            self.assertEqual(self.store.dead_size, 0)
+            self.assertEqual(os.path.getsize(self.store.pack_filename), PACK_HEADER.size + sum(RECORD_HEADER.size + len(data) for _, data in self.torrents[5:]))
+        finally:
+            torrentstore.COMPACT_MIN_DEAD_SIZE = old_min_dead_size
+
+        self.reopen()
+        for infohash, data in self.torrents[5:]:
+            self.assertEqual(self.store.get_torrent(infohash), data)
+
+    def test_pack_collected_torrents(self):
+        for i, (infohash, data) in enumerate(self.torrents[:3]):
+            filename = '%d.torrent' % i if i < 2 else infohash.encode('hex')
+            f = open(os.path.join(self.dirname, filename), 'wb')
+            f.write(data)
+            f.close()
+        # swift content, metadata and temporary files are skipped
+        for filename in ('f' * 40, 'f' * 40 + '.mhash', 'tmp_0.torrent'):
+            open(os.path.join(self.dirname, filename), 'wb').close()
+
+        self.assertEqual(pack_collected_torrents(self.dirname, self.store), (3, 1))
+        self.assertEqual(self.store.get_torrent(self.torrents[2][0]), self.torrents[2][1])
+        self.assertEqual(pack_collected_torrents(self.dirname, self.store), (0, 1))
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTorrentStore))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
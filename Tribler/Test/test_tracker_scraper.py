@@ -0,0 +1,338 @@
+# see LICENSE.txt for license information
+
+import unittest
+import socket
+import threading
+from struct import pack, unpack_from
+from time import time, sleep
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
+
+from Tribler.Core.Utilities.bencode import bencode
+import Tribler.TrackerChecking.TrackerChecking as TrackerChecking
+import Tribler.TrackerChecking.TrackerScraper as TrackerScraperModule
+from Tribler.TrackerChecking.TrackerScraper import TrackerScraper
+
+def fake_status(infohash):
+    """ The (seeders, leechers) the fake trackers report for infohash """
+    return (ord(infohash[0]) + 1, ord(infohash[1]))
+
+class FakeUDPTracker(threading.Thread):
+    """ Minimal BEP 15 tracker answering connect and scrape requests, after
+        delay seconds """
+
+    def __init__(self, delay = 0):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.settimeout(0.1)
+        self.port = self.socket.getsockname()[1]
+        self.url = "udp://127.0.0.1:%d/announce" % self.port
+        self.delay = delay
+        self.nr_connects = 0
+        self.nr_scrapes = 0
+        self.shouldquit = False
+
+    def send(self, data, address):
+        if self.delay:
+            threading.Timer(self.delay, self.socket.sendto, (data, address)).start()
+        else:
+            self.socket.sendto(data, address)
+
+    def run(self):
+        while not self.shouldquit:
+            try:
+                data, address = self.socket.recvfrom(8192)
+            except socket.timeout:
+                continue
+
+            connection_id, action, transaction_id = unpack_from('!qii', data)
+            if action == 0:
+                self.nr_connects += 1
+                self.send(pack('!iiq', 0, transaction_id, 42), address)
+
+            elif action == 2 and connection_id == 42:
+                self.nr_scrapes += 1
+                response = [pack('!ii', 2, transaction_id)]
+                for offset in xrange(16, len(data), 20):
+                    seeders, leechers = fake_status(data[offset:offset+20])
+                    response.append(pack('!iii', seeders, 0, leechers))
+                self.send(''.join(response), address)
+
+        self.socket.close()
+
+    def stop(self):
+        self.shouldquit = True
+        self.join()
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class FakeHTTPTracker(threading.Thread):
+
+    def __init__(self, delay = 0):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        tracker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                tracker.nr_scrapes += 1
+                if delay:
+                    sleep(delay)
+                files = {}
+                for infohash in parse_qs(urlparse(self.path).query)["info_hash"]:
+                    seeders, leechers = fake_status(infohash)
+                    files[infohash] = {"complete": seeders, "incomplete": leechers, "downloaded": 0}
+                body = bencode({"files": files})
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d/announce" % self.server.server_address[1]
+        self.nr_scrapes = 0
+
+    def run(self):
+        self.server.serve_forever(poll_interval = 0.1)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def make_torrents(count, trackers):
+    torrents = []
+    for i in xrange(count):
+        infohash = pack('!i', i).rjust(20, 'x')[::-1]
+        torrents.append({'infohash': infohash, 'info': {'announce': trackers[0], 'announce-list': [list(trackers)]}})
+    return torrents
+
+class TestTrackerScraper(unittest.TestCase):
+
+    def setUp(self):
+        self.results = []
+        self.event = threading.Event()
+        self.scraper = TrackerScraper(self.got_results)
+        self.scraper.start()
+
+    def tearDown(self):
+        self.scraper.shutdown()
+        self.scraper.join()
+
+    def got_results(self, results):
+        self.results.extend(results)
+        self.event.set()
+
+    def wait_for_results(self, count, timeout = 10):
+        end = time() + timeout
+        while len(self.results) < count and time() < end:
+            self.event.wait(0.1)
+            self.event.clear()
+        return len(self.results)
+
+    def check_results(self, torrents):
+        infohashes = set(torrent['infohash'] for torrent in torrents)
+        self.assertEqual(len(self.results), len(torrents))
+        for torrent, announce_dict in self.results:
+            self.assert_(torrent['infohash'] in infohashes)
+            self.assertEqual(announce_dict[torrent['infohash']], fake_status(torrent['infohash']))
+
+    def test_udp(self):
+        tracker = FakeUDPTracker()
+        tracker.start()
+        try:
+            torrents = make_torrents(200, [tracker.url])
+            for torrent in torrents:
+                self.assert_(self.scraper.add_torrent(torrent))
+            self.assertFalse(self.scraper.add_torrent(torrents[0]))
+
+            self.wait_for_results(len(torrents))
+            self.check_results(torrents)
+
+            # one connection id for all scrapes, 74 infohashes per scrape
+            self.assertEqual(tracker.nr_connects, 1)
+            self.assertEqual(tracker.nr_scrapes, 3)
+            self.assertEqual(self.scraper.get_nr_jobs(), 0)
+        finally:
+            tracker.stop()
+
+    def test_http(self):
+        tracker = FakeHTTPTracker()
+        tracker.start()
+        try:
+            torrents = make_torrents(100, [tracker.url])
+            for torrent in torrents:
+                self.assert_(self.scraper.add_torrent(torrent))
+
+            self.wait_for_results(len(torrents))
+            self.check_results(torrents)
+            self.assertEqual(tracker.nr_scrapes, 2)
+        finally:
+            tracker.stop()
+
+    def test_dead_tracker(self):
+        # nothing listens on the port of the dead tracker
+        dead = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        dead.bind(("127.0.0.1", 0))
+        dead_url = "udp://localhost:%d/announce" % dead.getsockname()[1]
+
+        old_timeout = TrackerScraperModule.REQUEST_TIMEOUT
+        TrackerScraperModule.REQUEST_TIMEOUT = 2.0
+        tracker = FakeUDPTracker()
+        tracker.start()
+        try:
+            # getTrackers prefers the dead tracker, as it sorts after 127.0.0.1
+            torrents = make_torrents(10, [dead_url, tracker.url])
+            for torrent in torrents:
+                torrent['info']['announce-list'] = [[dead_url], [tracker.url]]
+                self.scraper.add_torrent(torrent)
+
+            self.wait_for_results(len(torrents))
+            self.check_results(torrents)
+            self.assert_(dead_url in self.scraper.backoff)
+
+            # while backing off, the dead tracker is skipped
+            TrackerChecking.ioErrors.clear()
+            self.results = []
+            torrents = make_torrents(20, [dead_url, tracker.url])[10:]
+            for torrent in torrents:
+                torrent['info']['announce-list'] = [[dead_url], [tracker.url]]
+                self.scraper.add_torrent(torrent)
+
+            start = time()
+            self.wait_for_results(len(torrents))
+            self.check_results(torrents)
+            self.assert_(time() - start < TrackerScraperModule.REQUEST_TIMEOUT)
+        finally:
+            TrackerScraperModule.REQUEST_TIMEOUT = old_timeout
+            tracker.stop()
+            dead.close()
+
+    def test_dead_torrent(self):
+        dead = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        dead.bind(("127.0.0.1", 0))
+        dead_url = "udp://127.0.0.1:%d/announce" % dead.getsockname()[1]
+
+        old_timeout = TrackerScraperModule.REQUEST_TIMEOUT
+        TrackerScraperModule.REQUEST_TIMEOUT = 2.0
+        try:
+            # a torrent of which no tracker responds is reported dead, not unknown
+            torrents = make_torrents(5, [dead_url])
+            for torrent in torrents:
+                self.scraper.add_torrent(torrent)
+            self.wait_for_results(len(torrents))
+            self.assertEqual(len(self.results), len(torrents))
+            for torrent, announce_dict in self.results:
+                self.assertEqual(announce_dict[torrent['infohash']], (-2, -2))
+            self.assert_(dead_url in self.scraper.backoff)
+
+            # also while the tracker is backed off
+            TrackerChecking.ioErrors.clear()
+            self.results = []
+            torrents = make_torrents(10, [dead_url])[5:]
+            for torrent in torrents:
+                self.scraper.add_torrent(torrent)
+            self.wait_for_results(len(torrents))
+            self.assertEqual([announce_dict[torrent['infohash']] for torrent, announce_dict in self.results], [(-2, -2)] * len(torrents))
+        finally:
+            TrackerScraperModule.REQUEST_TIMEOUT = old_timeout
+            dead.close()
+
+    def patch_gethostbyname(self, gethostbyname):
+        self.lookups = []
+        def fake_gethostbyname(host):
+            self.lookups.append(host)
+            return gethostbyname(host)
+        old_gethostbyname = TrackerScraperModule.socket.gethostbyname
+        TrackerScraperModule.socket.gethostbyname = fake_gethostbyname
+        return old_gethostbyname
+
+    def test_slow_resolve(self):
+        resolved = threading.Event()
+        def gethostbyname(host):
+            resolved.wait(10)
+            return "127.0.0.1"
+
+        old_gethostbyname = self.patch_gethostbyname(gethostbyname)
+        tracker = FakeUDPTracker()
+        tracker.start()
+        try:
+            slow_url = "udp://slow.tracker.test:%d/announce" % tracker.port
+            slow_torrents = make_torrents(20, [slow_url])[10:]
+            torrents = make_torrents(10, [tracker.url])
+            for torrent in slow_torrents + torrents:
+                self.scraper.add_torrent(torrent)
+
+            # the scrapes of the other tracker are not held up by the lookup
+            self.wait_for_results(len(torrents))
+            self.check_results(torrents)
+            self.assertEqual(self.scraper.get_stats()['resolving'], 1)
+
+            resolved.set()
+            self.wait_for_results(len(torrents) + len(slow_torrents))
+            self.check_results(torrents + slow_torrents)
+            self.assertEqual(self.lookups, ["slow.tracker.test"])
+            self.assertEqual(self.scraper.get_stats()['resolving'], 0)
+        finally:
+            resolved.set()
+            TrackerScraperModule.socket.gethostbyname = old_gethostbyname
+            tracker.stop()
+
+    def test_failed_resolve(self):
+        addresses = {}
+        def gethostbyname(host):
+            if host not in addresses:
+                raise socket.gaierror("unknown host")
+            return addresses[host]
+
+        old_gethostbyname = self.patch_gethostbyname(gethostbyname)
+        tracker = FakeUDPTracker()
+        tracker.start()
+        try:
+            # each scrape uses another tracker url, so the backoff of a failed url does not interfere
+            def scrape(path, first, count):
+                bad_url = "udp://bad.tracker.test:%d/%s" % (tracker.port, path)
+                torrents = make_torrents(first + count, [bad_url, tracker.url])[first:]
+                for torrent in torrents:
+                    torrent['info']['announce-list'] = [[bad_url], [tracker.url]]
+                    self.scraper.add_torrent(torrent)
+                self.results = []
+                self.wait_for_results(len(torrents))
+                self.check_results(torrents)
+
+            scrape("announce1", 0, 10)
+            self.assertEqual(self.lookups, ["bad.tracker.test"])
+
+            # the failed lookup is cached for RESOLVE_RETRY seconds
+            ip, valid_until = self.scraper.addresses["bad.tracker.test"]
+            self.assertEqual(ip, None)
+            self.assert_(time() < valid_until <= time() + TrackerScraperModule.RESOLVE_RETRY)
+            scrape("announce2", 10, 10)
+            self.assertEqual(self.lookups, ["bad.tracker.test"])
+
+            # and retried once it expires
+            addresses["bad.tracker.test"] = "127.0.0.1"
+            self.scraper.addresses["bad.tracker.test"] = (None, time())
+            scrape("announce3", 20, 10)
+            self.assertEqual(self.lookups, ["bad.tracker.test"] * 2)
+            self.assertEqual(self.scraper.addresses["bad.tracker.test"][0], "127.0.0.1")
+        finally:
+            TrackerScraperModule.socket.gethostbyname = old_gethostbyname
+            tracker.stop()
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTrackerScraper))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
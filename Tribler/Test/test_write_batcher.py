@@ -0,0 +1,136 @@
+# see LICENSE.txt for license information
+
+import os
+import unittest
+import tempfile
+from shutil import rmtree
+from threading import Lock
+
+from Tribler.dispersy.callback import Callback
+import Tribler.Core.CacheDB.sqlitecachedb as sqlitecachedb
+from Tribler.Core.CacheDB.sqlitecachedb import SQLiteCacheDB, CURRENT_MAIN_DB_VERSION
+from Tribler.Core.CacheDB.SqliteCacheDBHandler import NetworkBuzzDBHandler
+
+CREATE_SQL_FILE = os.path.join('..', "schema_sdb_v"+str(CURRENT_MAIN_DB_VERSION)+".sql")
+INSERT_TORRENT = "INSERT INTO _ChannelTorrents (id, torrent_id, channel_id) VALUES (?,?,?)"
+UPDATE_CHANNEL = "UPDATE _Channels SET nr_torrents = nr_torrents+? WHERE id = ?"
+
+class FakeNetworkBuzzDBHandler(NetworkBuzzDBHandler):
+    """ Only the state used by the flush to the database """
+
+    def __init__(self, db):
+        self._db = db
+        self.termLock = Lock()
+        self.nr_bi_phrases = 0
+        self.new_terms = {}
+        self.update_terms = {}
+        self.new_phrases = []
+
+class TestWriteBatcher(unittest.TestCase):
+
+    # SQLiteCacheDB can only open one database file
+    @classmethod
+    def setUpClass(cls):
+        cls.db_dir = tempfile.mkdtemp()
+        cls.db = SQLiteCacheDB.getInstance()
+        cls.db.initDB(os.path.join(cls.db_dir, 'tribler.sdb'), CREATE_SQL_FILE)
+
+        cls.callback = Callback("Dispersy")
+        cls.callback.start()
+        sqlitecachedb.try_register(cls.db, cls.callback)
+
+    @classmethod
+    def tearDownClass(cls):
+        sqlitecachedb.unregister()
+        cls.callback.stop()
+        cls.db.close()
+        rmtree(cls.db_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.old_delay = sqlitecachedb.WRITE_BATCH_DELAY
+        # a delay long enough for the test to queue all writes before the first flush
+        sqlitecachedb.WRITE_BATCH_DELAY = 60.0
+
+        self.db.execute_write("DELETE FROM _ChannelTorrents")
+        self.db.execute_write("DELETE FROM _Channels")
+        self.db.executemany("INSERT INTO _Channels (id, name) VALUES (?,?)", [(1, u'one'), (2, u'two')])
+        self.stats = self.db.getWriteStats()
+
+    def tearDown(self):
+        sqlitecachedb.WRITE_BATCH_DELAY = self.old_delay
+
+    def test_coalesce(self):
+        for i in xrange(1, 51):
+            self.db.queue_write(INSERT_TORRENT, (i, i, 1 + i % 2))
+            self.db.queue_write(UPDATE_CHANNEL, (1, 1 + i % 2))
+        self.assertEqual(self.db.getWriteStats()['queue_depth'], 100)
+
+        # reading a table with queued writes flushes the queue
+        self.assertEqual(self.db.fetchone("SELECT COUNT(*) FROM ChannelTorrents"), 50)
+        self.assertEqual(self.db.fetchall("SELECT id, nr_torrents FROM Channels ORDER BY id"), [(1, 25), (2, 25)])
+
+        stats = self.db.getWriteStats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['queued'] - self.stats['queued'], 100)
+        self.assertEqual(stats['flushes'] - self.stats['flushes'], 1)
+        self.assertEqual(stats['statements'] - self.stats['statements'], 2)
+        self.assertEqual(stats['max_batch_size'], 50)
+
+    def test_dependent(self):
+        # the select in the second insert reads the table of the first insert, the
+        # third insert can not be moved before it
+        self.db.queue_write(INSERT_TORRENT, (1, 1, 1))
+        self.db.queue_write("INSERT INTO _ChannelTorrents (id, torrent_id, channel_id) SELECT 100 + COUNT(*), 0, 2 FROM _ChannelTorrents", ())
+        self.db.queue_write(INSERT_TORRENT, (2, 2, 1))
+
+        self.assertEqual(self.db.fetchall("SELECT id FROM ChannelTorrents ORDER BY id"), [(1,), (2,), (101,)])
+
+    def test_failed_row(self):
+        self.db.queue_writemany(INSERT_TORRENT, [(1, 1, 1), (2, 2, 1), (1, 3, 1), (3, 3, 1)])
+        self.db.flush_writes()
+
+        self.assertEqual(self.db.fetchall("SELECT id, torrent_id FROM ChannelTorrents ORDER BY id"), [(1, 1), (2, 2), (3, 3)])
+        self.assertEqual(self.db.getWriteStats()['failed'] - self.stats['failed'], 1)
+
+    def test_commit(self):
+        self.db.queue_write(UPDATE_CHANNEL, (1, 1))
+        self.db.commitNow()
+        self.callback.call(lambda: None)
+
+        stats = self.db.getWriteStats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['commits'] - self.stats['commits'], 1)
+        self.assertEqual(self.db.fetchone("SELECT nr_torrents FROM Channels WHERE id = 1"), 1)
+
+    def test_network_buzz_flush(self):
+        self.db.execute_write("DELETE FROM TorrentBiTermPhrase")
+        self.db.execute_write("DELETE FROM TermFrequency")
+
+        buzz = FakeNetworkBuzzDBHandler(self.db)
+        buzz.new_terms = {u'ubuntu': (u'ubuntu', 1), u'linux': (u'linux', 1)}
+        buzz.new_phrases = [(1, u'ubuntu', u'linux')]
+        flush = buzz._NetworkBuzzDBHandler__flush_to_database()
+
+        # counting the phrases does not flush the writes that were just queued
+        self.assertEqual(flush.next(), 5.0)
+        stats = self.db.getWriteStats()
+        self.assertEqual(stats['queue_depth'], 3)
+        self.assertEqual(stats['flushes'], self.stats['flushes'])
+
+        # the next flush counts the phrases written in the meantime
+        self.db.flush_writes()
+        flushes = self.db.getWriteStats()['flushes']
+        flush.next()
+        self.assertEqual(buzz.nr_bi_phrases, 1)
+        self.assertEqual(self.db.getWriteStats()['flushes'], flushes)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestWriteBatcher))
+    return suite
+
+def main():
+    unittest.main(defaultTest='test_suite')
+
+if __name__ == '__main__':
+    main()
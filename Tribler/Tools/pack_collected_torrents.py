@@ -0,0 +1,100 @@
+# see LICENSE.txt for license information
+#
+# Adds the .torrent files in the torrent collecting dir to the packed torrent
+# store (Tribler/Core/CacheDB/TorrentStore.py), to be used with
+# SessionConfig.set_torrent_store(True).  The files are left in place: swift
+# seeds the collected torrents from the files named after their root hash.
+# Run it while Tribler is not running.
+
+import sys
+import os
+import getopt
+from traceback import print_exc
+
+from Tribler.Core.CacheDB.TorrentStore import TorrentStore
+from Tribler.Core.Utilities.bencode import bencode, bdecode
+from Tribler.Core.Utilities.Crypto import sha
+
+def usage():
+    print "Usage: python pack_collected_torrents.py [options] directory"
+    print "Options:"
+    print "\t--verbose"
+    print "\t-v\t\t\tprint the files that are skipped"
+    print "\t--help"
+    print "\t-h\t\t\tprint this help screen"
+    print "\tdirectory is the torrent collecting dir, e.g. ~/.Tribler/collected_torrent_files"
+
+def is_collected_torrent_filename(filename):
+    """ The collected torrents are named after the sha1 of their infohash or
+    the root hash of their swift swarm, both in hex """
+    if filename.endswith('.torrent'):
+        return not filename.startswith('tmp_')
+    try:
+        return len(filename) == 40 and len(filename.decode('hex')) == 20
+    except TypeError:
+        return False
+
+def pack_collected_torrents(dirname, store, verbose=False):
+    """
+    Put the collected torrents in dirname that are not in the store yet in
+    the store.
+
+    @return A tuple (number of torrents added, number of files skipped).
+    """
+    added = skipped = 0
+    for filename in sorted(os.listdir(dirname)):
+        if not is_collected_torrent_filename(filename):
+            continue
+
+        try:
+            f = open(os.path.join(dirname, filename), 'rb')
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            infohash = sha(bencode(bdecode(data)['info'])).digest()
+
+        except Exception:
+            # swift content other than .torrent files or a broken file
+            if verbose:
+                print >> sys.stderr, "pack_collected_torrents: skipping", filename
+                print_exc()
+            skipped += 1
+            continue
+
+        if not store.has_torrent(infohash):
+            store.put_torrent(infohash, data)
+            added += 1
+    return added, skipped
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hv", ["help", "verbose"])
+    except getopt.GetoptError, err:
+        print str(err)
+        usage()
+        sys.exit(2)
+
+    verbose = False
+    for o, a in opts:
+        if o in ("-h", "--help"):
+            usage()
+            sys.exit(0)
+        elif o in ("-v", "--verbose"):
+            verbose = True
+
+    if len(args) != 1:
+        usage()
+        sys.exit(2)
+
+    dirname = os.path.abspath(args[0])
+    # a single fsync when closing the store
+    store = TorrentStore(dirname, sync=False)
+    try:
+        added, skipped = pack_collected_torrents(dirname, store, verbose)
+        print "Added %d torrents, skipped %d files, %d torrents in the store" % (added, skipped, len(store.get_infohashes()))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -36,7 +36,7 @@ except ImportError,e:
     prctlimported = False
 
 from Tribler.Core.Utilities.bencode import bdecode
-from Tribler.TrackerChecking.TrackerChecking import multiTrackerChecking
+from Tribler.TrackerChecking.TrackerScraper import TrackerScraper
 
 from Tribler.Core.CacheDB.CacheDBHandler import TorrentDBHandler
 from Tribler.Core.DecentralizedTracking.mainlineDHTChecker import mainlineDHTChecker
@@ -46,6 +46,7 @@ from traceback import print_exc
 from Tribler.Core.CacheDB.sqlitecachedb import forceDBThread
 
 QUEUE_SIZE_LIMIT = 250
+MAX_TORRENTS_IN_FLIGHT = 250
 DEBUG = False
 
 class TorrentChecking(Thread):
@@ -79,6 +80,9 @@ class TorrentChecking(Thread):
         
         self.sleepEvent = threading.Event()
         self.torrent_collection_dir = Session.get_instance().get_torrent_collecting_dir()
+        
+        self.scraper = TrackerScraper(self.dbUpdateTorrentsBatch, self.getInfoHashesForTracker, MAX_TORRENTS_IN_FLIGHT)
+        self.scraper.start()
                 
         self.start()
             
@@ -99,6 +103,7 @@ class TorrentChecking(Thread):
         self.shouldquit = True
         self.sleepEvent.set()
         self.announceQueue.put(None)
+        self.scraper.shutdown()
         
     #add a torrent to the queue, this will schedule a call to update the status etc. for this torrent
     #if the queue is currently full, it will not!
@@ -182,30 +187,24 @@ class TorrentChecking(Thread):
                     self.dbSelectTorrentToCheck(self.dbDoCheck)
                     
                 torrent = self.announceQueue.get()
-                if torrent:
+                if torrent and not self.shouldquit:
                     if DEBUG:
                         print >> sys.stderr, "TorrentChecking: tracker checking", torrent["info"].get("announce", ""), torrent["info"].get("announce-list", "")
     
-                    trackerStart = time()
-                    multi_announce_dict = multiTrackerChecking(torrent, self.getInfoHashesForTracker)
-                    if DEBUG:
-                        print >> sys.stderr, "TorrentChecking: tracker checking took ", time() - trackerStart, torrent["info"].get("announce", "") ,torrent["info"].get("announce-list", "")
-                    
-                    if not self.shouldquit:
-                        # Modify last_check time such that the torrents in queue will be skipped if present in this multi-announce
-                        with self.queueLock:
-                            for tor in self.queue:
-                                if tor['infohash'] in multi_announce_dict:
-                                    tor['last_check'] = time()
-        
-                        # Update torrent with new status
-                        self.dbUpdateTorrents(torrent, multi_announce_dict)
+                    # the scraper checks many torrents at once, results are
+                    # reported to dbUpdateTorrentsBatch
+                    self.scraper.add_torrent(torrent)
                     
                 self.announceQueue.task_done()
             
             except: #make sure we do not crash while True loop
                 print_exc()
             
+            # wait while the scraper is full
+            while self.scraper.is_full() and not self.shouldquit:
+                self.sleepEvent.clear()
+                self.sleepEvent.wait(1)
+            
             # schedule sleep time, only if we do not have any infohashes scheduled
             if len(self.queue) == 0 and not self.shouldquit:
                 diff = time() - start
@@ -242,18 +241,25 @@ class TorrentChecking(Thread):
     
     def readTorrent(self, torrent):
         try:
-            torrent_path = torrent['torrent_path']
-            
-            if not path.isfile(torrent_path):
-                #torrent not found, try filename + current torrent collection directory
-                _, torrent_filename = path.split(torrent_path)
-                torrent_path = path.join(self.torrent_collection_dir, torrent_filename)
+            _data = None
+            torrent_store = self.torrentdb.torrent_store
+            if torrent_store is not None and torrent_store.has_torrent(torrent['infohash']):
+                _data = torrent_store.get_torrent(torrent['infohash'])
                 
-            if path.isfile(torrent_path):
-                f = open(torrent_path,'rb')
-                _data = f.read()
-                f.close()
+            else:
+                torrent_path = torrent['torrent_path']
+                
+                if not path.isfile(torrent_path):
+                    #torrent not found, try filename + current torrent collection directory
+                    _, torrent_filename = path.split(torrent_path)
+                    torrent_path = path.join(self.torrent_collection_dir, torrent_filename)
+                    
+                if path.isfile(torrent_path):
+                    f = open(torrent_path,'rb')
+                    _data = f.read()
+                    f.close()
             
+            if _data:
                 data = bdecode(_data)
             
                 assert 'info' in data
@@ -340,6 +346,27 @@ class TorrentChecking(Thread):
             
         return torrent
     
+    @forceDBThread
+    def dbUpdateTorrentsBatch(self, results):
+        """ Called by the scraper with a list of (torrent, announce_dict) tuples """
+        if self.shouldquit:
+            return
+        
+        # Modify last_check time such that the torrents in queue will be skipped if present in this multi-announce
+        checked = set()
+        for _, announce_dict in results:
+            checked.update(announce_dict.iterkeys())
+        
+        now = time()
+        with self.queueLock:
+            for tor in self.queue:
+                if tor['infohash'] in checked:
+                    tor['last_check'] = now
+        
+        # Update torrents with new status
+        for torrent, announce_dict in results:
+            self.dbUpdateTorrents(torrent, announce_dict)
+    
     @forceDBThread
     def dbUpdateTorrents(self, torrent, announce_dict):
         for key, values in announce_dict.iteritems():
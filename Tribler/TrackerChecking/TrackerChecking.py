@@ -26,11 +26,9 @@ def trackerChecking(torrent):
 def multiTrackerChecking(torrent, multiscrapeCallback):
     return single_no_thread(torrent, multiscrapeCallback)
 
-def single_no_thread(torrent, multiscrapeCallback = None):
-    multi_announce_dict = {}
-    multi_announce_dict[torrent['infohash']] = (-2, -2)
-
-    #determine trackers
+def getTrackers(torrent):
+    """ Returns the http and udp trackers of torrent, in the order in which they
+        should be checked """
     trackers = []
     if (torrent["info"].get("announce-list", "")==""):  # no announce-list
         trackers.append(torrent["info"]["announce"])
@@ -53,7 +51,13 @@ def single_no_thread(torrent, multiscrapeCallback = None):
 
     trackers = [(-ioErrors.get(tracker, 0), tracker) for tracker in trackers if tracker.startswith('http') or tracker.startswith('udp')]
     trackers.sort(reverse = True) #sorting reverse will prefer udp over http trackers
-    for _, announce in trackers:
+    return [tracker for _, tracker in trackers]
+
+def single_no_thread(torrent, multiscrapeCallback = None):
+    multi_announce_dict = {}
+    multi_announce_dict[torrent['infohash']] = (-2, -2)
+
+    for announce in getTrackers(torrent):
         announce_dict = singleTrackerStatus(torrent, announce, multiscrapeCallback)
 
         for key, values in announce_dict.iteritems():
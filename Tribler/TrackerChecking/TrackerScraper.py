@@ -0,0 +1,661 @@
+# see LICENSE.txt for license information
+#
+# TrackerScraper checks many torrents at once.  Unlike multiTrackerChecking,
+# which blocks until a single tracker answers or times out, all UDP (BEP 15)
+# scrapes share one non-blocking socket and HTTP scrapes use non-blocking
+# sockets, all handled from a single select loop.
+#
+# Torrents waiting for the same tracker are grouped into one scrape request of
+# at most 74 infohashes.  UDP connection ids are cached for the 60 seconds they
+# are valid, and trackers that fail are not contacted again until their
+# backoff period expires.
+#
+# Tracker hostnames are resolved on separate threads, so a slow DNS lookup does
+# not stall the select loop.  The requests for a host wait until its lookup is
+# done.  Both addresses and failed lookups are cached, for RESOLVE_VALID and
+# RESOLVE_RETRY seconds respectively.
+#
+# Results are delivered in batches through the result callback, as a list of
+# (torrent, announce_dict) tuples, from the TrackerScraper thread.
+#
+
+import sys
+import socket
+from errno import EWOULDBLOCK, EAGAIN, EINPROGRESS, EINTR
+from random import randint
+from select import select, error as select_error
+from struct import pack, unpack_from
+from threading import Thread, Lock
+from time import time
+from traceback import print_exc
+from urlparse import urlparse
+try:
+    prctlimported = True
+    import prctl
+except ImportError,e:
+    prctlimported = False
+
+from Tribler.Core.Utilities.bencode import bdecode
+from Tribler.TrackerChecking.TrackerChecking import getTrackers, getUrl, getStatus, registerIOError, registerSuccess
+
+DEBUG = False
+
+UDP_CONNECT_MAGIC = 0x41727101980
+UDP_CONNECTION_ID_VALID = 60     # BEP 15: a connection id is valid for one minute
+MAX_INFOHASHES_PER_REQUEST = 74  # BEP 15: at most 74 infohashes per scrape
+MIN_INFOHASHES_PER_REQUEST = 10  # ask multiscrape_callback for more below this
+REQUEST_TIMEOUT = 15.0
+BATCH_DELAY = 0.5                # time to wait for more infohashes for a tracker
+BACKOFF_MIN = 30
+BACKOFF_MAX = 60*60
+RESULT_BATCH_SIZE = 50
+RESULT_BATCH_DELAY = 2.0
+MAX_HTTP_RESPONSE = 512*1024
+POLL_INTERVAL = 0.2
+RESOLVE_VALID = 60*60            # seconds to cache the address of a tracker
+RESOLVE_RETRY = 5*60             # seconds before retrying a failed lookup
+
+class ScrapeJob:
+    """ The check of a single torrent.  Its trackers are tried one after
+        another, until one of them reports seeders. """
+
+    def __init__(self, torrent, trackers):
+        self.torrent = torrent
+        self.infohash = torrent['infohash']
+        self.trackers = trackers
+        self.announce_dict = {self.infohash: (-2, -2)}
+
+    def merge(self, announce_dict):
+        for key, values in announce_dict.iteritems():
+            if key in self.announce_dict:
+                cur_values = self.announce_dict[key]
+                self.announce_dict[key] = (max(values[0], cur_values[0]), max(values[1], cur_values[1]))
+            else:
+                self.announce_dict[key] = values
+
+    def has_seeders(self):
+        return self.announce_dict[self.infohash][0] > 0
+
+class ScrapeRequest:
+    """ A single scrape of up to MAX_INFOHASHES_PER_REQUEST infohashes """
+
+    def __init__(self, tracker, jobs, extra_infohashes):
+        self.tracker = tracker
+        self.jobs = jobs # infohash -> [ScrapeJob, ...]
+        self.infohashes = jobs.keys() + extra_infohashes
+        # the result for the extra infohashes is reported with the first job
+        self.extra_infohashes = extra_infohashes
+        self.deadline = time() + REQUEST_TIMEOUT
+
+        # udp
+        self.address = None
+        self.transaction_id = None
+
+        # http
+        self.sock = None
+        self.outbuf = ''
+        self.inbuf = []
+        self.inlen = 0
+
+class UdpConnectRequest:
+    """ Obtains a connection id from a UDP tracker for the waiting requests """
+
+    def __init__(self, address, transaction_id):
+        self.address = address
+        self.transaction_id = transaction_id
+        self.waiting = []
+        self.deadline = time() + REQUEST_TIMEOUT
+
+class TrackerScraper(Thread):
+
+    def __init__(self, result_callback, multiscrape_callback = None, max_jobs = 250):
+        """ result_callback is called with a list of (torrent, announce_dict)
+            tuples.  multiscrape_callback(tracker) may return additional
+            infohashes to scrape when a request has room for them. """
+        Thread.__init__(self)
+        self.setName('TrackerScraper'+self.getName())
+        self.setDaemon(True)
+
+        self.result_callback = result_callback
+        self.multiscrape_callback = multiscrape_callback
+        self.max_jobs = max_jobs
+        self.shouldquit = False
+
+        self.lock = Lock()
+        self.new_jobs = []
+        self.infohashes_in_flight = set()
+
+        self.pending = {}         # tracker -> [first added, [ScrapeJob, ...]]
+        self.udp_requests = {}    # transaction id -> ScrapeRequest or UdpConnectRequest
+        self.udp_connecting = {}  # address -> UdpConnectRequest
+        self.http_requests = {}   # socket -> ScrapeRequest
+        self.thread_results = []  # (ScrapeRequest, announce_dict) from https threads
+        self.connection_ids = {}  # address -> (connection id, valid until)
+        self.addresses = {}       # hostname -> (ip or None, valid until)
+        self.resolving = {}       # hostname -> [ScrapeRequest, ...] waiting for its lookup
+        self.thread_resolved = [] # (hostname, ip or None) from resolver threads
+        self.backoff = {}         # tracker -> (failures, until)
+
+        self.results = []
+        self.results_since = 0
+
+        self.nr_checked = 0
+        self.nr_requests = 0
+        self.nr_responses = 0
+        self.nr_failures = 0
+        self.nr_infohashes = 0
+
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.setblocking(0)
+
+    def add_torrent(self, torrent):
+        """ Schedules torrent to be checked, torrent must contain an 'info'
+            dictionary with its announce and/or announce-list.  Returns False
+            if the torrent is already being checked or there are too many
+            torrents being checked. """
+        with self.lock:
+            if torrent['infohash'] in self.infohashes_in_flight or len(self.infohashes_in_flight) >= self.max_jobs:
+                return False
+
+            self.infohashes_in_flight.add(torrent['infohash'])
+            self.new_jobs.append(ScrapeJob(torrent, getTrackers(torrent)))
+        return True
+
+    def get_nr_jobs(self):
+        return len(self.infohashes_in_flight)
+
+    def is_full(self):
+        return len(self.infohashes_in_flight) >= self.max_jobs
+
+    def get_stats(self):
+        return {'jobs': len(self.infohashes_in_flight),
+                'checked': self.nr_checked,
+                'requests': self.nr_requests,
+                'responses': self.nr_responses,
+                'failures': self.nr_failures,
+                'infohashes': self.nr_infohashes,
+                'udp_in_flight': len(self.udp_requests),
+                'http_in_flight': len(self.http_requests),
+                'connection_ids': len(self.connection_ids),
+                'resolving': len(self.resolving),
+                'backed_off': len(self.backoff)}
+
+    def shutdown(self):
+        self.shouldquit = True
+
+    def run(self):
+        if prctlimported:
+            prctl.set_name("Tribler"+self.getName())
+
+        while not self.shouldquit:
+            try:
+                self._process_new_jobs()
+                self._send_pending()
+                self._wait_for_io()
+                self._check_timeouts()
+                self._flush_results()
+            except:
+                print_exc()
+
+        for sock in self.http_requests.keys():
+            sock.close()
+        self.udp_socket.close()
+
+    #
+    # jobs
+    #
+    def _process_new_jobs(self):
+        with self.lock:
+            new_jobs, self.new_jobs = self.new_jobs, []
+
+        for job in new_jobs:
+            self._next_tracker(job)
+
+        with self.lock:
+            new_results, self.thread_results = self.thread_results, []
+
+        for request, announce_dict in new_results:
+            if announce_dict is None:
+                self._request_failed(request)
+            else:
+                self._request_succeeded(request, announce_dict)
+
+        with self.lock:
+            resolved, self.thread_resolved = self.thread_resolved, []
+
+        now = time()
+        for host, ip in resolved:
+            self.addresses[host] = (ip, now + (RESOLVE_VALID if ip else RESOLVE_RETRY))
+            for request in self.resolving.pop(host, []):
+                self._dispatch_request(request)
+
+    def _next_tracker(self, job):
+        now = time()
+        while job.trackers and not job.has_seeders():
+            tracker = job.trackers.pop(0)
+            failures, until = self.backoff.get(tracker, (0, 0))
+            if until > now:
+                # as if it did not respond, the torrent stays dead unless another tracker reports it
+                job.merge({job.infohash: (-2, -2)})
+                continue
+
+            pending = self.pending.get(tracker)
+            if pending is None:
+                self.pending[tracker] = [now, [job]]
+            else:
+                pending[1].append(job)
+            return
+
+        self._finish_job(job)
+
+    def _finish_job(self, job):
+        if DEBUG:
+            print >> sys.stderr, "TrackerScraper: result", job.announce_dict
+
+        if not self.results:
+            self.results_since = time()
+        self.results.append((job.torrent, job.announce_dict))
+        self.nr_checked += 1
+
+        with self.lock:
+            self.infohashes_in_flight.discard(job.infohash)
+
+    def _flush_results(self):
+        if self.results:
+            if len(self.results) >= RESULT_BATCH_SIZE or time() - self.results_since >= RESULT_BATCH_DELAY or not self.infohashes_in_flight:
+                results, self.results = self.results, []
+                self.result_callback(results)
+
+    #
+    # requests
+    #
+    def _send_pending(self):
+        now = time()
+        for tracker, (since, jobs) in self.pending.items():
+            if len(jobs) < MAX_INFOHASHES_PER_REQUEST and now - since < BATCH_DELAY and not self.shouldquit:
+                continue
+            del self.pending[tracker]
+
+            jobs_by_infohash = {}
+            for job in jobs:
+                jobs_by_infohash.setdefault(job.infohash, []).append(job)
+
+            infohashes = jobs_by_infohash.keys()
+            for i in xrange(0, len(infohashes), MAX_INFOHASHES_PER_REQUEST):
+                chunk = dict((infohash, jobs_by_infohash[infohash]) for infohash in infohashes[i:i+MAX_INFOHASHES_PER_REQUEST])
+
+                extra_infohashes = []
+                if self.multiscrape_callback and len(chunk) < MIN_INFOHASHES_PER_REQUEST:
+                    for infohash in self.multiscrape_callback(tracker):
+                        if len(chunk) + len(extra_infohashes) >= MAX_INFOHASHES_PER_REQUEST:
+                            break
+                        if len(infohash) == 20 and infohash not in chunk and infohash not in extra_infohashes:
+                            extra_infohashes.append(infohash)
+
+                self._send_request(ScrapeRequest(tracker, chunk, extra_infohashes))
+
+    def _send_request(self, request):
+        self.nr_requests += 1
+        self.nr_infohashes += len(request.infohashes)
+        self._dispatch_request(request)
+
+    def _dispatch_request(self, request):
+        try:
+            if request.tracker.startswith('https'):
+                thread = Thread(target = self._https_request, args = (request,), name = "TrackerScraperHTTPS")
+                thread.setDaemon(True)
+                thread.start()
+                return
+
+            if request.tracker.startswith('udp'):
+                host, port = getUrl(request.tracker, [])
+            else:
+                host = urlparse(request.tracker).hostname
+
+            ip = self._resolve(host, request)
+            if ip is None:
+                # _process_new_jobs dispatches the request again when the lookup is done
+                return
+
+            if request.tracker.startswith('udp'):
+                self._send_udp_request(request, (ip, port))
+            else:
+                self._send_http_request(request, ip)
+
+        except (socket.error, socket.gaierror, ValueError):
+            if DEBUG:
+                print_exc()
+            self._request_failed(request)
+
+    def _request_succeeded(self, request, announce_dict):
+        if DEBUG:
+            print >> sys.stderr, "TrackerScraper: response from", request.tracker, len(announce_dict)
+
+        self.nr_responses += 1
+        registerSuccess(request.tracker)
+        self.backoff.pop(request.tracker, None)
+
+        first_job = None
+        for infohash, jobs in request.jobs.iteritems():
+            for job in jobs:
+                if first_job is None:
+                    first_job = job
+                if infohash in announce_dict:
+                    job.merge({infohash: announce_dict[infohash]})
+
+        extra_dict = dict((infohash, announce_dict[infohash]) for infohash in request.extra_infohashes if infohash in announce_dict)
+        if extra_dict and first_job:
+            first_job.merge(extra_dict)
+
+        for jobs in request.jobs.itervalues():
+            for job in jobs:
+                self._next_tracker(job)
+
+    def _request_failed(self, request, status = (-2, -2)):
+        if DEBUG:
+            print >> sys.stderr, "TrackerScraper: no response from", request.tracker
+
+        self.nr_failures += 1
+        registerIOError(request.tracker)
+
+        now = time()
+        failures, _ = self.backoff.get(request.tracker, (0, 0))
+        self.backoff[request.tracker] = (failures + 1, now + min(BACKOFF_MIN * 2 ** failures, BACKOFF_MAX))
+        if len(self.backoff) > 1000:
+            for tracker, (_, until) in self.backoff.items():
+                if until < now:
+                    del self.backoff[tracker]
+
+        # like singleTrackerStatus, a tracker that does not respond reports the torrent dead
+        for infohash, jobs in request.jobs.iteritems():
+            for job in jobs:
+                job.merge({infohash: status})
+                self._next_tracker(job)
+
+    def _resolve(self, host, request):
+        """ Returns the ip address of host, or None if request has to wait for
+            a resolver thread.  Raises socket.gaierror if the last lookup of
+            host, less than RESOLVE_RETRY seconds ago, failed. """
+        if not host:
+            raise ValueError("no hostname in %s" % request.tracker)
+        if is_ip_address(host):
+            return host
+
+        ip, valid_until = self.addresses.get(host, (None, 0))
+        if valid_until > time():
+            if ip is None:
+                raise socket.gaierror("unable to resolve %s" % host)
+            return ip
+
+        # gethostbyname blocks, one thread per host looks it up
+        waiting = self.resolving.get(host)
+        if waiting is None:
+            self.resolving[host] = [request]
+            thread = Thread(target = self._resolve_thread, args = (host,), name = "TrackerScraperResolver")
+            thread.setDaemon(True)
+            thread.start()
+        else:
+            waiting.append(request)
+        return None
+
+    def _resolve_thread(self, host):
+        try:
+            ip = socket.gethostbyname(host)
+        except (socket.error, UnicodeError):
+            ip = None
+
+        with self.lock:
+            self.thread_resolved.append((host, ip))
+
+    def _check_timeouts(self):
+        now = time()
+        for transaction_id, request in self.udp_requests.items():
+            if request.deadline < now:
+                del self.udp_requests[transaction_id]
+                if isinstance(request, UdpConnectRequest):
+                    del self.udp_connecting[request.address]
+                    for waiting in request.waiting:
+                        self._request_failed(waiting)
+                else:
+                    self._request_failed(request)
+
+        for sock, request in self.http_requests.items():
+            if request.deadline < now:
+                del self.http_requests[sock]
+                sock.close()
+                self._request_failed(request)
+
+        for host, waiting in self.resolving.items():
+            expired = [request for request in waiting if request.deadline < now]
+            if expired:
+                # the lookup is still running, keep the entry so it is not started again
+                waiting[:] = [request for request in waiting if request.deadline >= now]
+                for request in expired:
+                    self._request_failed(request)
+
+        for address, (_, valid_until) in self.connection_ids.items():
+            if valid_until < now:
+                del self.connection_ids[address]
+
+    def _wait_for_io(self):
+        rlist = [self.udp_socket]
+        wlist = []
+        for sock, request in self.http_requests.iteritems():
+            if request.outbuf:
+                wlist.append(sock)
+            else:
+                rlist.append(sock)
+
+        try:
+            readable, writable, _ = select(rlist, wlist, [], POLL_INTERVAL)
+        except select_error, e:
+            if e.args[0] == EINTR:
+                return
+            raise
+
+        for sock in readable:
+            if sock is self.udp_socket:
+                self._read_udp()
+            else:
+                self._read_http(sock)
+
+        for sock in writable:
+            if sock in self.http_requests:
+                self._write_http(sock)
+
+    #
+    # UDP trackers, BEP 15
+    #
+    def _new_transaction_id(self):
+        transaction_id = randint(0, 0x7fffffff)
+        while transaction_id in self.udp_requests:
+            transaction_id = randint(0, 0x7fffffff)
+        return transaction_id
+
+    def _send_udp_request(self, request, address):
+        request.address = address
+
+        connection_id = self.connection_ids.get(request.address)
+        if connection_id is not None:
+            self._send_udp_scrape(request, connection_id[0])
+
+        elif request.address in self.udp_connecting:
+            self.udp_connecting[request.address].waiting.append(request)
+
+        else:
+            connect = UdpConnectRequest(request.address, self._new_transaction_id())
+            connect.waiting.append(request)
+            self.udp_socket.sendto(pack('!qii', UDP_CONNECT_MAGIC, 0, connect.transaction_id), request.address)
+            self.udp_requests[connect.transaction_id] = connect
+            self.udp_connecting[request.address] = connect
+
+    def _send_udp_scrape(self, request, connection_id):
+        request.transaction_id = self._new_transaction_id()
+        request.deadline = time() + REQUEST_TIMEOUT
+        msg = pack('!qii' + '20s' * len(request.infohashes), connection_id, 2, request.transaction_id, *request.infohashes)
+        try:
+            self.udp_socket.sendto(msg, request.address)
+        except socket.error:
+            if DEBUG:
+                print_exc()
+            self._request_failed(request)
+        else:
+            self.udp_requests[request.transaction_id] = request
+
+    def _read_udp(self):
+        # drain all datagrams that are available
+        while True:
+            try:
+                data, address = self.udp_socket.recvfrom(8192)
+            except socket.error, e:
+                if e.args[0] in (EWOULDBLOCK, EAGAIN):
+                    return
+                # e.g. ECONNREFUSED from an earlier sendto, requests will time out
+                if DEBUG:
+                    print >> sys.stderr, "TrackerScraper: udp error", e
+                return
+
+            if len(data) < 8:
+                continue
+
+            action, transaction_id = unpack_from('!ii', data)
+            request = self.udp_requests.get(transaction_id)
+            if request is None or request.address != address:
+                continue
+            del self.udp_requests[transaction_id]
+
+            if isinstance(request, UdpConnectRequest):
+                del self.udp_connecting[request.address]
+                if action == 0 and len(data) >= 16:
+                    connection_id, = unpack_from('!q', data, 8)
+                    self.connection_ids[request.address] = (connection_id, time() + UDP_CONNECTION_ID_VALID)
+                    for waiting in request.waiting:
+                        self._send_udp_scrape(waiting, connection_id)
+                else:
+                    for waiting in request.waiting:
+                        self._request_failed(waiting)
+
+            elif action == 2:
+                announce_dict = {}
+                for index, infohash in enumerate(request.infohashes):
+                    offset = 8 + 12 * index
+                    if offset + 12 > len(data):
+                        break
+                    seeders, completed, leechers = unpack_from('!iii', data, offset)
+                    announce_dict[infohash] = (seeders, leechers)
+                self._request_succeeded(request, announce_dict)
+
+            else:
+                # action 3: error, the connection id may have expired
+                self.connection_ids.pop(request.address, None)
+                self._request_failed(request)
+
+    #
+    # HTTP trackers
+    #
+    def _send_http_request(self, request, ip):
+        url = urlparse(getUrl(request.tracker, request.infohashes))
+        port = url.port or 80
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(0)
+        err = sock.connect_ex((ip, port))
+        if err not in (0, EINPROGRESS, EWOULDBLOCK):
+            sock.close()
+            raise socket.error(err, "connect failed")
+
+        request.sock = sock
+        request.outbuf = "GET %s HTTP/1.0\r\nHost: %s\r\nUser-Agent: Tribler\r\nConnection: close\r\n\r\n" % (path, url.netloc)
+        self.http_requests[sock] = request
+
+    def _write_http(self, sock):
+        request = self.http_requests[sock]
+        try:
+            sent = sock.send(request.outbuf)
+            request.outbuf = request.outbuf[sent:]
+        except socket.error, e:
+            if e.args[0] not in (EWOULDBLOCK, EAGAIN):
+                del self.http_requests[sock]
+                sock.close()
+                self._request_failed(request)
+
+    def _read_http(self, sock):
+        request = self.http_requests[sock]
+        try:
+            data = sock.recv(65536)
+        except socket.error, e:
+            if e.args[0] in (EWOULDBLOCK, EAGAIN):
+                return
+            data = None
+
+        if data:
+            request.inbuf.append(data)
+            request.inlen += len(data)
+            if request.inlen <= MAX_HTTP_RESPONSE:
+                return
+            data = None
+
+        del self.http_requests[sock]
+        sock.close()
+
+        announce_dict = None
+        if data is not None:
+            # connection closed, the response is complete
+            announce_dict = parseHTTPScrapeResponse(''.join(request.inbuf), request.infohashes[0])
+
+        if announce_dict is None:
+            self._request_failed(request)
+        else:
+            self._request_succeeded(request, announce_dict)
+
+    def _https_request(self, request):
+        # https is rare, use the blocking implementation on a separate thread
+        try:
+            url = getUrl(request.tracker, request.infohashes)
+            announce_dict = getStatus(request.tracker, url, request.infohashes[0], request.infohashes)
+        except:
+            announce_dict = None
+
+        with self.lock:
+            self.thread_results.append((request, announce_dict))
+
+def is_ip_address(host):
+    try:
+        socket.inet_aton(host)
+    except (socket.error, UnicodeError):
+        return False
+    return host.count('.') == 3
+
+def parseHTTPScrapeResponse(response, info_hash):
+    """ Parses the HTTP response to a scrape request, returns None when the
+        response is invalid """
+    header, _, body = response.partition("\r\n\r\n")
+    status = header.split("\r\n", 1)[0].split(" ")
+    if len(status) < 2 or status[1] != "200":
+        return None
+
+    try:
+        response_dict = bdecode(body)
+    except:
+        return None
+
+    if not isinstance(response_dict, dict):
+        return None
+
+    if "files" in response_dict:
+        returndict = {}
+        try:
+            for cur_infohash, status in response_dict["files"].iteritems():
+                returndict[cur_infohash] = (max(0, status["complete"]), max(0, status["incomplete"]))
+        except (KeyError, TypeError, AttributeError):
+            return None
+        return returndict
+
+    flags = response_dict.get("flags")
+    if isinstance(flags, dict) and "min_request_interval" in flags:
+        # may be interval problem
+        return {info_hash: (-3, -3)}
+    return None
@@ -4,8 +4,16 @@
 # Simpler way of communicating with a separate process running swift via
 # its CMDGW interface
 #
+# Commands are \r\n ended lines.  When both sides agreed on it by exchanging
+# TUNNELFRAMING BINARY, tunneled packets are sent as binary frames instead of
+# a TUNNELSEND or TUNNELRECV line followed by the data:
+# - [0x01][4 byte data length][4 byte IPv4 address][2 byte port][1 byte session length][session][data]
+# A frame starts with a byte below any command character, so frames and lines
+# can be told apart in the same stream.
+#
 
 import sys
+import struct
 from threading import Thread,Lock,currentThread
 import socket
 from traceback import print_exc
@@ -19,9 +27,16 @@ from Tribler.dispersy.decorator import attach_profiler
 
 DEBUG = False
 
+FRAMING_CMD = "TUNNELFRAMING BINARY"
+TUNNEL_FRAME = 0x01
+TUNNEL_HEADER = struct.Struct("!BI4sHB")
+
+# parsed bytes are removed from the front of the buffer once there are this many
+COMPACT_SIZE = 65536
+
 class FastI2IConnection(Thread):
     
-    def __init__(self,port,readlinecallback,closecallback):
+    def __init__(self,port,readlinecallback,closecallback,tunnelcallback=None,framing=False):
         Thread.__init__(self)
         self.setName("FastI2I"+self.getName())
         self.setDaemon(True)
@@ -29,10 +44,15 @@ class FastI2IConnection(Thread):
         self.port = port
         self.readlinecallback = readlinecallback
         self.closecallback = closecallback
+        self.tunnelcallback = tunnelcallback
+        # binary tunnel frames: requested by us, agreed by swift
+        self.framing_requested = framing
+        self.framing = False
         
         self.sock = None
-        # Socket only every read by self
-        self.buffer = ''
+        # Socket only every read by self, the unparsed data starts at self.offset
+        self.buffer = bytearray()
+        self.offset = 0
         # write lock on socket
         self.lock = Lock() 
 
@@ -47,6 +67,8 @@ class FastI2IConnection(Thread):
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.connect(("127.0.0.1",self.port))
+            if self.framing_requested:
+                self.write(FRAMING_CMD+"\r\n")
             while True:
                 data = self.sock.recv(10240)
                 if len(data) == 0:
@@ -80,31 +102,95 @@ class FastI2IConnection(Thread):
         if DEBUG:
             print >>sys.stderr,"fasti2i: data_came_in",`data`,len(data)
 
-        if len(self.buffer) == 0:
-            self.buffer = data
-        else:
-            self.buffer = self.buffer + data
+        self.buffer += data
         self.read_lines()
         
     def read_lines(self):
-        while True:
-            cmd, separator, self.buffer = self.buffer.partition("\r\n")
-            if separator:
-                if self.readlinecallback(self, cmd):
-                    # 01/05/12 Boudewijn: when a positive value is returned we immediately return to
-                    # allow more bytes to be pushed into the buffer
-                    self.buffer = "".join((cmd, separator, self.buffer))
-
-            else:
-                self.buffer = cmd
+        while self.offset < len(self.buffer):
+            # without agreed framing a TUNNEL_FRAME byte is just data
+            if self.framing and self.buffer[self.offset] == TUNNEL_FRAME:
+                if not self.read_frame():
+                    break
+                continue
+
+            end = self.buffer.find("\r\n", self.offset)
+            if end == -1:
                 break
+            start = self.offset
+            cmd = str(self.buffer[start:end])
+            self.offset = end + 2
+
+            if self.framing_requested and not self.framing and self.read_framing_reply(cmd):
+                continue
+
+            if self.readlinecallback(self, cmd):
+                # 01/05/12 Boudewijn: when a positive value is returned we immediately return to
+                # allow more bytes to be pushed into the buffer
+                self.offset = start
+                break
+
+        if self.offset == len(self.buffer):
+            del self.buffer[:]
+            self.offset = 0
+        elif self.offset >= COMPACT_SIZE:
+            del self.buffer[:self.offset]
+            self.offset = 0
+
+    def read_frame(self):
+        """ Pass the tunnel frame at the read offset to tunnelcallback, returns False when it is incomplete """
+        if len(self.buffer) - self.offset < TUNNEL_HEADER.size:
+            return False
+        _, length, ip, port, sessionlength = TUNNEL_HEADER.unpack_from(self.buffer, self.offset)
+        start = self.offset + TUNNEL_HEADER.size
+        end = start + sessionlength + length
+        if len(self.buffer) < end:
+            return False
+
+        session = str(self.buffer[start:start+sessionlength])
+        data = str(self.buffer[start+sessionlength:end])
+        self.offset = end
+        self.tunnelcallback(self, session, (socket.inet_ntoa(ip), port), data)
+        return True
+
+    def read_framing_reply(self, cmd):
+        """ Returns True when cmd is the answer of swift to FRAMING_CMD """
+        if cmd == FRAMING_CMD:
+            self.framing = True
+            return True
+
+        # a swift engine without binary frames rejects the command, other
+        # errors are about a download and start with its roothash
+        words = cmd.split()
+        if words and words[0] == "ERROR" and (len(words) < 2 or len(words[1]) != 40):
+            print >>sys.stderr,"fasti2i: swift does not support binary tunnel frames:",cmd
+            self.framing_requested = False
+            return True
+        return False
+
+    def buffered(self):
+        """ Returns the number of received bytes after the last read line """
+        return len(self.buffer) - self.offset
+
+    def read(self, length):
+        """ Read data that followed a line, called by readlinecallback """
+        data = str(self.buffer[self.offset:self.offset+length])
+        self.offset += len(data)
+        return data
+
+    def write_tunnel(self, session, address, data):
+        """ Called by any thread """
+        if self.framing:
+            header = TUNNEL_HEADER.pack(TUNNEL_FRAME, len(data), socket.inet_aton(address[0]), address[1], len(session))
+            self.write(header+session+data)
+        else:
+            self.write("TUNNELSEND %s:%d/%s %d\r\n" % (address[0], address[1], session.encode("HEX"), len(data)) + data)
     
     def write(self,data):
         """ Called by any thread """
         self.lock.acquire()
         try:
             if self.sock is not None:
-                self.sock.send(data)
+                self.sock.sendall(data)
         finally:
             self.lock.release()            
     
@@ -21,6 +21,9 @@ except ImportError,e:
 
 DEBUG = False
 
+# parsed bytes are removed from the front of the buffer once there are this many
+COMPACT_SIZE = 65536
+
 class Instance2InstanceServer(Thread):
 
     def __init__(self,i2iport,connhandler,timeout=300.0):
@@ -181,7 +184,9 @@ class InstanceConnection:
         self.singsock = singsock
         self.connhandler = connhandler
         self.readlinecallback = readlinecallback
-        self.buffer = ''
+        # the unparsed data starts at self.offset
+        self.buffer = bytearray()
+        self.offset = 0
 
 
     def data_came_in(self,data):
@@ -191,25 +196,40 @@ class InstanceConnection:
         if DEBUG:
             print >>sys.stderr,"i2is: ic: data_came_in",`data`,len(data)
 
-        if len(self.buffer) == 0:
-            self.buffer = data
-        else:
-            self.buffer = self.buffer + data
+        self.buffer += data
         self.read_lines()
 
     def read_lines(self):
         while True:
-            cmd, separator, self.buffer = self.buffer.partition("\r\n")
-            if separator:
-                if self.readlinecallback(self, cmd):
-                    # 01/05/12 Boudewijn: when a positive value is returned we immediately return to
-                    # allow more bytes to be pushed into the buffer
-                    self.buffer = "".join((cmd, separator, self.buffer))
-
-            else:
-                self.buffer = cmd
+            end = self.buffer.find("\r\n", self.offset)
+            if end == -1:
+                break
+            start = self.offset
+            cmd = str(self.buffer[start:end])
+            self.offset = end + 2
+            if self.readlinecallback(self, cmd):
+                # 01/05/12 Boudewijn: when a positive value is returned we immediately return to
+                # allow more bytes to be pushed into the buffer
+                self.offset = start
                 break
 
+        if self.offset == len(self.buffer):
+            del self.buffer[:]
+            self.offset = 0
+        elif self.offset >= COMPACT_SIZE:
+            del self.buffer[:self.offset]
+            self.offset = 0
+
+    def buffered(self):
+        """ Returns the number of received bytes after the last read line """
+        return len(self.buffer) - self.offset
+
+    def read(self, length):
+        """ Read data that followed a line, called by readlinecallback """
+        data = str(self.buffer[self.offset:self.offset+length])
+        self.offset += len(data)
+        return data
+
     def write(self,data):
         if self.singsock is not None:
             self.singsock.write(data)
@@ -11,6 +11,7 @@ import sys
 from threading import Thread,Condition, RLock, currentThread
 from traceback import print_exc,print_stack,format_stack
 from time import time
+from heapq import heappush, heappop, heapify
 try:
     prctlimported = True
     import prctl
@@ -19,6 +20,9 @@ except ImportError,e:
 
 DEBUG = False
 
+# marker for tasks that were removed from the queue
+REMOVED = object()
+
 class TimedTaskQueue:
 
     __single = None
@@ -27,8 +31,18 @@ class TimedTaskQueue:
         self.inDEBUG = inDEBUG
 
         self.cond = Condition(RLock())
-        self.queue = []
+        self.queue = [] # heap of [when,count,task,id] entries
+        self.tasks_by_id = {} # id -> entry, used for O(1) lookup and lazy removal
+        self.nr_removed = 0 # number of cancelled entries still in the heap
         self.count = 0.0 # serves to keep task that were scheduled at the same time in FIFO order
+        
+        # statistics, see get_stats()
+        self.nr_dispatched = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.task_runtimes = {} # task name -> [nr calls, total runtime, max runtime]
+
         self.thread = Thread(target = self.run)
         self.thread.setDaemon(isDaemon)
         self.thread.setName( nameprefix+self.thread.getName() )
@@ -59,21 +73,98 @@ class TimedTaskQueue:
         if __debug__:
             self.callstack[self.count] = format_stack()
 
+        entry = [when,self.count,task,id]
         if id != None:  # remove all redundant tasks
-            self.queue = filter(lambda item:item[3]!=id, self.queue)
-        self.queue.append((when,self.count,task,id))
+            self._remove_entry(self.tasks_by_id.get(id))
+            self.tasks_by_id[id] = entry
+        heappush(self.queue, entry)
         self.count += 1.0
         self.cond.notify()
         self.cond.release()
 
     def remove_task(self, id):
         self.cond.acquire()
-        self.queue = filter(lambda item:item[3]!=id, self.queue)
+        self._remove_entry(self.tasks_by_id.get(id))
         self.cond.notify()
         self.cond.release()
 
     def does_task_exist(self, id):
-        return any(item[3]==id for item in self.queue)
+        return id in self.tasks_by_id
+
+    def get_queue_size(self):
+        """ Returns the number of tasks waiting to be executed """
+        return len(self.queue) - self.nr_removed
+
+    def get_stats(self):
+        """ Returns a dictionary describing how well this queue keeps up:
+            queue_size: number of pending tasks
+            dispatched: number of tasks executed so far
+            avg_lag, max_lag, last_lag: seconds between the time a task was
+                due and the time it was started
+            runtimes: task name -> (nr calls, total runtime, max runtime)
+        """
+        self.cond.acquire()
+        try:
+            if self.nr_dispatched:
+                avg_lag = self.total_lag / self.nr_dispatched
+            else:
+                avg_lag = 0.0
+            runtimes = dict((name, tuple(value)) for name, value in self.task_runtimes.iteritems())
+            return {'queue_size': self.get_queue_size(),
+                    'dispatched': self.nr_dispatched,
+                    'avg_lag': avg_lag,
+                    'max_lag': self.max_lag,
+                    'last_lag': self.last_lag,
+                    'runtimes': runtimes}
+        finally:
+            self.cond.release()
+
+    def _remove_entry(self, entry):
+        """ Mark entry as removed, it is dropped from the heap when it surfaces.
+            Must be called while holding self.cond """
+        if entry is None or entry[2] is REMOVED:
+            return
+
+        entry[2] = REMOVED
+        if entry[3] is not None:
+            self.tasks_by_id.pop(entry[3], None)
+        if __debug__:
+            self.callstack.pop(entry[1], None)
+
+        self.nr_removed += 1
+        # compact the heap if it mostly consists of removed tasks
+        if self.nr_removed > 64 and self.nr_removed * 2 > len(self.queue):
+            self.queue = [item for item in self.queue if item[2] is not REMOVED]
+            heapify(self.queue)
+            self.nr_removed = 0
+
+    def _pop_removed(self):
+        """ Drop removed entries from the top of the heap.
+            Must be called while holding self.cond """
+        while self.queue and self.queue[0][2] is REMOVED:
+            heappop(self.queue)
+            self.nr_removed -= 1
+
+    def _update_stats(self, task, lag, took):
+        self.cond.acquire()
+        try:
+            self.nr_dispatched += 1
+            self.total_lag += lag
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+            name = task.__name__ if hasattr(task, "__name__") else str(task)
+            runtime = self.task_runtimes.get(name)
+            if runtime is None:
+                self.task_runtimes[name] = [1, took, took]
+            else:
+                runtime[0] += 1
+                runtime[1] += took
+                if took > runtime[2]:
+                    runtime[2] = took
+        finally:
+            self.cond.release()
 
     def run(self):
         """ Run by server thread """
@@ -87,6 +178,7 @@ class TimedTaskQueue:
             flag = False
             self.cond.acquire()
             while True:
+                self._pop_removed()
                 while len(self.queue) == 0 or flag:
                     flag = False
                     if timeout is None:
@@ -95,9 +187,8 @@ class TimedTaskQueue:
                     else:
                         # Wait till first event is due
                         self.cond.wait(timeout)
+                    self._pop_removed()
                 # A new event was added or an event is due
-                self.queue.sort()
-
                 (when,count,task,id) = self.queue[0]
                 if DEBUG:
                     print >>sys.stderr,"ttqueue: EVENT IN QUEUE",when,task
@@ -112,7 +203,9 @@ class TimedTaskQueue:
                     # Event due, execute
                     if DEBUG:
                         print >>sys.stderr,"ttqueue: EVENT DUE"
-                    self.queue.pop(0)
+                    heappop(self.queue)
+                    if id is not None:
+                        del self.tasks_by_id[id]
                     if __debug__:
                         assert count in self.callstack
                         stack = self.callstack.pop(count)
@@ -125,20 +218,22 @@ class TimedTaskQueue:
                 if task == 'stop':
                     break
                 elif task == 'quit':
-                    if len(self.queue) == 0:
+                    if self.get_queue_size() == 0:
                         break
                     else:
-                        (when,count,task,id) = self.queue[-1]
+                        self.cond.acquire()
+                        (when,count,task,id) = max(item for item in self.queue if item[2] is not REMOVED)
+                        self.cond.release()
                         t = when-time()+0.001
                         self.add_task('quit',t)
                 else:
-                    if self.inDEBUG:
-                        t1 = time()
+                    t1 = time()
 
                     task()
 
+                    took = time() - t1
+                    self._update_stats(task, t1 - when, took)
                     if self.inDEBUG:
-                        took = time() - t1
                         if took > 0.2:
                             debug_call_name = task.__name__ if hasattr(task, "__name__") else str(task)
                             print >> sys.stderr,"ttqueue: EVENT TOOK", took, debug_call_name
@@ -3,6 +3,7 @@ import sys
 from os import path
 from time import time
 from random import sample, randint, shuffle, random
+from collections import OrderedDict
 from Crypto.Util.number import bytes_to_long, long_to_bytes
 
 from Tribler.dispersy.authentication import MemberAuthentication
@@ -31,8 +32,8 @@ from Tribler.community.privatesearch.conversion import PSearchConversion, \
     HSearchConversion
 from Tribler.dispersy.script import assert_
 
-from Tribler.community.privatesearch.pallier import pallier_add, pallier_init, pallier_encrypt, pallier_decrypt
-from Tribler.community.privatesearch.rsa import rsa_init, rsa_encrypt, rsa_decrypt, rsa_compatible, hash_element
+from Tribler.community.privatesearch.pallier import pallier_add, pallier_init, pallier_encrypt_many, pallier_decrypt
+from Tribler.community.privatesearch.rsa import rsa_init, rsa_encrypt_many, rsa_decrypt_many, rsa_compatible, hash_element
 
 if __debug__:
     from Tribler.dispersy.dprint import dprint
@@ -44,6 +45,7 @@ NEIGHBORS = 5
 FNEIGHBORS = 1
 ENCRYPTION = True
 PING_INTERVAL = CANDIDATE_WALK_LIFETIME - 5.0
+MAX_PEER_KEY_CACHE = 100
 
 class SearchCommunity(Community):
     """
@@ -56,16 +58,16 @@ class SearchCommunity(Community):
         return [master]
 
     @classmethod
-    def load_community(cls, master, my_member, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False):
+    def load_community(cls, master, my_member, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False, crypto_workers=0):
         dispersy_database = DispersyDatabase.get_instance()
         try:
             dispersy_database.execute(u"SELECT 1 FROM community WHERE master = ?", (master.database_id,)).next()
         except StopIteration:
-            return cls.join_community(master, my_member, my_member, integrate_with_tribler=integrate_with_tribler, ttl=ttl, neighbors=neighbors, fneighbors=fneighbors, encryption=encryption, max_prefs=max_prefs, log_searches=log_searches)
+            return cls.join_community(master, my_member, my_member, integrate_with_tribler=integrate_with_tribler, ttl=ttl, neighbors=neighbors, fneighbors=fneighbors, encryption=encryption, max_prefs=max_prefs, log_searches=log_searches, crypto_workers=crypto_workers)
         else:
-            return super(SearchCommunity, cls).load_community(master, integrate_with_tribler=integrate_with_tribler, ttl=ttl, neighbors=neighbors, fneighbors=fneighbors, encryption=encryption, max_prefs=max_prefs, log_searches=log_searches)
+            return super(SearchCommunity, cls).load_community(master, integrate_with_tribler=integrate_with_tribler, ttl=ttl, neighbors=neighbors, fneighbors=fneighbors, encryption=encryption, max_prefs=max_prefs, log_searches=log_searches, crypto_workers=crypto_workers)
 
-    def __init__(self, master, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False):
+    def __init__(self, master, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False, crypto_workers=0):
         super(SearchCommunity, self).__init__(master)
 
         self.integrate_with_tribler = bool(integrate_with_tribler)
@@ -84,6 +86,10 @@ class SearchCommunity(Community):
 
         self.taste_buddies = []
         self.my_preference_cache = [None, None]
+        # [my preferences, subset used for similarity, his key n -> (compatible key, hashed encrypted subset)]
+        # the subset is sampled once and reused until my preferences change, the at most
+        # MAX_PEER_KEY_CACHE peer keys are evicted least recently used first
+        self.my_compatible_preference_cache = [None, None, OrderedDict()]
 
         # To always perform searches using a peer uncomment/modify the following line
         # self.taste_buddies.append([1, time(), Candidate(("127.0.0.1", 1234), False))
@@ -110,6 +116,13 @@ class SearchCommunity(Community):
         self.create_time_decryption = 0.0
         self.receive_time_encryption = 0.0
 
+        # optionally run the rsa/pallier operations in worker processes
+        if crypto_workers and self.encryption:
+            from Tribler.community.privatesearch.cryptopool import CryptoPool
+            self.crypto_pool = CryptoPool(int(crypto_workers), self._dispersy.callback.register)
+        else:
+            self.crypto_pool = None
+
         if self.integrate_with_tribler:
             from Tribler.Core.CacheDB.SqliteCacheDBHandler import ChannelCastDBHandler, TorrentDBHandler, MyPreferenceDBHandler
             from Tribler.Core.CacheDB.Notifier import Notifier
@@ -132,6 +145,20 @@ class SearchCommunity(Community):
             self._notifier = None
             self._rtorrent_handler = None
 
+    def unload_community(self):
+        super(SearchCommunity, self).unload_community()
+
+        if self.crypto_pool:
+            self.crypto_pool.shutdown()
+
+    def get_crypto_statistics(self):
+        statistics = {"create_time_encryption": self.create_time_encryption,
+                      "create_time_decryption": self.create_time_decryption,
+                      "receive_time_encryption": self.receive_time_encryption}
+        if self.crypto_pool:
+            statistics.update(("pool_" + key, value) for key, value in self.crypto_pool.get_statistics().iteritems())
+        return statistics
+
     def fast_walker(self):
         for cycle in xrange(10):
             if cycle < 2:
@@ -267,10 +294,10 @@ class SearchCommunity(Community):
                 myPreferences = [bytes_to_long(infohash) for infohash in myPreferences]
                 if self.encryption:
                     t1 = time()
-                    myPreferences = [rsa_encrypt(self.key, infohash) for infohash in myPreferences]
+                    myPreferences = rsa_encrypt_many(self.key, myPreferences)
                     self.create_time_encryption += time() - t1
 
-                self.my_vector_cache = [str_myPreferences, myPreferences]
+                self.my_preference_cache = [str_myPreferences, myPreferences]
 
             if DEBUG_VERBOSE:
                 print >> sys.stderr, long(time()), "SearchCommunity: sending introduction request to", destination, "containing", len(myPreferences), "hashes", self._mypref_db.getMyPrefListInfohash()
@@ -315,53 +342,109 @@ class SearchCommunity(Community):
     def process_rsa_simirequest(self, messages, send_messages=True):
         # 1. fetch my preferences
         myPreferences = [preference for preference in self._mypref_db.getMyPrefListInfohash(local=False) if preference]
-        myListLen = len(myPreferences)
+        tuple_myPreferences = tuple(myPreferences)
 
-        # 2. use subset if we have to many preferences
-        if myListLen > self.max_h_prefs:
-            myPreferences = sample(myPreferences, self.max_h_prefs)
+        if self.my_compatible_preference_cache[0] == tuple_myPreferences:
+            myPreferences = self.my_compatible_preference_cache[1]
+        else:
+            # 2. use subset if we have to many preferences, every peer receives the same
+            # subset until my preferences change (previously it was resampled per request)
+            if len(myPreferences) > self.max_h_prefs:
+                myPreferences = sample(myPreferences, self.max_h_prefs)
 
-        if self.encryption:
-            myPreferences = [bytes_to_long(preference) for preference in myPreferences]
+            if self.encryption:
+                myPreferences = [bytes_to_long(preference) for preference in myPreferences]
+
+            # my preferences changed, the lists encrypted for other peers are no longer valid
+            self.my_compatible_preference_cache = [tuple_myPreferences, myPreferences, OrderedDict()]
+        peer_key_cache = self.my_compatible_preference_cache[2]
 
         for message in messages:
             if self.encryption:
                 t1 = time()
 
-                # 3. construct a rsa key to encrypt my preferences
+                # 3. construct a rsa key to encrypt my preferences, reuse the key and
+                # my encrypted + hashed list if we have seen this peer key before
                 his_n = message.payload.key_n
-                fake_phi = his_n / 2
-                compatible_key = rsa_compatible(his_n, fake_phi)
+                cached = peer_key_cache.pop(his_n, None)
+
+                if send_messages and self.crypto_pool:
+                    # encrypt in a worker process, _on_simirequest_encrypted sends the response
+                    if cached is None:
+                        compatible_key, myList = rsa_compatible(his_n, his_n / 2), None
+                    else:
+                        compatible_key, myList = cached
+                        self._cache_peer_key(peer_key_cache, his_n, cached)
+
+                    self.crypto_pool.submit(u"rsa-similarity-response", compatible_key, (message.payload.preference_list, None if myList else myPreferences),
+                                            self._on_simirequest_encrypted, (message, his_n, compatible_key, myList, peer_key_cache))
+                    continue
+
+                if cached is None:
+                    fake_phi = his_n / 2
+                    compatible_key = rsa_compatible(his_n, fake_phi)
+                    cached = (compatible_key, [hash_element(cipher) for cipher in rsa_encrypt_many(compatible_key, myPreferences)])
+                self._cache_peer_key(peer_key_cache, his_n, cached)
+                compatible_key, myList = cached
 
                 # 4. encrypt hislist and mylist + hash mylist
-                hisList = [rsa_encrypt(compatible_key, infohash) for infohash in message.payload.preference_list]
-                myList = [hash_element(rsa_encrypt(compatible_key, infohash)) for infohash in myPreferences]
+                hisList = rsa_encrypt_many(compatible_key, message.payload.preference_list)
+                myList = myList[:]
 
                 self.receive_time_encryption += time() - t1
             else:
                 hisList = message.payload.preference_list
-                myList = myPreferences
+                myList = myPreferences[:]
 
             shuffle(hisList)
             shuffle(myList)
             if send_messages:
-                # 5. create a messages, containing hislist encrypted with my compatible key and mylist only encrypted by the compatible key + hashed
-                meta = self.get_meta_message(u"encrypted-response")
-                resp_message = meta.impl(authentication=(self._my_member,),
-                                    distribution=(self.global_time,),
-                                    destination=(message.candidate,),
-                                    payload=(message.payload.identifier, hisList, myList))
-
-                self._dispersy._forward([resp_message])
-
-                if DEBUG_VERBOSE:
-                    print >> sys.stderr, long(time()), "SearchCommunity: sending encrypted-response to", message.payload.identifier, message.candidate
+                self._send_encrypted_response(message, hisList, myList)
             else:
                 return hisList, myList
 
+    def _on_simirequest_encrypted(self, result, took, message, his_n, compatible_key, myList, peer_key_cache):
+        # called with the result of the crypto_pool
+        self.receive_time_encryption += took
+
+        hisList, new_myList = result
+        if new_myList is not None:
+            myList = new_myList
+            self._cache_peer_key(peer_key_cache, his_n, (compatible_key, myList))
+
+        myList = myList[:]
+        shuffle(hisList)
+        shuffle(myList)
+        self._send_encrypted_response(message, hisList, myList)
+
+    def _cache_peer_key(self, peer_key_cache, his_n, cached):
+        # keep at most MAX_PEER_KEY_CACHE peer keys, the least recently used one is evicted
+        peer_key_cache.pop(his_n, None)
+        if len(peer_key_cache) >= MAX_PEER_KEY_CACHE:
+            peer_key_cache.popitem(last=False)
+        peer_key_cache[his_n] = cached
+
+    def _send_encrypted_response(self, message, hisList, myList):
+        # 5. create a messages, containing hislist encrypted with my compatible key and mylist only encrypted by the compatible key + hashed
+        meta = self.get_meta_message(u"encrypted-response")
+        resp_message = meta.impl(authentication=(self._my_member,),
+                            distribution=(self.global_time,),
+                            destination=(message.candidate,),
+                            payload=(message.payload.identifier, hisList, myList))
+
+        self._dispersy._forward([resp_message])
+
+        if DEBUG_VERBOSE:
+            print >> sys.stderr, long(time()), "SearchCommunity: sending encrypted-response to", message.payload.identifier, message.candidate
+
     def on_encr_response(self, messages):
         # TODO: we should check if this is our request, ie use the requestcache however the requestcache is completely broken...
         for message in messages:
+            if self.encryption and self.crypto_pool:
+                # decrypt in a worker process, _on_encr_response_decrypted adds the taste buddy
+                self.crypto_pool.submit(u"rsa-decrypt-hash", self.key, (message.payload.preference_list,), self._on_encr_response_decrypted, (message,))
+                continue
+
             overlap = self.compute_rsa_overlap(message.payload.preference_list, message.payload.his_preference_list)
 
 #            for now only use overlap
@@ -373,20 +456,31 @@ class SearchCommunity(Community):
 
             self.add_taste_buddies([[overlap, time(), message.candidate]])
 
+    def _on_encr_response_decrypted(self, myList, took, message):
+        # called with the result of the crypto_pool
+        self.create_time_decryption += took
+
+        overlap = self.count_overlap(myList, message.payload.his_preference_list)
+        self.add_taste_buddies([[overlap, time(), message.candidate]])
+
     def compute_rsa_overlap(self, preference_list, his_preference_list):
         if self.encryption:
             t1 = time()
-            myList = [hash_element(rsa_decrypt(self.key, infohash)) for infohash in preference_list]
+            myList = [hash_element(infohash) for infohash in rsa_decrypt_many(self.key, preference_list)]
 
             self.create_time_decryption += time() - t1
         else:
             myList = [long_to_bytes(infohash) for infohash in preference_list]
 
+        return self.count_overlap(myList, his_preference_list)
+
+    def count_overlap(self, myList, his_preference_list):
         assert all(len(infohash) == 20 for infohash in myList)
 
+        his_preference_set = set(his_preference_list)
         overlap = 0
         for pref in myList:
-            if pref in his_preference_list:
+            if pref in his_preference_set:
                 overlap += 1
         return overlap
 
@@ -773,8 +867,7 @@ class SearchCommunity(Community):
                 print >> sys.stderr, long(time()), long(time()), "SearchCommunity: got request for ", len(requested_packets), "torrents from", message.candidate
 
     def on_torrent(self, messages):
-        for message in messages:
-            self._torrent_db.addExternalTorrentNoDef(message.payload.infohash, message.payload.name, message.payload.files, message.payload.trackers, message.payload.timestamp, "DISP_SC", {'dispersy_id':message.packet_id})
+        self._torrent_db.addExternalTorrentsNoDef([(message.payload.infohash, message.payload.name, message.payload.files, message.payload.trackers, message.payload.timestamp, {'dispersy_id':message.packet_id}) for message in messages], "DISP_SC")
 
     def _get_channel_id(self, cid):
         assert isinstance(cid, str)
@@ -884,8 +977,8 @@ class SearchCommunity(Community):
 
 class ForwardCommunity(SearchCommunity):
 
-    def __init__(self, master, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False):
-        SearchCommunity.__init__(self, master, integrate_with_tribler, ttl, neighbors, fneighbors, encryption, max_prefs, log_searches)
+    def __init__(self, master, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False, crypto_workers=0):
+        SearchCommunity.__init__(self, master, integrate_with_tribler, ttl, neighbors, fneighbors, encryption, max_prefs, log_searches, crypto_workers)
 
         self.possible_taste_buddies = []
         self.requested_introductions = {}
@@ -1030,8 +1123,8 @@ class ForwardCommunity(SearchCommunity):
 
 class PSearchCommunity(ForwardCommunity):
 
-    def __init__(self, master, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False):
-        ForwardCommunity.__init__(self, master, integrate_with_tribler, ttl, neighbors, fneighbors, encryption, max_prefs, log_searches)
+    def __init__(self, master, integrate_with_tribler=True, ttl=TTL, neighbors=NEIGHBORS, fneighbors=FNEIGHBORS, encryption=ENCRYPTION, max_prefs=None, log_searches=False, crypto_workers=0):
+        ForwardCommunity.__init__(self, master, integrate_with_tribler, ttl, neighbors, fneighbors, encryption, max_prefs, log_searches, crypto_workers)
 
         self.key = pallier_init(self.key)
         self.my_vector_cache = [None, None]
@@ -1057,19 +1150,30 @@ class PSearchCommunity(ForwardCommunity):
         else:
             my_vector = self.get_my_vector(global_vector, local=True)
             if self.encryption:
+                if self.crypto_pool:
+                    # encrypt in a worker process, _on_my_vector_encrypted sends the request
+                    self.crypto_pool.submit(u"pallier-encrypt", self.key, (my_vector,), self._on_my_vector_encrypted, (destination, identifier, str_global_vector, global_vector_request))
+                    return True
 
                 t1 = time()
-                encrypted_vector = []
-                for element in my_vector:
-                    cipher = pallier_encrypt(self.key, element)
-                    encrypted_vector.append(cipher)
-
+                encrypted_vector = pallier_encrypt_many(self.key, my_vector)
                 self.create_time_encryption += time() - t1
             else:
                 encrypted_vector = my_vector
 
             self.my_vector_cache = [str_global_vector, encrypted_vector]
 
+        self._send_sums_request(destination, identifier, encrypted_vector, global_vector_request)
+        return True
+
+    def _on_my_vector_encrypted(self, encrypted_vector, took, destination, identifier, str_global_vector, global_vector_request):
+        # called with the result of the crypto_pool
+        self.create_time_encryption += took
+        self.my_vector_cache = [str_global_vector, encrypted_vector]
+
+        self._send_sums_request(destination, identifier, encrypted_vector, global_vector_request)
+
+    def _send_sums_request(self, destination, identifier, encrypted_vector, global_vector_request):
         meta_request = self.get_meta_message(u"sums-request")
         request = meta_request.impl(authentication=(self.my_member,),
                                 distribution=(self.global_time,),
@@ -1373,10 +1477,10 @@ class HSearchCommunity(ForwardCommunity):
             myPreferences = [bytes_to_long(infohash) for infohash in myPreferences]
             if self.encryption:
                 t1 = time()
-                myPreferences = [rsa_encrypt(self.key, infohash) for infohash in myPreferences]
+                myPreferences = rsa_encrypt_many(self.key, myPreferences)
                 self.create_time_encryption += time() - t1
 
-            self.my_vector_cache = [str_myPreferences, myPreferences]
+            self.my_preference_cache = [str_myPreferences, myPreferences]
 
         if myPreferences:
             if DEBUG_VERBOSE:
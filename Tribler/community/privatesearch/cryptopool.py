@@ -0,0 +1,110 @@
+import sys
+from multiprocessing import Pool
+from threading import Lock
+from time import time
+from traceback import format_exc
+
+from gmpy import mpz
+from Crypto import Random
+
+from Tribler.community.privatesearch.rsa import rsa_encrypt_many, rsa_decrypt_many, hash_element
+from Tribler.community.privatesearch.pallier import pallier_encrypt_many, pallier_decrypt_many
+
+DEBUG = False
+
+def rsa_similarity_response(key, his_list, my_list):
+    # encrypt his list, and encrypt + hash my list if it is not cached
+    his_list = rsa_encrypt_many(key, his_list)
+    if my_list is not None:
+        my_list = [hash_element(cipher) for cipher in rsa_encrypt_many(key, my_list)]
+    return his_list, my_list
+
+def rsa_decrypt_hash_many(key, ciphers):
+    return [hash_element(element) for element in rsa_decrypt_many(key, ciphers)]
+
+JOBS = {u"rsa-encrypt": rsa_encrypt_many,
+        u"rsa-decrypt": rsa_decrypt_many,
+        u"rsa-decrypt-hash": rsa_decrypt_hash_many,
+        u"rsa-similarity-response": rsa_similarity_response,
+        u"pallier-encrypt": pallier_encrypt_many,
+        u"pallier-decrypt": pallier_decrypt_many}
+
+def _pack_key(key):
+    # mpz values are converted to long to send them to a worker process
+    return type(key), tuple(long(value) if type(value).__name__ == "mpz" else value for value in key)
+
+def _unpack_key(packed_key):
+    key_type, values = packed_key
+    return key_type(*[mpz(value) if isinstance(value, long) else value for value in values])
+
+def _init_worker():
+    # the StrongRandom used by pallier_encrypt must be re-initialized after fork
+    Random.atfork()
+
+def _run_job(job, packed_key, args):
+    """ Runs in a worker process, returns (result, cpu time, error) """
+    try:
+        t1 = time()
+        result = JOBS[job](_unpack_key(packed_key), *args)
+        return result, time() - t1, None
+    except:
+        return None, 0.0, format_exc()
+
+class CryptoPool(object):
+    """
+    Runs batches of RSA and Pallier operations in worker processes, so they
+    do not block the Dispersy thread.
+
+    The result of a job is passed to its callback using register, usually
+    dispersy.callback.register, as callback(result, took, *args) where took is
+    the time spent in the worker process.
+    """
+
+    def __init__(self, processes, register):
+        self._pool = Pool(processes, _init_worker)
+        self._register = register
+        self._lock = Lock()
+
+        self.nr_jobs = 0
+        self.nr_elements = 0
+        self.nr_pending = 0
+        self.nr_failed = 0
+        self.worker_time = 0.0
+
+    def submit(self, job, key, args, callback, callback_args=()):
+        assert job in JOBS, job
+
+        def on_result(result):
+            result, took, error = result
+            with self._lock:
+                self.nr_pending -= 1
+                self.worker_time += took
+                if error:
+                    self.nr_failed += 1
+
+            if error:
+                print >> sys.stderr, "CryptoPool: job", job, "failed", error
+            else:
+                self._register(callback, args=(result, took) + tuple(callback_args))
+
+        with self._lock:
+            self.nr_jobs += 1
+            self.nr_pending += 1
+            self.nr_elements += sum(len(arg) for arg in args if isinstance(arg, list))
+
+        if DEBUG:
+            print >> sys.stderr, "CryptoPool: submitting", job, "pending", self.nr_pending
+
+        self._pool.apply_async(_run_job, (job, _pack_key(key), args), callback=on_result)
+
+    def get_statistics(self):
+        with self._lock:
+            return {"jobs": self.nr_jobs,
+                    "elements": self.nr_elements,
+                    "pending": self.nr_pending,
+                    "failed": self.nr_failed,
+                    "worker_time": self.worker_time}
+
+    def shutdown(self):
+        self._pool.terminate()
+        self._pool.join()
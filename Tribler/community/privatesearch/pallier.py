@@ -56,6 +56,12 @@ def pallier_decrypt(key, cipher):
     value = (t1 * key.d) % key.n
     return long(value)
 
+def pallier_encrypt_many(key, elements):
+    return [pallier_encrypt(key, element) for element in elements]
+
+def pallier_decrypt_many(key, ciphers):
+    return [pallier_decrypt(key, cipher) for cipher in ciphers]
+
 def pallier_multiply(cipher, times,  n2):
     cipher_ = mpz(cipher)
     times_ = mpz(times)
@@ -35,6 +35,14 @@ def rsa_decrypt(key, cipher):
     _cipher = mpz(cipher)
     return long(pow(_cipher, key.d, key.n))
 
+def rsa_encrypt_many(key, elements):
+    e, n = key.e, key.n
+    return [long(pow(mpz(element), e, n)) for element in elements]
+
+def rsa_decrypt_many(key, ciphers):
+    d, n = key.d, key.n
+    return [long(pow(mpz(cipher), d, n)) for cipher in ciphers]
+
 def hash_element(element):
     return sha1(str(element)).digest()
 
@@ -22,6 +22,8 @@ class SearchScript(ScenarioScriptBase):
             self.community_kargs['fneighbors'] = int(kargs['fneighbors'])
         if 'max_prefs' in kargs:
             self.community_kargs['max_prefs'] = int(kargs['max_prefs'])
+        if 'crypto_workers' in kargs:
+            self.community_kargs['crypto_workers'] = int(kargs['crypto_workers'])
 
         def str2bool(v):
             return v.lower() in ("yes", "true", "t", "1")
@@ -137,7 +139,7 @@ class SearchScript(ScenarioScriptBase):
             recall /= float(self.do_search)
 
             log("dispersy.log", "scenario-statistics", bootstrapped=taste_ratio, latejoin=latejoin, recall=recall, nr_search_=self.nr_search)
-            log("dispersy.log", "scenario-debug", not_connected=list(self.not_connected_taste_buddies), search_forward=self._community.search_forward, search_forward_success=self._community.search_forward_success, search_forward_timeout=self._community.search_forward_timeout, search_endpoint=self._community.search_endpoint, search_cycle_detected=self._community.search_cycle_detected, search_megacachesize=self._community.search_megacachesize, create_time_encryption=self._community.create_time_encryption, create_time_decryption=self._community.create_time_decryption, receive_time_encryption=self._community.receive_time_encryption)
+            log("dispersy.log", "scenario-debug", not_connected=list(self.not_connected_taste_buddies), search_forward=self._community.search_forward, search_forward_success=self._community.search_forward_success, search_forward_timeout=self._community.search_forward_timeout, search_endpoint=self._community.search_endpoint, search_cycle_detected=self._community.search_cycle_detected, search_megacachesize=self._community.search_megacachesize, **self._community.get_crypto_statistics())
             yield 5.0
 
     def log_taste_buddies(self, new_taste_buddies):
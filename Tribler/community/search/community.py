@@ -311,7 +311,7 @@ class SearchCommunity(Community):
                 print >> sys.stderr, "SearchCommunity: got search request for",keywords
 
             results = []
-            dbresults = self._torrent_db.searchNames(keywords, local = False, keys = ['infohash', 'T.name', 'T.length', 'T.num_files', 'T.category_id', 'T.creation_date', 'T.num_seeders', 'T.num_leechers', 'swift_hash', 'swift_torrent_hash'])
+            dbresults = self._torrent_db.searchNames(keywords, local = False, keys = ['infohash', 'T.name', 'T.length', 'T.num_files', 'T.category_id', 'T.creation_date', 'T.num_seeders', 'T.num_leechers', 'swift_hash', 'swift_torrent_hash'], limit = 25)
             if len(dbresults) > 0:
                 for dbresult in dbresults:
                     channel_details = dbresult[-10:]
@@ -589,8 +589,7 @@ class SearchCommunity(Community):
         return messages
 
     def on_torrent(self, messages):
-        for message in messages:
-            self._torrent_db.addExternalTorrentNoDef(message.payload.infohash, message.payload.name, message.payload.files, message.payload.trackers, message.payload.timestamp, "DISP_SC", {'dispersy_id':message.packet_id})
+        self._torrent_db.addExternalTorrentsNoDef([(message.payload.infohash, message.payload.name, message.payload.files, message.payload.trackers, message.payload.timestamp, {'dispersy_id':message.packet_id}) for message in messages], "DISP_SC")
 
     def _get_channel_id(self, cid):
         assert isinstance(cid, str)